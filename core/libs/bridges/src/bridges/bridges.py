@@ -1,16 +1,78 @@
+import asyncio
 import logging
+import os
 import shlex
-import time
+from collections import deque
+from dataclasses import dataclass
 from shutil import which
-from subprocess import PIPE, Popen
+from typing import Deque, List, Optional, Set
 
-from bridges.serialhelper import Baudrate
+from bridges.serialhelper import Baudrate, SerialCounters, serial_counters
 from serial.tools.list_ports_linux import SysFS
 
 
-# pylint: disable=too-many-arguments
+@dataclass
+class BridgeStatistics:
+    running: bool
+    # Times the bridge was restarted after exiting
+    restarts: int
+    # Bytes received from and sent to the serial device since the bridge was started, when the driver counts them
+    serial_rx_bytes: Optional[int] = None
+    serial_tx_bytes: Optional[int] = None
+    serial_frame_errors: Optional[int] = None
+    serial_overruns: Optional[int] = None
+    serial_parity_errors: Optional[int] = None
+    serial_breaks: Optional[int] = None
+    serial_buffer_overruns: Optional[int] = None
+    # Datagrams dropped as the bridge didn't read them fast enough
+    udp_drops: Optional[int] = None
+
+
+def process_sockets(pid: int) -> Set[str]:
+    """Inodes of the sockets opened by the process"""
+    inodes = set()
+    for fd in os.listdir(f"/proc/{pid}/fd"):
+        try:
+            target = os.readlink(f"/proc/{pid}/fd/{fd}")
+        except OSError:
+            continue
+        if target.startswith("socket:["):
+            inodes.add(target[8:-1])
+    return inodes
+
+
+def udp_drops(pid: int) -> int:
+    """Datagrams dropped by the UDP sockets of the process"""
+    inodes = process_sockets(pid)
+    drops = 0
+    for table in ("udp", "udp6"):
+        with open(f"/proc/{pid}/net/{table}", encoding="utf-8") as sockets:
+            next(sockets)
+            for line in sockets:
+                columns = line.split()
+                if columns[9] in inodes:
+                    drops += int(columns[12])
+    return drops
+
+
+# pylint: disable=too-many-arguments,too-many-instance-attributes
 class Bridge:
-    """Basic abstraction of Bridges. Used to bridge serial devices to UDP ports"""
+    """Basic abstraction of Bridges. Used to bridge serial devices to UDP ports
+
+    The bridges process is supervised once started: it's restarted with an exponential backoff when it exits, and
+    its output is read as it's written, so it never blocks on full pipes.
+    """
+
+    # Time for the bridge to open its serial device and UDP socket
+    READY_TIMEOUT_S = 5.0
+    STOP_TIMEOUT_S = 2.0
+    MIN_BACKOFF_S = 1.0
+    MAX_BACKOFF_S = 30.0
+    # Bridges running for longer than this are restarted again after MIN_BACKOFF_S
+    STABLE_TIME_S = 60.0
+    READ_CHUNK_SIZE = 64 * 1024
+    OUTPUT_LINES = 20
+    OUTPUT_LINE_LENGTH = 256
 
     def __init__(
         self,
@@ -30,22 +92,157 @@ class Bridge:
         if not is_server and udp_listen_port != 0:
             command_line += f" --listen-port {udp_listen_port}"
 
-        logging.info(f"Launching bridge link with command '{command_line}'.")
-        # pylint: disable=consider-using-with
-        self.process = Popen(shlex.split(command_line), stdout=PIPE, stderr=PIPE)
-        time.sleep(1.0)
-        if self.process.poll() is not None:
-            _stdout, strerr = self.process.communicate()
-            error = strerr.decode("utf-8") if strerr else "Empty error"
-            raise RuntimeError(f'Failed to initialize bridge, code: {self.process.returncode}, message: "{error}".')
+        self.serial_port = serial_port
+        self.command_line = command_line
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.restarts = 0
+        self.output: Deque[str] = deque(maxlen=self.OUTPUT_LINES)
+        self._output_tasks: List["asyncio.Task[None]"] = []
+        self._supervisor: Optional["asyncio.Task[None]"] = None
+        self._counters_baseline: Optional[SerialCounters] = None
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self) -> None:
+        """Launches the bridge and waits for it to be ready, raising RuntimeError if it fails to start."""
+        if self._supervisor is not None:
+            raise RuntimeError("Bridge is already running.")
+        await self._launch()
+        self._counters_baseline = await asyncio.to_thread(serial_counters, self.serial_port.device)
+        self._supervisor = asyncio.create_task(self._supervise())
 
-    def stop(self) -> None:
+    async def stop(self) -> None:
         if not self.process:
             raise RuntimeError("Bridges process doesn't exist.")
-        self.process.kill()
-        time.sleep(1.0)
-        if self.process.poll() is None:
-            raise RuntimeError("Failed to kill bridges process.")
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            await asyncio.gather(self._supervisor, return_exceptions=True)
+            self._supervisor = None
+        if self.process.returncode is None:
+            self.process.kill()
+        try:
+            await asyncio.wait_for(self.process.wait(), self.STOP_TIMEOUT_S)
+        except asyncio.TimeoutError as error:
+            raise RuntimeError("Failed to kill bridges process.") from error
+        await asyncio.gather(*self._output_tasks, return_exceptions=True)
+
+    async def restart(self) -> None:
+        await self.stop()
+        await self.start()
+
+    async def _launch(self) -> None:
+        logging.info(f"Launching bridge link with command '{self.command_line}'.")
+        self.output.clear()
+        self.process = await asyncio.create_subprocess_exec(
+            *shlex.split(self.command_line), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        self._output_tasks = [
+            asyncio.create_task(self._pump(self.process.stdout, logging.DEBUG)),
+            asyncio.create_task(self._pump(self.process.stderr, logging.INFO)),
+        ]
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.READY_TIMEOUT_S
+        while not self._is_ready():
+            if self.process.returncode is not None:
+                await asyncio.gather(*self._output_tasks)
+                error = "\n".join(self.output) or "Empty error"
+                raise RuntimeError(f'Failed to initialize bridge, code: {self.process.returncode}, message: "{error}".')
+            if loop.time() > deadline:
+                logging.warning(f"Bridge for {self.serial_port.device} is running, but its ports were not seen open.")
+                return
+            await asyncio.sleep(0.05)
+
+    def _is_ready(self) -> bool:
+        """If the bridge opened its serial device and UDP socket"""
+        assert self.process is not None
+        device = os.path.realpath(self.serial_port.device)
+        serial_open = False
+        try:
+            for fd in os.listdir(f"/proc/{self.process.pid}/fd"):
+                try:
+                    serial_open |= os.readlink(f"/proc/{self.process.pid}/fd/{fd}") == device
+                except OSError:
+                    continue
+            return serial_open and bool(process_sockets(self.process.pid))
+        except OSError:
+            return False
+
+    async def _supervise(self) -> None:
+        loop = asyncio.get_running_loop()
+        backoff = self.MIN_BACKOFF_S
+        while True:
+            assert self.process is not None
+            started = loop.time()
+            returncode = await self.process.wait()
+            await asyncio.gather(*self._output_tasks)
+            if loop.time() - started > self.STABLE_TIME_S:
+                backoff = self.MIN_BACKOFF_S
+            logging.warning(
+                f"Bridge for {self.serial_port.device} exited with code {returncode}, restarting in {backoff}s. "
+                f'Output: "{" ".join(self.output)}".'
+            )
+            while True:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.MAX_BACKOFF_S)
+                try:
+                    await self._launch()
+                    break
+                except RuntimeError as error:
+                    logging.warning(f"{error} Retrying in {backoff}s.")
+            self.restarts += 1
+
+    async def _pump(self, stream: Optional[asyncio.StreamReader], level: int) -> None:
+        """Read the output of the bridge until EOF, keeping its last lines"""
+        if stream is None:
+            return
+        pending = b""
+        while chunk := await stream.read(self.READ_CHUNK_SIZE):
+            *lines, pending = (pending + chunk).split(b"\n")
+            # Avoid growing forever on output without line breaks
+            if len(pending) > self.READ_CHUNK_SIZE:
+                lines.append(pending)
+                pending = b""
+            self._add_lines(lines, level)
+        self._add_lines([pending], level)
+
+    def _add_lines(self, lines: List[bytes], level: int) -> None:
+        for line in lines:
+            message = line.decode(errors="replace").strip()
+            if message:
+                message = message[: self.OUTPUT_LINE_LENGTH]
+                self.output.append(message)
+                logging.log(level, f"Bridge {self.serial_port.device}: {message}")
+
+    def statistics(self) -> BridgeStatistics:
+        statistics = BridgeStatistics(running=self.running, restarts=self.restarts)
+        if not self.running:
+            return statistics
+        assert self.process is not None
+
+        counters = serial_counters(self.serial_port.device)
+        if counters is not None:
+            counters = counters.since(self._counters_baseline or SerialCounters())
+            statistics.serial_rx_bytes = counters.rx
+            statistics.serial_tx_bytes = counters.tx
+            statistics.serial_frame_errors = counters.frame
+            statistics.serial_overruns = counters.overrun
+            statistics.serial_parity_errors = counters.parity
+            statistics.serial_breaks = counters.brk
+            statistics.serial_buffer_overruns = counters.buf_overrun
+        try:
+            statistics.udp_drops = udp_drops(self.process.pid)
+        except OSError:
+            pass
+        return statistics
 
     def __del__(self) -> None:
-        self.stop()
+        # Bridges are stopped with stop(), this only makes sure the process doesn't outlive its Bridge
+        if self.running:
+            assert self.process is not None
+            try:
+                self.process.kill()
+            except (ProcessLookupError, RuntimeError):
+                pass
@@ -1,6 +1,11 @@
+import fcntl
 import logging
+import os
+import struct
+from dataclasses import dataclass, fields
 from enum import IntEnum
 from pathlib import Path
+from typing import Optional
 
 from serial.tools.list_ports_linux import SysFS
 
@@ -45,3 +50,45 @@ def set_low_latency(port: SysFS) -> None:
             p.flush()
     except IOError:
         logging.warning(f"Unable to set latency for device {device_name}, your device may work slower than expected.")
+
+
+# Linux ioctl to read the counters of serial interrupts, including the ones of transferred bytes and errors
+TIOCGICOUNT = 0x545D
+# cts, dsr, rng and dcd changes, rx, tx, frame, overrun, parity, brk and buf_overrun, followed by reserved fields
+SERIAL_ICOUNTER = struct.Struct("<11i9i")
+
+
+@dataclass
+class SerialCounters:
+    rx: int = 0
+    tx: int = 0
+    frame: int = 0
+    overrun: int = 0
+    parity: int = 0
+    brk: int = 0
+    buf_overrun: int = 0
+
+    def since(self, baseline: "SerialCounters") -> "SerialCounters":
+        """Counters since the baseline, or since they were reset, as when the device was plugged again"""
+        if any(getattr(self, item.name) < getattr(baseline, item.name) for item in fields(self)):
+            baseline = SerialCounters()
+        return SerialCounters(*(getattr(self, item.name) - getattr(baseline, item.name) for item in fields(self)))
+
+
+def serial_counters(device: str) -> Optional[SerialCounters]:
+    """
+    returns the counters kept by the driver of the serial device, if it supports them
+    """
+    try:
+        fd = os.open(device, os.O_RDONLY | os.O_NONBLOCK | os.O_NOCTTY)
+    except OSError:
+        return None
+    try:
+        counters = bytearray(SERIAL_ICOUNTER.size)
+        fcntl.ioctl(fd, TIOCGICOUNT, counters)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+    _cts, _dsr, _rng, _dcd, *values = SERIAL_ICOUNTER.unpack(counters)[:11]
+    return SerialCounters(*values)
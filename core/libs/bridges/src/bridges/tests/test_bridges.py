@@ -0,0 +1,81 @@
+import asyncio
+import os
+import pathlib
+import signal
+import sys
+from types import SimpleNamespace
+from typing import Any, Iterator
+from unittest.mock import patch
+
+import pytest
+
+from ..bridges import Bridge
+from ..serialhelper import Baudrate, SerialCounters
+
+# Writes a lot of output before opening its serial device and UDP socket, as the bridges binary does
+FAKE_BRIDGES = f"""#!{sys.executable}
+import socket, sys, time
+address = sys.argv[sys.argv.index("-u") + 1].rsplit(":", 1)
+device = sys.argv[sys.argv.index("-p") + 1].rsplit(":", 1)[0]
+sys.stdout.write("x" * 1024 * 1024 + "\\n")
+sys.stdout.flush()
+try:
+    serial = open(device, "rb")
+except OSError as error:
+    sys.exit(f"Failed to open serial port: {{error}}")
+udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+udp.bind((address[0], int(address[1])))
+print("Bridge running", flush=True)
+time.sleep(3600)
+"""
+
+
+@pytest.fixture(name="serial_device")
+def fixture_serial_device(tmp_path: pathlib.Path) -> Iterator[str]:
+    bridges = tmp_path / "bridges"
+    bridges.write_text(FAKE_BRIDGES)
+    bridges.chmod(0o755)
+    main, secondary = os.openpty()
+    with patch.dict(os.environ, {"PATH": f"{tmp_path}:{os.environ['PATH']}"}):
+        yield os.ttyname(secondary)
+    os.close(main)
+    os.close(secondary)
+
+
+def bridge_to(device: str) -> Bridge:
+    port: Any = SimpleNamespace(device=device)
+    return Bridge(port, Baudrate.b115200, "127.0.0.1", 0, 0)
+
+
+@pytest.mark.asyncio
+async def test_bridge_is_supervised(serial_device: str) -> None:
+    bridge = bridge_to(serial_device)
+    bridge.MIN_BACKOFF_S = 0.01
+    await bridge.start()
+    assert bridge.running and bridge.output[-1] == "Bridge running"
+    statistics = bridge.statistics()
+    assert statistics.running and statistics.restarts == 0 and statistics.udp_drops == 0
+
+    # Bridges that exit are restarted
+    assert bridge.process is not None
+    os.kill(bridge.process.pid, signal.SIGKILL)
+    while bridge.restarts == 0:
+        await asyncio.sleep(0.01)
+    assert bridge.running and bridge.statistics().restarts == 1
+
+    await bridge.stop()
+    assert not bridge.statistics().running and bridge.process.returncode is not None
+
+
+@pytest.mark.asyncio
+async def test_bridge_failing_to_start(serial_device: str) -> None:
+    bridge = bridge_to(f"{serial_device}-missing")
+    with pytest.raises(RuntimeError, match="(?s)code: 1, .*Failed to open serial port"):
+        await bridge.start()
+
+
+def test_serial_counters_since_start() -> None:
+    counters = SerialCounters(rx=100, tx=50, frame=2)
+    assert counters.since(SerialCounters(rx=40, tx=50)) == SerialCounters(rx=60, frame=2)
+    # Counters reset when devices are plugged again
+    assert counters.since(SerialCounters(rx=400)) == counters
@@ -1,13 +1,17 @@
 import asyncio
+import concurrent.futures
 import pathlib
 import shutil
 import subprocess
+import threading
 from datetime import datetime, timezone
+from enum import Enum
 from ipaddress import IPv4Address, IPv4Interface, IPv4Network
-from typing import Any, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import psutil
 from commonwealth.utils.DHCPDiscovery import discover_dhcp_servers
+from commonwealth.utils.inotify import InotifyWatch
 from loguru import logger
 from pydantic import BaseModel
 
@@ -25,6 +29,158 @@ class DHCPServerLease(BaseModel):
         return self.expires_epoch > datetime.now(timezone.utc).timestamp() if self.expires_epoch else False
 
 
+class LeaseEventType(str, Enum):
+    Joined = "joined"
+    Left = "left"
+    Updated = "updated"
+
+
+class DHCPLeaseEvent(BaseModel):
+    type: LeaseEventType
+    interface: str
+    lease: DHCPServerLease
+
+
+LeaseEventsCallback = Callable[[List[DHCPLeaseEvent]], None]
+
+
+class DHCPLeaseCache:
+    """Leases of a dnsmasq lease file, indexed by MAC and IP, parsed again only when the file changes.
+
+    Changes are detected with inotify, falling back to the file modification time when it's not available.
+    When given an event loop, changes are also picked up as soon as they happen, reporting which devices
+    joined, left or had their lease updated.
+    """
+
+    SETTLE_TIME_S = 0.1
+
+    def __init__(
+        self,
+        lease_file: pathlib.Path,
+        interface: str,
+        parse: Callable[[List[str]], List[DHCPServerLease]],
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        on_events: Optional[LeaseEventsCallback] = None,
+    ) -> None:
+        self._lease_file = lease_file
+        self._interface = interface
+        self._parse = parse
+        self._loop = loop
+        self._on_events = on_events
+        # Leases are read from the API worker threads and refreshed from the event loop
+        self._lock = threading.Lock()
+        self._by_mac: Dict[str, DHCPServerLease] = {}
+        self._by_ip: Dict[IPv4Address, DHCPServerLease] = {}
+        self._loaded = False
+        self._stale = True
+        self._file_signature: Optional[Tuple[int, int, int]] = None
+
+        self._watch: Optional[InotifyWatch] = None
+        try:
+            self._watch = InotifyWatch(lease_file.parent)
+        except Exception as exc:
+            logger.warning(f"Lease file changes will be detected by its modification time: {exc}")
+        self._refresh_handle: Optional[asyncio.TimerHandle] = None
+        if self._watch is not None and loop is not None:
+            loop.call_soon_threadsafe(loop.add_reader, self._watch.fileno(), self._on_file_events)
+
+    def _on_file_events(self) -> None:
+        assert self._loop is not None
+        if self._watch is None:
+            return
+        with self._lock:
+            if self._lease_file.name not in self._watch.read_changes():
+                return
+            self._stale = True
+        # dnsmasq truncates and rewrites the file in place, so wait for it to settle down before parsing it
+        if self._refresh_handle is None:
+            self._refresh_handle = self._loop.call_later(self.SETTLE_TIME_S, self._scheduled_refresh)
+
+    def _scheduled_refresh(self) -> None:
+        self._refresh_handle = None
+        self.refresh()
+
+    def _file_changed(self) -> bool:
+        if self._watch is not None:
+            return self._lease_file.name in self._watch.read_changes()
+        try:
+            stat = self._lease_file.stat()
+            signature: Optional[Tuple[int, int, int]] = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            signature = None
+        changed = signature != self._file_signature
+        self._file_signature = signature
+        return changed
+
+    def _read(self) -> List[DHCPServerLease]:
+        try:
+            lines = self._lease_file.read_text(encoding="utf-8", errors="ignore").splitlines()
+        except FileNotFoundError:
+            return []
+        except Exception as exc:
+            logger.warning(f"Failed to read leases from {self._lease_file}: {exc}")
+            return []
+        return self._parse(lines)
+
+    def refresh(self) -> None:
+        """Parse the lease file again if it changed, reporting the lease changes."""
+        with self._lock:
+            self._stale = self._file_changed() or self._stale
+            if not self._stale:
+                return
+            by_mac = {lease.mac: lease for lease in self._read()}
+            events = self._diff(by_mac) if self._loaded else []
+            self._by_mac = by_mac
+            self._by_ip = {lease.ip: lease for lease in by_mac.values()}
+            self._loaded = True
+            self._stale = False
+
+        if events and self._on_events is not None:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._on_events, events)
+            else:
+                self._on_events(events)
+
+    def _diff(self, by_mac: Dict[str, DHCPServerLease]) -> List[DHCPLeaseEvent]:
+        events = [
+            DHCPLeaseEvent(type=LeaseEventType.Left, interface=self._interface, lease=lease)
+            for mac, lease in self._by_mac.items()
+            if mac not in by_mac
+        ]
+        for mac, lease in by_mac.items():
+            previous = self._by_mac.get(mac)
+            if previous is None:
+                events.append(DHCPLeaseEvent(type=LeaseEventType.Joined, interface=self._interface, lease=lease))
+            elif previous != lease:
+                events.append(DHCPLeaseEvent(type=LeaseEventType.Updated, interface=self._interface, lease=lease))
+        return events
+
+    @property
+    def leases(self) -> List[DHCPServerLease]:
+        self.refresh()
+        return list(self._by_mac.values())
+
+    def lease_by_mac(self, mac: str) -> Optional[DHCPServerLease]:
+        self.refresh()
+        return self._by_mac.get(mac.lower())
+
+    def lease_by_ip(self, ip: IPv4Address) -> Optional[DHCPServerLease]:
+        self.refresh()
+        return self._by_ip.get(ip)
+
+    def close(self) -> None:
+        if self._watch is None:
+            return
+        if self._loop is not None and not self._loop.is_closed():
+            if self._refresh_handle is not None:
+                self._loop.call_soon_threadsafe(self._refresh_handle.cancel)
+            self._loop.call_soon_threadsafe(self._loop.remove_reader, self._watch.fileno())
+            self._loop.call_soon_threadsafe(self._watch.close)
+        else:
+            self._watch.close()
+        self._watch = None
+
+
 class DHCPServerDetails(BaseModel):
     interface: str
     ipv4_gateway: IPv4Address
@@ -48,6 +204,8 @@ class Dnsmasq:
         lease_time: str = "24h",
         backup: bool = False,
         lease_dir: pathlib.Path = pathlib.Path("/var/lib/dnsmasq"),
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        on_lease_events: Optional[LeaseEventsCallback] = None,
     ) -> None:
         self._subprocess: Optional[Any] = None
 
@@ -78,6 +236,13 @@ class Dnsmasq:
 
         lease_dir.mkdir(parents=True, exist_ok=True)
         self._lease_file = lease_dir.joinpath(f"dnsmasq-{self._interface}.leases")
+        self._lease_cache = DHCPLeaseCache(
+            self._lease_file,
+            self._interface,
+            self._parse_leases_lines,
+            loop if loop is not None else asyncio.get_running_loop(),
+            on_lease_events,
+        )
 
         binary_path = shutil.which(self.binary_name())
         if binary_path is None:
@@ -88,7 +253,21 @@ class Dnsmasq:
         self.validate_binary()
 
         self.validate_config()
-        asyncio.create_task(self.start())
+        self._start_future: Union["asyncio.Task[None]", "concurrent.futures.Future[None]"]
+        if loop is None:
+            self._start_future = asyncio.create_task(self.start())
+        else:
+            # Allows the server to be created from a worker thread, starting it on the given loop
+            self._start_future = asyncio.run_coroutine_threadsafe(self.start(), loop)
+        # Nobody waits for the server to start, so its failures are only reported here
+        self._start_future.add_done_callback(self._log_start_failure)
+
+    def _log_start_failure(self, future: Union["asyncio.Future[None]", "concurrent.futures.Future[None]"]) -> None:
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            logger.opt(exception=error).error(f"DHCP server on interface {self._interface} failed: {error}")
 
     @staticmethod
     def binary_name() -> str:
@@ -230,16 +409,14 @@ class Dnsmasq:
 
     @property
     def leases(self) -> List[DHCPServerLease]:
-        """Return all parsed leases from this instance's lease file."""
-        try:
-            lines = self._lease_file.read_text(encoding="utf-8", errors="ignore").splitlines()
-        except FileNotFoundError:
-            return []
-        except Exception as exc:
-            logger.warning(f"Failed to read leases from {self._lease_file}: {exc}")
-            return []
+        """Return all leases from this instance's lease file."""
+        return self._lease_cache.leases
+
+    def lease_by_mac(self, mac: str) -> Optional[DHCPServerLease]:
+        return self._lease_cache.lease_by_mac(mac)
 
-        return self._parse_leases_lines(lines)
+    def lease_by_ip(self, ip: IPv4Address) -> Optional[DHCPServerLease]:
+        return self._lease_cache.lease_by_ip(ip)
 
     @property
     def details(self) -> DHCPServerDetails:
@@ -256,3 +433,7 @@ class Dnsmasq:
 
     def __del__(self) -> None:
         self.stop()
+        # The cache doesn't exist if the server failed to be created
+        lease_cache = getattr(self, "_lease_cache", None)
+        if lease_cache is not None:
+            lease_cache.close()
@@ -0,0 +1,126 @@
+import ctypes
+import os
+import pathlib
+import struct
+from typing import Dict, List, Optional, Set, Tuple
+
+# Events from linux/inotify.h
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+
+# struct inotify_event: int wd, uint32 mask, uint32 cookie, uint32 len, followed by a name of len bytes
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatch:
+    """Non-blocking inotify watch of a folder, reporting which of its entries changed.
+
+    The folder is watched instead of the files themselves, so files that are created, replaced or removed
+    keep being tracked. The file descriptor can be registered on an event loop to be notified of changes.
+    More folders can be added to the same watch, which only takes a single inotify instance.
+    """
+
+    DEFAULT_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, folder: pathlib.Path, mask: int = DEFAULT_MASK) -> None:
+        self._fd = -1
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd: int = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"Failed to initialize inotify: {os.strerror(errno)}")
+        self._fd = fd
+        self._libc = libc
+        self._mask = mask
+        self._folders: Dict[int, pathlib.Path] = {}
+        try:
+            self.add_folder(folder)
+        except OSError:
+            self.close()
+            raise
+        self.folder = folder
+
+    def fileno(self) -> int:
+        return self._fd
+
+    @property
+    def folders(self) -> Set[pathlib.Path]:
+        """Folders being watched, as of the last events read"""
+        return set(self._folders.values())
+
+    def add_folder(self, folder: pathlib.Path) -> None:
+        """Watch another folder, which stops being watched by itself when removed"""
+        wd: int = self._libc.inotify_add_watch(self._fd, str(folder).encode(), self._mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"Failed to watch {folder}: {os.strerror(errno)}")
+        self._folders[wd] = folder
+
+    def read_changes(self) -> Set[str]:
+        """Consume the pending events without blocking.
+
+        Returns:
+            Set[str]: Names of the folder entries that changed since the last call.
+        """
+        names: Set[str] = set()
+        for _wd, _mask, name in self._read_events():
+            if name:
+                names.add(name)
+        return names
+
+    def read_folder_changes(self) -> Optional[Dict[pathlib.Path, Set[str]]]:
+        """Consume the pending events of all the watched folders without blocking.
+
+        Returns:
+            Optional[Dict[pathlib.Path, Set[str]]]: Names of the entries that changed in each folder since the last
+                call, or None if the kernel queue overflowed and changes were lost.
+        """
+        changes: Dict[pathlib.Path, Set[str]] = {}
+        overflowed = False
+        for wd, mask, name in self._read_events():
+            if mask & IN_Q_OVERFLOW:
+                overflowed = True
+            elif mask & IN_IGNORED:
+                self._folders.pop(wd, None)
+            elif wd in self._folders and name:
+                changes.setdefault(self._folders[wd], set()).add(name)
+        return None if overflowed else changes
+
+    def _read_events(self) -> List[Tuple[int, int, str]]:
+        events = []
+        for buffer in self._read_pending():
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(buffer):
+                wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(buffer, offset)
+                offset += _EVENT_HEADER.size
+                name = buffer[offset : offset + length].rstrip(b"\0").decode(errors="ignore")
+                offset += length
+                events.append((wd, mask, name))
+        return events
+
+    def _read_pending(self) -> List[bytes]:
+        buffers = []
+        while True:
+            try:
+                buffer = os.read(self._fd, 4096)
+            except BlockingIOError:
+                break
+            if not buffer:
+                break
+            buffers.append(buffer)
+        return buffers
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __del__(self) -> None:
+        self.close()
@@ -75,13 +75,19 @@ async def streamer(gen: AsyncGenerator[str | bytes, None], heartbeats: float = -
                 heartbeat_task.cancel()
             await queue.put(None)
 
-    asyncio.create_task(generator_wrapper(gen, queue))
+    task = asyncio.create_task(generator_wrapper(gen, queue))
 
-    while True:
-        item = await queue.get()
-        if item is None:
-            break
-        yield item
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            yield item
+    finally:
+        # The client may disconnect before the generator ends, which should stop it too
+        task.cancel()
+        if heartbeat_task:
+            heartbeat_task.cancel()
 
 
 async def _fetch_stream(
@@ -0,0 +1,108 @@
+import asyncio
+import pathlib
+from ipaddress import IPv4Address
+from typing import Any, List
+
+import pytest
+from loguru import logger
+
+from ..DHCPServerManager import (
+    DHCPLeaseCache,
+    DHCPLeaseEvent,
+    DHCPServerLease,
+    Dnsmasq,
+    LeaseEventType,
+)
+
+
+class CountingParser:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def __call__(self, lines: List[str]) -> List[DHCPServerLease]:
+        self.calls += 1
+        leases = []
+        for line in lines:
+            expires, mac, ip, hostname = line.split()[:4]
+            leases.append(DHCPServerLease(expires_epoch=int(expires), mac=mac, ip=IPv4Address(ip), hostname=hostname))
+        return leases
+
+
+def write_leases(lease_file: pathlib.Path, lines: List[str]) -> None:
+    lease_file.write_text("".join(f"{line}\n" for line in lines), encoding="utf-8")
+
+
+CAMERA = "1700000000 aa:bb:cc:00:00:01 192.168.2.101 camera *"
+SONAR = "1700000000 aa:bb:cc:00:00:02 192.168.2.102 sonar *"
+SONAR_RENEWED = "1700003600 aa:bb:cc:00:00:02 192.168.2.102 sonar *"
+LAPTOP = "1700000000 aa:bb:cc:00:00:03 192.168.2.103 laptop *"
+
+
+def test_lease_cache_parses_only_on_change(tmp_path: pathlib.Path) -> None:
+    lease_file = tmp_path / "dnsmasq-eth0.leases"
+    write_leases(lease_file, [CAMERA, SONAR])
+    parser = CountingParser()
+    events: List[DHCPLeaseEvent] = []
+    cache = DHCPLeaseCache(lease_file, "eth0", parser, on_events=events.extend)
+
+    for _ in range(100):
+        assert len(cache.leases) == 2
+    assert cache.lease_by_mac("AA:BB:CC:00:00:02").hostname == "sonar"  # type: ignore
+    assert cache.lease_by_ip(IPv4Address("192.168.2.101")).hostname == "camera"  # type: ignore
+    assert cache.lease_by_ip(IPv4Address("192.168.2.200")) is None
+    assert parser.calls == 1
+    # Leases already there when the cache is created are not reported
+    assert events == []
+
+    write_leases(lease_file, [SONAR_RENEWED, LAPTOP])
+    assert len(cache.leases) == 2
+    assert cache.lease_by_mac("aa:bb:cc:00:00:01") is None
+    assert parser.calls == 2
+    assert sorted((event.type, event.lease.hostname) for event in events) == [
+        (LeaseEventType.Joined, "laptop"),
+        (LeaseEventType.Left, "camera"),
+        (LeaseEventType.Updated, "sonar"),
+    ]
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_lease_cache_reports_changes(tmp_path: pathlib.Path) -> None:
+    lease_file = tmp_path / "dnsmasq-eth0.leases"
+    events: asyncio.Queue[DHCPLeaseEvent] = asyncio.Queue()
+
+    def on_events(new_events: List[DHCPLeaseEvent]) -> None:
+        for event in new_events:
+            events.put_nowait(event)
+
+    cache = DHCPLeaseCache(lease_file, "eth0", CountingParser(), asyncio.get_running_loop(), on_events)
+    assert cache.leases == []
+    await asyncio.sleep(0.1)
+
+    # Reported without anyone reading the leases
+    write_leases(lease_file, [CAMERA])
+    event = await asyncio.wait_for(events.get(), timeout=1.0)
+    assert (event.type, event.interface, event.lease.hostname) == (LeaseEventType.Joined, "eth0", "camera")
+
+    lease_file.unlink()
+    event = await asyncio.wait_for(events.get(), timeout=1.0)
+    assert (event.type, event.lease.hostname) == (LeaseEventType.Left, "camera")
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_dnsmasq_start_failure_is_logged(mocker: Any, tmp_path: pathlib.Path) -> None:
+    mocker.patch("commonwealth.utils.DHCPServerManager.psutil.net_if_stats", return_value={"eth0": None})
+    mocker.patch("commonwealth.utils.DHCPServerManager.shutil.which", return_value="/usr/sbin/dnsmasq")
+    mocker.patch("commonwealth.utils.DHCPServerManager.subprocess.check_output")
+    mocker.patch.object(Dnsmasq, "start", side_effect=RuntimeError("Unable to start DHCP Server."))
+    errors: List[str] = []
+    handler = logger.add(lambda message: errors.append(message.record["message"]), level="ERROR")
+    loop = asyncio.get_running_loop()
+    try:
+        # Created from a worker thread, as the network manager does it
+        await asyncio.to_thread(Dnsmasq, "eth0", IPv4Address("192.168.2.1"), lease_dir=tmp_path, loop=loop)
+        await asyncio.sleep(0.01)
+    finally:
+        logger.remove(handler)
+    assert errors == ["DHCP server on interface eth0 failed: Unable to start DHCP Server."]
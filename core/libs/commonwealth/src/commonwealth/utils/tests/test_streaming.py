@@ -0,0 +1,33 @@
+import asyncio
+from typing import AsyncGenerator
+
+import pytest
+from commonwealth.utils.streaming import streamer
+
+
+@pytest.mark.asyncio
+async def test_streamer_stops_generator_when_closed() -> None:
+    subscribed = asyncio.Event()
+    unsubscribed = asyncio.Event()
+    queue: asyncio.Queue[str] = asyncio.Queue()
+
+    async def subscription() -> AsyncGenerator[str, None]:
+        subscribed.set()
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            unsubscribed.set()
+
+    tasks = asyncio.all_tasks()
+    stream = streamer(subscription(), heartbeats=0.01)
+    queue.put_nowait("first")
+    assert '"fragment": 0' in await stream.__anext__()
+    assert subscribed.is_set()
+
+    # The client disconnects
+    await stream.aclose()
+    await asyncio.sleep(0)
+    assert unsubscribed.is_set()
+    await asyncio.sleep(0.05)
+    assert asyncio.all_tasks() == tasks
@@ -3,7 +3,7 @@ import os
 import shutil
 from functools import wraps
 from pathlib import Path
-from typing import Any, Callable, List, Optional, Tuple
+from typing import Any, AsyncGenerator, Callable, List, Optional, Tuple
 
 from autopilot_manager import AutoPilotManager
 from commonwealth.mavlink_comm.exceptions import (
@@ -14,18 +14,28 @@ from commonwealth.mavlink_comm.exceptions import (
 from commonwealth.mavlink_comm.typedefs import FirmwareInfo, MavlinkVehicleType
 from commonwealth.utils.apis import StackedHTTPException
 from commonwealth.utils.decorators import single_threaded
-from exceptions import InvalidFirmwareFile, NoDefaultFirmwareAvailable
+from commonwealth.utils.streaming import streamer
+from exceptions import (
+    FirmwareInstallInProgress,
+    InvalidFirmwareFile,
+    NoDefaultFirmwareAvailable,
+    UnsupportedPlatform,
+)
 from fastapi import APIRouter, Body, File, HTTPException, UploadFile, status
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi_versioning import versioned_api_route
 from loguru import logger
+from mavlink_proxy.RouterOutput import RouterOutput
 from typedefs import (
     Firmware,
+    FirmwareMetadata,
     FlightController,
     FlightControllerFlags,
     Parameters,
+    PlatformType,
     Serial,
     SITLFrame,
+    StartupReport,
     Vehicle,
 )
 
@@ -49,6 +59,8 @@ def index_to_http_exception(endpoint: Callable[..., Any]) -> Callable[..., Any]:
             return endpoint(*args, **kwargs)
         except HTTPException as error:
             raise error
+        except FirmwareInstallInProgress as error:
+            raise HTTPException(status_code=status.HTTP_423_LOCKED, detail=str(error)) from error
         except Exception as error:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(error)) from error
 
@@ -115,6 +127,19 @@ async def get_firmware_info() -> Any:
         return PlainTextResponse("Timed out requesting Firmware Info message", status_code=500)
 
 
+@index_router_v1.get(
+    "/firmware_metadata",
+    response_model=FirmwareMetadata,
+    summary="Get cached information about the firmware file installed for a board.",
+)
+@index_to_http_exception
+async def get_firmware_metadata(board_name: Optional[str] = None) -> Any:
+    try:
+        return autopilot.get_firmware_metadata(await target_board(board_name))
+    except (FileNotFoundError, UnsupportedPlatform) as error:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(error)) from error
+
+
 @index_router_v1.get("/vehicle_type", response_model=MavlinkVehicleType, summary="Get mavlink vehicle type.")
 @index_to_http_exception
 async def get_vehicle_type() -> Any:
@@ -171,12 +196,13 @@ async def install_firmware_from_url(
     auto_switch_board: bool = True,
 ) -> Any:
     board = None
-    try:
-        await autopilot.kill_ardupilot()
-        board = await target_board(board_name)
-        await autopilot.install_firmware_from_url(url, board, make_default, parameters)
-    finally:
-        await autopilot.start_ardupilot()
+    with autopilot.exclusive_firmware_install():
+        try:
+            await autopilot.kill_ardupilot()
+            board = await target_board(board_name)
+            await autopilot.install_firmware_from_url(url, board, make_default, parameters)
+        finally:
+            await autopilot.start_ardupilot()
 
     # In some cases user might install a firmware that implies in a board change but this is not reflected,
     # so if the board is different from the current one, we change it.
@@ -190,6 +216,33 @@ async def install_firmware_from_url(
         await autopilot.change_board(board)
 
 
+@index_router_v1.post(
+    "/install_firmware_from_url_on_serial_boards",
+    summary="Install firmware for given URL on multiple serial boards concurrently, streaming the upload progress.",
+)
+@index_to_http_exception
+async def install_firmware_from_url_on_serial_boards(url: str, board_paths: List[str] = Body(...)) -> Any:
+    boards = [
+        board
+        for board in await autopilot.available_boards(True)
+        if board.type == PlatformType.Serial and board.path in board_paths
+    ]
+    missing_paths = set(board_paths) - {board.path for board in boards}
+    if missing_paths:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"No serial boards found on {sorted(missing_paths)}."
+        )
+
+    # The upload starts right away and holds the install guard until it's over, even if the client leaves
+    upload = autopilot.install_firmware_from_url_on_serial_boards(url, boards)
+
+    async def install() -> AsyncGenerator[str, None]:
+        async for progress in upload:
+            yield progress.model_dump_json()
+
+    return StreamingResponse(streamer(install(), heartbeats=1.0))
+
+
 @index_router_v1.post("/install_firmware_from_file", summary="Install firmware from user file.")
 @index_to_http_exception
 @single_threaded(callback=raise_lock)
@@ -198,21 +251,22 @@ async def install_firmware_from_file(
     board_name: Optional[str] = None,
     parameters: Optional[Parameters] = None,
 ) -> Any:
-    try:
-        custom_firmware = Path.joinpath(autopilot.settings.firmware_folder, "custom_firmware")
-        with open(custom_firmware, "wb") as buffer:
-            shutil.copyfileobj(binary.file, buffer)
-        logger.debug("Going to kill ardupilot")
-        await autopilot.kill_ardupilot()
-        logger.debug("Installing firmware from file")
-        await autopilot.install_firmware_from_file(custom_firmware, await target_board(board_name), parameters)
-        os.remove(custom_firmware)
-    except InvalidFirmwareFile as error:
-        raise StackedHTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, error=error) from error
-    finally:
-        binary.file.close()
-        logger.debug("Starting ardupilot again")
-        await autopilot.start_ardupilot()
+    with autopilot.exclusive_firmware_install():
+        try:
+            custom_firmware = Path.joinpath(autopilot.settings.firmware_folder, "custom_firmware")
+            with open(custom_firmware, "wb") as buffer:
+                shutil.copyfileobj(binary.file, buffer)
+            logger.debug("Going to kill ardupilot")
+            await autopilot.kill_ardupilot()
+            logger.debug("Installing firmware from file")
+            await autopilot.install_firmware_from_file(custom_firmware, await target_board(board_name), parameters)
+            os.remove(custom_firmware)
+        except InvalidFirmwareFile as error:
+            raise StackedHTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, error=error) from error
+        finally:
+            binary.file.close()
+            logger.debug("Starting ardupilot again")
+            await autopilot.start_ardupilot()
 
 
 @index_router_v1.get(
@@ -267,6 +321,26 @@ def available_routers() -> Any:
     return autopilot.get_available_routers()
 
 
+@index_router_v1.get(
+    "/router_output",
+    response_model=RouterOutput,
+    summary="Retrieve the most recent output lines of the MAVLink router, with output statistics.",
+)
+@index_to_http_exception
+def router_output(lines: Optional[int] = None) -> Any:
+    return autopilot.get_router_output(lines)
+
+
+@index_router_v1.get(
+    "/startup_timings",
+    response_model=StartupReport,
+    summary="Retrieve how long each phase of the service startup took, until the first autopilot heartbeat.",
+)
+@index_to_http_exception
+def startup_timings() -> Any:
+    return autopilot.get_startup_report()
+
+
 @index_router_v1.post("/stop", summary="Stop the autopilot.")
 @index_to_http_exception
 async def stop() -> Any:
@@ -279,13 +353,14 @@ async def stop() -> Any:
 @index_router_v1.post("/restore_default_firmware", summary="Restore default firmware.")
 @index_to_http_exception
 async def restore_default_firmware(board_name: Optional[str] = None) -> Any:
-    try:
-        await autopilot.kill_ardupilot()
-        await autopilot.restore_default_firmware(await target_board(board_name))
-    except (NoDefaultFirmwareAvailable, ValueError) as error:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(error)) from error
-    finally:
-        await autopilot.start_ardupilot()
+    with autopilot.exclusive_firmware_install():
+        try:
+            await autopilot.kill_ardupilot()
+            await autopilot.restore_default_firmware(await target_board(board_name))
+        except (NoDefaultFirmwareAvailable, ValueError) as error:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(error)) from error
+        finally:
+            await autopilot.start_ardupilot()
 
 
 @index_router_v1.get(
@@ -4,28 +4,32 @@ import pathlib
 import subprocess
 import time
 from copy import deepcopy
-from typing import Any, List, Optional, Set
+from typing import Any, AsyncGenerator, ContextManager, List, Optional, Set
 from uuid import uuid4
 
 import psutil
 from commonwealth.mavlink_comm.VehicleManager import VehicleManager
 from commonwealth.utils.Singleton import Singleton
-from elftools.elf.elffile import ELFFile
 from exceptions import (
     AutoPilotProcessKillFail,
     NoDefaultFirmwareAvailable,
     NoPreferredBoardSet,
 )
 from firmware.FirmwareManagement import FirmwareManager
+from flight_controller_detector.BoardRegistry import BoardRegistry
 from flight_controller_detector.Detector import Detector as BoardDetector
 from flight_controller_detector.linux.linux_boards import LinuxFlightController
 from loguru import logger
 from mavlink_proxy.Endpoint import Endpoint, EndpointType
 from mavlink_proxy.exceptions import EndpointAlreadyExists
 from mavlink_proxy.Manager import Manager as MavlinkManager
+from mavlink_proxy.RouterOutput import RouterOutput
 from settings import Settings
+from startup_profiler import StartupProfiler
 from typedefs import (
     Firmware,
+    FirmwareMetadata,
+    FirmwareUploadProgress,
     FlightController,
     FlightControllerFlags,
     Parameters,
@@ -33,6 +37,7 @@ from typedefs import (
     PlatformType,
     Serial,
     SITLFrame,
+    StartupReport,
     Vehicle,
 )
 
@@ -45,6 +50,7 @@ class AutoPilotManager(metaclass=Singleton):
         self._current_board: Optional[FlightController] = None
         self.should_be_running = False
         self._restart_lock = asyncio.Lock()
+        self._background_tasks: Set["asyncio.Task[None]"] = set()
         self.mavlink_manager = MavlinkManager()
 
         # Kept out of setup() because that runs on every start attempt, which would reset the counter
@@ -133,6 +139,15 @@ class AutoPilotManager(metaclass=Singleton):
                 persistent=True,
                 protected=False,
             ),
+            Endpoint(
+                name="Ping1D Rangefinders",
+                owner=self.settings.app_name,
+                connection_type=EndpointType.UDPServer,
+                place="127.0.0.1",
+                argument=14661,
+                persistent=True,
+                protected=True,
+            ),
         ]
 
     async def setup(self) -> None:
@@ -143,15 +158,16 @@ class AutoPilotManager(metaclass=Singleton):
         if self.mavlink_manager is not None:
             await self.mavlink_manager.stop()
 
-        self.mavlink_manager = MavlinkManager()
+        # Checking the routers runs their binaries, so it's done outside of the event loop
         preferred_router = self.load_preferred_router()
         try:
-            self.mavlink_manager = MavlinkManager(preferred_router)
+            self.mavlink_manager = await asyncio.to_thread(MavlinkManager, preferred_router)
         except ValueError as error:
             logger.warning(
                 f"Failed to start MavlinkManager[{preferred_router}]. Falling back to the first available router. Error details: {error}"
             )
             preferred_router = None
+            self.mavlink_manager = await asyncio.to_thread(MavlinkManager)
 
         if not preferred_router:
             await self.set_preferred_router(self.mavlink_manager.tool.name())
@@ -272,19 +288,8 @@ class AutoPilotManager(metaclass=Singleton):
         self._current_sitl_frame = frame
         logger.info(f"Setting {frame.value} as frame for SITL.")
 
-    @staticmethod
-    def firmware_has_debug_symbols(firmware_path: pathlib.Path) -> bool:
-        with open(firmware_path, "rb") as f:
-            elffile = ELFFile(f)
-
-            for section in elffile.iter_sections():
-                if section.name.startswith(".debug_line"):
-                    # 100k is Empirical data. non-debug binaries seem to have around 700 entries here,
-                    # while debug ones have 28 million entries
-                    if section.header.sh_size > 100000:
-                        return True
-                    return False
-        return False
+    def firmware_has_debug_symbols(self, firmware_path: pathlib.Path) -> bool:
+        return self.firmware_manager.metadata_store.get(firmware_path).has_debug_symbols
 
     def update_serials(self, serials: List[Serial]) -> None:
         self.configuration["serials"] = [vars(serial) for serial in serials]
@@ -343,7 +348,10 @@ class AutoPilotManager(metaclass=Singleton):
                 )
 
         firmware_path = self.firmware_manager.firmware_path(self._current_board.platform)
-        self.firmware_manager.validate_firmware(firmware_path, self._current_board.platform)
+        with StartupProfiler().phase("firmware_validation"):
+            await asyncio.to_thread(
+                self.firmware_manager.validate_firmware, firmware_path, self._current_board.platform
+            )
 
         # ArduPilot process will connect as a client on the UDP server created by the mavlink router
         master_endpoint = Endpoint(
@@ -456,6 +464,9 @@ class AutoPilotManager(metaclass=Singleton):
     def should_start_on_boot(self) -> bool:
         return bool(self.settings.content.get("start_on_boot", True))
 
+    def get_router_output(self, lines: Optional[int] = None) -> RouterOutput:
+        return self.mavlink_manager.router_output(lines)
+
     def get_available_routers(self) -> List[str]:
         return [router.name() for router in self.mavlink_manager.available_interfaces()]
 
@@ -476,7 +487,10 @@ class AutoPilotManager(metaclass=Singleton):
         self.current_sitl_frame = frame
 
         firmware_path = self.firmware_manager.firmware_path(self._current_board.platform)
-        self.firmware_manager.validate_firmware(firmware_path, self._current_board.platform)
+        with StartupProfiler().phase("firmware_validation"):
+            await asyncio.to_thread(
+                self.firmware_manager.validate_firmware, firmware_path, self._current_board.platform
+            )
 
         # ArduPilot SITL binary will bind TCP port 5760 (server) and the mavlink router will connect to it as a client
         master_endpoint = Endpoint(
@@ -538,7 +552,7 @@ class AutoPilotManager(metaclass=Singleton):
 
     @staticmethod
     async def available_boards(include_bootloaders: bool = False) -> List[FlightController]:
-        all_boards = await BoardDetector.detect(True)
+        all_boards = await BoardRegistry().detect(True)
         if include_bootloaders:
             return all_boards
         return [board for board in all_boards if FlightControllerFlags.is_bootloader not in board.flags]
@@ -671,9 +685,26 @@ class AutoPilotManager(metaclass=Singleton):
         if self.should_be_running and self.is_running():
             return
 
-        await self.setup()
+        profiler = StartupProfiler()
+
+        async def setup() -> None:
+            with profiler.phase("setup"):
+                await self.setup()
+            with profiler.phase("firmware_prevalidation"):
+                await self.prevalidate_preferred_firmware()
+
+        async def detect_boards() -> List[FlightController]:
+            with profiler.phase("board_detection"):
+                return await self.available_boards()
+
+        # Setup (router checks and settings) and board detection don't depend on each other
+        setup_result, boards_result = await asyncio.gather(setup(), detect_boards(), return_exceptions=True)
+        if isinstance(setup_result, BaseException):
+            raise setup_result
         try:
-            available_boards = await self.available_boards()
+            if isinstance(boards_result, BaseException):
+                raise boards_result
+            available_boards = boards_result
             if not available_boards:
                 raise RuntimeError("No boards available.")
             if len(available_boards) > 1:
@@ -682,30 +713,64 @@ class AutoPilotManager(metaclass=Singleton):
             flight_controller = self.get_board_to_be_used(available_boards)
             logger.info(f"Using {flight_controller.name} flight-controller.")
 
-            if flight_controller.platform.type == PlatformType.Linux:
-                assert isinstance(flight_controller, LinuxFlightController)
-                flight_controller.setup()
-                await self.start_linux_board(flight_controller)
-            elif flight_controller.platform.type == PlatformType.Serial:
-                await self.start_serial(flight_controller)
-            elif flight_controller.platform == Platform.SITL:
-                await self.start_sitl()
-            elif flight_controller.platform == Platform.Manual:
-                await self.start_manual_board(flight_controller)
-            else:
-                raise RuntimeError(f"Invalid board type: {flight_controller}")
+            with profiler.phase("autopilot_start"):
+                if flight_controller.platform.type == PlatformType.Linux:
+                    assert isinstance(flight_controller, LinuxFlightController)
+                    flight_controller.setup()
+                    await self.start_linux_board(flight_controller)
+                elif flight_controller.platform.type == PlatformType.Serial:
+                    await self.start_serial(flight_controller)
+                elif flight_controller.platform == Platform.SITL:
+                    await self.start_sitl()
+                elif flight_controller.platform == Platform.Manual:
+                    await self.start_manual_board(flight_controller)
+                else:
+                    raise RuntimeError(f"Invalid board type: {flight_controller}")
+            profiler.mark_autopilot_started()
         finally:
             self.should_be_running = True
 
-    async def _detect_serial_board(self, board: FlightController) -> Optional[FlightController]:
-        return next(
-            (
-                detected
-                for detected in await self.available_boards()
-                if detected.type == PlatformType.Serial and detected.platform == board.platform and detected.path
-            ),
-            None,
-        )
+    async def prevalidate_preferred_firmware(self) -> None:
+        """Parse the firmware of the preferred board while the boards are being detected.
+
+        Firmware metadata is cached, so the validation done when starting the board is immediate.
+        Failures are ignored here, since the preferred board may not be the one used.
+        """
+        try:
+            board = self.get_preferred_board()
+            if board.type != PlatformType.Linux:
+                return
+            firmware_path = self.firmware_manager.firmware_path(board.platform)
+            if firmware_path.is_file():
+                await asyncio.to_thread(self.firmware_manager.metadata_store.get, firmware_path)
+        except Exception as error:
+            logger.debug(f"Skipping firmware prevalidation: {error}")
+
+    async def wait_first_heartbeat(self, timeout: float = 120.0) -> None:
+        """Record when the autopilot heartbeat is first seen after boot."""
+        profiler = StartupProfiler()
+        deadline = time.monotonic() + timeout
+        # Heartbeats received before the autopilot started don't count. Not using get_updated_mavlink_message or
+        # is_heart_beating, since they log every failure and trigger system-id detection, and failures are expected
+        baseline = await self._heartbeat_counter() or 0
+        while not profiler.finished and time.monotonic() < deadline:
+            if self.should_be_running:
+                counter = await self._heartbeat_counter()
+                if counter is not None and counter > baseline:
+                    profiler.mark_first_heartbeat()
+                    return
+            await asyncio.sleep(0.5)
+        profiler.finish()
+
+    async def _heartbeat_counter(self) -> Optional[int]:
+        try:
+            heartbeat = await self.vehicle_manager.mavlink2rest.get_mavlink_message("HEARTBEAT")
+            return int(heartbeat["status"]["time"]["counter"])
+        except Exception:
+            return None
+
+    def get_startup_report(self) -> StartupReport:
+        return StartupProfiler().report()
 
     async def restart_ardupilot(self) -> None:
         # Both the /restart endpoint and the heartbeat watchdog can call this, so serialize them.
@@ -729,19 +794,9 @@ class AutoPilotManager(metaclass=Singleton):
                 # the router keeps a stale handle. Wait for the board to drop first: this confirms the
                 # reboot landed and stops us from reopening the pre-reboot path. Boards reached through a
                 # separate USB-serial adapter never drop, so this wait is best-effort.
-                disconnect_deadline = time.monotonic() + 10.0
-                while time.monotonic() < disconnect_deadline:
-                    if await self._detect_serial_board(board) is None:
-                        break
-                    await asyncio.sleep(0.5)
-                else:
-                    logger.warning(f"{board.name} did not disconnect after reboot. Restarting its link anyway.")
-
-                reconnected_board = None
-                reconnect_deadline = time.monotonic() + 30.0
-                while reconnected_board is None and time.monotonic() < reconnect_deadline:
-                    await asyncio.sleep(0.5)
-                    reconnected_board = await self._detect_serial_board(board)
+                reconnected_board = await BoardRegistry().wait_for_reboot(
+                    board, disconnect_timeout=10.0, reconnect_timeout=30.0
+                )
                 if reconnected_board is None:
                     raise RuntimeError(f"Timed out waiting for {board.name} to reconnect after reboot.")
 
@@ -812,6 +867,9 @@ class AutoPilotManager(metaclass=Singleton):
         self._save_current_endpoints()
         await self.mavlink_manager.restart()
 
+    def get_firmware_metadata(self, board: FlightController) -> FirmwareMetadata:
+        return self.firmware_manager.get_firmware_metadata(board)
+
     async def get_available_firmwares(self, vehicle: Vehicle, platform: Platform) -> List[Firmware]:
         return await self.firmware_manager.get_available_firmwares(vehicle, platform)
 
@@ -829,6 +887,31 @@ class AutoPilotManager(metaclass=Singleton):
     ) -> None:
         await self.firmware_manager.install_firmware_from_url(url, board, make_default, default_parameters)
 
+    def exclusive_firmware_install(self) -> ContextManager[None]:
+        """Guard a firmware install, failing if another one is running, like a serial boards upload."""
+        return self.firmware_manager.exclusive_install()
+
+    def install_firmware_from_url_on_serial_boards(
+        self, url: str, boards: List[FlightController]
+    ) -> AsyncGenerator[FirmwareUploadProgress, None]:
+        """Start installing firmware on multiple serial boards concurrently, returning the upload progress.
+
+        The autopilot is stopped if it uses one of them, and started again once all boards are flashed,
+        even if the progress stops being consumed.
+        """
+        current_board = self.current_board
+        uses_target_board = current_board is not None and any(board.path == current_board.path for board in boards)
+        if not uses_target_board:
+            return self.firmware_manager.install_firmware_from_url_on_serial_boards(url, boards)
+        return self.firmware_manager.install_firmware_from_url_on_serial_boards(
+            url, boards, on_start=self.kill_ardupilot, on_done=self._restart_after_upload
+        )
+
+    def _restart_after_upload(self) -> None:
+        task = asyncio.create_task(self.start_ardupilot())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
     async def restore_default_firmware(self, board: FlightController) -> None:
         await self.firmware_manager.restore_default_firmware(board)
 
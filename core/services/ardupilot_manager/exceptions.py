@@ -55,6 +55,10 @@ class FirmwareInstallFail(RuntimeError):
     """Firmware install operation failed."""
 
 
+class FirmwareInstallInProgress(RuntimeError):
+    """Another firmware install is still running."""
+
+
 class AutoPilotProcessKillFail(RuntimeError):
     """Could not kill AutoPilot process."""
 
@@ -6,11 +6,12 @@ import shutil
 import stat
 from typing import Optional, Union
 
-from ardupilot_fw_decoder import BoardSubType, BoardType, Decoder
-from elftools.elf.elffile import ELFFile
+from ardupilot_fw_decoder import BoardSubType, BoardType
 from exceptions import FirmwareInstallFail, InvalidFirmwareFile, UnsupportedPlatform
 from firmware.FirmwareDownload import FirmwareDownloader
-from firmware.FirmwareUpload import FirmwareUploader
+from firmware.FirmwareMetadata import FirmwareMetadataStore
+from firmware.FirmwareUpload import FirmwareUploader, UploadProgressCallback
+from flight_controller_detector.BoardRegistry import BoardRegistry
 from loguru import logger
 from typedefs import FirmwareFormat, FlightController, Platform, PlatformType
 
@@ -79,13 +80,10 @@ class FirmwareInstaller:
 
     @staticmethod
     def _validate_elf(firmware_path: pathlib.Path, platform: Platform) -> None:
+        metadata = FirmwareMetadataStore().get(firmware_path)
+
         # Check if firmware's architecture matches system's architecture
-        with open(firmware_path, "rb") as file:
-            try:
-                elf_file = ELFFile(file)
-                firm_arch = elf_file.get_machine_arch()
-            except Exception as error:
-                raise InvalidFirmwareFile("Given file is not a valid ELF.") from error
+        firm_arch = metadata.arch or ""
         if not is_valid_elf_type(firm_arch):
             raise InvalidFirmwareFile(
                 f"Firmware's architecture ({firm_arch}) does not match system's ({system_platform.machine()})."
@@ -93,10 +91,10 @@ class FirmwareInstaller:
 
         # Check if firmware's platform matches system platform
         try:
-            firm_decoder = Decoder()
-            firm_decoder.process(firmware_path)
-            firm_board = BoardType(firm_decoder.fwversion.board_type)
-            firm_sub_board = BoardSubType(firm_decoder.fwversion.board_subtype)
+            if metadata.board_type is None or metadata.board_subtype is None:
+                raise ValueError("Firmware version information not found.")
+            firm_board = BoardType(metadata.board_type)
+            firm_sub_board = BoardSubType(metadata.board_subtype)
             current_decoder_platform = get_correspondent_decoder_platform(platform)
             logger.debug(
                 f"firm_board: {firm_board}, firm_sub_board: {firm_sub_board}, current_decoder_platform: {current_decoder_platform}"
@@ -142,6 +140,7 @@ class FirmwareInstaller:
         new_firmware_path: pathlib.Path,
         board: FlightController,
         firmware_dest_path: Optional[pathlib.Path] = None,
+        progress_callback: Optional[UploadProgressCallback] = None,
     ) -> None:
         """Install given firmware."""
         if not new_firmware_path.is_file():
@@ -158,13 +157,17 @@ class FirmwareInstaller:
             if not board.path:
                 raise ValueError("Board path not available.")
             firmware_uploader.set_autopilot_port(pathlib.Path(board.path))
-            await firmware_uploader.upload(new_firmware_path)
+            await firmware_uploader.upload(new_firmware_path, progress_callback)
+            # Give the board time to reboot and re-enumerate (preventing fail reconnecting to it)
+            if await BoardRegistry().wait_for_reboot(board, disconnect_timeout=2.0, reconnect_timeout=10.0) is None:
+                logger.warning(f"{board.name} did not reconnect after firmware upload.")
             return
         if firmware_format == FirmwareFormat.ELF:
             # Using copy() instead of move() since the last can't handle cross-device properly (e.g. docker binds)
             if not firmware_dest_path:
                 raise FirmwareInstallFail("Firmware file destination not provided.")
             shutil.copy(new_firmware_path, firmware_dest_path)
+            FirmwareMetadataStore().register_copy(new_firmware_path, firmware_dest_path)
             return
 
         raise UnsupportedPlatform("Firmware install is not implemented for this platform.")
@@ -1,22 +1,30 @@
+import asyncio
+import contextlib
+import functools
 import pathlib
 import shutil
 import subprocess
 import tempfile
 from pathlib import Path
-from typing import List, Optional
+from typing import AsyncGenerator, Awaitable, Callable, Iterator, List, Optional, Union
 
 from exceptions import (
     FirmwareInstallFail,
+    FirmwareInstallInProgress,
     NoDefaultFirmwareAvailable,
     NoVersionAvailable,
     UnsupportedPlatform,
 )
 from firmware.FirmwareDownload import FirmwareDownloader
 from firmware.FirmwareInstall import FirmwareInstaller
+from firmware.FirmwareMetadata import FirmwareMetadataStore
 from loguru import logger
 from typedefs import (
     Firmware,
     FirmwareFormat,
+    FirmwareMetadata,
+    FirmwareUploadProgress,
+    FirmwareUploadStage,
     FlightController,
     Parameters,
     Platform,
@@ -34,6 +42,12 @@ class FirmwareManager:
         self.user_defaults_folder = user_defaults_folder
         self.firmware_download = FirmwareDownloader()
         self.firmware_installer = FirmwareInstaller()
+        self.metadata_store = FirmwareMetadataStore()
+        # Only one install can run at a time, including uploads that keep going after their request is over
+        self._installing = False
+        # Keep a reference to the running upload, as it should finish even if nobody is following it
+        self._upload_task: Optional[asyncio.Task[None]] = None
+        self.metadata_store.load(pathlib.Path.joinpath(self.firmware_folder, "firmware_metadata.json"))
 
     @staticmethod
     def firmware_name(platform: Platform) -> str:
@@ -77,6 +91,15 @@ class FirmwareManager:
 
         raise UnsupportedPlatform("Install check is not implemented for this platform.")
 
+    def get_firmware_metadata(self, board: FlightController) -> FirmwareMetadata:
+        """Get metadata of the firmware installed for given board, parsing it only if not cached yet."""
+        if FirmwareDownloader._supported_firmware_formats[board.platform.type] != FirmwareFormat.ELF:
+            raise UnsupportedPlatform("Firmware metadata is only available for ELF firmwares.")
+        firmware_path = self.firmware_path(board.platform)
+        if not firmware_path.is_file():
+            raise FileNotFoundError(f"No firmware installed for '{board.name}'.")
+        return self.metadata_store.get(firmware_path)
+
     async def get_available_firmwares(self, vehicle: Vehicle, platform: Platform) -> List[Firmware]:
         firmwares = []
         versions = await self.firmware_download.get_available_versions(vehicle, platform)
@@ -159,6 +182,91 @@ class FirmwareManager:
             shutil.copy(temporary_file, self.default_user_firmware_path(board.platform))
         await self.install_firmware_from_file(temporary_file, board, default_parameters)
 
+    @contextlib.contextmanager
+    def exclusive_install(self) -> Iterator[None]:
+        """Hold the install guard while the block runs, failing if another install is running."""
+        self._start_install()
+        try:
+            yield
+        finally:
+            self._installing = False
+
+    def _start_install(self) -> None:
+        if self._installing:
+            raise FirmwareInstallInProgress("Another firmware install is in progress.")
+        self._installing = True
+
+    def install_firmware_from_url_on_serial_boards(
+        self,
+        url: str,
+        boards: List[FlightController],
+        on_start: Optional[Callable[[], Awaitable[None]]] = None,
+        on_done: Optional[Callable[[], None]] = None,
+    ) -> AsyncGenerator[FirmwareUploadProgress, None]:
+        """Download a firmware once and upload it to multiple serial boards concurrently, returning the progress.
+
+        The upload holds the install guard until it's over, and keeps going if the progress is no longer consumed.
+        on_start is awaited before the download, and on_done is called once the upload is over, even if it failed.
+        """
+        if any(board.type != PlatformType.Serial or not board.path for board in boards):
+            raise UnsupportedPlatform("Concurrent firmware install is only available for serial boards.")
+        self._start_install()
+        progress_queue: asyncio.Queue[Union[FirmwareUploadProgress, Exception, None]] = asyncio.Queue()
+        self._upload_task = asyncio.create_task(self._upload_to_serial_boards(url, boards, progress_queue, on_start))
+        self._upload_task.add_done_callback(functools.partial(self._upload_done, on_done))
+        return self._upload_progress(progress_queue)
+
+    async def _upload_to_serial_boards(
+        self,
+        url: str,
+        boards: List[FlightController],
+        progress_queue: "asyncio.Queue[Union[FirmwareUploadProgress, Exception, None]]",
+        on_start: Optional[Callable[[], Awaitable[None]]],
+    ) -> None:
+        try:
+            if on_start is not None:
+                await on_start()
+            temporary_file = await self.firmware_download._download(url.strip())
+        except Exception as error:
+            logger.error(f"Could not start firmware upload from {url}: {error}")
+            progress_queue.put_nowait(error)
+            return
+
+        async def install(board: FlightController) -> None:
+            try:
+                await self.firmware_installer.install_firmware(
+                    temporary_file, board, progress_callback=progress_queue.put_nowait
+                )
+            except Exception as error:
+                logger.error(f"Could not install firmware on {board.name} ({board.path}): {error}")
+                progress_queue.put_nowait(
+                    FirmwareUploadProgress(port=str(board.path), stage=FirmwareUploadStage.Failed, message=str(error))
+                )
+
+        try:
+            await asyncio.gather(*[install(board) for board in boards])
+        finally:
+            temporary_file.unlink(missing_ok=True)
+            progress_queue.put_nowait(None)
+
+    @staticmethod
+    async def _upload_progress(
+        progress_queue: "asyncio.Queue[Union[FirmwareUploadProgress, Exception, None]]",
+    ) -> AsyncGenerator[FirmwareUploadProgress, None]:
+        while True:
+            progress = await progress_queue.get()
+            if progress is None:
+                break
+            if isinstance(progress, Exception):
+                raise progress
+            yield progress
+
+    def _upload_done(self, on_done: Optional[Callable[[], None]], _task: "asyncio.Task[None]") -> None:
+        self._upload_task = None
+        self._installing = False
+        if on_done is not None:
+            on_done()
+
     async def install_firmware_from_params(self, vehicle: Vehicle, board: FlightController, version: str = "") -> None:
         url = await self.firmware_download.get_download_url(vehicle, board.platform, version)
         await self.install_firmware_from_url(url, board)
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import pathlib
+import threading
+from typing import Dict, Optional
+
+from ardupilot_fw_decoder import Decoder
+from commonwealth.utils.Singleton import Singleton
+from elftools.elf.elffile import ELFFile
+from exceptions import InvalidFirmwareFile
+from loguru import logger
+from typedefs import FirmwareMetadata
+
+# 100k is Empirical data. non-debug binaries seem to have around 700 entries here,
+# while debug ones have 28 million entries
+DEBUG_LINE_SECTION_MIN_SIZE = 100000
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path: pathlib.Path) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FirmwareMetadataStore(metaclass=Singleton):
+    """Cache of firmware metadata, so ELF files are only parsed once per content.
+
+    A record is reused while the file keeps the same size and modification time. When those change,
+    the file is hashed and a record with the same content hash is reused if available (e.g. a firmware
+    copied to the install destination), otherwise the file is parsed again.
+    """
+
+    def __init__(self) -> None:
+        self._records: Dict[str, FirmwareMetadata] = {}
+        self._storage_file: Optional[pathlib.Path] = None
+        self._lock = threading.RLock()
+
+    def load(self, storage_file: pathlib.Path) -> None:
+        """Load persisted records from given file, which will also be used to store new ones."""
+        with self._lock:
+            self._storage_file = storage_file
+            if not storage_file.is_file():
+                return
+            try:
+                with open(storage_file, encoding="utf-8") as file:
+                    raw_records = json.load(file)
+                for raw_record in raw_records:
+                    record = FirmwareMetadata(**raw_record)
+                    # Records of files that were removed (e.g. temporary downloads) are not useful anymore
+                    if pathlib.Path(record.path).is_file():
+                        self._records[record.path] = record
+                logger.debug(f"Loaded {len(self._records)} firmware metadata records from {storage_file}.")
+            except Exception as error:
+                logger.warning(f"Failed to load firmware metadata from {storage_file}: {error}")
+
+    def _save(self) -> None:
+        if self._storage_file is None:
+            return
+        try:
+            temporary_file = self._storage_file.with_suffix(".tmp")
+            with open(temporary_file, "w", encoding="utf-8") as file:
+                json.dump([record.model_dump() for record in self._records.values()], file, indent=4)
+            os.replace(temporary_file, self._storage_file)
+        except Exception as error:
+            logger.warning(f"Could not save firmware metadata to {self._storage_file}: {error}")
+
+    def _find_by_hash(self, sha256: str) -> Optional[FirmwareMetadata]:
+        return next((record for record in self._records.values() if record.sha256 == sha256), None)
+
+    @staticmethod
+    def _is_up_to_date(record: FirmwareMetadata, stat: os.stat_result) -> bool:
+        return record.size == stat.st_size and record.mtime_ns == stat.st_mtime_ns
+
+    @staticmethod
+    def inspect(firmware_path: pathlib.Path, sha256: Optional[str] = None) -> FirmwareMetadata:
+        """Parse given ELF firmware file, without using the cache."""
+        stat = firmware_path.stat()
+        has_debug_symbols = False
+        with open(firmware_path, "rb") as file:
+            try:
+                elf_file = ELFFile(file)
+                arch = elf_file.get_machine_arch()
+                for section in elf_file.iter_sections():
+                    if section.name.startswith(".debug_line"):
+                        has_debug_symbols = section.header.sh_size > DEBUG_LINE_SECTION_MIN_SIZE
+                        break
+            except Exception as error:
+                raise InvalidFirmwareFile("Given file is not a valid ELF.") from error
+
+        metadata = FirmwareMetadata(
+            path=str(firmware_path),
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            sha256=sha256 or file_sha256(firmware_path),
+            arch=arch,
+            has_debug_symbols=has_debug_symbols,
+        )
+
+        try:
+            decoder = Decoder()
+            decoder.process(firmware_path)
+            fwversion = decoder.fwversion
+            metadata.board_type = int(fwversion.board_type)
+            metadata.board_subtype = int(fwversion.board_subtype)
+            metadata.version = f"{fwversion.major}.{fwversion.minor}.{fwversion.patch}"
+            metadata.git_hash = getattr(fwversion, "firmware_hash_string", None) or None
+        except Exception as error:
+            logger.debug(f"Could not decode ArduPilot version information from {firmware_path}: {error}")
+
+        return metadata
+
+    def get(self, firmware_path: pathlib.Path) -> FirmwareMetadata:
+        """Get metadata for given ELF firmware file, parsing it only if no valid record is available."""
+        with self._lock:
+            stat = firmware_path.stat()
+            record = self._records.get(str(firmware_path))
+            if record is not None and self._is_up_to_date(record, stat):
+                return record
+
+            sha256 = file_sha256(firmware_path)
+            known_record = self._find_by_hash(sha256)
+            if known_record is not None:
+                record = known_record.model_copy(
+                    update={"path": str(firmware_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+                )
+            else:
+                logger.debug(f"Parsing firmware metadata for {firmware_path}.")
+                record = self.inspect(firmware_path, sha256)
+
+            self._records[record.path] = record
+            self._save()
+            return record
+
+    def get_cached(self, firmware_path: pathlib.Path) -> Optional[FirmwareMetadata]:
+        """Get stored record for given file, if still valid, without parsing or hashing it."""
+        with self._lock:
+            record = self._records.get(str(firmware_path))
+            try:
+                if record is not None and self._is_up_to_date(record, firmware_path.stat()):
+                    return record
+            except FileNotFoundError:
+                pass
+            return None
+
+    def register_copy(self, source_path: pathlib.Path, destination_path: pathlib.Path) -> None:
+        """Record that the destination file is a copy of the source, so it doesn't need to be parsed or hashed."""
+        with self._lock:
+            source_record = self._records.get(str(source_path))
+            if source_record is None:
+                return
+            stat = destination_path.stat()
+            if stat.st_size != source_record.size:
+                logger.warning(f"Size of {destination_path} does not match {source_path}, not registering it.")
+                return
+            self._records[str(destination_path)] = source_record.model_copy(
+                update={"path": str(destination_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            )
+            self._save()
@@ -1,13 +1,25 @@
 import asyncio
 import pathlib
+import re
 import shutil
 import subprocess
+from typing import Callable, Optional
 
 from exceptions import FirmwareUploadFail, InvalidUploadTool, UploadToolNotFound
 from loguru import logger
+from typedefs import FirmwareUploadProgress, FirmwareUploadStage
+
+# e.g. "Program: [=============       ] 65.2%"
+UPLOADER_PROGRESS_REGEX = re.compile(r"(?P<stage>Erase|Program|Verify)\s*:\s*\[[=\s]*\]\s*(?P<percentage>[\d.]+)%")
+UPLOADER_LINE_SEPARATOR_REGEX = re.compile(r"[\r\n]")
+
+UploadProgressCallback = Callable[[FirmwareUploadProgress], None]
 
 
 class FirmwareUploader:
+    # Time without any output from the uploader before considering it stalled
+    UPLOAD_IDLE_TIMEOUT_S = 60
+
     def __init__(self) -> None:
         self._autopilot_port: pathlib.Path = pathlib.Path("/dev/autopilot")
         self._baudrate_bootloader: int = 115200
@@ -42,47 +54,74 @@ class FirmwareUploader:
     def set_baudrate_flightstack(self, baudrate: int) -> None:
         self._baudrate_flightstack = baudrate
 
-    async def upload(self, firmware_path: pathlib.Path) -> None:
-        logger.info("Starting upload of firmware to board.")
-
-        process = await asyncio.create_subprocess_shell(
-            f"{self.binary()} {firmware_path}"
-            f" --port {self._autopilot_port}"
-            f" --baud-bootloader {self._baudrate_bootloader}"
-            f" --baud-flightstack {self._baudrate_flightstack}",
+    async def upload(
+        self, firmware_path: pathlib.Path, progress_callback: Optional[UploadProgressCallback] = None
+    ) -> None:
+        logger.info(f"Starting upload of firmware to board on {self._autopilot_port}.")
+
+        def report(stage: FirmwareUploadStage, percentage: float = 0.0, message: Optional[str] = None) -> None:
+            if progress_callback is not None:
+                progress_callback(
+                    FirmwareUploadProgress(
+                        port=str(self._autopilot_port), stage=stage, percentage=percentage, message=message
+                    )
+                )
+
+        report(FirmwareUploadStage.Starting)
+        process = await asyncio.create_subprocess_exec(
+            str(self.binary()),
+            str(firmware_path),
+            "--port",
+            str(self._autopilot_port),
+            "--baud-bootloader",
+            str(self._baudrate_bootloader),
+            "--baud-flightstack",
+            str(self._baudrate_flightstack),
             stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            shell=True,
+            stderr=asyncio.subprocess.STDOUT,
         )
 
-        async def monitor_uploader_process() -> None:
-            if process.stdout:
-                while True:
-                    line = await process.stdout.readline()
-                    if not line:
-                        break
-                    logger.debug(line.decode().strip())
+        def handle_output_line(line: str) -> None:
+            match = UPLOADER_PROGRESS_REGEX.search(line)
+            if match:
+                report(FirmwareUploadStage(match.group("stage").lower()), float(match.group("percentage")))
+                return
+            if line.startswith("Rebooting"):
+                report(FirmwareUploadStage.Rebooting, 100.0)
+            logger.debug(line)
 
+        async def monitor_uploader_process() -> None:
+            assert process.stdout is not None
+            pending = ""
             while True:
-                if process.returncode is not None:
+                # The uploader draws its progress bars with carriage returns, so we can't rely on readline()
+                chunk = await asyncio.wait_for(process.stdout.read(1024), timeout=self.UPLOAD_IDLE_TIMEOUT_S)
+                if not chunk:
                     break
-                logger.debug("Waiting for upload process to finish.")
-                await asyncio.sleep(1)
+                *lines, pending = UPLOADER_LINE_SEPARATOR_REGEX.split(pending + chunk.decode(errors="ignore"))
+                for line in lines:
+                    if line.strip():
+                        handle_output_line(line.strip())
+            if pending.strip():
+                handle_output_line(pending.strip())
 
         try:
-            await asyncio.wait_for(monitor_uploader_process(), timeout=180)
+            await monitor_uploader_process()
 
             return_code = await process.wait()
             if return_code != 0:
                 raise FirmwareUploadFail(f"Upload process returned non-zero code {return_code}.")
 
-            logger.info("Successfully uploaded firmware to board.")
+            logger.info(f"Successfully uploaded firmware to board on {self._autopilot_port}.")
+            report(FirmwareUploadStage.Done, 100.0)
         except asyncio.TimeoutError as error:
             process.kill()
-            raise FirmwareUploadFail("Firmware upload timed out after 180 seconds.") from error
+            raise FirmwareUploadFail(
+                f"Firmware upload stalled, no output for {self.UPLOAD_IDLE_TIMEOUT_S} seconds."
+            ) from error
         except Exception as error:
-            process.kill()
+            if process.returncode is None:
+                process.kill()
+            if isinstance(error, FirmwareUploadFail):
+                raise
             raise FirmwareUploadFail("Unable to upload firmware to board.") from error
-        finally:
-            # Give some time for the board to reboot (preventing fail reconnecting to it)
-            await asyncio.sleep(10)
@@ -0,0 +1,77 @@
+import asyncio
+import pathlib
+from typing import Any, List
+
+import pytest
+from exceptions import FirmwareInstallInProgress
+from firmware.FirmwareManagement import FirmwareManager
+from typedefs import (
+    FirmwareUploadProgress,
+    FirmwareUploadStage,
+    FlightController,
+    Platform,
+)
+
+
+def create_manager(tmp_path: pathlib.Path) -> FirmwareManager:
+    return FirmwareManager(tmp_path, tmp_path, tmp_path)
+
+
+@pytest.mark.asyncio
+async def test_serial_boards_upload_holds_install_guard(mocker: Any, tmp_path: pathlib.Path) -> None:
+    manager = create_manager(tmp_path)
+    firmware = tmp_path / "firmware.apj"
+    firmware.touch()
+    mocker.patch.object(manager.firmware_download, "_download", return_value=firmware)
+    flashing = asyncio.Event()
+
+    async def install_firmware(_firmware: pathlib.Path, board: FlightController, **kwargs: Any) -> None:
+        await flashing.wait()
+        kwargs["progress_callback"](FirmwareUploadProgress(port=str(board.path), stage=FirmwareUploadStage.Done))
+
+    mocker.patch.object(manager.firmware_installer, "install_firmware", side_effect=install_firmware)
+    calls: List[str] = []
+
+    async def on_start() -> None:
+        calls.append("start")
+
+    boards = [FlightController(name="Pixhawk1", platform=Platform.Pixhawk1, path=f"/dev/ttyACM{i}") for i in range(2)]
+    upload = manager.install_firmware_from_url_on_serial_boards(
+        "http://firmware.apj", boards, on_start=on_start, on_done=lambda: calls.append("done")
+    )
+
+    # Nobody follows the progress, but the upload is already running and no other install can start
+    await asyncio.sleep(0)
+    assert calls == ["start"]
+    with pytest.raises(FirmwareInstallInProgress):
+        manager.install_firmware_from_url_on_serial_boards("http://firmware.apj", boards)
+    with pytest.raises(FirmwareInstallInProgress):
+        with manager.exclusive_install():
+            pass
+
+    flashing.set()
+    assert sorted([progress.port async for progress in upload]) == ["/dev/ttyACM0", "/dev/ttyACM1"]
+    await asyncio.sleep(0)
+    assert calls == ["start", "done"]
+    assert not firmware.exists()
+    with manager.exclusive_install():
+        pass
+
+
+@pytest.mark.asyncio
+async def test_serial_boards_upload_download_failure(mocker: Any, tmp_path: pathlib.Path) -> None:
+    manager = create_manager(tmp_path)
+    mocker.patch.object(manager.firmware_download, "_download", side_effect=RuntimeError("No connection"))
+    calls: List[str] = []
+    board = FlightController(name="Pixhawk1", platform=Platform.Pixhawk1, path="/dev/ttyACM0")
+
+    upload = manager.install_firmware_from_url_on_serial_boards(
+        "http://firmware.apj", [board], on_done=lambda: calls.append("done")
+    )
+    with pytest.raises(RuntimeError, match="No connection"):
+        async for _progress in upload:
+            pass
+    await asyncio.sleep(0)
+    assert calls == ["done"]
+    with manager.exclusive_install():
+        pass
@@ -0,0 +1,83 @@
+import pathlib
+import shutil
+import sys
+from typing import Any, Generator, List
+
+import pytest
+from commonwealth.utils.Singleton import Singleton
+from exceptions import InvalidFirmwareFile
+from firmware.FirmwareMetadata import FirmwareMetadataStore
+
+
+@pytest.fixture(name="store")
+def fixture_store(monkeypatch: Any) -> Generator[FirmwareMetadataStore, None, None]:
+    Singleton._instances.pop(FirmwareMetadataStore, None)
+    inspected: List[pathlib.Path] = []
+    original_inspect = FirmwareMetadataStore.inspect
+
+    def counting_inspect(firmware_path: pathlib.Path, sha256: Any = None) -> Any:
+        inspected.append(firmware_path)
+        return original_inspect(firmware_path, sha256)
+
+    monkeypatch.setattr(FirmwareMetadataStore, "inspect", staticmethod(counting_inspect))
+    store = FirmwareMetadataStore()
+    store.inspected = inspected  # type: ignore[attr-defined]
+    yield store
+    Singleton._instances.pop(FirmwareMetadataStore, None)
+
+
+def test_metadata_is_cached(store: FirmwareMetadataStore, tmp_path: pathlib.Path) -> None:
+    # The python interpreter is a valid ELF for the running system, although not an ArduPilot one
+    firmware = tmp_path / "firmware"
+    shutil.copy(sys.executable, firmware)
+
+    metadata = store.get(firmware)
+    assert metadata.arch is not None
+    assert metadata.board_type is None
+    assert store.get(firmware) == metadata
+    assert store.get_cached(firmware) == metadata
+    assert len(store.inspected) == 1  # type: ignore[attr-defined]
+
+
+def test_metadata_reused_for_copies(store: FirmwareMetadataStore, tmp_path: pathlib.Path) -> None:
+    firmware = tmp_path / "firmware"
+    shutil.copy(sys.executable, firmware)
+    metadata = store.get(firmware)
+
+    registered_copy = tmp_path / "registered_copy"
+    shutil.copy(firmware, registered_copy)
+    store.register_copy(firmware, registered_copy)
+    assert store.get_cached(registered_copy) is not None
+
+    # Unregistered copies are hashed, but still not parsed again
+    unregistered_copy = tmp_path / "unregistered_copy"
+    shutil.copy(firmware, unregistered_copy)
+    assert store.get_cached(unregistered_copy) is None
+    assert store.get(unregistered_copy).sha256 == metadata.sha256
+    assert len(store.inspected) == 1  # type: ignore[attr-defined]
+
+
+def test_metadata_persistence(store: FirmwareMetadataStore, tmp_path: pathlib.Path) -> None:
+    storage_file = tmp_path / "metadata.json"
+    firmware = tmp_path / "firmware"
+    shutil.copy(sys.executable, firmware)
+    store.load(storage_file)
+    metadata = store.get(firmware)
+    assert storage_file.is_file()
+
+    Singleton._instances.pop(FirmwareMetadataStore, None)
+    new_store = FirmwareMetadataStore()
+    new_store.load(storage_file)
+    assert new_store.get_cached(firmware) == metadata
+
+    # Modified files should not use the old record
+    with open(firmware, "ab") as file:
+        file.write(b"\0")
+    assert new_store.get_cached(firmware) is None
+
+
+def test_invalid_elf(store: FirmwareMetadataStore, tmp_path: pathlib.Path) -> None:
+    firmware = tmp_path / "firmware"
+    firmware.write_text("not an elf", encoding="utf-8")
+    with pytest.raises(InvalidFirmwareFile):
+        store.get(firmware)
@@ -0,0 +1,55 @@
+import pathlib
+from typing import Any, List
+
+import pytest
+from exceptions import FirmwareUploadFail
+from firmware.FirmwareUpload import FirmwareUploader
+from typedefs import FirmwareUploadProgress, FirmwareUploadStage
+
+FAKE_UPLOADER_OUTPUT = (
+    r"Found board id: 9,0 bootloader version: 5 on /dev/ttyACM0\n"
+    r"\rErase  : [                    ] 0.0%"
+    r"\rErase  : [====================] 100.0%\n"
+    r"\rProgram: [==========          ] 50.0%"
+    r"\rProgram: [====================] 100.0%\n"
+    r"\rVerify : [====================] 100.0%\n"
+    r"Rebooting.\n"
+)
+
+
+def create_fake_uploader(folder: pathlib.Path, return_code: int) -> pathlib.Path:
+    uploader = folder / "ardupilot_fw_uploader.py"
+    uploader.write_text(f"#!/bin/sh\nprintf '%b' '{FAKE_UPLOADER_OUTPUT}'\nexit {return_code}\n", encoding="utf-8")
+    uploader.chmod(0o755)
+    return uploader
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("return_code", [0, 1])
+async def test_upload_progress(mocker: Any, tmp_path: pathlib.Path, return_code: int) -> None:
+    uploader_path = create_fake_uploader(tmp_path, return_code)
+    mocker.patch("firmware.FirmwareUpload.shutil.which", return_value=str(uploader_path))
+    mocker.patch.object(FirmwareUploader, "validate_binary")
+
+    progress: List[FirmwareUploadProgress] = []
+    uploader = FirmwareUploader()
+    uploader.set_autopilot_port(pathlib.Path("/dev/ttyACM0"))
+
+    if return_code != 0:
+        with pytest.raises(FirmwareUploadFail):
+            await uploader.upload(tmp_path / "firmware.apj", progress.append)
+        assert progress[-1].stage == FirmwareUploadStage.Rebooting
+        return
+
+    await uploader.upload(tmp_path / "firmware.apj", progress.append)
+    assert [(report.stage, report.percentage) for report in progress] == [
+        (FirmwareUploadStage.Starting, 0.0),
+        (FirmwareUploadStage.Erase, 0.0),
+        (FirmwareUploadStage.Erase, 100.0),
+        (FirmwareUploadStage.Program, 50.0),
+        (FirmwareUploadStage.Program, 100.0),
+        (FirmwareUploadStage.Verify, 100.0),
+        (FirmwareUploadStage.Rebooting, 100.0),
+        (FirmwareUploadStage.Done, 100.0),
+    ]
+    assert all(report.port == "/dev/ttyACM0" for report in progress)
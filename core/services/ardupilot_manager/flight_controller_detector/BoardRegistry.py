@@ -0,0 +1,193 @@
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional
+
+import pyudev
+from commonwealth.utils.Singleton import Singleton
+from flight_controller_detector.Detector import Detector
+from loguru import logger
+from serial.tools.list_ports_linux import SysFS, comports
+from typedefs import FlightController, FlightControllerFlags, Platform, PlatformType
+
+BoardsPredicate = Callable[[List[FlightController]], bool]
+
+
+class BoardRegistry(metaclass=Singleton):
+    """Keeps track of connected flight controllers, updated by udev hotplug events of tty devices.
+
+    Serial ports are inspected once when added, so detection requests are served from memory. When the udev
+    monitor is not available, every request falls back to a full detection.
+    """
+
+    # Used only while the udev monitor is not running
+    POLLING_INTERVAL_S = 0.5
+
+    def __init__(self) -> None:
+        self._ports: Dict[str, SysFS] = {}
+        self._serial_boards: List[FlightController] = []
+        self._monitor: Optional[pyudev.Monitor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def is_monitoring(self) -> bool:
+        return self._monitor is not None
+
+    def start(self) -> None:
+        """Start listening to udev events. Needs to be called from a running event loop."""
+        if self.is_monitoring:
+            return
+        try:
+            monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+            monitor.filter_by(subsystem="tty")
+            monitor.start()
+            loop = asyncio.get_running_loop()
+            loop.add_reader(monitor.fileno(), self._handle_udev_events)
+        except Exception as error:
+            logger.warning(f"Could not start udev monitor, serial boards will be detected on demand: {error}")
+            return
+
+        self._monitor = monitor
+        self._loop = loop
+        self._ports = {port.device: port for port in comports() if Detector.detect_serial_platform(port)}
+        self._update_serial_boards()
+        logger.info(f"Board registry started with serial boards: {[board.name for board in self._serial_boards]}")
+
+    def stop(self) -> None:
+        if self._monitor is None or self._loop is None:
+            return
+        self._loop.remove_reader(self._monitor.fileno())
+        self._monitor = None
+        self._loop = None
+
+    def _handle_udev_events(self) -> None:
+        assert self._monitor is not None
+        changed = False
+        while True:
+            device = self._monitor.poll(timeout=0)
+            if device is None:
+                break
+            if device.device_node is None:
+                continue
+            if device.action == "add":
+                port = SysFS(device.device_node)
+                if Detector.detect_serial_platform(port) is None:
+                    continue
+                logger.info(f"Serial board connected on {device.device_node}.")
+                self._ports[device.device_node] = port
+                changed = True
+            elif device.action == "remove" and self._ports.pop(device.device_node, None) is not None:
+                logger.info(f"Serial board disconnected from {device.device_node}.")
+                changed = True
+
+        if changed:
+            self._update_serial_boards()
+
+    def _update_serial_boards(self) -> None:
+        self._serial_boards = Detector.detect_serial_flight_controllers(self._ports.values())
+        # Wake up everyone waiting for a change and arm a new event for the next one
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def serial_flight_controllers(self) -> List[FlightController]:
+        if not self.is_monitoring:
+            return await asyncio.to_thread(Detector.detect_serial_flight_controllers)
+        return [board.model_copy(deep=True) for board in self._serial_boards]
+
+    async def detect(self, include_sitl: bool = True, include_manual: bool = True) -> List[FlightController]:
+        """Same as `Detector.detect`, but using the known serial boards when possible."""
+        if not self.is_monitoring:
+            return await Detector.detect(include_sitl, include_manual)
+        return await Detector.detect(include_sitl, include_manual, await self.serial_flight_controllers())
+
+    async def wait_for(self, predicate: BoardsPredicate, timeout: float) -> Optional[List[FlightController]]:
+        """Wait until the connected serial boards satisfy the predicate.
+
+        Returns:
+            Optional[List[FlightController]]: The serial boards that satisfied the predicate, None on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            # Get the event before checking, so a change between the check and the wait is not lost
+            changed = self._changed
+            boards = await self.serial_flight_controllers()
+            if predicate(boards):
+                return boards
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            if not self.is_monitoring:
+                await asyncio.sleep(min(self.POLLING_INTERVAL_S, remaining))
+                continue
+            try:
+                await asyncio.wait_for(changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return None
+
+    @staticmethod
+    def _running_serial_boards(boards: List[FlightController], platform: Platform) -> List[FlightController]:
+        """Serial boards of given platform that are running their flight stack (not in bootloader)."""
+        return [
+            board
+            for board in boards
+            if board.type == PlatformType.Serial
+            and board.platform == platform
+            and board.path
+            and FlightControllerFlags.is_bootloader not in board.flags
+        ]
+
+    def _port_at(self, path: str) -> SysFS:
+        port = self._ports.get(path)
+        return port if port is not None else SysFS(path)
+
+    @staticmethod
+    def _same_usb_device(port: SysFS, other: SysFS) -> bool:
+        """If both ports belong to the same USB device, by its serial number or physical port location."""
+        if port.serial_number and port.serial_number == other.serial_number:
+            return True
+        return bool(port.location) and port.location == other.location
+
+    async def wait_for_reboot(
+        self, board: FlightController, disconnect_timeout: float, reconnect_timeout: float
+    ) -> Optional[FlightController]:
+        """Wait for a serial board to drop and re-enumerate, as it happens after a reboot.
+
+        The device path can change when re-enumerating, so the board is recognized by the USB serial number or
+        physical port location it had before rebooting. Boards without USB information are only recognized on their
+        previous path. Boards reached through a separate USB-serial adapter never drop, so the disconnection is
+        best-effort.
+
+        Returns:
+            Optional[FlightController]: The reconnected board, None if it didn't come back in time.
+        """
+        assert board.path is not None
+        port = self._port_at(board.path)
+        is_usb = bool(port.serial_number or port.location)
+
+        disconnected_boards = await self.wait_for(
+            lambda boards: all(detected.path != board.path for detected in boards), timeout=disconnect_timeout
+        )
+        if disconnected_boards is None:
+            logger.warning(f"{board.name} did not disconnect after reboot.")
+
+        def is_same_board(detected: FlightController) -> bool:
+            assert detected.path is not None
+            if not is_usb:
+                return detected.path == board.path
+            return self._same_usb_device(port, self._port_at(detected.path))
+
+        def find_board(boards: List[FlightController]) -> Optional[FlightController]:
+            return next(
+                (
+                    detected
+                    for detected in self._running_serial_boards(boards, board.platform)
+                    if is_same_board(detected)
+                ),
+                None,
+            )
+
+        reconnected_boards = await self.wait_for(lambda boards: find_board(boards) is not None, reconnect_timeout)
+        if reconnected_boards is None:
+            return None
+        return find_board(reconnected_boards)
@@ -1,5 +1,6 @@
 import asyncio
-from typing import List, Optional
+import time
+from typing import ClassVar, Iterable, List, Optional
 
 from commonwealth.utils.general import is_running_as_root
 from flight_controller_detector.board_identification import identifiers
@@ -9,13 +10,23 @@ from typedefs import FlightController, FlightControllerFlags, Platform
 
 
 class Detector:
+    # Linux boards are not hot-pluggable, so a failed detection is only retried after this interval
+    LINUX_BOARD_RETRY_INTERVAL_S: ClassVar[float] = 30.0
+    _last_linux_board_failure: ClassVar[Optional[float]] = None
+
     @classmethod
     async def detect_linux_board(cls) -> Optional[FlightController]:
+        last_failure = cls._last_linux_board_failure
+        if last_failure is not None and time.monotonic() - last_failure < cls.LINUX_BOARD_RETRY_INTERVAL_S:
+            return None
+
         for _i in range(5):
             board = cls._detect_linux_board()
             if board:
+                cls._last_linux_board_failure = None
                 return board
             await asyncio.sleep(0.1)
+        cls._last_linux_board_failure = time.monotonic()
         return None
 
     @classmethod
@@ -42,33 +53,38 @@ class Detector:
         return None
 
     @staticmethod
-    def detect_serial_flight_controllers() -> List[FlightController]:
+    def detect_serial_flight_controllers(ports: Optional[Iterable[SysFS]] = None) -> List[FlightController]:
         """Check if a Pixhawk1 or a Pixhawk4 is connected.
 
+        Arguments:
+            ports {Optional[Iterable[SysFS]]} -- Serial ports to look into. All system ports are used if not provided.
+
         Returns:
             List[FlightController]: List with connected serial flight controller.
         """
-        sorted_serial_ports = sorted(comports(), key=lambda port: port.name)  # type: ignore
-        unique_serial_devices: List[SysFS] = []
+        if ports is None:
+            ports = comports()
+        sorted_serial_ports = sorted(ports, key=lambda port: port.name)  # type: ignore
+        unique_usb_device_paths = set()
+        boards: List[FlightController] = []
         for port in sorted_serial_ports:
             # usb_device_path property will be the same for two serial connections using the same USB port
-            if port.usb_device_path not in [device.usb_device_path for device in unique_serial_devices]:
-                unique_serial_devices.append(port)
-        boards = [
-            FlightController(
+            if port.usb_device_path in unique_usb_device_paths:
+                continue
+            unique_usb_device_paths.add(port.usb_device_path)
+
+            platform = Detector.detect_serial_platform(port)
+            if platform is None:
+                continue
+            board = FlightController(
                 name=port.product or port.name,
                 manufacturer=port.manufacturer,
-                platform=Detector.detect_serial_platform(port)
-                or Platform(),  # this is just to make CI happy. check line 82
+                platform=platform,
                 path=port.device,
             )
-            for port in unique_serial_devices
-            if Detector.detect_serial_platform(port) is not None
-        ]
-        for port in unique_serial_devices:
-            for board in boards:
-                if board.path == port.device and Detector.is_serial_bootloader(port):
-                    board.flags.append(FlightControllerFlags.is_bootloader)
+            if Detector.is_serial_bootloader(port):
+                board.flags.append(FlightControllerFlags.is_bootloader)
+            boards.append(board)
         return boards
 
     @staticmethod
@@ -76,11 +92,17 @@ class Detector:
         return FlightController(name="SITL", manufacturer="ArduPilot Team", platform=Platform.SITL)
 
     @classmethod
-    async def detect(cls, include_sitl: bool = True, include_manual: bool = True) -> List[FlightController]:
+    async def detect(
+        cls,
+        include_sitl: bool = True,
+        include_manual: bool = True,
+        serial_boards: Optional[List[FlightController]] = None,
+    ) -> List[FlightController]:
         """Return a list of available flight controllers
 
         Arguments:
             include_sitl {bool} -- To include or not SITL controllers in the returned list
+            serial_boards {Optional[List[FlightController]]} -- Already known serial boards, to skip serial detection
 
         Returns:
             List[FlightController]: List of available flight controllers
@@ -89,11 +111,18 @@ class Detector:
         if not is_running_as_root():
             return available
 
-        linux_board = await cls.detect_linux_board()
+        if serial_boards is None:
+            # I²C probing of Linux boards and the serial ports enumeration are independent
+            linux_board, detected_serial_boards = await asyncio.gather(
+                cls.detect_linux_board(), asyncio.to_thread(cls.detect_serial_flight_controllers)
+            )
+        else:
+            linux_board, detected_serial_boards = await cls.detect_linux_board(), serial_boards
+
         if linux_board:
             available.append(linux_board)
 
-        available.extend(cls().detect_serial_flight_controllers())
+        available.extend(detected_serial_boards)
 
         if include_sitl:
             available.append(Detector.detect_sitl())
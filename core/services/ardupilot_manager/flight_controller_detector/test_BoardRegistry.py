@@ -0,0 +1,78 @@
+import asyncio
+from typing import Any, List
+
+import pytest
+from commonwealth.utils.Singleton import Singleton
+from flight_controller_detector.BoardRegistry import BoardRegistry
+from flight_controller_detector.Detector import Detector
+from typedefs import FlightController, Platform
+
+PIXHAWK = FlightController(name="Pixhawk1", platform=Platform.Pixhawk1, path="/dev/ttyACM0")
+
+
+@pytest.mark.asyncio
+async def test_wait_for_board(mocker: Any) -> None:
+    Singleton._instances.pop(BoardRegistry, None)
+    connected: List[FlightController] = []
+    mocker.patch.object(Detector, "detect_serial_flight_controllers", side_effect=lambda ports=None: list(connected))
+
+    registry = BoardRegistry()
+    # Without udev monitor the registry falls back to polling
+    assert not registry.is_monitoring
+    assert await registry.wait_for(lambda boards: len(boards) > 0, timeout=0.2) is None
+
+    asyncio.get_running_loop().call_later(0.2, connected.append, PIXHAWK)
+    boards = await registry.wait_for(lambda boards: len(boards) > 0, timeout=2.0)
+    assert boards == [PIXHAWK]
+    Singleton._instances.pop(BoardRegistry, None)
+
+
+@pytest.mark.asyncio
+async def test_udev_events(mocker: Any) -> None:
+    Singleton._instances.pop(BoardRegistry, None)
+    mocker.patch.object(Detector, "detect_serial_platform", return_value=Platform.Pixhawk1)
+    mocker.patch.object(Detector, "detect_serial_flight_controllers", return_value=[PIXHAWK])
+
+    registry = BoardRegistry()
+    registry._monitor = mocker.Mock()
+    registry._monitor.poll.side_effect = [mocker.Mock(action="add", device_node="/dev/ttyACM0"), None]
+    mocker.patch("flight_controller_detector.BoardRegistry.SysFS")
+
+    waiter = asyncio.create_task(registry.wait_for(lambda boards: len(boards) > 0, timeout=2.0))
+    await asyncio.sleep(0.1)
+    assert not waiter.done()
+    registry._handle_udev_events()
+    assert await waiter == [PIXHAWK]
+    Singleton._instances.pop(BoardRegistry, None)
+
+
+@pytest.mark.asyncio
+async def test_wait_for_reboot_matches_usb_device(mocker: Any) -> None:
+    Singleton._instances.pop(BoardRegistry, None)
+    connected: List[FlightController] = [PIXHAWK]
+    # USB serial number and location of the device on each path
+    devices = {
+        "/dev/ttyACM0": ("SERIAL_A", "1-1"),
+        "/dev/ttyACM1": ("SERIAL_B", "1-2"),
+        "/dev/ttyACM2": ("SERIAL_A", "1-1"),
+    }
+    mocker.patch.object(Detector, "detect_serial_flight_controllers", side_effect=lambda ports=None: list(connected))
+    mocker.patch(
+        "flight_controller_detector.BoardRegistry.SysFS",
+        side_effect=lambda path: mocker.Mock(serial_number=devices[path][0], location=devices[path][1]),
+    )
+
+    loop = asyncio.get_running_loop()
+
+    def reenumerate() -> None:
+        # Another board of the same platform shows up first, on a path that was free
+        connected[:] = [PIXHAWK.model_copy(update={"path": "/dev/ttyACM1"})]
+        loop.call_later(0.2, connected.append, PIXHAWK.model_copy(update={"path": "/dev/ttyACM2"}))
+
+    registry = BoardRegistry()
+    loop.call_later(0.1, connected.clear)
+    loop.call_later(0.3, reenumerate)
+    board = await registry.wait_for_reboot(PIXHAWK, disconnect_timeout=2.0, reconnect_timeout=2.0)
+    assert board is not None
+    assert board.path == "/dev/ttyACM2"
+    Singleton._instances.pop(BoardRegistry, None)
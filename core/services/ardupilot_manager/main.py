@@ -7,16 +7,19 @@ from autopilot_manager import AutoPilotManager
 from commonwealth.utils.general import is_running_as_root
 from commonwealth.utils.logs import InterceptHandler, init_logger
 from commonwealth.utils.sentry_config import init_sentry_async
+from flight_controller_detector.BoardRegistry import BoardRegistry
 from flight_controller_detector.Detector import Detector as BoardDetector
 from loguru import logger
 from settings import SERVICE_NAME
+from startup_profiler import StartupProfiler
 from uvicorn import Config, Server
 
 logging.basicConfig(handlers=[InterceptHandler()], level=0)
 init_logger(SERVICE_NAME)
 
 logger.info("Starting AutoPilot Manager.")
-autopilot = AutoPilotManager()
+with StartupProfiler().phase("settings"):
+    autopilot = AutoPilotManager()
 
 from api import application
 
@@ -36,6 +39,9 @@ async def main() -> None:
     config = Config(app=application, host=args.host, port=args.port, log_config=None)
     server = Server(config)
 
+    with StartupProfiler().phase("board_registry"):
+        BoardRegistry().start()
+
     if args.sitl:
         autopilot.set_preferred_board(BoardDetector.detect_sitl())
 
@@ -44,14 +50,17 @@ async def main() -> None:
             await autopilot.start_ardupilot()
         except Exception as start_error:
             logger.exception(start_error)
+        asyncio.create_task(autopilot.wait_first_heartbeat())
     else:
         logger.info("Autopilot was stopped by the user, skipping auto-start on boot.")
+        StartupProfiler().finish()
 
     asyncio.create_task(autopilot.auto_restart_ardupilot())
     asyncio.create_task(autopilot.start_mavlink_manager_watchdog())
 
     await server.serve()
     await autopilot.kill_ardupilot()
+    BoardRegistry().stop()
 
 
 if __name__ == "__main__":
@@ -1,10 +1,12 @@
 import abc
 import asyncio
+import os
 import pathlib
 import shlex
 import shutil
 import tempfile
-from typing import Any, List, Optional, Set, Type
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple, Type
 
 from loguru import logger
 from mavlink_proxy.Endpoint import Endpoint
@@ -15,19 +17,30 @@ from mavlink_proxy.exceptions import (
     MavlinkRouterStartFail,
     NoMasterMavlinkEndpoint,
 )
+from mavlink_proxy.RouterOutput import (
+    RouterOutput,
+    RouterOutputBuffer,
+    RouterOutputStream,
+)
 
 
 class AbstractRouter(metaclass=abc.ABCMeta):
+    # Versions of the router binaries, identified by router name, binary path and modification time.
+    # Getting the version runs the binary, so it's done once instead of on every router instantiation.
+    _versions: Dict[Tuple[str, str, int], Optional[str]] = {}
+
     def __init__(self) -> None:
         self._endpoints: Set[Endpoint] = set()
         self._master_endpoint: Optional[Endpoint] = None
         self._subprocess: Optional[asyncio.subprocess.Process] = None
+        self._output = RouterOutputBuffer(self.name())
+        self._output_tasks: Set["asyncio.Task[None]"] = set()
 
         # Since this methods can fail we need to have the other variables defined
         # to avoid any problem in __del__
         self._binary = shutil.which(self.binary_name())
         self._logdir = pathlib.Path(tempfile.gettempdir())
-        self._version = self._get_version()
+        self._version = self._cached_version()
 
     @staticmethod
     @abc.abstractmethod
@@ -57,6 +70,14 @@ class AbstractRouter(metaclass=abc.ABCMeta):
     def assemble_command(self, master_endpoint: Endpoint) -> str:
         pass
 
+    def _cached_version(self) -> Optional[str]:
+        if self._binary is None:
+            return self._get_version()
+        key = (self.name(), self._binary, os.stat(self._binary).st_mtime_ns)
+        if key not in AbstractRouter._versions:
+            AbstractRouter._versions[key] = self._get_version()
+        return AbstractRouter._versions[key]
+
     @staticmethod
     def possible_interfaces() -> List[str]:
         return [subclass.name() for subclass in AbstractRouter.__subclasses__()]
@@ -71,7 +92,11 @@ class AbstractRouter(metaclass=abc.ABCMeta):
             logger.debug(subclass.__str__(subclass))  # type: ignore
             return subclass.is_ok()
 
-        availables = list(filter(caller, AbstractRouter.__subclasses__()))
+        # Each check may run the router binary, so all routers are checked at the same time
+        subclasses = AbstractRouter.__subclasses__()
+        with ThreadPoolExecutor(max_workers=max(len(subclasses), 1)) as executor:
+            results = list(executor.map(caller, subclasses))
+        availables = [subclass for subclass, is_ok in zip(subclasses, results) if is_ok]
         logger.debug(f"Available interfaces: {availables}")
         return availables
 
@@ -136,29 +161,18 @@ class AbstractRouter(metaclass=abc.ABCMeta):
     async def start_house_keepers(self) -> None:
         if self._subprocess is None:
             return
-        # Ensure that the logging tasks are awaited and executed
-        asyncio.create_task(self._log_stdout())
-        asyncio.create_task(self._log_stderr())
-
-    async def _log_stdout(self) -> None:
-        while self._subprocess is not None:
-            if self._subprocess.stdout:
-                stdout_line = await self._subprocess.stdout.readline()
-                if stdout_line:
-                    logger.debug(f"Router: {stdout_line.decode().strip()}")
-                else:
-                    break  # EOF reached
-            await asyncio.sleep(0.01)
-
-    async def _log_stderr(self) -> None:
-        while self._subprocess is not None:
-            if self._subprocess.stderr:
-                stderr_line = await self._subprocess.stderr.readline()
-                if stderr_line:
-                    logger.debug(f"Router: {stderr_line.decode().strip()}")
-                else:
-                    break  # EOF reached
-            await asyncio.sleep(0.01)
+        # Keep references to the tasks, so they are not garbage collected while draining the pipes
+        for stream_type, stream in [
+            (RouterOutputStream.stdout, self._subprocess.stdout),
+            (RouterOutputStream.stderr, self._subprocess.stderr),
+        ]:
+            task = asyncio.create_task(self._output.pump(stream_type, stream))
+            self._output_tasks.add(task)
+            task.add_done_callback(self._output_tasks.discard)
+
+    def output(self, lines: Optional[int] = None) -> RouterOutput:
+        """Get the most recent router output lines and output statistics."""
+        return self._output.tail(lines)
 
     async def restart(self) -> None:
         if self._master_endpoint is None:
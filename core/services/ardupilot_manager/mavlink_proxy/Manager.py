@@ -18,6 +18,7 @@ from mavlink_proxy.exceptions import (
     EndpointUpdateFail,
     NoMasterMavlinkEndpoint,
 )
+from mavlink_proxy.RouterOutput import RouterOutput
 
 
 class Manager:
@@ -175,6 +176,9 @@ class Manager:
     def router_name(self) -> str:
         return self.tool.name()
 
+    def router_output(self, lines: Optional[int] = None) -> RouterOutput:
+        return self.tool.output(lines)
+
     def set_logdir(self, log_dir: pathlib.Path) -> None:
         self.tool.set_logdir(log_dir)
 
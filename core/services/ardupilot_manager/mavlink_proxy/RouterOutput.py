@@ -0,0 +1,144 @@
+import asyncio
+import dataclasses
+import re
+import time
+from collections import deque
+from enum import Enum
+from typing import Deque, Dict, List, Optional
+
+from loguru import logger
+from pydantic.dataclasses import dataclass
+
+
+class RouterOutputStream(str, Enum):
+    stdout = "stdout"
+    stderr = "stderr"
+
+
+class RouterOutputLevel(str, Enum):
+    debug = "debug"
+    warning = "warning"
+
+
+@dataclass
+class RouterOutputLine:
+    timestamp: float
+    stream: RouterOutputStream
+    level: RouterOutputLevel
+    message: str
+
+
+@dataclass
+class RouterOutputStatistics:
+    # Lines read from the router pipes
+    received_lines: int = 0
+    # Lines that didn't fit the ring buffer anymore and were discarded
+    evicted_lines: int = 0
+    # Lines that were kept in the ring buffer but not forwarded to the logger due to rate limiting
+    rate_limited_lines: int = 0
+
+
+@dataclass
+class RouterOutput:
+    lines: List[RouterOutputLine]
+    statistics: RouterOutputStatistics
+
+
+class LogRateLimiter:
+    """Token bucket limiting the amount of lines per second forwarded to the logger."""
+
+    def __init__(self, lines_per_second: float, burst: int) -> None:
+        self._rate = lines_per_second
+        self._burst = burst
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._last_refill) * self._rate)
+        self._last_refill = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class RouterOutputBuffer:
+    """Drains the router output pipes, keeping the most recent lines in a bounded ring buffer.
+
+    The pipes are read in big chunks and never wait on the logger, so a verbose router can't fill its pipes and
+    stall. Lines are forwarded to the logger with a per-level rate limit, the remaining ones are only counted.
+    """
+
+    READ_CHUNK_SIZE = 64 * 1024
+    WARNING_REGEX = re.compile(r"error|fail|critical|warn", re.IGNORECASE)
+    # Interval used to report lines that were not logged due to the rate limit
+    SUPPRESSED_REPORT_INTERVAL_S = 10.0
+
+    def __init__(self, router_name: str, max_lines: int = 1000) -> None:
+        self._router_name = router_name
+        self._lines: Deque[RouterOutputLine] = deque(maxlen=max_lines)
+        self._statistics = RouterOutputStatistics()
+        self._rate_limiters: Dict[RouterOutputLevel, LogRateLimiter] = {
+            RouterOutputLevel.debug: LogRateLimiter(lines_per_second=20, burst=100),
+            RouterOutputLevel.warning: LogRateLimiter(lines_per_second=5, burst=20),
+        }
+        self._suppressed_since_report = 0
+        self._last_suppressed_report = time.monotonic()
+
+    @classmethod
+    def classify(cls, stream: RouterOutputStream, message: str) -> RouterOutputLevel:
+        if stream == RouterOutputStream.stderr and cls.WARNING_REGEX.search(message):
+            return RouterOutputLevel.warning
+        return RouterOutputLevel.debug
+
+    def add_lines(self, stream: RouterOutputStream, messages: List[str]) -> None:
+        timestamp = time.time()
+        for message in messages:
+            if not message:
+                continue
+            level = self.classify(stream, message)
+            if len(self._lines) == self._lines.maxlen:
+                self._statistics.evicted_lines += 1
+            self._lines.append(RouterOutputLine(timestamp=timestamp, stream=stream, level=level, message=message))
+            self._statistics.received_lines += 1
+
+            if self._rate_limiters[level].allow():
+                logger.log(level.name.upper(), f"Router: {message}")
+            else:
+                self._statistics.rate_limited_lines += 1
+                self._suppressed_since_report += 1
+
+        now = time.monotonic()
+        if self._suppressed_since_report and now - self._last_suppressed_report > self.SUPPRESSED_REPORT_INTERVAL_S:
+            logger.debug(
+                f"Router: {self._suppressed_since_report} lines were not logged due to rate limiting. "
+                "Check the router output endpoint for the full output."
+            )
+            self._suppressed_since_report = 0
+            self._last_suppressed_report = now
+
+    async def pump(self, stream_type: RouterOutputStream, stream: Optional[asyncio.StreamReader]) -> None:
+        """Read given pipe until EOF."""
+        if stream is None:
+            return
+        pending = b""
+        while True:
+            chunk = await stream.read(self.READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            *lines, pending = (pending + chunk).split(b"\n")
+            # Avoid growing forever on output without line breaks
+            if len(pending) > self.READ_CHUNK_SIZE:
+                lines.append(pending)
+                pending = b""
+            self.add_lines(stream_type, [line.decode(errors="replace").strip() for line in lines])
+        if pending:
+            self.add_lines(stream_type, [pending.decode(errors="replace").strip()])
+        logger.debug(f"{self._router_name} {stream_type.value} closed.")
+
+    def tail(self, lines: Optional[int] = None) -> RouterOutput:
+        recent_lines = list(self._lines)
+        if lines is not None:
+            recent_lines = recent_lines[-lines:] if lines > 0 else []
+        return RouterOutput(lines=recent_lines, statistics=dataclasses.replace(self._statistics))
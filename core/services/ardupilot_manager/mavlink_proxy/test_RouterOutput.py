@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+from mavlink_proxy.RouterOutput import (
+    RouterOutputBuffer,
+    RouterOutputLevel,
+    RouterOutputStream,
+)
+
+
+@pytest.mark.asyncio
+async def test_router_output_pump() -> None:
+    buffer = RouterOutputBuffer("TestRouter", max_lines=100)
+    stream = asyncio.StreamReader()
+    for index in range(1000):
+        stream.feed_data(f"line {index}\n".encode())
+    stream.feed_data(b"Error: something failed\nincomplete")
+    stream.feed_eof()
+    await buffer.pump(RouterOutputStream.stderr, stream)
+
+    output = buffer.tail()
+    assert output.statistics.received_lines == 1002
+    assert output.statistics.evicted_lines == 902
+    # Lines above the logging burst are only kept in the buffer
+    assert output.statistics.rate_limited_lines > 0
+    assert len(output.lines) == 100
+    assert output.lines[-2].message == "Error: something failed"
+    assert output.lines[-2].level == RouterOutputLevel.warning
+    assert output.lines[-1].message == "incomplete"
+    assert output.lines[-1].level == RouterOutputLevel.debug
+
+
+def test_router_output_tail() -> None:
+    output = RouterOutputBuffer("TestRouter", max_lines=10)
+    output.add_lines(RouterOutputStream.stdout, ["first", "", "second", "third"])
+    assert [line.message for line in output.tail(2).lines] == ["second", "third"]
+    assert output.tail(0).lines == []
+    assert output.tail().statistics.received_lines == 3
@@ -0,0 +1,77 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+import psutil
+from commonwealth.utils.Singleton import Singleton
+from loguru import logger
+from typedefs import StartupPhase, StartupReport
+
+
+class StartupProfiler(metaclass=Singleton):
+    """Records how long each phase of the service startup takes.
+
+    Only the boot sequence is recorded: once the first heartbeat is seen (or the profiler is finished for any
+    other reason), further phases, like the ones of later autopilot restarts, are ignored.
+    """
+
+    def __init__(self) -> None:
+        self._process_start_time: float
+        try:
+            self._process_start_time = psutil.Process().create_time()
+        except Exception as error:
+            logger.warning(f"Could not get process start time, using profiler creation time instead: {error}")
+            self._process_start_time = time.time()
+        self._phases: List[StartupPhase] = []
+        self._autopilot_started: Optional[float] = None
+        self._first_heartbeat: Optional[float] = None
+        self._finished = False
+
+    def _now(self) -> float:
+        return round(time.time() - self._process_start_time, 3)
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the wrapped block as a startup phase. Phases can overlap when running concurrently."""
+        if self._finished:
+            yield
+            return
+
+        phase = StartupPhase(name=name, start=self._now())
+        self._phases.append(phase)
+        try:
+            yield
+        except BaseException as error:
+            phase.error = str(error) or type(error).__name__
+            raise
+        finally:
+            phase.duration = round(self._now() - phase.start, 3)
+            logger.debug(f"Startup phase '{name}' took {phase.duration}s.")
+
+    def mark_autopilot_started(self) -> None:
+        if self._finished or self._autopilot_started is not None:
+            return
+        self._autopilot_started = self._now()
+        logger.info(f"Autopilot started {self._autopilot_started}s after service start.")
+
+    def mark_first_heartbeat(self) -> None:
+        if self._finished:
+            return
+        self._first_heartbeat = self._now()
+        logger.info(f"First autopilot heartbeat {self._first_heartbeat}s after service start.")
+        self.finish()
+
+    def finish(self) -> None:
+        self._finished = True
+
+    def report(self) -> StartupReport:
+        return StartupReport(
+            process_start_time=self._process_start_time,
+            phases=[phase.model_copy() for phase in self._phases],
+            autopilot_started=self._autopilot_started,
+            first_heartbeat=self._first_heartbeat,
+        )
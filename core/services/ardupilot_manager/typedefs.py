@@ -174,6 +174,45 @@ class FirmwareFormat(str, Enum):
     ELF = "ELF"
 
 
+class FirmwareUploadStage(str, Enum):
+    """Stages reported while uploading a firmware to a serial board."""
+
+    Starting = "starting"
+    Erase = "erase"
+    Program = "program"
+    Verify = "verify"
+    Rebooting = "rebooting"
+    Done = "done"
+    Failed = "failed"
+
+
+class FirmwareUploadProgress(BaseModel):
+    """Progress of a firmware upload to the board connected on the given port.
+    The percentage refers to the current stage."""
+
+    port: str
+    stage: FirmwareUploadStage
+    percentage: float = 0.0
+    message: Optional[str] = None
+
+
+class FirmwareMetadata(BaseModel):
+    """Information extracted from a firmware file, cached to avoid re-parsing the binary.
+
+    Records are identified by the file path, size, modification time and content hash."""
+
+    path: str
+    size: int
+    mtime_ns: int
+    sha256: str
+    arch: Optional[str] = None
+    board_type: Optional[int] = None
+    board_subtype: Optional[int] = None
+    version: Optional[str] = None
+    git_hash: Optional[str] = None
+    has_debug_symbols: bool = False
+
+
 class Serial(BaseModel):
     """Simplified representation of linux serial port configurations,
     gets transformed into command line arguments such as
@@ -209,3 +248,21 @@ class Serial(BaseModel):
 
     def __hash__(self) -> int:  # make hashable BaseModel subclass
         return hash(self.port + self.endpoint)
+
+
+class StartupPhase(BaseModel):
+    """Timing of a single startup phase. Times are in seconds relative to the service process start."""
+
+    name: str
+    start: float
+    duration: Optional[float] = None
+    error: Optional[str] = None
+
+
+class StartupReport(BaseModel):
+    """Per-phase timing of the service startup, and when the autopilot was first seen alive."""
+
+    process_start_time: float
+    phases: List[StartupPhase]
+    autopilot_started: Optional[float] = None
+    first_heartbeat: Optional[float] = None
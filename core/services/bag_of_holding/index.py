@@ -0,0 +1,139 @@
+import asyncio
+import json
+import uuid
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+import dpath
+from storage import WALStorage
+
+ROOT = "*"
+GLOB_CHARACTERS = ("*", "?", "[")
+
+
+@dataclass
+class Change:
+    path: str
+    version: int
+
+
+class PathIndex:
+    """Exact path lookups, versions and change notifications over the database of a storage.
+
+    Resolved paths are kept in a flattened index, invalidated for the changed path and all the paths under it.
+    Parents don't need to be invalidated, since changes are done in place on their objects.
+
+    Each change gets a new version, which is recorded for the changed path and all its parents, so the version of a
+    path is the latest one of changes done on it, under it, or on any of its parents. Versions are not persisted,
+    so ETags include an identifier of the running instance.
+    """
+
+    def __init__(self, storage: WALStorage) -> None:
+        self.storage = storage
+        self._index: Dict[str, Any] = {}
+        self._version = 0
+        # Version of the latest change done on each path, or under it
+        self._tree_versions: Dict[str, int] = {}
+        # Version of the latest change done exactly on each path
+        self._set_versions: Dict[str, int] = {}
+        self._overwrite_version = 0
+        self._root_json: Optional[Tuple[int, bytes]] = None
+        self._instance = uuid.uuid4().hex[:8]
+        self._watchers: List[Tuple[str, asyncio.Queue[Change]]] = []
+
+    @staticmethod
+    def normalize(path: str) -> str:
+        return path.strip("/")
+
+    @staticmethod
+    def _parents(path: str) -> List[str]:
+        segments = path.split("/")
+        return ["/".join(segments[:length]) for length in range(1, len(segments))]
+
+    def get(self, path: str) -> Any:
+        """Value of the given path, which may have globs matching a single path
+
+        Raises:
+            KeyError: If the path doesn't exist.
+        """
+        path = self.normalize(path)
+        if path == ROOT:
+            return self.storage.data
+        if path in self._index:
+            return self._index[path]
+        if any(character in path for character in GLOB_CHARACTERS):
+            return dpath.get(self.storage.data, path)
+
+        value: Any = self.storage.data
+        for segment in path.split("/"):
+            if isinstance(value, dict):
+                value = value[segment]
+            elif isinstance(value, list):
+                try:
+                    value = value[int(segment)]
+                except (ValueError, IndexError) as error:
+                    raise KeyError(path) from error
+            else:
+                raise KeyError(path)
+        self._index[path] = value
+        return value
+
+    def root_json(self) -> bytes:
+        """Whole database serialized, cached until it changes"""
+        if self._root_json is None or self._root_json[0] != self._version:
+            self._root_json = (self._version, json.dumps(self.storage.data).encode("utf-8"))
+        return self._root_json[1]
+
+    def version(self, path: str) -> int:
+        path = self.normalize(path)
+        if path == ROOT or any(character in path for character in GLOB_CHARACTERS):
+            return self._version
+        parents_version = max((self._set_versions.get(parent, 0) for parent in self._parents(path)), default=0)
+        return max(self._overwrite_version, self._tree_versions.get(path, 0), parents_version)
+
+    def etag(self, path: str) -> str:
+        return f'"{self._instance}-{self.version(path)}"'
+
+    def set(self, path: str, value: Any) -> None:
+        path = self.normalize(path)
+        self.storage.set(path, value)
+        self._version += 1
+        self._set_versions[path] = self._version
+        for changed in [path, *self._parents(path)]:
+            self._tree_versions[changed] = self._version
+        prefix = f"{path}/"
+        for indexed in [indexed for indexed in self._index if indexed == path or indexed.startswith(prefix)]:
+            del self._index[indexed]
+        self._notify(path)
+
+    def overwrite(self, payload: dict[str, Any]) -> None:
+        self.storage.overwrite(payload)
+        self._version += 1
+        self._overwrite_version = self._version
+        self._index.clear()
+        self._tree_versions.clear()
+        self._set_versions.clear()
+        self._notify(ROOT)
+
+    def _notify(self, path: str) -> None:
+        change = Change(path=path, version=self._version)
+        for prefix, queue in self._watchers:
+            if self._affects(path, prefix):
+                queue.put_nowait(change)
+
+    @staticmethod
+    def _affects(path: str, prefix: str) -> bool:
+        """If a change of path changes something under prefix"""
+        if ROOT in (path, prefix):
+            return True
+        return path == prefix or path.startswith(f"{prefix}/") or prefix.startswith(f"{path}/")
+
+    async def watch(self, prefix: str) -> AsyncGenerator[Change, None]:
+        """Stream the changes that affect the given path or anything under it"""
+        watcher: Tuple[str, asyncio.Queue[Change]] = (self.normalize(prefix) or ROOT, asyncio.Queue())
+        self._watchers.append(watcher)
+        try:
+            while True:
+                yield await watcher[1].get()
+        finally:
+            self._watchers.remove(watcher)
@@ -2,21 +2,23 @@
 import asyncio
 import json
 import logging
-import os
 from pathlib import Path
-from types import SimpleNamespace
-from typing import Any
+from typing import Any, AsyncGenerator, Optional
 
 import appdirs
-import dpath
 from commonwealth.utils.apis import GenericErrorHandlingRoute
 from commonwealth.utils.logs import InterceptHandler, init_logger
 from commonwealth.utils.sentry_config import init_sentry_async
-from fastapi import Body, Depends, FastAPI, HTTPException
+from commonwealth.utils.streaming import streamer
+from fastapi import Body, Depends, FastAPI, Header, HTTPException
 from fastapi import Path as FastPath
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import Response, status
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi_versioning import VersionedFastAPI, version
+from index import ROOT, PathIndex
 from loguru import logger
+from storage import WALStorage
+from typedefs import MultiGetRequest, MultiGetResponse
 from uvicorn import Config, Server
 
 SERVICE_NAME = "bag-of-holding"
@@ -27,56 +29,9 @@ logging.basicConfig(handlers=[InterceptHandler()], level=0)
 init_logger(SERVICE_NAME)
 
 
-def read_db() -> dict[str, Any]:
-    try:
-        with open(FILE_PATH, "r", encoding="utf-8") as handle:
-            data = json.load(handle)
-            if isinstance(data, dict):
-                return data
-            logger.error("Database file is not an object")
-    except FileNotFoundError:
-        logger.error("Database not found")
-    except json.decoder.JSONDecodeError as exception:
-        logger.error(f"Failed to parse json in database file: {exception}")
-    except Exception as exception:
-        logger.exception(exception)
-    return {}
-
-
-def write_db() -> None:
-    FILE_PATH.parent.mkdir(parents=True, exist_ok=True)
-    temp_file = FILE_PATH.with_suffix(".tmp")
-    with open(temp_file, "w", encoding="utf-8") as handle:
-        json.dump(bag_of_holding_db, handle)
-        handle.flush()
-        os.fsync(handle.fileno())
-    temp_file.replace(FILE_PATH)
-
-
-bag_of_holding_db = read_db()
-_pending = SimpleNamespace(handle=None)
-
-
-def mark_dirty() -> None:
-    if _pending.handle is not None:
-        return
-    _pending.handle = asyncio.get_running_loop().call_later(FLUSH_INTERVAL, _flush)
-
-
-def _flush() -> None:
-    try:
-        write_db()
-        _pending.handle = None
-    except Exception:
-        logger.exception("Failed to persist database")
-        _pending.handle = asyncio.get_running_loop().call_later(FLUSH_INTERVAL, _flush)
-
-
-def flush_now() -> None:
-    if _pending.handle is not None:
-        _pending.handle.cancel()
-        _pending.handle = None
-    write_db()
+storage = WALStorage(FILE_PATH, flush_interval=FLUSH_INTERVAL)
+bag_of_holding_db = storage.load()
+index = PathIndex(storage)
 
 
 app = FastAPI(
@@ -98,9 +53,8 @@ async def parse_nullable_body(payload: Any | None = Body(None)) -> Any:
 @version(1, 0)
 async def overwrite_data(payload: dict[str, Any] = Body(...)) -> JSONResponse:
     logger.debug(f"Overwrite: {json.dumps(payload)}")
-    bag_of_holding_db.clear()
-    bag_of_holding_db.update(payload)
-    flush_now()
+    index.overwrite(payload)
+    await storage.flush()
     return JSONResponse(content={"status": "success"})
 
 
@@ -111,26 +65,63 @@ async def write_data(
     payload: Any = Depends(parse_nullable_body),
 ) -> JSONResponse:
     logger.debug(f"Write path: {path}, {json.dumps(payload)}")
-    dpath.new(bag_of_holding_db, path, payload)
-    mark_dirty()
+    index.set(path, payload)
     return JSONResponse(content={"status": "success"})
 
 
 @app.get("/get/{path:path}")
 @version(1, 0)
-async def read_data(path: str) -> JSONResponse:
+async def read_data(path: str, if_none_match: Optional[str] = Header(None)) -> Response:
     logger.debug(f"Get path: {path}")
 
-    if path == "*":
-        return JSONResponse(bag_of_holding_db)
+    etag = index.etag(path)
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    if path == ROOT:
+        return Response(index.root_json(), media_type="application/json", headers={"ETag": etag})
 
     try:
-        result = dpath.get(bag_of_holding_db, path)
-        return JSONResponse(result)
+        result = index.get(path)
+        return JSONResponse(result, headers={"ETag": etag})
     except KeyError as error:
         raise HTTPException(status_code=400, detail="Invalid path") from error
 
 
+@app.post("/get_many", response_model=MultiGetResponse)
+@version(1, 0)
+async def read_many(request: MultiGetRequest) -> Any:
+    """Read many paths at once, skipping the ones that didn't change since the given ETags."""
+    response = MultiGetResponse(values={}, etags={}, missing=[])
+    for path in request.paths:
+        try:
+            value = index.get(path)
+        except KeyError:
+            response.missing.append(path)
+            continue
+        etag = index.etag(path)
+        response.etags[path] = etag
+        if request.etags.get(path) != etag:
+            response.values[path] = value
+    return response
+
+
+@app.get("/watch/{path:path}", summary="Stream changes under a path.")
+@version(1, 0)
+async def watch_data(path: str) -> StreamingResponse:
+    """Stream the changes of the given path, including changes of its children and parents, with their values."""
+
+    async def changes() -> AsyncGenerator[str, None]:
+        async for change in index.watch(path):
+            try:
+                value = index.get(change.path)
+            except KeyError:
+                value = None
+            yield json.dumps({"path": change.path, "etag": index.etag(change.path), "value": value})
+
+    return StreamingResponse(streamer(changes(), heartbeats=1.0))
+
+
 app = VersionedFastAPI(app, version="1.0.0", prefix_format="/v{major}.{minor}", enable_latest=True)
 
 
@@ -156,7 +147,7 @@ async def main() -> None:
     try:
         await server.serve()
     finally:
-        flush_now()
+        await storage.close()
 
 
 if __name__ == "__main__":
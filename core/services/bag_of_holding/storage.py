@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, List, Optional
+
+import dpath
+from loguru import logger
+
+
+class WALStorage:
+    """JSON database persisted as a snapshot plus an append-only log of the operations done after it.
+
+    Operations are applied in memory right away, and appended to the log in batches, with a single fsync for all the
+    operations of each flush interval. Writes happen on a worker thread, so requests are not blocked by the disk.
+    Once the log grows bigger than the snapshot, it's compacted into a new snapshot in the background.
+
+    On load, the log is replayed over the snapshot. A compaction marker with the hash of the snapshot being written
+    is logged before replacing it, so operations already in the snapshot are not replayed if a crash happens
+    before the log is truncated. A partially written operation at the end of the log is discarded.
+    """
+
+    FLUSH_INTERVAL = 1.0
+    # Logs smaller than this are not compacted, even if bigger than the snapshot
+    COMPACT_MIN_BYTES = 1024 * 1024
+
+    def __init__(self, snapshot_path: Path, flush_interval: float = FLUSH_INTERVAL) -> None:
+        self.snapshot_path = snapshot_path
+        self.log_path = snapshot_path.with_name(f"{snapshot_path.name}.wal")
+        self.flush_interval = flush_interval
+        self.data: dict[str, Any] = {}
+        self._pending: List[str] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional["asyncio.Task[None]"] = None
+        self._flush_lock = asyncio.Lock()
+        self._compaction: Optional["asyncio.Task[None]"] = None
+        self._log_size = 0
+        self._snapshot_size = 0
+
+    def load(self) -> dict[str, Any]:
+        """Load the snapshot and replay the log over it, compacting both if any operation was replayed."""
+        snapshot = self._read_snapshot()
+        self.data = self._parse_snapshot(snapshot)
+        self._snapshot_size = len(snapshot)
+
+        operations = self._read_log(snapshot)
+        for operation in operations:
+            self._apply(operation)
+        if operations:
+            logger.info(f"Replayed {len(operations)} operations from {self.log_path}")
+            self._write_snapshot(json.dumps(self.data).encode("utf-8"))
+        elif self.log_path.exists():
+            # Only a compaction marker, or operations that were not completely written
+            self._truncate_log()
+        return self.data
+
+    def _read_snapshot(self) -> bytes:
+        try:
+            return self.snapshot_path.read_bytes()
+        except FileNotFoundError:
+            logger.error("Database not found")
+        except Exception as exception:
+            logger.exception(exception)
+        return b""
+
+    @staticmethod
+    def _parse_snapshot(snapshot: bytes) -> dict[str, Any]:
+        if not snapshot:
+            return {}
+        try:
+            data = json.loads(snapshot)
+            if isinstance(data, dict):
+                return data
+            logger.error("Database file is not an object")
+        except json.decoder.JSONDecodeError as exception:
+            logger.error(f"Failed to parse json in database file: {exception}")
+        return {}
+
+    def _read_log(self, snapshot: bytes) -> List[dict[str, Any]]:
+        """Operations of the log that are not in the snapshot yet"""
+        try:
+            lines = self.log_path.read_bytes().split(b"\n")
+        except FileNotFoundError:
+            return []
+
+        snapshot_hash = hashlib.sha256(snapshot).hexdigest()
+        operations: List[dict[str, Any]] = []
+        for number, line in enumerate(lines):
+            if not line:
+                continue
+            try:
+                operation = json.loads(line)
+            except json.decoder.JSONDecodeError:
+                logger.warning(f"Discarding {len(lines) - number} incomplete operations at the end of {self.log_path}")
+                break
+            if operation.get("op") == "compact":
+                if operation.get("sha256") == snapshot_hash:
+                    # The compaction finished, so the snapshot already has everything before it
+                    operations.clear()
+                continue
+            operations.append(operation)
+        return operations
+
+    def _apply(self, operation: dict[str, Any]) -> None:
+        try:
+            if operation["op"] == "set":
+                dpath.new(self.data, operation["path"], operation["value"])
+            elif operation["op"] == "overwrite":
+                self.data.clear()
+                self.data.update(operation["value"])
+        except Exception as exception:
+            logger.warning(f"Failed to replay {operation}: {exception}")
+
+    def set(self, path: str, value: Any) -> None:
+        dpath.new(self.data, path, value)
+        self._log({"op": "set", "path": path, "value": value})
+
+    def overwrite(self, payload: dict[str, Any]) -> None:
+        self.data.clear()
+        self.data.update(payload)
+        self._log({"op": "overwrite", "value": payload})
+
+    def _log(self, operation: dict[str, Any]) -> None:
+        self._pending.append(json.dumps(operation) + "\n")
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self._start_flush)
+
+    def _start_flush(self) -> None:
+        self._flush_handle = None
+        self._flush_task = asyncio.create_task(self._flush_in_background())
+
+    async def _flush_in_background(self) -> None:
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Failed to persist database")
+            self._schedule_flush()
+            return
+        if self._should_compact() and (self._compaction is None or self._compaction.done()):
+            self._compaction = asyncio.create_task(self.compact())
+
+    async def flush(self) -> None:
+        """Write the pending operations to the log, returning once they are on disk."""
+        async with self._flush_lock:
+            await self._write_pending()
+
+    async def _write_pending(self) -> None:
+        if not self._pending:
+            return
+        records, self._pending = "".join(self._pending), []
+        try:
+            await asyncio.to_thread(self._append_log, records)
+        except Exception:
+            # Kept to be written by the next flush
+            self._pending.insert(0, records)
+            raise
+
+    def _should_compact(self) -> bool:
+        return self._log_size > max(self.COMPACT_MIN_BYTES, self._snapshot_size)
+
+    async def compact(self) -> None:
+        """Write a new snapshot with all operations done so far, and truncate the log."""
+        async with self._flush_lock:
+            await self._write_pending()
+            # Serialized after the log is written, so the snapshot has every logged operation. Operations done
+            # while it was written are in the snapshot too, and are logged again after it, which is harmless
+            # as replaying them over the snapshot gives the same data
+            snapshot = json.dumps(self.data).encode("utf-8")
+            await asyncio.to_thread(self._write_snapshot, snapshot)
+
+    def _append_log(self, records: str) -> None:
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.log_path, "a", encoding="utf-8") as handle:
+            handle.write(records)
+            handle.flush()
+            os.fsync(handle.fileno())
+            self._log_size = handle.tell()
+
+    def _write_snapshot(self, snapshot: bytes) -> None:
+        marker = json.dumps({"op": "compact", "sha256": hashlib.sha256(snapshot).hexdigest()}) + "\n"
+        self._append_log(marker)
+
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = self.snapshot_path.with_suffix(".tmp")
+        with open(temp_file, "wb") as handle:
+            handle.write(snapshot)
+            handle.flush()
+            os.fsync(handle.fileno())
+        temp_file.replace(self.snapshot_path)
+        self._snapshot_size = len(snapshot)
+        self._truncate_log()
+        logger.debug(f"Compacted database into {self._snapshot_size} bytes")
+
+    def _truncate_log(self) -> None:
+        with open(self.log_path, "w", encoding="utf-8") as handle:
+            os.fsync(handle.fileno())
+        self._log_size = 0
+
+    async def close(self) -> None:
+        """Persist everything into the snapshot, leaving an empty log. Used on shutdown."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        await self.compact()
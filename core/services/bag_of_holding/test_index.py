@@ -0,0 +1,99 @@
+import asyncio
+import pathlib
+
+import pytest
+from commonwealth.utils.streaming import streamer
+from index import Change, PathIndex
+from storage import WALStorage
+
+
+def create_index(tmp_path: pathlib.Path) -> PathIndex:
+    storage = WALStorage(tmp_path / "db.json", flush_interval=60)
+    storage.load()
+    return PathIndex(storage)
+
+
+@pytest.mark.asyncio
+async def test_index_lookups(tmp_path: pathlib.Path) -> None:
+    index = create_index(tmp_path)
+    index.set("cockpit/layouts", [{"name": "main"}, {"name": "map"}])
+    index.set("cockpit/theme", "dark")
+
+    assert index.get("cockpit/layouts/1/name") == "map"
+    assert index.get("/cockpit/theme/") == "dark"
+    assert index.get("cockpit/the*") == "dark"
+    for missing in ["cockpit/missing", "cockpit/layouts/2", "cockpit/theme/color", "cockpit/layouts/name"]:
+        with pytest.raises(KeyError):
+            index.get(missing)
+
+    # Indexed paths under a changed one are updated, and parents keep following their objects
+    cockpit = index.get("cockpit")
+    index.set("cockpit/layouts", [{"name": "video"}])
+    assert index.get("cockpit/layouts/0/name") == "video"
+    with pytest.raises(KeyError):
+        index.get("cockpit/layouts/1/name")
+    index.set("cockpit/volume", 5)
+    assert cockpit["volume"] == 5 and index.get("cockpit") is cockpit
+
+    index.overwrite({"cockpit": {"theme": "light"}})
+    assert index.get("cockpit/theme") == "light"
+    with pytest.raises(KeyError):
+        index.get("cockpit/layouts")
+
+
+@pytest.mark.asyncio
+async def test_index_versions(tmp_path: pathlib.Path) -> None:
+    index = create_index(tmp_path)
+    index.set("cockpit/theme", "dark")
+    index.set("extensions/rtk/enabled", True)
+    theme, rtk, root = index.etag("cockpit/theme"), index.etag("extensions/rtk"), index.etag("*")
+
+    # Changes only affect the version of the paths on, under or above them
+    index.set("cockpit/volume", 5)
+    assert index.etag("cockpit/theme") == theme
+    assert index.etag("extensions/rtk") == rtk
+    assert index.etag("cockpit") != index.etag("cockpit/theme")
+    assert index.etag("*") != root
+    index.set("extensions/rtk/enabled", False)
+    assert index.etag("extensions/rtk") != rtk
+    rtk = index.etag("extensions/rtk")
+    index.set("extensions", {})
+    assert index.etag("extensions/rtk") != rtk
+
+    assert index.root_json() == b'{"cockpit": {"theme": "dark", "volume": 5}, "extensions": {}}'
+    index.overwrite({})
+    assert index.etag("cockpit/theme") != theme
+    assert index.root_json() == b"{}"
+
+
+@pytest.mark.asyncio
+async def test_index_watch(tmp_path: pathlib.Path) -> None:
+    index = create_index(tmp_path)
+    changes = index.watch("cockpit/layouts")
+    next_change = asyncio.ensure_future(changes.__anext__())
+    await asyncio.sleep(0)
+
+    index.set("extensions/rtk", True)
+    index.set("cockpit/layouts/0", {"name": "main"})
+    assert await asyncio.wait_for(next_change, 1) == Change(path="cockpit/layouts/0", version=2)
+    index.set("cockpit", {})
+    assert await asyncio.wait_for(changes.__anext__(), 1) == Change(path="cockpit", version=3)
+    index.overwrite({})
+    assert await asyncio.wait_for(changes.__anext__(), 1) == Change(path="*", version=4)
+    await changes.aclose()
+
+
+@pytest.mark.asyncio
+async def test_index_watch_stream_unsubscribes_on_disconnect(tmp_path: pathlib.Path) -> None:
+    index = create_index(tmp_path)
+    stream = streamer((change.path async for change in index.watch("cockpit")), heartbeats=1.0)
+    first: "asyncio.Future[str]" = asyncio.ensure_future(stream.__anext__())
+    await asyncio.sleep(0.01)
+    assert len(index._watchers) == 1
+    index.set("cockpit/theme", "dark")
+    assert '"fragment": 0' in await first
+
+    # The client disconnects
+    await stream.aclose()
+    await asyncio.sleep(0)
+    assert index._watchers == []
@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import json
+import os
+import pathlib
+import time
+from typing import Any, List, Optional, Union
+
+import dpath
+import pytest
+from storage import WALStorage
+
+
+@pytest.mark.asyncio
+async def test_storage_recovers_by_replaying_log(tmp_path: pathlib.Path) -> None:
+    snapshot_path = tmp_path / "db.json"
+    snapshot_path.write_text(json.dumps({"cockpit": {"theme": "dark"}}), encoding="utf-8")
+
+    storage = WALStorage(snapshot_path, flush_interval=0.01)
+    storage.load()
+    storage.set("cockpit/layout/0", {"widget": "map"})
+    storage.set("extensions/rtk", "enabled")
+    await storage.flush()
+    # Not flushed, as in a crash before the next flush
+    storage.set("extensions/lost", True)
+    assert json.loads(snapshot_path.read_text(encoding="utf-8")) == {"cockpit": {"theme": "dark"}}
+
+    # A crash while appending leaves an incomplete operation at the end
+    log_path = tmp_path / "db.json.wal"
+    with open(log_path, "a", encoding="utf-8") as handle:
+        handle.write('{"op": "set", "path": "extensions/torn", "val')
+
+    storage = WALStorage(snapshot_path)
+    assert storage.load() == {
+        "cockpit": {"theme": "dark", "layout": [{"widget": "map"}]},
+        "extensions": {"rtk": "enabled"},
+    }
+    # Replayed operations are compacted into the snapshot
+    assert json.loads(snapshot_path.read_text(encoding="utf-8")) == storage.data
+    assert log_path.read_bytes() == b""
+
+
+@pytest.mark.asyncio
+async def test_storage_compaction_crash(tmp_path: pathlib.Path) -> None:
+    snapshot_path = tmp_path / "db.json"
+
+    storage = WALStorage(snapshot_path, flush_interval=0.01)
+    storage.load()
+    storage.overwrite({"counter": 0})
+    for counter in range(1, 10):
+        storage.set("counter", counter)
+    await storage.flush()
+    log_path = tmp_path / "db.json.wal"
+    operations = log_path.read_bytes()
+    after_compaction = json.dumps({"op": "set", "path": "after", "value": "compaction"}) + "\n"
+
+    def crash_during_compaction(snapshot: dict[str, Any], snapshot_replaced: bool) -> None:
+        snapshot_bytes = json.dumps(snapshot).encode("utf-8")
+        marker = {"op": "compact", "sha256": hashlib.sha256(snapshot_bytes).hexdigest()}
+        log_path.write_bytes(operations + json.dumps(marker).encode("utf-8") + b"\n" + after_compaction.encode())
+        snapshot_path.write_bytes(snapshot_bytes if snapshot_replaced else b'{"old": true}')
+
+    # Crash after the new snapshot replaced the old one, but before the log was truncated:
+    # operations before the compaction marker are already in the snapshot, and are not applied again
+    crash_during_compaction({"counter": 9, "kept": True}, snapshot_replaced=True)
+    assert WALStorage(snapshot_path).load() == {"counter": 9, "kept": True, "after": "compaction"}
+
+    # Crash before the snapshot was replaced: all operations are applied over the old one
+    crash_during_compaction({"counter": 9, "kept": True}, snapshot_replaced=False)
+    assert WALStorage(snapshot_path).load() == {"counter": 9, "after": "compaction"}
+
+
+class LegacyStorage:
+    """Previous persistence, rewriting the whole database on the event loop on every flush, used as reference"""
+
+    def __init__(self, path: pathlib.Path, data: dict[str, Any], flush_interval: float) -> None:
+        self.path = path
+        self.data = data
+        self.flush_interval = flush_interval
+        self.handle: Optional[asyncio.TimerHandle] = None
+
+    def set(self, path: str, value: Any) -> None:
+        dpath.new(self.data, path, value)
+        if self.handle is None:
+            self.handle = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+
+    def flush(self) -> None:
+        self.handle = None
+        temp_file = self.path.with_suffix(".tmp")
+        with open(temp_file, "w", encoding="utf-8") as handle:
+            json.dump(self.data, handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        temp_file.replace(self.path)
+
+    async def close(self) -> None:
+        if self.handle is not None:
+            self.handle.cancel()
+        self.flush()
+
+
+Storage = Union[LegacyStorage, WALStorage]
+
+
+def frontend_data(layouts: int) -> dict[str, Any]:
+    """Widget layouts and extensions data of a busy frontend"""
+    layout = {"widgets": [{"name": f"widget{index}", "options": "x" * 64} for index in range(20)]}
+    return {"layouts": {f"layout{index}": layout for index in range(layouts)}}
+
+
+def create_storage(tmp_path: pathlib.Path, data: dict[str, Any], legacy: bool) -> Storage:
+    flush_interval = 0.05
+    if legacy:
+        return LegacyStorage(tmp_path / "legacy.json", json.loads(json.dumps(data)), flush_interval)
+    snapshot_path = tmp_path / "db.json"
+    snapshot_path.write_text(json.dumps(data), encoding="utf-8")
+    (tmp_path / "db.json.wal").unlink(missing_ok=True)
+    storage = WALStorage(snapshot_path, flush_interval=flush_interval)
+    storage.load()
+    return storage
+
+
+def run_sets(storage: Storage, count: int, interval: float = 0.0) -> List[float]:
+    """Latencies of sets done at the given interval, from when each one was due to when it was done.
+    The storage is closed after them, persisting everything."""
+
+    async def run() -> List[float]:
+        latencies = []
+        start = time.perf_counter()
+        for index in range(count):
+            due = start + index * interval
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            storage.set(f"cockpit/widgets/{index % 100}/position", {"x": index, "y": index})
+            latencies.append(time.perf_counter() - due)
+        await storage.close()
+        return latencies
+
+    return asyncio.run(run())
+
+
+def percentile(values: List[float], ratio: float) -> float:
+    return sorted(values)[min(len(values) - 1, int(len(values) * ratio))]
+
+
+def test_storage_matches_legacy_storage(tmp_path: pathlib.Path) -> None:
+    data = frontend_data(50)
+    legacy = create_storage(tmp_path, data, legacy=True)
+    run_sets(legacy, 1000)
+    run_sets(create_storage(tmp_path, data, legacy=False), 1000)
+    assert WALStorage(tmp_path / "db.json").load() == legacy.data
+
+
+@pytest.mark.parametrize("legacy", [False, True], ids=["wal", "legacy"])
+def test_storage_benchmark(request: pytest.FixtureRequest, tmp_path: pathlib.Path, legacy: bool) -> None:
+    """Time of 1000 sets on a ~1MiB database, and p99 latency of sets arriving every 1ms, against the previous storage.
+    Runs with pytest-benchmark."""
+    pytest.importorskip("pytest_benchmark")
+    benchmark = request.getfixturevalue("benchmark")
+    benchmark.group = "storage sets"
+    data = frontend_data(500)
+    count = 1000
+
+    latencies = run_sets(create_storage(tmp_path, data, legacy), count, interval=0.001)
+    benchmark.extra_info["p99_latency_ms"] = percentile(latencies, 0.99) * 1000
+    benchmark.pedantic(run_sets, setup=lambda: ((create_storage(tmp_path, data, legacy), count), {}), rounds=5)
+    benchmark.extra_info["sets_per_s"] = count / benchmark.stats.stats.mean
@@ -0,0 +1,16 @@
+from typing import Any, Dict, List
+
+from pydantic import BaseModel
+
+
+class MultiGetRequest(BaseModel):
+    paths: List[str]
+    # ETags already known by the client, so unchanged values are not sent again
+    etags: Dict[str, str] = {}
+
+
+class MultiGetResponse(BaseModel):
+    # Values that changed since the given ETags
+    values: Dict[str, Any]
+    etags: Dict[str, str]
+    missing: List[str]
@@ -0,0 +1,138 @@
+import asyncio
+from typing import AsyncGenerator, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+from responder import InterfaceResponder
+from typedefs import DiscoveredService, DiscoveryEvent, DiscoveryEventType
+from zeroconf import ServiceStateChange, Zeroconf
+from zeroconf.asyncio import AsyncServiceBrowser, AsyncServiceInfo
+
+
+class ServiceDiscovery:
+    """Passive cache of the services seen on each interface, browsed with the zeroconf instance of its responder.
+
+    Records expire following their TTLs in the zeroconf cache, which reports them as removed, so the services kept
+    here are the ones currently announced on the networks. Devices may announce services with the same name, like
+    vehicles with default names, so a service is kept for each of the addresses its name resolves to. Services served
+    by Beacon itself are recognized by their addresses and not included.
+    """
+
+    BROWSED_TYPES = ["_blueos._tcp.local.", "_http._tcp.local.", "_mavlink._udp.local."]
+    RESOLVE_TIMEOUT_MS = 3000
+
+    def __init__(self) -> None:
+        # Services by interface, full name and address
+        self._services: Dict[Tuple[str, str, str], DiscoveredService] = {}
+        self._browsers: Dict[str, AsyncServiceBrowser] = {}
+        self._resolving: Set["asyncio.Task[None]"] = set()
+        self._events_queues: List[asyncio.Queue[DiscoveryEvent]] = []
+
+    def browse(self, responder: InterfaceResponder) -> None:
+        """Start browsing the interface of the given responder, which needs to be started."""
+        assert responder.aiozc is not None
+        interface_name = responder.interface_name
+        own_addresses = set(responder.ips)
+
+        def on_state_change(zeroconf: Zeroconf, service_type: str, name: str, state_change: ServiceStateChange) -> None:
+            if state_change is ServiceStateChange.Removed:
+                self._remove(interface_name, name)
+                return
+            task = asyncio.create_task(self._resolve(zeroconf, interface_name, own_addresses, service_type, name))
+            self._resolving.add(task)
+            task.add_done_callback(self._resolving.discard)
+
+        self._browsers[interface_name] = AsyncServiceBrowser(
+            responder.aiozc.zeroconf, self.BROWSED_TYPES, handlers=[on_state_change]
+        )
+
+    async def stop_browsing(self, interface_name: str) -> None:
+        browser = self._browsers.pop(interface_name, None)
+        if browser is not None:
+            await browser.async_cancel()
+        for name in {name for interface, name, _address in self._services if interface == interface_name}:
+            self._remove(interface_name, name)
+
+    async def stop(self) -> None:
+        await asyncio.gather(*[self.stop_browsing(interface_name) for interface_name in list(self._browsers)])
+
+    async def _resolve(
+        self, zeroconf: Zeroconf, interface_name: str, own_addresses: Set[str], service_type: str, name: str
+    ) -> None:
+        info = AsyncServiceInfo(service_type, name)
+        try:
+            if not await info.async_request(zeroconf, self.RESOLVE_TIMEOUT_MS):
+                logger.debug(f"Could not resolve {name} on {interface_name}")
+                return
+        except Exception as e:
+            logger.debug(f"Failed to resolve {name} on {interface_name}: {e}")
+            return
+        # Browsing may have stopped while resolving
+        if interface_name not in self._browsers:
+            return
+
+        properties = {
+            key.decode(errors="replace"): value.decode(errors="replace") if value is not None else ""
+            for key, value in info.properties.items()
+        }
+        services = {
+            address: DiscoveredService(
+                interface=interface_name,
+                name=name,
+                service_type=service_type,
+                server=info.server,
+                address=address,
+                port=info.port,
+                properties=properties,
+            )
+            for address in info.parsed_addresses()
+            if address not in own_addresses
+        }
+
+        for key in [key for key in self._services if key[:2] == (interface_name, name) and key[2] not in services]:
+            self._publish(DiscoveryEventType.Removed, self._services.pop(key))
+        for address, service in services.items():
+            previous = self._services.get((interface_name, name, address))
+            if previous == service:
+                continue
+            self._services[(interface_name, name, address)] = service
+            self._publish(DiscoveryEventType.Added if previous is None else DiscoveryEventType.Updated, service)
+
+    def _remove(self, interface_name: str, name: str) -> None:
+        for key in [key for key in self._services if key[:2] == (interface_name, name)]:
+            self._publish(DiscoveryEventType.Removed, self._services.pop(key))
+
+    def _publish(self, event_type: DiscoveryEventType, service: DiscoveredService) -> None:
+        logger.info(f"Service {event_type.value} on {service.interface}: {service.name} ({service.address})")
+        event = DiscoveryEvent(type=event_type, service=service)
+        for queue in self._events_queues:
+            queue.put_nowait(event)
+
+    def services(
+        self, interface_name: Optional[str] = None, service_type: Optional[str] = None, name: Optional[str] = None
+    ) -> List[DiscoveredService]:
+        return [
+            service
+            for service in self._services.values()
+            if (interface_name is None or service.interface == interface_name)
+            and (service_type is None or service.service_type == service_type)
+            and (name is None or service.name == name)
+        ]
+
+    async def events(self, interface_name: Optional[str] = None) -> AsyncGenerator[DiscoveryEvent, None]:
+        """Stream the services changes, as they are found or removed
+
+        Args:
+            interface_name (str, optional): Only stream changes of this interface. Defaults to all of them
+        """
+        queue: asyncio.Queue[DiscoveryEvent] = asyncio.Queue()
+        self._events_queues.append(queue)
+        try:
+            while True:
+                event = await queue.get()
+                if interface_name is None or event.service.interface == interface_name:
+                    yield event
+        finally:
+            self._events_queues.remove(queue)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({len(self._services)} services, browsing {sorted(self._browsers)})"
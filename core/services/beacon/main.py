@@ -5,78 +5,45 @@ import itertools
 import logging
 import pathlib
 import socket
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
 
 import psutil
 from commonwealth.settings.manager import PydanticManager
 from commonwealth.utils.apis import PrettyJSONResponse
 from commonwealth.utils.logs import InterceptHandler, init_logger
 from commonwealth.utils.sentry_config import init_sentry_async
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from commonwealth.utils.streaming import streamer
+from discovery import ServiceDiscovery
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi_versioning import VersionedFastAPI, version
 from loguru import logger
+from netlink import InterfaceChanges
+from responder import InterfaceResponder
 from settings import ServiceTypes, SettingsV4
-from typedefs import InterfaceType, IpInfo, MdnsEntry
+from typedefs import DiscoveredService, InterfaceType, IpInfo, MdnsEntry
 from uvicorn import Config, Server
-from zeroconf import IPVersion
-from zeroconf.asyncio import AsyncServiceInfo, AsyncZeroconf
+from zeroconf.asyncio import AsyncServiceInfo
 
 SERVICE_NAME = "beacon"
 
 
-class AsyncRunner:
-    def __init__(self, ip_version: IPVersion, interface: str, interface_name: str) -> None:
-        self.ip_version = ip_version
-        self.aiozc: Optional[AsyncZeroconf] = None
-        self.interface: str = interface
-        self.services: List[AsyncServiceInfo] = []
-        self.interface_name = interface_name
-
-    def add_services(self, service: AsyncServiceInfo) -> None:
-        self.services.append(service)
-
-    def get_services(self) -> List[MdnsEntry]:
-        return [
-            MdnsEntry(
-                ip=self.interface,
-                fullname=service.name,
-                hostname=service.name.split(".")[0],
-                service_type=service.name.split(".")[1],
-                interface=self.interface_name,
-                interface_type=InterfaceType.guess_from_name(self.interface_name),
-            )
-            for service in self.services
-        ]
-
-    async def register_services(self) -> None:
-        self.aiozc = AsyncZeroconf(ip_version=self.ip_version, interfaces=[self.interface])  # type: ignore
-        tasks = [self.aiozc.async_register_service(info, cooperating_responders=True, ttl=25) for info in self.services]
-        background_tasks = await asyncio.gather(*tasks)
-        await asyncio.gather(*background_tasks)
-        logger.info("Finished registration, press Ctrl-C to exit...")
-
-    async def unregister_services(self) -> None:
-        assert self.aiozc is not None
-        tasks = [self.aiozc.async_unregister_service(info) for info in self.services]
-        background_tasks = await asyncio.gather(*tasks)
-        await asyncio.gather(*background_tasks)
-        await self.aiozc.async_close()
-
-    def __eq__(self, other: Any) -> bool:
-        return {str(service) for service in self.services} == {
-            str(service) for service in other.services
-        } and self.interface == other.interface
-
-    def __repr__(self) -> str:
-        return f"Runner on {self.interface}, serving {[service.name for service in self.services]}."
+# Services of each interface, keyed by their full name, and the IPs of the interface serving them
+InterfaceServices = Tuple[List[str], Dict[str, AsyncServiceInfo]]
 
 
 class Beacon:
     DEFAULT_HOSTNAME = "blueos"
+    # Interfaces are checked on netlink events, and periodically to catch settings changed by others
+    UPDATE_INTERVAL_S = 60.0
+    # Used instead when netlink events are not available
+    POLLING_INTERVAL_S = 10.0
 
     def __init__(self) -> None:
-        self.runners: Dict[str, AsyncRunner] = {}
+        self.responders: Dict[str, InterfaceResponder] = {}
+        self.discovery = ServiceDiscovery()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._update_requested = asyncio.Event()
         try:
             self.manager = PydanticManager(SERVICE_NAME, SettingsV4)
         except Exception as e:
@@ -124,6 +91,12 @@ class Beacon:
                 case InterfaceType.HOTSPOT:
                     interface.domain_names = [f"{hostname}-hotspot"]
         self.manager.save()
+        self.request_update()
+
+    def request_update(self) -> None:
+        """Update the served services without waiting for the next periodic check. Thread-safe."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._update_requested.set)
 
     def get_hostname(self) -> str:
         try:
@@ -139,7 +112,7 @@ class Beacon:
         return self.manager.settings.vehicle_name or "BlueROV2"
 
     def create_async_service_infos(
-        self, interface: str, service_name: str, domain_name: str, ip: str
+        self, interface: str, service_name: str, domain_name: str, ips: List[str]
     ) -> AsyncServiceInfo:
         """
         Create A list of AsyncServiceInfo() for the given interface and service
@@ -150,7 +123,7 @@ class Beacon:
             return AsyncServiceInfo(
                 f"{service.name}.{service.protocol}.local.",
                 f"{domain_name}.{service.name}.{service.protocol}.local.",
-                addresses=[socket.inet_aton(ip)],
+                addresses=[socket.inet_aton(ip) for ip in ips],
                 port=service.port,
                 properties=service.get_properties(),
                 server=f"{domain_name}.local.",
@@ -174,94 +147,132 @@ class Beacon:
 
         return available_networks
 
-    def create_default_runners(self) -> Dict[str, AsyncRunner]:
+    def create_default_services(self) -> Dict[str, InterfaceServices]:
         """
-        This creates default runners with the name blueos-{interface}-{count}
+        This creates default services with the name blueos-{interface}-{count}
         used for emergencies.
         """
 
-        default_runners = {}
+        default_services: Dict[str, InterfaceServices] = {}
         for interface_name in self.get_filtered_interfaces():
             count = 1
             interface = self.settings.get_interface_or_create_default(interface_name)
-            for ip in interface.get_ip_strs():
+            ips = interface.get_ip_strs()
+            services: Dict[str, AsyncServiceInfo] = {}
+            for ip in ips:
                 for domain in self.settings.default.domain_names:
-                    runner_name = f"{domain}-{interface_name}-{count}"
-                    try:
-                        runner = AsyncRunner(IPVersion.V4Only, interface=ip, interface_name=interface_name)
-                        logger.info(f"Created runner {runner_name} for {ip}")
-                    except Exception as e:
-                        logger.warning(f"Error creating {runner_name}: {e}, skipping this interface")
-                        continue
+                    domain_name = f"{domain}-{interface_name}-{count}"
                     for service in self.settings.default.advertise:
                         try:
-                            runner.add_services(self.create_async_service_infos(interface, service, runner_name, ip))
+                            info = self.create_async_service_infos(interface, service, domain_name, [ip])
+                            services[info.name] = info
                         except ValueError as e:
                             logger.warning(f"Error adding service for {interface.name}-{service}: {e}, skipping.")
-                    default_runners[runner_name] = runner
                     count += 1
-        return default_runners
+            default_services[interface_name] = (ips, services)
+        return default_services
 
-    def create_user_runners(self) -> Dict[str, AsyncRunner]:
+    def create_user_services(self) -> Dict[str, InterfaceServices]:
         """
-        Creates runners specified in the "interfaces" sections of settings.json
+        Creates services specified in the "interfaces" sections of settings.json
+        Each domain is served with all the selected IPs of its interface
         """
-        runners = {}
+        user_services: Dict[str, InterfaceServices] = {}
         for interface_name in self.get_filtered_interfaces():
             interface = self.settings.get_interface_or_create_default(interface_name)
-            for ip in interface.get_ip_strs():
+            ips = interface.get_ip_strs()
+            services: Dict[str, AsyncServiceInfo] = {}
+            if ips:
                 for domain in interface.domain_names:
-                    runner = None
-                    try:
-                        runner = AsyncRunner(IPVersion.V4Only, interface=ip, interface_name=interface_name)
-                        logger.info(f"Created runner for interface {interface.name}, broadcasting {domain} on {ip}")
-                    except Exception as e:
-                        logger.warning(f"Error creating runner for {interface.name}: {e}, skipping this interface")
-                        continue
-
                     for service in interface.advertise:
                         try:
-                            runner.add_services(self.create_async_service_infos(interface, service, domain, ip))
+                            info = self.create_async_service_infos(interface, service, domain, ips)
+                            services[info.name] = info
                         except ValueError as e:
                             logger.warning(f"Error adding service for {interface.name}-{service}: {e}, skipping.")
-                    runners[f"{interface_name}-{domain}-{ip}"] = runner
-        return runners
+            user_services[interface_name] = (ips, services)
+        return user_services
+
+    async def update_responders(self) -> None:
+        """
+        Update the responders of each interface with the services that should be served on it,
+        recreating the ones with IPs that changed.
+        """
+        # re-load settings in case something changed
+        self.manager.load()
+        self.settings = self.manager.settings
+        self.service_types = self.load_service_types()
+
+        interfaces_services = self.create_default_services()
+        for interface_name, (ips, services) in self.create_user_services().items():
+            default_services = interfaces_services[interface_name][1] if interface_name in interfaces_services else {}
+            interfaces_services[interface_name] = (ips, {**default_services, **services})
+
+        for interface_name, responder in list(self.responders.items()):
+            ips = interfaces_services[interface_name][0] if interface_name in interfaces_services else []
+            if responder.ips != sorted(ips):
+                logger.info(f"{interface_name} changed to {ips}, removing {responder}")
+                del self.responders[interface_name]
+                await self.discovery.stop_browsing(interface_name)
+                await responder.close()
+
+        for interface_name, (ips, services) in interfaces_services.items():
+            if not ips:
+                continue
+            if interface_name not in self.responders:
+                responder = InterfaceResponder(interface_name, ips)
+                try:
+                    responder.start()
+                except Exception as e:
+                    logger.warning(f"Error creating responder for {interface_name}: {e}, skipping this interface")
+                    continue
+                logger.info(f"Created responder for {interface_name} on {ips}")
+                self.responders[interface_name] = responder
+                try:
+                    self.discovery.browse(responder)
+                except Exception as e:
+                    logger.warning(f"Error browsing services on {interface_name}: {e}")
+            await self.responders[interface_name].update(services)
 
     async def run(self) -> None:
         """
         This is the "main loop" from Beacon.
         """
-        while True:
-            # re-load settings in case something changed
-            self.manager.load()
-            self.settings = self.manager.settings
-            self.service_types = self.load_service_types()
-
-            default_runners = self.create_default_runners()
-            user_runners = self.create_user_runners()
-
-            all_runners = {**default_runners, **user_runners}
-            for runner in all_runners.values():
-                logger.info(runner)
-
-            for runner_name, runner in all_runners.items():
-                if runner_name not in self.runners:
-                    try:
-                        await runner.register_services()
-                        self.runners[runner_name] = runner
-                    except Exception as e:
-                        logger.warning(e)
-                elif self.runners[runner_name] != runner:
-                    # unregister old one and register new one
-                    logger.info(f"runner {runner_name} has changed, updating runner...")
-                    await self.runners[runner_name].unregister_services()
-                    self.runners[runner_name] = runner
-                    await runner.register_services()
-
-            await asyncio.sleep(10)
+        self._loop = asyncio.get_running_loop()
+        interface_changes: Optional[InterfaceChanges] = None
+        try:
+            interface_changes = InterfaceChanges()
+            interface_changes.start()
+        except Exception as e:
+            logger.warning(f"Netlink events not available ({e}), checking interfaces every {self.POLLING_INTERVAL_S}s")
+            interface_changes = None
+
+        try:
+            while True:
+                try:
+                    await self.update_responders()
+                except Exception as e:
+                    logger.warning(f"Failed to update responders: {e}")
+                await self._wait_for_changes(interface_changes)
+        finally:
+            if interface_changes is not None:
+                interface_changes.stop()
+
+    async def _wait_for_changes(self, interface_changes: Optional[InterfaceChanges]) -> None:
+        interval = self.UPDATE_INTERVAL_S if interface_changes else self.POLLING_INTERVAL_S
+        waiters: List[asyncio.Task[Any]] = [asyncio.create_task(self._update_requested.wait())]
+        if interface_changes is not None:
+            waiters.append(asyncio.create_task(interface_changes.wait(interval)))
+        try:
+            await asyncio.wait(waiters, timeout=interval, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+        self._update_requested.clear()
 
     async def stop(self) -> None:
-        await asyncio.gather(*[runner.unregister_services() for runner in self.runners.values()])
+        await self.discovery.stop()
+        await asyncio.gather(*[responder.close() for responder in self.responders.values()])
 
 
 logging.basicConfig(handlers=[InterceptHandler()], level=0)
@@ -280,7 +291,39 @@ beacon = Beacon()
 @app.get("/services", response_model=List[MdnsEntry], summary="Current domains broadcasted.")
 @version(1, 0)
 def get_services() -> Any:
-    return list(itertools.chain.from_iterable([runner.get_services() for runner in beacon.runners.values()]))
+    return list(itertools.chain.from_iterable([responder.get_services() for responder in beacon.responders.values()]))
+
+
+@app.get("/discovered", response_model=List[DiscoveredService], summary="Services found on the networks.")
+@version(1, 0)
+def get_discovered_services(interface_name: Optional[str] = None, service_type: Optional[str] = None) -> Any:
+    """Services announced by other devices, like other vehicles and topside computers, without querying the networks.
+
+    Service types are in the "_http._tcp.local." format."""
+    return beacon.discovery.services(interface_name, service_type)
+
+
+@app.get(
+    "/discovered/{interface_name}/{name}",
+    response_model=List[DiscoveredService],
+    summary="Service found on a network, once for each device announcing it.",
+)
+@version(1, 0)
+def get_discovered_service(interface_name: str, name: str) -> Any:
+    services = beacon.discovery.services(interface_name, name=name)
+    if not services:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"{name} not found on {interface_name}.")
+    return services
+
+
+@app.get("/discovered_events", summary="Stream changes of the services found on the networks.")
+@version(1, 0)
+async def stream_discovered_events(interface_name: Optional[str] = None) -> StreamingResponse:
+    async def events() -> AsyncGenerator[str, None]:
+        async for event in beacon.discovery.events(interface_name):
+            yield event.model_dump_json()
+
+    return StreamingResponse(streamer(events(), heartbeats=1.0))
 
 
 @app.post("/hostname", summary="Set the hostname for mDNS.")
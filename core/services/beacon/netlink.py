@@ -0,0 +1,66 @@
+import asyncio
+import socket
+from typing import Optional
+
+# Multicast groups from linux/rtnetlink.h
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+
+
+class InterfaceChanges:
+    """Notifies changes of network interfaces links and IPv4 addresses, from netlink events.
+
+    Messages are not parsed: any change means the interfaces need to be checked again, and bursts of changes,
+    like the ones of a DHCP lease being applied, are reported once they settle down.
+    """
+
+    def __init__(self, settle_time_s: float = 1.0) -> None:
+        self._settle_time_s = settle_time_s
+        self._socket: Optional[socket.socket] = None
+        self._changed = asyncio.Event()
+
+    def start(self) -> None:
+        """Start listening to netlink events. Needs to be called from a running event loop."""
+        loop = asyncio.get_running_loop()
+        netlink = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW | socket.SOCK_NONBLOCK, socket.NETLINK_ROUTE)
+        try:
+            netlink.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR))
+            loop.add_reader(netlink.fileno(), self._on_messages)
+        except Exception:
+            netlink.close()
+            raise
+        self._socket = netlink
+
+    def _on_messages(self) -> None:
+        assert self._socket is not None
+        while True:
+            try:
+                if not self._socket.recv(65536):
+                    break
+            except BlockingIOError:
+                break
+            except OSError:
+                # Buffer overrun (ENOBUFS) means events were lost, which is a change as well
+                break
+        self._changed.set()
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for changes of the interfaces, up to timeout.
+
+        Returns:
+            bool: True if interfaces changed, False if timed out.
+        """
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        await asyncio.sleep(self._settle_time_s)
+        self._changed.clear()
+        return True
+
+    def stop(self) -> None:
+        if self._socket is None:
+            return
+        asyncio.get_running_loop().remove_reader(self._socket.fileno())
+        self._socket.close()
+        self._socket = None
@@ -0,0 +1,107 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+from typedefs import InterfaceType, MdnsEntry
+from zeroconf import IPVersion
+from zeroconf.asyncio import AsyncServiceInfo, AsyncZeroconf
+
+
+class InterfaceResponder:
+    """Zeroconf responder of a single interface, serving the services of all its IPs and domains.
+
+    Services are kept by their full name, and updating them only registers, unregisters or updates the ones that
+    changed, so the records that didn't change are not announced again.
+    """
+
+    TTL = 25
+
+    def __init__(self, interface_name: str, ips: List[str], ip_version: IPVersion = IPVersion.V4Only) -> None:
+        self.interface_name = interface_name
+        self.ips = sorted(ips)
+        self.ip_version = ip_version
+        self.aiozc: Optional[AsyncZeroconf] = None
+        self.services: Dict[str, AsyncServiceInfo] = {}
+
+    def start(self) -> None:
+        self.aiozc = AsyncZeroconf(ip_version=self.ip_version, interfaces=self.ips)  # type: ignore
+
+    async def update(self, services: Dict[str, AsyncServiceInfo]) -> None:
+        """Serve the given services, keyed by their full name, instead of the current ones."""
+        assert self.aiozc is not None
+        aiozc = self.aiozc
+
+        removed = [info for name, info in self.services.items() if name not in services]
+        added = [info for name, info in services.items() if name not in self.services]
+        # AsyncServiceInfo equality only compares names, while its representation has all the records data
+        changed = [
+            info for name, info in services.items() if name in self.services and str(self.services[name]) != str(info)
+        ]
+        if not (removed or added or changed):
+            return
+
+        async def register(info: AsyncServiceInfo) -> Awaitable[Any]:
+            return await aiozc.async_register_service(info, cooperating_responders=True, ttl=self.TTL)
+
+        for info, succeeded in zip(removed, await self._apply("unregister", aiozc.async_unregister_service, removed)):
+            if succeeded:
+                del self.services[info.name]
+        for info, succeeded in zip(changed, await self._apply("update", aiozc.async_update_service, changed)):
+            if succeeded:
+                self.services[info.name] = info
+        for info, succeeded in zip(added, await self._apply("register", register, added)):
+            if succeeded:
+                self.services[info.name] = info
+
+        logger.info(
+            f"Updated services of {self.interface_name}: {len(added)} added, {len(changed)} changed, "
+            f"{len(removed)} removed, serving {sorted(self.services)} on {self.ips}."
+        )
+
+    async def _apply(
+        self,
+        description: str,
+        operation: Callable[[AsyncServiceInfo], Awaitable[Awaitable[Any]]],
+        infos: List[AsyncServiceInfo],
+    ) -> List[bool]:
+        """Run operation for all infos concurrently, waiting for their announcements to be sent.
+
+        Returns:
+            List[bool]: If the operation succeeded, for each one of the infos.
+        """
+
+        async def run(info: AsyncServiceInfo) -> bool:
+            try:
+                background_task = await operation(info)
+                await background_task
+                return True
+            except Exception as e:
+                logger.warning(f"Failed to {description} {info.name} on {self.interface_name}: {e}")
+                return False
+
+        return await asyncio.gather(*[run(info) for info in infos])
+
+    def get_services(self) -> List[MdnsEntry]:
+        return [
+            MdnsEntry(
+                ip=ip,
+                fullname=service.name,
+                hostname=service.name.split(".")[0],
+                service_type=service.name.split(".")[1],
+                interface=self.interface_name,
+                interface_type=InterfaceType.guess_from_name(self.interface_name),
+            )
+            for service in self.services.values()
+            for ip in service.parsed_addresses()
+        ]
+
+    async def close(self) -> None:
+        if self.aiozc is None:
+            return
+        await self._apply("unregister", self.aiozc.async_unregister_service, list(self.services.values()))
+        self.services.clear()
+        await self.aiozc.async_close()
+        self.aiozc = None
+
+    def __repr__(self) -> str:
+        return f"Responder on {self.interface_name} ({self.ips}), serving {sorted(self.services)}."
@@ -0,0 +1,171 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pytest
+from commonwealth.utils.streaming import streamer
+from discovery import ServiceDiscovery
+from responder import InterfaceResponder
+from typedefs import DiscoveryEventType
+from zeroconf import ServiceStateChange
+
+HTTP = "_http._tcp.local."
+BLUEOS = f"BlueOS.{HTTP}"
+
+
+class FakeNetwork:
+    """Services announced on a network, browsed and resolved as zeroconf does it."""
+
+    def __init__(self) -> None:
+        # Port and addresses announced for each service name
+        self.records: Dict[str, Tuple[int, List[str]]] = {}
+        self.handlers: List[Callable[..., None]] = []
+        self.cancelled = False
+
+    def browser(self, _zeroconf: Any, _types: List[str], handlers: List[Callable[..., None]]) -> Any:
+        self.handlers = handlers
+        network = self
+
+        class FakeBrowser:
+            async def async_cancel(self) -> None:
+                network.cancelled = True
+
+        return FakeBrowser()
+
+    def service_info(self, service_type: str, name: str) -> Any:
+        network = self
+
+        class FakeServiceInfo:
+            server = f"{name.split('.')[0].lower()}.local."
+            port: Optional[int] = None
+            properties = {b"path": b"/"}
+            addresses: List[str] = []
+
+            async def async_request(self, _zeroconf: Any, _timeout: int) -> bool:
+                if name not in network.records:
+                    return False
+                self.port, self.addresses = network.records[name]
+                return True
+
+            def parsed_addresses(self) -> List[str]:
+                return self.addresses
+
+        return FakeServiceInfo()
+
+    def announce(self, name: str, port: int, addresses: List[str]) -> None:
+        state = ServiceStateChange.Updated if name in self.records else ServiceStateChange.Added
+        self.records[name] = (port, addresses)
+        self._notify(name, state)
+
+    def expire(self, name: str) -> None:
+        del self.records[name]
+        self._notify(name, ServiceStateChange.Removed)
+
+    def _notify(self, name: str, state_change: ServiceStateChange) -> None:
+        for handler in self.handlers:
+            handler(zeroconf=None, service_type=HTTP, name=name, state_change=state_change)
+
+
+@pytest.fixture(name="network")
+def fixture_network(mocker: Any) -> FakeNetwork:
+    network = FakeNetwork()
+    mocker.patch("discovery.AsyncServiceBrowser", side_effect=network.browser)
+    mocker.patch("discovery.AsyncServiceInfo", side_effect=network.service_info)
+    return network
+
+
+def browse(discovery: ServiceDiscovery, interface_name: str, ips: List[str]) -> None:
+    responder = InterfaceResponder(interface_name, ips)
+    responder.aiozc = SimpleNamespace(zeroconf=None)  # type: ignore
+    discovery.browse(responder)
+
+
+async def settle(discovery: ServiceDiscovery) -> None:
+    await asyncio.gather(*discovery._resolving)
+    await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_discovery_follows_announced_services(network: FakeNetwork) -> None:
+    discovery = ServiceDiscovery()
+    events: List[Tuple[DiscoveryEventType, str, int]] = []
+
+    async def collect() -> None:
+        async for event in discovery.events():
+            assert event.service.port is not None
+            events.append((event.type, event.service.address, event.service.port))
+
+    collector = asyncio.create_task(collect())
+    browse(discovery, "eth0", ["192.168.2.2"])
+    await asyncio.sleep(0)
+
+    # Another vehicle with the default name, on a network where our own service is announced too
+    network.announce(BLUEOS, 80, ["192.168.2.2", "192.168.2.3"])
+    await settle(discovery)
+    assert [(service.name, service.address) for service in discovery.services()] == [(BLUEOS, "192.168.2.3")]
+
+    # And a third one, which changes its port later
+    network.announce(BLUEOS, 80, ["192.168.2.2", "192.168.2.3", "192.168.2.4"])
+    await settle(discovery)
+    network.announce(BLUEOS, 8080, ["192.168.2.2", "192.168.2.3", "192.168.2.4"])
+    await settle(discovery)
+    assert sorted((service.address, service.port) for service in discovery.services(name=BLUEOS)) == [
+        ("192.168.2.3", 8080),
+        ("192.168.2.4", 8080),
+    ]
+
+    # Announcing the same records again is not a change
+    network.announce(BLUEOS, 8080, ["192.168.2.2", "192.168.2.3", "192.168.2.4"])
+    await settle(discovery)
+
+    network.announce(BLUEOS, 8080, ["192.168.2.2", "192.168.2.4"])
+    await settle(discovery)
+    assert [service.address for service in discovery.services("eth0", HTTP)] == ["192.168.2.4"]
+
+    network.expire(BLUEOS)
+    await settle(discovery)
+    assert discovery.services() == []
+
+    assert events == [
+        (DiscoveryEventType.Added, "192.168.2.3", 80),
+        (DiscoveryEventType.Added, "192.168.2.4", 80),
+        (DiscoveryEventType.Updated, "192.168.2.3", 8080),
+        (DiscoveryEventType.Updated, "192.168.2.4", 8080),
+        (DiscoveryEventType.Removed, "192.168.2.3", 8080),
+        (DiscoveryEventType.Removed, "192.168.2.4", 8080),
+    ]
+    collector.cancel()
+
+
+@pytest.mark.asyncio
+async def test_discovery_stop_browsing(network: FakeNetwork) -> None:
+    discovery = ServiceDiscovery()
+    browse(discovery, "eth0", ["192.168.2.2"])
+    network.announce(BLUEOS, 80, ["192.168.2.3"])
+    network.announce(f"camera.{HTTP}", 80, ["192.168.2.10"])
+    network.announce(f"missing.{HTTP}", 80, [])
+    await settle(discovery)
+    assert sorted(service.name for service in discovery.services("eth0")) == [BLUEOS, f"camera.{HTTP}"]
+    assert discovery.services("wlan0") == []
+
+    await discovery.stop_browsing("eth0")
+    assert network.cancelled
+    assert discovery.services() == []
+
+
+@pytest.mark.asyncio
+async def test_discovery_events_stream_unsubscribes_on_disconnect(network: FakeNetwork) -> None:
+    discovery = ServiceDiscovery()
+    browse(discovery, "eth0", ["192.168.2.2"])
+    stream = streamer((event.model_dump_json() async for event in discovery.events()), heartbeats=1.0)
+    first: "asyncio.Future[str]" = asyncio.ensure_future(stream.__anext__())
+    await asyncio.sleep(0.01)
+    assert len(discovery._events_queues) == 1
+    network.announce(BLUEOS, 80, ["192.168.2.3"])
+    await settle(discovery)
+    assert '"fragment": 0' in await first
+
+    # The client disconnects
+    await stream.aclose()
+    await asyncio.sleep(0)
+    assert discovery._events_queues == []
@@ -0,0 +1,87 @@
+import asyncio
+import socket
+from typing import Any, Awaitable, Dict, List, Tuple
+
+import pytest
+from responder import InterfaceResponder
+from zeroconf.asyncio import AsyncServiceInfo
+
+
+class FakeZeroconf:
+    """Records the operations done by the responder, as AsyncZeroconf does them."""
+
+    def __init__(self) -> None:
+        self.operations: List[Tuple[str, str]] = []
+
+    async def _operation(self, name: str, info: AsyncServiceInfo) -> Awaitable[None]:
+        if info.name.startswith("broken"):
+            raise ValueError("Broken service")
+        self.operations.append((name, info.name))
+        return asyncio.sleep(0)
+
+    async def async_register_service(self, info: AsyncServiceInfo, **_kwargs: Any) -> Awaitable[None]:
+        return await self._operation("register", info)
+
+    async def async_update_service(self, info: AsyncServiceInfo) -> Awaitable[None]:
+        return await self._operation("update", info)
+
+    async def async_unregister_service(self, info: AsyncServiceInfo) -> Awaitable[None]:
+        return await self._operation("unregister", info)
+
+    async def async_close(self) -> None:
+        self.operations.append(("close", ""))
+
+
+def services(*names: str, port: int = 80) -> Dict[str, AsyncServiceInfo]:
+    infos = [
+        AsyncServiceInfo(
+            "_http._tcp.local.",
+            f"{name}._http._tcp.local.",
+            addresses=[socket.inet_aton("192.168.2.2"), socket.inet_aton("10.0.0.2")],
+            port=port,
+            server=f"{name}.local.",
+        )
+        for name in names
+    ]
+    return {info.name: info for info in infos}
+
+
+@pytest.mark.asyncio
+async def test_responder_updates_only_changed_services() -> None:
+    responder = InterfaceResponder("eth0", ["192.168.2.2", "10.0.0.2"])
+    zeroconf = FakeZeroconf()
+    responder.aiozc = zeroconf  # type: ignore
+
+    await responder.update(services("blueos", "companion", "broken"))
+    assert sorted(zeroconf.operations) == [
+        ("register", "blueos._http._tcp.local."),
+        ("register", "companion._http._tcp.local."),
+    ]
+    # Services that failed are not served, and are tried again on the next update
+    assert sorted(responder.services) == ["blueos._http._tcp.local.", "companion._http._tcp.local."]
+    assert sorted((entry.hostname, entry.ip) for entry in responder.get_services()) == [
+        ("blueos", "10.0.0.2"),
+        ("blueos", "192.168.2.2"),
+        ("companion", "10.0.0.2"),
+        ("companion", "192.168.2.2"),
+    ]
+
+    zeroconf.operations.clear()
+    await responder.update(services("blueos", "companion"))
+    assert not zeroconf.operations
+
+    await responder.update({**services("blueos", port=8080), **services("vehicle")})
+    assert sorted(zeroconf.operations) == [
+        ("register", "vehicle._http._tcp.local."),
+        ("unregister", "companion._http._tcp.local."),
+        ("update", "blueos._http._tcp.local."),
+    ]
+    assert responder.services["blueos._http._tcp.local."].port == 8080
+
+    zeroconf.operations.clear()
+    await responder.close()
+    assert sorted(zeroconf.operations) == [
+        ("close", ""),
+        ("unregister", "blueos._http._tcp.local."),
+        ("unregister", "vehicle._http._tcp.local."),
+    ]
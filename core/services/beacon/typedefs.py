@@ -1,4 +1,5 @@
 from enum import Enum
+from typing import Dict, Optional
 
 from pydantic import BaseModel
 
@@ -37,3 +38,24 @@ class MdnsEntry(BaseModel):
 class IpInfo(BaseModel):
     client_ip: str
     interface_ip: str
+
+
+class DiscoveryEventType(str, Enum):
+    Added = "added"
+    Updated = "updated"
+    Removed = "removed"
+
+
+class DiscoveredService(BaseModel):
+    interface: str
+    name: str
+    service_type: str
+    server: Optional[str] = None
+    address: str
+    port: Optional[int] = None
+    properties: Dict[str, str]
+
+
+class DiscoveryEvent(BaseModel):
+    type: DiscoveryEventType
+    service: DiscoveredService
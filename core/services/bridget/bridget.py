@@ -1,8 +1,9 @@
+import asyncio
 import logging
 from typing import Annotated, Dict, List
 
 import requests
-from bridges.bridges import Bridge
+from bridges.bridges import Bridge, BridgeStatistics
 from bridges.serialhelper import Baudrate
 from commonwealth.settings.manager import PydanticManager
 from fastapi import HTTPException, status
@@ -39,6 +40,11 @@ class BridgeFrontendSpec(BaseModel):
         )
 
 
+class BridgeStatus(BaseModel):
+    bridge: BridgeFrontendSpec
+    statistics: BridgeStatistics
+
+
 class Bridget:
     """Manager for 'bridges' links."""
 
@@ -46,10 +52,13 @@ class Bridget:
         self._bridges: Dict[BridgeFrontendSpec, Bridge] = {}
         self._settings_manager = PydanticManager("bridget", SettingsV2)
         self._settings_manager.load()
+
+    async def load_bridges(self) -> None:
+        """Start the bridges saved in the settings."""
         for bridge_settings_spec in self._settings_manager.settings.specsv2:
             try:
                 logging.debug(f"Adding following bridge from persistency '{bridge_settings_spec}'.")
-                self.add_bridge(BridgeFrontendSpec.from_settings_spec(bridge_settings_spec))
+                await self.add_bridge(BridgeFrontendSpec.from_settings_spec(bridge_settings_spec))
             except Exception as error:
                 logging.exception(f"Could not add bridge '{bridge_settings_spec}'. {error}")
 
@@ -64,7 +73,10 @@ class Bridget:
     def get_bridges(self) -> List[BridgeFrontendSpec]:
         return [spec for spec, bridge in self._bridges.items()]
 
-    def add_bridge(self, bridge_spec: BridgeFrontendSpec) -> None:
+    def get_bridges_status(self) -> List[BridgeStatus]:
+        return [BridgeStatus(bridge=spec, statistics=bridge.statistics()) for spec, bridge in self._bridges.items()]
+
+    async def add_bridge(self, bridge_spec: BridgeFrontendSpec) -> None:
         if bridge_spec in self._bridges:
             raise RuntimeError("Bridge already exist.")
         new_bridge = Bridge(
@@ -75,24 +87,23 @@ class Bridget:
             bridge_spec.udp_listen_port,
             automatic_disconnect=False,
         )
+        await new_bridge.start()
         self._bridges[bridge_spec] = new_bridge
         settings_spec = BridgeSettingsSpecV2.from_spec(bridge_spec)
         if settings_spec not in self._settings_manager.settings.specsv2:
             self._settings_manager.settings.specsv2.append(settings_spec)
             self._settings_manager.save()
 
-    def remove_bridge(self, bridge_spec: BridgeFrontendSpec) -> None:
+    async def remove_bridge(self, bridge_spec: BridgeFrontendSpec) -> None:
         bridge = self._bridges.pop(bridge_spec, None)
         self._settings_manager.settings.specsv2.remove(BridgeSettingsSpecV2.from_spec(bridge_spec))
         self._settings_manager.save()
         if bridge is None:
             raise RuntimeError("Bridge doesn't exist.")
-        bridge.stop()
-
-    def stop(self) -> None:
-        logging.debug("Stopping Bridget and removing all bridges.")
-        for bridge_spec in self._bridges:
-            self.remove_bridge(bridge_spec)
+        await bridge.stop()
 
-    def __del__(self) -> None:
-        self.stop()
+    async def stop(self) -> None:
+        logging.debug("Stopping Bridget and all bridges.")
+        bridges = list(self._bridges.values())
+        self._bridges.clear()
+        await asyncio.gather(*[bridge.stop() for bridge in bridges], return_exceptions=True)
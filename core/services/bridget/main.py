@@ -3,7 +3,7 @@ import asyncio
 import logging
 from typing import Any, List
 
-from bridget import BridgeFrontendSpec, Bridget
+from bridget import BridgeFrontendSpec, BridgeStatus, Bridget
 from commonwealth.utils.apis import GenericErrorHandlingRoute, PrettyJSONResponse
 from commonwealth.utils.logs import InterceptHandler, init_logger
 from commonwealth.utils.sentry_config import init_sentry_async
@@ -45,19 +45,25 @@ def get_bridges() -> Any:
     return bridges
 
 
+@app.get("/bridges/status", response_model=List[BridgeStatus], summary="Bridges with their traffic and errors.")
+@version(1, 0)
+async def get_bridges_status() -> Any:
+    return await asyncio.to_thread(controller.get_bridges_status)
+
+
 @app.post("/bridges", status_code=status.HTTP_201_CREATED)
 @version(1, 0)
-def add_bridge(bridge: BridgeFrontendSpec) -> Any:
+async def add_bridge(bridge: BridgeFrontendSpec) -> Any:
     logger.debug(f"Adding bridge '{bridge}'.")
-    controller.add_bridge(bridge)
+    await controller.add_bridge(bridge)
     logger.debug(f"Bridge '{bridge}' added.")
 
 
 @app.delete("/bridges", status_code=status.HTTP_200_OK)
 @version(1, 0)
-def remove_bridge(bridge: BridgeFrontendSpec) -> Any:
+async def remove_bridge(bridge: BridgeFrontendSpec) -> Any:
     logger.debug(f"Removing bridge '{bridge}'.")
-    controller.remove_bridge(bridge)
+    await controller.remove_bridge(bridge)
     logger.debug(f"Bridge '{bridge}' removed.")
 
 
@@ -83,7 +89,11 @@ async def main() -> None:
     config = Config(app=app, host="0.0.0.0", port=27353, log_config=None)
     server = Server(config)
 
-    await server.serve()
+    await controller.load_bridges()
+    try:
+        await server.serve()
+    finally:
+        await controller.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,300 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack
+from functools import partial
+from typing import Any, AsyncGenerator, Callable, Dict, Iterable, List, Optional, Set
+
+from api.dns import DnsData
+from api.manager import EthernetManager
+from api.monitor import InterfaceMonitor
+from commonwealth.utils.DHCPServerManager import (
+    DHCPLeaseEvent,
+    DHCPServerDetails,
+    DHCPServerLease,
+)
+from loguru import logger
+from typedefs import (
+    NetworkInterface,
+    NetworkInterfaceMetricApi,
+    OperationMetrics,
+    Route,
+)
+
+
+class AsyncEthernetManager:
+    """Async facade over EthernetManager, running its blocking netlink and subprocess calls on worker threads.
+
+    Operations that change an interface hold a lock of that interface, so conflicting changes are serialized while
+    changes of other interfaces and reads don't wait for them. Every operation has a timeout and its latency is
+    recorded.
+    """
+
+    # Timeouts for operations that only read the system state, and for the ones that change it
+    READ_TIMEOUT_S = 10.0
+    WRITE_TIMEOUT_S = 30.0
+    # Interval between full checks of the interfaces configuration, on top of the netlink events
+    WATCHDOG_FULL_CHECK_INTERVAL_S = 60.0
+    # Used instead when netlink events are not available
+    WATCHDOG_POLLING_INTERVAL_S = 5.0
+
+    def __init__(self, manager: EthernetManager, max_workers: int = 4) -> None:
+        self.manager = manager
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="EthernetManager")
+        self._interface_locks: Dict[str, asyncio.Lock] = {}
+        self._metrics: Dict[str, OperationMetrics] = {}
+
+    def _record(self, operation: str, elapsed_s: float, error: bool = False, timeout: bool = False) -> None:
+        metrics = self._metrics.setdefault(operation, OperationMetrics())
+        if timeout:
+            metrics.timeouts += 1
+            return
+        elapsed_ms = elapsed_s * 1000
+        metrics.average_ms = (metrics.average_ms * metrics.count + elapsed_ms) / (metrics.count + 1)
+        metrics.count += 1
+        metrics.errors += int(error)
+        metrics.last_ms = elapsed_ms
+        metrics.max_ms = max(metrics.max_ms, elapsed_ms)
+
+    def metrics(self) -> Dict[str, OperationMetrics]:
+        return {operation: metrics.model_copy() for operation, metrics in self._metrics.items()}
+
+    async def _run(
+        self,
+        operation: str,
+        function: Callable[..., Any],
+        *args: Any,
+        interfaces: Iterable[str] = (),
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """Run the operation holding the locks of the given interfaces, failing if it doesn't finish in time.
+
+        Blocking functions run on the worker threads, coroutine functions on the event loop. An operation that
+        times out after it started keeps the interfaces locked until it actually finishes, since it can't be
+        interrupted; one that is still waiting for the locks is cancelled.
+        """
+        timeout = timeout if timeout is not None else self.READ_TIMEOUT_S
+        start = time.monotonic()
+        started = False
+
+        async def run_locked() -> Any:
+            nonlocal started
+            async with AsyncExitStack() as stack:
+                # Always locked in the same order to avoid deadlocks between multi-interface operations
+                for name in sorted(set(interfaces)):
+                    await stack.enter_async_context(self._interface_locks.setdefault(name, asyncio.Lock()))
+                started = True
+                try:
+                    if asyncio.iscoroutinefunction(function):
+                        result = await function(*args)
+                    else:
+                        loop = asyncio.get_running_loop()
+                        result = await loop.run_in_executor(self._executor, partial(function, *args))
+                except Exception:
+                    self._record(operation, time.monotonic() - start, error=True)
+                    raise
+                self._record(operation, time.monotonic() - start)
+                return result
+
+        task = asyncio.ensure_future(run_locked())
+        # Errors of operations that timed out were already recorded
+        task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            if not started:
+                task.cancel()
+            self._record(operation, time.monotonic() - start, timeout=True)
+            raise TimeoutError(f"Operation '{operation}' timed out after {timeout}s.") from None
+
+    async def save(self) -> None:
+        await self._run("save", self.manager.save)
+
+    async def get_interfaces(self) -> List[NetworkInterface]:
+        return await self._run("get_interfaces", self.manager.get_interfaces)  # type: ignore[no-any-return]
+
+    async def get_ethernet_interfaces(self) -> List[NetworkInterface]:
+        return await self._run(  # type: ignore[no-any-return]
+            "get_ethernet_interfaces", self.manager.get_ethernet_interfaces
+        )
+
+    async def set_configuration(self, interface: NetworkInterface, watchdog_call: bool = False) -> None:
+        await self._run(
+            "set_configuration",
+            self.manager.set_configuration,
+            interface,
+            watchdog_call,
+            interfaces=[interface.name],
+            timeout=self.WRITE_TIMEOUT_S,
+        )
+
+    async def set_interfaces_priority(self, interfaces: List[NetworkInterfaceMetricApi]) -> None:
+        await self._run(
+            "set_interfaces_priority",
+            self.manager.set_interfaces_priority,
+            interfaces,
+            interfaces=[interface.name for interface in interfaces],
+            timeout=self.WRITE_TIMEOUT_S,
+        )
+
+    async def add_static_ip(self, interface_name: str, ip_address: str) -> None:
+        await self._run(
+            "add_static_ip",
+            self.manager.add_static_ip,
+            interface_name,
+            ip_address,
+            interfaces=[interface_name],
+            timeout=self.WRITE_TIMEOUT_S,
+        )
+
+    async def remove_ip(self, interface_name: str, ip_address: str) -> None:
+        await self._run(
+            "remove_ip",
+            self.manager.remove_ip,
+            interface_name,
+            ip_address,
+            interfaces=[interface_name],
+            timeout=self.WRITE_TIMEOUT_S,
+        )
+
+    async def get_dhcp_server_details(self, interface_name: Optional[str] = None) -> Dict[str, DHCPServerDetails]:
+        return await self._run(  # type: ignore[no-any-return]
+            "get_dhcp_server_details", self.manager.get_dhcp_server_details, interface_name
+        )
+
+    async def get_dhcp_server_leases(self, interface_name: Optional[str] = None) -> Dict[str, List[DHCPServerLease]]:
+        return await self._run(  # type: ignore[no-any-return]
+            "get_dhcp_server_leases", self.manager.get_dhcp_server_leases, interface_name
+        )
+
+    async def find_dhcp_server_lease(self, address: str) -> Optional[DHCPServerLease]:
+        return await self._run(  # type: ignore[no-any-return]
+            "find_dhcp_server_lease", self.manager.find_dhcp_server_lease, address
+        )
+
+    def dhcp_lease_events(self, interface_name: Optional[str] = None) -> AsyncGenerator[DHCPLeaseEvent, None]:
+        return self.manager.dhcp_lease_events(interface_name)
+
+    async def add_dhcp_server_to_interface(self, interface_name: str, ipv4_gateway: str, backup: bool) -> None:
+        await self._run(
+            "add_dhcp_server_to_interface",
+            self.manager.add_dhcp_server_to_interface,
+            interface_name,
+            ipv4_gateway,
+            backup,
+            interfaces=[interface_name],
+            timeout=self.WRITE_TIMEOUT_S,
+        )
+
+    async def remove_dhcp_server_from_interface(self, interface_name: str) -> None:
+        await self._run(
+            "remove_dhcp_server_from_interface",
+            self.manager.remove_dhcp_server_from_interface,
+            interface_name,
+            interfaces=[interface_name],
+            timeout=self.WRITE_TIMEOUT_S,
+        )
+
+    async def trigger_dynamic_ip_acquisition(self, interface_name: str) -> None:
+        await self._run(
+            "trigger_dynamic_ip_acquisition",
+            self.manager.trigger_dynamic_ip_acquisition,
+            interface_name,
+            interfaces=[interface_name],
+            timeout=self.WRITE_TIMEOUT_S,
+        )
+
+    async def retrieve_host_nameservers(self) -> Any:
+        return await self._run("retrieve_host_nameservers", self.manager.dns.retrieve_host_nameservers)
+
+    async def update_host_nameservers(self, dns_data: DnsData) -> None:
+        await self._run(
+            "update_host_nameservers", self.manager.dns.update_host_nameservers, dns_data, timeout=self.WRITE_TIMEOUT_S
+        )
+
+    async def add_route(self, interface_name: str, route: Route) -> None:
+        await self._run(
+            "add_route",
+            self.manager.add_route,
+            interface_name,
+            route,
+            interfaces=[interface_name],
+            timeout=self.WRITE_TIMEOUT_S,
+        )
+
+    async def remove_route(self, interface_name: str, route: Route) -> None:
+        await self._run(
+            "remove_route",
+            self.manager.remove_route,
+            interface_name,
+            route,
+            interfaces=[interface_name],
+            timeout=self.WRITE_TIMEOUT_S,
+        )
+
+    async def get_routes(self, interface_name: str) -> List[Route]:
+        routes = await self._run("get_routes", self.manager.get_routes, interface_name, False)
+        return list(routes)
+
+    async def reconcile(self, interface_names: Optional[Set[str]] = None) -> None:
+        """Apply the saved settings on the interfaces that differ from them
+
+        Args:
+            interface_names (Set[str], optional): Only check these interfaces. Defaults to all of them
+        """
+        # The interfaces are cached, and are known to have changed when checking specific ones
+        if interface_names is not None:
+            self.manager.get_ethernet_interfaces.invalidate()  # type: ignore[attr-defined]
+            self.manager.get_interfaces_priority.invalidate()  # type: ignore[attr-defined]
+
+        mismatches = await self._run("config_mismatch", self.manager.config_mismatch, interface_names)
+        if mismatches:
+            logger.warning("Interface config mismatch, applying saved settings.")
+            logger.debug(f"Mismatches: {mismatches}")
+            for interface in mismatches:
+                logger.info(f"Applying saved settings for {interface.name}")
+                await self.set_configuration(interface, watchdog_call=True)
+        priority_mismatch = await self._run("priorities_mismatch", self.manager.priorities_mismatch, interface_names)
+        if priority_mismatch:
+            logger.warning("Interface priorities mismatch, applying saved settings.")
+            priorities = [
+                NetworkInterfaceMetricApi(name=interface.name, priority=interface.priority)
+                for interface in self.manager.saved_interfaces()
+                if interface.priority is not None
+            ]
+            await self.set_interfaces_priority(priorities)
+
+    async def watchdog(self) -> None:
+        """
+        checks the interfaces states against the saved settings,
+        if there is a mismatch, it will apply the saved settings.
+        Interfaces are checked as soon as netlink reports a change on them, and all of them are
+        periodically checked as a fallback.
+        """
+        monitor = InterfaceMonitor()
+        try:
+            monitor.start()
+        except Exception as error:
+            logger.warning(f"Could not start netlink monitor, interfaces will be polled instead: {error}")
+
+        last_full_check = 0.0
+        while True:
+            try:
+                interval = (
+                    self.WATCHDOG_FULL_CHECK_INTERVAL_S if monitor.is_running else self.WATCHDOG_POLLING_INTERVAL_S
+                )
+                changed_interfaces = await monitor.wait_for_changes(
+                    max(0.0, last_full_check + interval - time.monotonic())
+                )
+                if changed_interfaces:
+                    logger.debug(f"Interfaces changed: {changed_interfaces}")
+                    await self.reconcile(changed_interfaces)
+                if time.monotonic() - last_full_check >= interval:
+                    last_full_check = time.monotonic()
+                    await self.reconcile()
+            except Exception as error:
+                logger.error(f"Error in watchdog: {error}")
+                await asyncio.sleep(5)
+
+    def stop(self) -> None:
+        self._executor.shutdown(wait=False)
@@ -2,17 +2,22 @@ import asyncio
 import errno
 import re
 import subprocess
+import threading
 import time
 from ipaddress import IPv4Address
 from socket import AddressFamily
-from typing import Any, Dict, List, Optional, Set, Tuple, cast
+from typing import Any, AsyncGenerator, Dict, List, Optional, Set, cast
 
-import psutil
 from api import dns, settings
+from api.netlink import NetlinkSnapshot
 from commonwealth.settings.manager import PydanticManager
 from commonwealth.utils.decorators import temporary_cache
 from commonwealth.utils.DHCPDiscovery import DHCPDiscoveryError, discover_dhcp_servers
-from commonwealth.utils.DHCPServerManager import DHCPServerDetails, DHCPServerLease
+from commonwealth.utils.DHCPServerManager import (
+    DHCPLeaseEvent,
+    DHCPServerDetails,
+    DHCPServerLease,
+)
 from commonwealth.utils.DHCPServerManager import Dnsmasq as DHCPServerManager
 from config import SERVICE_NAME
 from loguru import logger
@@ -20,7 +25,6 @@ from networksetup import AbstractNetworkHandler, NetworkHandlerDetector
 from pydantic import IPvAnyAddress, IPvAnyNetwork
 from pyroute2 import IW, NDB, IPRoute
 from pyroute2.netlink.exceptions import NetlinkError
-from pyroute2.netlink.rtnl.ifaddrmsg import ifaddrmsg
 from typedefs import (
     AddressMode,
     InterfaceAddress,
@@ -51,7 +55,6 @@ class EthernetManager:
     dns = dns.Dns()
     # Network handler for dhcpd and network manager
     network_handler: AbstractNetworkHandler
-    config_mutex: asyncio.Lock = asyncio.Lock()
 
     result: List[NetworkInterface] = []
 
@@ -63,10 +66,17 @@ class EthernetManager:
 
     def __init__(self) -> None:
         self._dhcp_servers: List[DHCPServerManager] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Lease changes of all DHCP servers, for each client streaming them
+        self._lease_events_queues: List[asyncio.Queue[DHCPLeaseEvent]] = []
+        # Changes of different interfaces can run concurrently, and all of them update the same settings
+        self._settings_lock = threading.RLock()
         # Make sure that default behavior changes will be persisted initially on the disk
         self._manager.save()
 
     async def initialize(self) -> None:
+        # DHCP servers are created from worker threads, but run on the event loop
+        self._loop = asyncio.get_running_loop()
         self.network_handler = await NetworkHandlerDetector().getHandler()
         logger.info("Loading previous settings.")
         for item in self._settings.content:
@@ -93,7 +103,8 @@ class EthernetManager:
 
     def save(self) -> None:
         """Save actual configuration"""
-        self._manager.save()
+        with self._settings_lock:
+            self._manager.save()
 
     async def set_configuration(self, interface: NetworkInterface, watchdog_call: bool = False) -> None:
         """Modify hardware based in the configuration
@@ -102,38 +113,39 @@ class EthernetManager:
             interface: NetworkInterface
             watchdog_call: Whether this is a watchdog call
         """
-        async with self.config_mutex:
-            interfaces = self.get_interfaces()
-            valid_names = [interface.name for interface in interfaces]
-            if interface.name not in valid_names:
-                raise ValueError(f"Invalid interface name ('{interface.name}'). Valid names are: {valid_names}")
-            if not watchdog_call:
-                await self.network_handler.cleanup_interface_connections(interface.name)
-            logger.info(f"Setting configuration for interface '{interface.name}'.")
-            if interface.addresses:
-                # bring interface up
-                interface_index = self._get_interface_index(interface.name)
-                self.ipr.link("set", index=interface_index, state="up")
-            logger.info(f"Configuring addresses for interface '{interface.name}': {interface.addresses}.")
-            for address in interface.addresses:
-                if address.mode == AddressMode.Unmanaged:
-                    logger.info(f"Adding static IP '{address.ip}' to interface '{interface.name}'.")
-                    self.add_static_ip(interface.name, address.ip)
-                elif address.mode == AddressMode.Server:
-                    logger.info(f"Adding DHCP server with gateway '{address.ip}' to interface '{interface.name}'.")
-                    self.add_dhcp_server_to_interface(interface.name, address.ip)
-                elif address.mode == AddressMode.BackupServer:
-                    logger.info(
-                        f"Adding backup DHCP server with gateway '{address.ip}' to interface '{interface.name}'."
-                    )
-                    self.add_dhcp_server_to_interface(interface.name, address.ip, backup=True)
-            # Even if it happened to receive more than one dynamic IP, only one trigger is necessary
-            if any(address.mode == AddressMode.Client for address in interface.addresses):
-                logger.info(f"Triggering dynamic IP acquisition for interface '{interface.name}'.")
-                self.trigger_dynamic_ip_acquisition(interface.name)
-
-            # Handle routes configuration
-            self._set_routes_configuration(interface)
+        # Netlink and subprocess calls are blocking, so they are done on a worker thread
+        interfaces = await asyncio.to_thread(self.get_interfaces)
+        valid_names = [interface.name for interface in interfaces]
+        if interface.name not in valid_names:
+            raise ValueError(f"Invalid interface name ('{interface.name}'). Valid names are: {valid_names}")
+        if not watchdog_call:
+            await self.network_handler.cleanup_interface_connections(interface.name)
+        await asyncio.to_thread(self._apply_configuration, interface)
+
+    def _apply_configuration(self, interface: NetworkInterface) -> None:
+        logger.info(f"Setting configuration for interface '{interface.name}'.")
+        if interface.addresses:
+            # bring interface up
+            interface_index = self._get_interface_index(interface.name)
+            self.ipr.link("set", index=interface_index, state="up")
+        logger.info(f"Configuring addresses for interface '{interface.name}': {interface.addresses}.")
+        for address in interface.addresses:
+            if address.mode == AddressMode.Unmanaged:
+                logger.info(f"Adding static IP '{address.ip}' to interface '{interface.name}'.")
+                self.add_static_ip(interface.name, address.ip)
+            elif address.mode == AddressMode.Server:
+                logger.info(f"Adding DHCP server with gateway '{address.ip}' to interface '{interface.name}'.")
+                self.add_dhcp_server_to_interface(interface.name, address.ip)
+            elif address.mode == AddressMode.BackupServer:
+                logger.info(f"Adding backup DHCP server with gateway '{address.ip}' to interface '{interface.name}'.")
+                self.add_dhcp_server_to_interface(interface.name, address.ip, backup=True)
+        # Even if it happened to receive more than one dynamic IP, only one trigger is necessary
+        if any(address.mode == AddressMode.Client for address in interface.addresses):
+            logger.info(f"Triggering dynamic IP acquisition for interface '{interface.name}'.")
+            self.trigger_dynamic_ip_acquisition(interface.name)
+
+        # Handle routes configuration
+        self._set_routes_configuration(interface)
 
     def _set_routes_configuration(self, interface: NetworkInterface) -> None:
         try:
@@ -221,29 +233,23 @@ class EthernetManager:
         """
         return re.match(r"\d+.\d+.\d+.\d+", ip) is not None
 
-    def is_static_ip(self, ip: str) -> bool:
+    def netlink_snapshot(self) -> NetlinkSnapshot:
+        """Get a new snapshot of the system links, addresses and routes, to be shared between lookups."""
+        return NetlinkSnapshot(self.ipr)
+
+    def is_static_ip(self, ip: str, snapshot: Optional[NetlinkSnapshot] = None) -> bool:
         """Check if ip address is static or dynamic
             For more information: https://code.woboq.org/qt5/include/linux/if_addr.h.html
                 https://www.systutorials.com/docs/linux/man/8-ip-address/
 
         Args:
             ip (str): ip address
+            snapshot (NetlinkSnapshot, optional): Netlink snapshot to be used, a new one is taken if not provided
 
         Returns:
             bool: true if static false if not
         """
-        for address in list(self.ipr.get_addr()):
-
-            def get_item(items: List[Tuple[str, Any]], name: str) -> Any:
-                return [value for key, value in items if key == name][0]
-
-            if get_item(address["attrs"], "IFA_ADDRESS") != ip:
-                continue
-
-            flags = get_item(address["attrs"], "IFA_FLAGS")
-            result = "IFA_F_PERMANENT" in ifaddrmsg.flags2names(flags)
-            return result
-        return False
+        return (snapshot or self.netlink_snapshot()).is_static_ip(ip)
 
     def _get_interface_index(self, interface_name: str) -> int:
         """Get interface index for internal usage
@@ -307,9 +313,12 @@ class EthernetManager:
             updated_interface (NetworkInterface): New interface configuration
         """
         # Filter out the old interface configuration and append the new one
-        self._settings.content = [interface for interface in self._settings.content if interface.name != interface_name]
-        self._settings.content.append(updated_interface)
-        self._manager.save()
+        with self._settings_lock:
+            self._settings.content = [
+                interface for interface in self._settings.content if interface.name != interface_name
+            ]
+            self._settings.content.append(updated_interface)
+            self._manager.save()
         # OS state has just been mutated; drop the cached view so the next read returns fresh data.
         self.get_ethernet_interfaces.invalidate()  # type: ignore[attr-defined]
 
@@ -397,6 +406,10 @@ class EthernetManager:
                 return interface
         raise ValueError(f"No interface with name '{name}' is present.")
 
+    def saved_interfaces(self) -> List[NetworkInterface]:
+        with self._settings_lock:
+            return list(self._settings.content)
+
     def get_saved_interface_by_name(self, name: str) -> Optional[NetworkInterface]:
         return next((i for i in self._settings.content if i.name == name), None)
 
@@ -413,30 +426,28 @@ class EthernetManager:
             List of NetworkInterface instances available
         """
         result = []
-        for interface, addresses in psutil.net_if_addrs().items():
+        # Links, addresses and routes are dumped once and shared by all the lookups below
+        snapshot = self.netlink_snapshot()
+        for interface in snapshot.interface_names():
             # We don't care about virtual ethernet interfaces
             ## Virtual interfaces are created by programs such as docker
             ## and they are an abstraction of real interfaces, the ones that we want to configure.
             if not self.is_valid_interface_name(interface, filter_wifi):
                 continue
 
+            dhcp_server = next((server for server in self._dhcp_servers if server.interface == interface), None)
             valid_addresses = []
-            for address in addresses:
-                # We just care about IPV4 addresses
-                if not address.family == AddressFamily.AF_INET:
-                    continue
-
-                valid_ip = EthernetManager.weak_is_ip_address(address.address)
-                ip = address.address if valid_ip else "undefined"
+            # We just care about IPV4 addresses
+            for address in snapshot.ipv4_addresses(interface):
+                valid_ip = EthernetManager.weak_is_ip_address(address)
+                ip = address if valid_ip else "undefined"
 
-                is_static_ip = self.is_static_ip(ip)
+                is_static_ip = self.is_static_ip(ip, snapshot)
 
                 # Populate our output item
-                if self._is_dhcp_server_running_on_interface(interface) and str(
-                    self._dhcp_server_on_interface(interface).ipv4_gateway
-                ) == str(ip):
+                if dhcp_server is not None and str(dhcp_server.ipv4_gateway) == str(ip):
                     mode = AddressMode.Server
-                    if self._dhcp_server_on_interface(interface).is_backup_server:
+                    if dhcp_server.is_backup_server:
                         mode = AddressMode.BackupServer
                 else:
                     mode = AddressMode.Unmanaged if is_static_ip and valid_ip else AddressMode.Client
@@ -455,18 +466,18 @@ class EthernetManager:
                 )
             ):
                 valid_addresses.append(InterfaceAddress(ip="0.0.0.0", mode=AddressMode.Client))
-            info = self.get_interface_info(interface)
+            info = self.get_interface_info(interface, snapshot)
             saved_interface = self.get_saved_interface_by_name(interface)
             # Get priority from saved interface or from current interface metrics, defaulting to None if neither exists
             priority = None
             if saved_interface and saved_interface.priority is not None:
                 priority = saved_interface.priority
             else:
-                interface_metric = self.get_interface_priority(interface)
+                interface_metric = self.get_interface_priority(interface, snapshot)
                 if interface_metric:
                     priority = interface_metric.priority
 
-            routes = self.get_routes(interface, ignore_unmanaged=False)
+            routes = self.get_routes(interface, ignore_unmanaged=False, snapshot=snapshot)
 
             interface_data = NetworkInterface(
                 name=interface, addresses=valid_addresses, info=info, priority=priority, routes=list(routes)
@@ -516,45 +527,7 @@ class EthernetManager:
         Returns:
             List[NetworkInterfaceMetric]: A list of priority metrics for each active interface.
         """
-
-        interfaces = self.ipr.get_links()
-        # I hope that you are not here to move this code to IPv6.
-        # If that is the case, you'll need to figure out a way to handle
-        # priorities between interfaces, between IP categories.
-        # GLHF
-        routes = self.ipr.get_routes(family=AddressFamily.AF_INET)
-
-        # First find interfaces with default routes
-        interfaces_with_default_routes = set()
-        for route in routes:
-            dst = route.get_attr("RTA_DST")
-            oif = route.get_attr("RTA_OIF")
-            if dst is None and oif is not None:  # Default route
-                interfaces_with_default_routes.add(oif)
-
-        # Generate a dict of index to network name, but only for interfaces that are UP and RUNNING
-        # IFF_UP flag is 0x1, IFF_RUNNING is 0x40 in Linux
-        name_dict = {
-            iface["index"]: iface.get_attr("IFLA_IFNAME")
-            for iface in interfaces
-            if (iface["flags"] & 0x1) and (iface["flags"] & 0x40) and iface["index"] in interfaces_with_default_routes
-        }
-
-        # Get metrics for default routes of active interfaces
-        interface_metrics: Dict[int, int] = {}
-        for route in routes:
-            oif = route.get_attr("RTA_OIF")
-            if oif in name_dict and route.get_attr("RTA_DST") is None:  # Only default routes
-                metric = route.get_attr("RTA_PRIORITY", 0)
-                # Keep the highest metric for each interface
-                if oif not in interface_metrics or metric > interface_metrics[oif]:
-                    interface_metrics[oif] = metric
-
-        # Create the list of interface metrics
-        return [
-            NetworkInterfaceMetric(index=index, name=name, priority=interface_metrics.get(index, 0))
-            for index, name in name_dict.items()
-        ]
+        return self.netlink_snapshot().interfaces_metrics
 
     def set_interfaces_priority(self, interfaces: List[NetworkInterfaceMetricApi]) -> None:
         """Sets network interface priority. This is an abstraction function for different
@@ -575,17 +548,21 @@ class EthernetManager:
             saved_interface.priority = interface.priority
             self._update_interface_settings(interface.name, saved_interface)
 
-    def get_interface_priority(self, interface_name: str) -> Optional[NetworkInterfaceMetric]:
+    def get_interface_priority(
+        self, interface_name: str, snapshot: Optional[NetlinkSnapshot] = None
+    ) -> Optional[NetworkInterfaceMetric]:
         """Get the priority metric for a network interface.
 
         Args:
             interface_name (str): The name of the network interface.
+            snapshot (NetlinkSnapshot, optional): Netlink snapshot to be used instead of the cached priorities.
 
         Returns:
             Optional[NetworkInterfaceMetric]: The priority metric for the interface, or None if no metric found.
         """
+        metrics = snapshot.interfaces_metrics if snapshot else self.get_interfaces_priority()
         metric: NetworkInterfaceMetric
-        for metric in self.get_interfaces_priority():
+        for metric in metrics:
             if interface_name == metric.name:
                 return metric
 
@@ -611,21 +588,22 @@ class EthernetManager:
         if result.returncode != 0:
             raise RuntimeError(f"Failed to change network priority {name}")
 
-    def get_interface_info(self, interface_name: str) -> InterfaceInfo:
+    def get_interface_info(self, interface_name: str, snapshot: Optional[NetlinkSnapshot] = None) -> InterfaceInfo:
         """Get interface info field
 
         Args:
             interface_name (str): Interface name
+            snapshot (NetlinkSnapshot, optional): Netlink snapshot to be used, a new one is taken if not provided
 
         Returns:
             InterfaceInfo object
         """
-        metric = self.get_interface_priority(interface_name)
+        snapshot = snapshot or self.netlink_snapshot()
+        metric = self.get_interface_priority(interface_name, snapshot)
         priority = metric.priority if metric else 0
-        interface = self.get_interface_ndb(interface_name)
         return InterfaceInfo(
-            connected=interface.carrier != 0,
-            number_of_disconnections=interface.carrier_down_count,
+            connected=snapshot.carrier(interface_name),
+            number_of_disconnections=snapshot.carrier_down_count(interface_name),
             priority=priority,
         )
 
@@ -675,10 +653,11 @@ class EthernetManager:
                 current_route.managed = route.managed
         self._update_interface_settings(interface_name, current_interface)
 
-    def get_routes(self, interface_name: str, ignore_unmanaged: bool = True) -> Set[Route]:
+    def get_routes(
+        self, interface_name: str, ignore_unmanaged: bool = True, snapshot: Optional[NetlinkSnapshot] = None
+    ) -> Set[Route]:
         try:
-            interface_index = self._get_interface_index(interface_name)
-            raw_routes = self.ipr.get_routes(oif=interface_index)
+            raw_routes = (snapshot or self.netlink_snapshot()).routes_of(interface_name)
         except Exception as err:
             logger.error(f"Failed to get routes for {interface_name}: {err}")
             return set()
@@ -829,7 +808,15 @@ class EthernetManager:
             interface_name, ipv4_gateway, mode=AddressMode.Server if not backup else AddressMode.BackupServer
         )
         logger.info(f"Adding DHCP server with gateway '{ipv4_gateway}' to interface '{interface_name}'.")
-        self._dhcp_servers.append(DHCPServerManager(interface_name, IPv4Address(ipv4_gateway), backup=backup))
+        self._dhcp_servers.append(
+            DHCPServerManager(
+                interface_name,
+                IPv4Address(ipv4_gateway),
+                backup=backup,
+                loop=self._loop,
+                on_lease_events=self._publish_lease_events,
+            )
+        )
 
         saved_interface = self.get_saved_interface_by_name(interface_name)
         if saved_interface is None:
@@ -845,11 +832,14 @@ class EthernetManager:
     def __del__(self) -> None:
         self.stop()
 
-    def priorities_mismatch(self) -> List[NetworkInterface]:
+    def priorities_mismatch(self, interface_names: Optional[Set[str]] = None) -> List[NetworkInterface]:
         """Check if the current interface priorities differ from the saved ones.
         Uses sets for order-independent comparison of NetworkInterfaceMetric objects,
         which compare only name and priority fields.
 
+        Args:
+            interface_names (Set[str], optional): Only check these interfaces. Defaults to all of them
+
         Returns:
             bool: True if priorities don't match, False if they do
         """
@@ -860,6 +850,8 @@ class EthernetManager:
         for interface in self._settings.content:
             if interface.priority is None:
                 continue
+            if interface_names is not None and interface.name not in interface_names:
+                continue
             if interface.name in current_priorities and interface.priority != current_priorities[interface.name]:
                 logger.info(
                     f"Priority mismatch for {interface.name}: {interface.priority} != {current_priorities[interface.name]}"
@@ -868,9 +860,12 @@ class EthernetManager:
 
         return mismatched_interfaces
 
-    def config_mismatch(self) -> Set[NetworkInterface]:
+    def config_mismatch(self, interface_names: Optional[Set[str]] = None) -> Set[NetworkInterface]:
         """Check if the current interface config differs from the saved ones.
 
+        Args:
+            interface_names (Set[str], optional): Only check these interfaces. Defaults to all of them
+
         Returns:
             bool: True if config doesn't match, False if it does
         """
@@ -885,6 +880,8 @@ class EthernetManager:
         saved_interfaces = {interface.name: interface for interface in self._settings.content}
 
         for current_interface in current_interfaces:
+            if interface_names is not None and current_interface.name not in interface_names:
+                continue
             if current_interface.name not in saved_interfaces:
                 logger.debug(f"Interface {current_interface.name} not in saved configuration, skipping")
                 continue
@@ -907,34 +904,6 @@ class EthernetManager:
 
         return mismatches
 
-    async def watchdog(self) -> None:
-        """
-        periodically checks the interfaces states against the saved settings,
-        if there is a mismatch, it will apply the saved settings
-        """
-        while True:
-            try:
-                mismatches = self.config_mismatch()
-                if mismatches:
-                    logger.warning("Interface config mismatch, applying saved settings.")
-                    logger.debug(f"Mismatches: {mismatches}")
-                    for interface in mismatches:
-                        logger.info(f"Applying saved settings for {interface.name}")
-                        await self.set_configuration(interface, watchdog_call=True)
-                priority_mismatch = self.priorities_mismatch()
-                if priority_mismatch:
-                    logger.warning("Interface priorities mismatch, applying saved settings.")
-                    priorities = [
-                        NetworkInterfaceMetricApi(name=interface.name, priority=interface.priority)
-                        for interface in self._settings.content
-                        if interface.priority is not None
-                    ]
-                    self.set_interfaces_priority(priorities)
-                await asyncio.sleep(5)
-            except Exception as error:
-                logger.error(f"Error in watchdog: {error}")
-                await asyncio.sleep(5)
-
     def _get_dhcp_server_attribute(
         self, interface_name: Optional[str] = None, attribute: str = "leases"
     ) -> Dict[str, Any]:
@@ -950,3 +919,44 @@ class EthernetManager:
 
     def get_dhcp_server_details(self, interface_name: Optional[str] = None) -> Dict[str, DHCPServerDetails]:
         return self._get_dhcp_server_attribute(interface_name, "details")
+
+    def find_dhcp_server_lease(self, address: str) -> Optional[DHCPServerLease]:
+        """Find the lease of a device, on any of the DHCP servers
+
+        Args:
+            address (str): MAC or IPv4 address of the device
+
+        Returns:
+            Optional[DHCPServerLease]: The device lease, None if it has none
+        """
+        try:
+            ip: Optional[IPv4Address] = IPv4Address(address)
+        except ValueError:
+            ip = None
+        for dhcp_server in self._dhcp_servers:
+            lease = dhcp_server.lease_by_ip(ip) if ip is not None else dhcp_server.lease_by_mac(address)
+            if lease is not None:
+                return lease
+        return None
+
+    def _publish_lease_events(self, events: List[DHCPLeaseEvent]) -> None:
+        for event in events:
+            logger.info(f"DHCP lease {event.type.value} on {event.interface}: {event.lease.mac} ({event.lease.ip})")
+            for queue in self._lease_events_queues:
+                queue.put_nowait(event)
+
+    async def dhcp_lease_events(self, interface_name: Optional[str] = None) -> AsyncGenerator[DHCPLeaseEvent, None]:
+        """Stream the DHCP leases changes, as devices join or leave the networks
+
+        Args:
+            interface_name (str, optional): Only stream changes of this interface. Defaults to all of them
+        """
+        queue: asyncio.Queue[DHCPLeaseEvent] = asyncio.Queue()
+        self._lease_events_queues.append(queue)
+        try:
+            while True:
+                event = await queue.get()
+                if interface_name is None or event.interface == interface_name:
+                    yield event
+        finally:
+            self._lease_events_queues.remove(queue)
@@ -0,0 +1,180 @@
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from socket import AddressFamily
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from api.netlink import IFF_RUNNING, IFF_UP
+from loguru import logger
+from pyroute2 import IPRoute
+from pyroute2.netlink.rtnl import RTMGRP_IPV4_IFADDR, RTMGRP_IPV4_ROUTE, RTMGRP_LINK
+
+
+@dataclass
+class InterfaceState:
+    index: int
+    name: str
+    up: bool
+    running: bool
+    addresses: Set[str] = field(default_factory=set)
+
+
+class InterfaceMonitor:
+    """Keeps the state of the network interfaces updated from netlink events of links, IPv4 addresses and routes,
+    reporting which interfaces changed.
+
+    Changes are debounced per interface: an interface is reported once it stays quiet for `debounce_s`, or after
+    `max_delay_s` of continuous changes, so a flapping link doesn't trigger a reconfiguration for every event.
+    """
+
+    GROUPS = RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV4_ROUTE
+
+    def __init__(self, debounce_s: float = 1.0, max_delay_s: float = 10.0) -> None:
+        self._debounce_s = debounce_s
+        self._max_delay_s = max_delay_s
+        self._states: Dict[int, InterfaceState] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ipr: Optional[IPRoute] = None
+        # Interfaces waiting to settle down, with the time of their first change and the timer to report them
+        self._pending: Dict[str, Tuple[float, asyncio.TimerHandle]] = {}
+        self._changed: Set[str] = set()
+        self._changed_event = asyncio.Event()
+
+    @property
+    def is_running(self) -> bool:
+        return self._ipr is not None
+
+    def start(self) -> None:
+        """Start listening to netlink events. Needs to be called from a running event loop."""
+        if self.is_running:
+            return
+        loop = asyncio.get_running_loop()
+        ipr = IPRoute()
+        try:
+            ipr.bind(groups=self.GROUPS)
+            with IPRoute() as dump_ipr:
+                for link in dump_ipr.get_links():
+                    self._apply(link)
+                for address in dump_ipr.get_addr(family=AddressFamily.AF_INET):
+                    self._apply(address)
+        except Exception:
+            ipr.close()
+            raise
+
+        self._loop = loop
+        self._ipr = ipr
+        # The netlink socket is read on a dedicated thread, and every message is handled on the event loop
+        threading.Thread(target=self._receive, args=(ipr,), name="NetlinkMonitor", daemon=True).start()
+        logger.info(f"Netlink monitor started with interfaces: {[state.name for state in self.interfaces()]}")
+
+    def stop(self) -> None:
+        if self._ipr is None:
+            return
+        ipr, self._ipr = self._ipr, None
+        ipr.close()
+        for _, handle in self._pending.values():
+            handle.cancel()
+        self._pending.clear()
+
+    def _receive(self, ipr: IPRoute) -> None:
+        assert self._loop is not None
+        loop = self._loop
+        while self._ipr is ipr:
+            try:
+                messages = list(ipr.get())
+            except Exception as error:
+                if self._ipr is ipr:
+                    logger.error(f"Netlink monitor stopped: {error}")
+                    loop.call_soon_threadsafe(self.stop)
+                return
+            loop.call_soon_threadsafe(self._handle_messages, messages)
+
+    def _handle_messages(self, messages: List[Any]) -> None:
+        for message in messages:
+            try:
+                name = self._apply(message)
+            except Exception as error:
+                logger.debug(f"Ignoring netlink message: {error}")
+                continue
+            if name is not None:
+                self._schedule(name)
+
+    def _apply(self, message: Any) -> Optional[str]:
+        """Update the interfaces state with given netlink message.
+
+        Returns:
+            Optional[str]: Name of the interface that changed, None if nothing relevant changed.
+        """
+        event = message.get("event")
+        if event == "RTM_NEWLINK":
+            index = message["index"]
+            previous = self._states.get(index)
+            state = InterfaceState(
+                index=index,
+                name=message.get_attr("IFLA_IFNAME"),
+                up=bool(message["flags"] & IFF_UP),
+                running=bool(message["flags"] & IFF_RUNNING),
+                addresses=previous.addresses if previous else set(),
+            )
+            self._states[index] = state
+            # Links also notify changes that we don't care about, like statistics
+            if previous and (previous.name, previous.up, previous.running) == (state.name, state.up, state.running):
+                return None
+            return state.name
+
+        if event == "RTM_DELLINK":
+            removed = self._states.pop(message["index"], None)
+            return removed.name if removed else message.get_attr("IFLA_IFNAME")
+
+        if event in ["RTM_NEWADDR", "RTM_DELADDR"]:
+            address_owner = self._states.get(message["index"])
+            if address_owner is None:
+                return None
+            address = message.get_attr("IFA_LOCAL") or message.get_attr("IFA_ADDRESS")
+            if event == "RTM_NEWADDR":
+                address_owner.addresses.add(address)
+            else:
+                address_owner.addresses.discard(address)
+            return address_owner.name
+
+        if event in ["RTM_NEWROUTE", "RTM_DELROUTE"]:
+            route_owner = self._states.get(message.get_attr("RTA_OIF"))
+            return route_owner.name if route_owner else None
+
+        return None
+
+    def _schedule(self, name: str) -> None:
+        assert self._loop is not None
+        now = self._loop.time()
+        first_change = now
+        if name in self._pending:
+            first_change, handle = self._pending[name]
+            handle.cancel()
+        delay = min(self._debounce_s, max(0.0, first_change + self._max_delay_s - now))
+        self._pending[name] = (first_change, self._loop.call_later(delay, self._report, name))
+
+    def _report(self, name: str) -> None:
+        self._pending.pop(name, None)
+        self._changed.add(name)
+        self._changed_event.set()
+
+    def interfaces(self) -> List[InterfaceState]:
+        return list(self._states.values())
+
+    async def wait_for_changes(self, timeout: float) -> Set[str]:
+        """Wait for interfaces to change.
+
+        Returns:
+            Set[str]: Names of the interfaces that changed, empty on timeout or when the monitor is not running.
+        """
+        if not self.is_running:
+            await asyncio.sleep(timeout)
+            return set()
+        if not self._changed:
+            try:
+                await asyncio.wait_for(self._changed_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        changed, self._changed = self._changed, set()
+        self._changed_event.clear()
+        return changed
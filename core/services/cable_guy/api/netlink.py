@@ -0,0 +1,155 @@
+from collections import defaultdict
+from functools import cached_property
+from socket import AddressFamily
+from typing import Any, Dict, List, Optional
+
+from pyroute2 import IPRoute
+from pyroute2.netlink.rtnl.ifaddrmsg import ifaddrmsg
+from typedefs import NetworkInterfaceMetric
+
+# Interface flags, from linux/if.h
+IFF_UP = 0x1
+IFF_RUNNING = 0x40
+
+
+class NetlinkSnapshot:
+    """Links, IPv4 addresses and routes of the system, dumped from netlink and indexed for lookups.
+
+    Each table is dumped at most once, when first used, so a snapshot can be shared by all the helpers involved
+    in building the interfaces list instead of each one doing its own dumps.
+    """
+
+    def __init__(self, ipr: IPRoute) -> None:
+        self._ipr = ipr
+
+    @cached_property
+    def links(self) -> List[Any]:
+        return list(self._ipr.get_links())
+
+    @cached_property
+    def _links_by_name(self) -> Dict[str, Any]:
+        return {link.get_attr("IFLA_IFNAME"): link for link in self.links}
+
+    @cached_property
+    def addresses(self) -> List[Any]:
+        return list(self._ipr.get_addr(family=AddressFamily.AF_INET))
+
+    @cached_property
+    def _addresses_by_index(self) -> Dict[int, List[Any]]:
+        addresses: Dict[int, List[Any]] = defaultdict(list)
+        for address in self.addresses:
+            addresses[address["index"]].append(address)
+        return addresses
+
+    @cached_property
+    def _address_flags(self) -> Dict[str, int]:
+        flags: Dict[str, int] = {}
+        for address in self.addresses:
+            # The first match wins, as it used to be when scanning the whole dump for an address
+            flags.setdefault(self._local_address(address), self._flags(address))
+        return flags
+
+    @cached_property
+    def routes(self) -> List[Any]:
+        return list(self._ipr.get_routes())
+
+    @cached_property
+    def _routes_by_oif(self) -> Dict[int, List[Any]]:
+        routes: Dict[int, List[Any]] = defaultdict(list)
+        for route in self.routes:
+            oif = route.get_attr("RTA_OIF")
+            if oif is not None:
+                routes[oif].append(route)
+        return routes
+
+    @staticmethod
+    def _local_address(address: Any) -> str:
+        # IFA_LOCAL is the address of the interface itself, IFA_ADDRESS the peer one on point-to-point links
+        return str(address.get_attr("IFA_LOCAL") or address.get_attr("IFA_ADDRESS"))
+
+    @staticmethod
+    def _flags(address: Any) -> int:
+        # IFA_FLAGS carries the full 32 bits flags, the header only the lower 8 bits
+        flags = address.get_attr("IFA_FLAGS")
+        return int(flags if flags is not None else address["flags"])
+
+    def interface_names(self) -> List[str]:
+        return list(self._links_by_name.keys())
+
+    def link(self, interface_name: str) -> Optional[Any]:
+        return self._links_by_name.get(interface_name)
+
+    def _existing_link(self, interface_name: str) -> Any:
+        link = self.link(interface_name)
+        if link is None:
+            raise ValueError(f"No interface with name '{interface_name}' is present.")
+        return link
+
+    def index(self, interface_name: str) -> Optional[int]:
+        link = self.link(interface_name)
+        return int(link["index"]) if link is not None else None
+
+    def ipv4_addresses(self, interface_name: str) -> List[str]:
+        index = self.index(interface_name)
+        if index is None:
+            return []
+        return [self._local_address(address) for address in self._addresses_by_index.get(index, [])]
+
+    def is_static_ip(self, ip: str) -> bool:
+        flags = self._address_flags.get(ip)
+        if flags is None:
+            return False
+        return "IFA_F_PERMANENT" in ifaddrmsg.flags2names(flags)
+
+    def routes_of(self, interface_name: str) -> List[Any]:
+        return list(self._routes_by_oif.get(self._existing_link(interface_name)["index"], []))
+
+    def carrier(self, interface_name: str) -> bool:
+        return bool(self._existing_link(interface_name).get_attr("IFLA_CARRIER"))
+
+    def carrier_down_count(self, interface_name: str) -> int:
+        return int(self._existing_link(interface_name).get_attr("IFLA_CARRIER_DOWN_COUNT") or 0)
+
+    @cached_property
+    def interfaces_metrics(self) -> List[NetworkInterfaceMetric]:
+        """Get the priority metrics for all network interfaces that are UP and RUNNING with a default route.
+
+        Returns:
+            List[NetworkInterfaceMetric]: A list of priority metrics for each active interface.
+        """
+        # I hope that you are not here to move this code to IPv6.
+        # If that is the case, you'll need to figure out a way to handle
+        # priorities between interfaces, between IP categories.
+        # GLHF
+        default_routes = [
+            route
+            for route in self.routes
+            if route["family"] == AddressFamily.AF_INET
+            and route.get_attr("RTA_DST") is None
+            and route.get_attr("RTA_OIF") is not None
+        ]
+        interfaces_with_default_routes = {route.get_attr("RTA_OIF") for route in default_routes}
+
+        # Generate a dict of index to network name, but only for interfaces that are UP and RUNNING
+        name_dict = {
+            link["index"]: link.get_attr("IFLA_IFNAME")
+            for link in self.links
+            if (link["flags"] & IFF_UP)
+            and (link["flags"] & IFF_RUNNING)
+            and link["index"] in interfaces_with_default_routes
+        }
+
+        # Keep the highest metric of the default routes for each interface
+        interface_metrics: Dict[int, int] = {}
+        for route in default_routes:
+            oif = route.get_attr("RTA_OIF")
+            if oif not in name_dict:
+                continue
+            metric = route.get_attr("RTA_PRIORITY", 0)
+            if oif not in interface_metrics or metric > interface_metrics[oif]:
+                interface_metrics[oif] = metric
+
+        return [
+            NetworkInterfaceMetric(index=index, name=name, priority=interface_metrics.get(index, 0))
+            for index, name in name_dict.items()
+        ]
@@ -3,27 +3,29 @@ import asyncio
 import logging
 import os
 import sys
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncGenerator, Dict, List, Optional
 
+from api.async_manager import AsyncEthernetManager
 from api.dns import DnsData
 from api.manager import EthernetManager, NetworkInterface, NetworkInterfaceMetricApi
 from commonwealth.utils.apis import GenericErrorHandlingRoute, PrettyJSONResponse
-from commonwealth.utils.decorators import temporary_cache
 from commonwealth.utils.DHCPServerManager import DHCPServerDetails, DHCPServerLease
 from commonwealth.utils.logs import InterceptHandler, init_logger
 from commonwealth.utils.sentry_config import init_sentry_async
+from commonwealth.utils.streaming import streamer
 from config import SERVICE_NAME
 from fastapi import Body, FastAPI
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi_versioning import VersionedFastAPI, version
 from loguru import logger
-from typedefs import Route
+from typedefs import OperationMetrics, Route
 from uvicorn import Config, Server
 
 logging.basicConfig(handlers=[InterceptHandler()], level=0)
 init_logger(SERVICE_NAME)
 
-manager = EthernetManager()
+ethernet_manager = EthernetManager()
+manager = AsyncEthernetManager(ethernet_manager)
 
 app = FastAPI(
     title="Cable Guy API",
@@ -36,9 +38,9 @@ app.router.route_class = GenericErrorHandlingRoute
 
 @app.get("/ethernet", response_model=List[NetworkInterface], summary="Retrieve ethernet interfaces.")
 @version(1, 0)
-def retrieve_ethernet_interfaces() -> Any:
+async def retrieve_ethernet_interfaces() -> Any:
     """REST API endpoint to retrieve the configured ethernet interfaces."""
-    return manager.get_ethernet_interfaces()
+    return await manager.get_ethernet_interfaces()
 
 
 @app.post("/ethernet", response_model=NetworkInterface, summary="Configure a ethernet interface.")
@@ -46,114 +48,139 @@ def retrieve_ethernet_interfaces() -> Any:
 async def configure_interface(interface: NetworkInterface = Body(...)) -> Any:
     """REST API endpoint to configure a new ethernet interface or modify an existing one."""
     await manager.set_configuration(interface)
-    manager.save()
+    await manager.save()
     return interface
 
 
 @app.get("/interfaces", response_model=List[NetworkInterface], summary="Retrieve all network interfaces.")
 @version(1, 0)
-@temporary_cache(timeout_seconds=1)
-def retrieve_interfaces() -> Any:
+async def retrieve_interfaces() -> Any:
     """REST API endpoint to retrieve the all network interfaces."""
-    return manager.get_interfaces()
+    return await manager.get_interfaces()
 
 
 @app.post("/set_interfaces_priority", summary="Set interface priority")
 @version(1, 0)
-def set_interfaces_priority(interfaces: List[NetworkInterfaceMetricApi]) -> Any:
+async def set_interfaces_priority(interfaces: List[NetworkInterfaceMetricApi]) -> Any:
     """REST API endpoint to set the interface priority."""
-    return manager.set_interfaces_priority(interfaces)
+    return await manager.set_interfaces_priority(interfaces)
 
 
 @app.post("/address", summary="Add IP address to interface.")
 @version(1, 0)
-def add_address(interface_name: str, ip_address: str) -> Any:
+async def add_address(interface_name: str, ip_address: str) -> Any:
     """REST API endpoint to add a static IP address to an ethernet interface."""
-    manager.add_static_ip(interface_name, ip_address)
-    manager.save()
+    await manager.add_static_ip(interface_name, ip_address)
+    await manager.save()
 
 
 @app.delete("/address", summary="Delete IP address from interface.")
 @version(1, 0)
-def delete_address(interface_name: str, ip_address: str) -> Any:
+async def delete_address(interface_name: str, ip_address: str) -> Any:
     """REST API endpoint to delete an IP address from an ethernet interface."""
-    manager.remove_ip(interface_name, ip_address)
-    manager.save()
+    await manager.remove_ip(interface_name, ip_address)
+    await manager.save()
 
 
 @app.get("/dhcp/details/{interface_name}", summary="Get all DHCP leases.")
 @version(1, 0)
-def get_dhcp_server_details(interface_name: Optional[str] = None) -> Dict[str, DHCPServerDetails]:
+async def get_dhcp_server_details(interface_name: Optional[str] = None) -> Dict[str, DHCPServerDetails]:
     """REST API endpoint to get the DHCP server details."""
-    return manager.get_dhcp_server_details(interface_name)
+    return await manager.get_dhcp_server_details(interface_name)
 
 
 @app.get("/dhcp/leases/{interface_name}", summary="Get all DHCP leases.")
 @version(1, 0)
-def get_dhcp_server_leases(interface_name: Optional[str] = None) -> Dict[str, List[DHCPServerLease]]:
+async def get_dhcp_server_leases(interface_name: Optional[str] = None) -> Dict[str, List[DHCPServerLease]]:
     """REST API endpoint to get the DHCP leases."""
-    return manager.get_dhcp_server_leases(interface_name)
+    return await manager.get_dhcp_server_leases(interface_name)
+
+
+@app.get("/dhcp/lease/{address}", summary="Get the DHCP lease of a device.")
+@version(1, 0)
+async def get_dhcp_server_lease(address: str) -> Optional[DHCPServerLease]:
+    """REST API endpoint to get the DHCP lease of a device, by its MAC or IP address."""
+    return await manager.find_dhcp_server_lease(address)
+
+
+@app.get("/dhcp/lease_events", summary="Stream DHCP leases changes.")
+@version(1, 0)
+async def stream_dhcp_lease_events(interface_name: Optional[str] = None) -> StreamingResponse:
+    """REST API endpoint to stream the devices joining and leaving the DHCP servers networks."""
+
+    async def events() -> AsyncGenerator[str, None]:
+        async for event in manager.dhcp_lease_events(interface_name):
+            yield event.model_dump_json()
+
+    return StreamingResponse(streamer(events(), heartbeats=1.0))
 
 
 @app.post("/dhcp", summary="Add local DHCP server to interface.")
 @version(1, 0)
 async def add_dhcp_server(interface_name: str, ipv4_gateway: str, is_backup_server: bool = False) -> Any:
     """REST API endpoint to enable/disable local DHCP server."""
-    manager.add_dhcp_server_to_interface(interface_name, ipv4_gateway, is_backup_server)
-    manager.save()
+    await manager.add_dhcp_server_to_interface(interface_name, ipv4_gateway, is_backup_server)
+    await manager.save()
 
 
 @app.delete("/dhcp", summary="Remove local DHCP server from interface.")
 @version(1, 0)
-def remove_dhcp_server(interface_name: str) -> Any:
+async def remove_dhcp_server(interface_name: str) -> Any:
     """REST API endpoint to enable/disable local DHCP server."""
-    manager.remove_dhcp_server_from_interface(interface_name)
-    manager.save()
+    await manager.remove_dhcp_server_from_interface(interface_name)
+    await manager.save()
 
 
 @app.post("/dynamic_ip", summary="Trigger reception of dynamic IP.")
 @version(1, 0)
-def trigger_dynamic_ip_acquisition(interface_name: str) -> Any:
+async def trigger_dynamic_ip_acquisition(interface_name: str) -> Any:
     """REST API endpoint to trigger interface to receive a new dynamic IP."""
-    manager.trigger_dynamic_ip_acquisition(interface_name)
-    manager.save()
+    await manager.trigger_dynamic_ip_acquisition(interface_name)
+    await manager.save()
 
 
 @app.get("/host_dns", summary="Retrieve host DNS configuration.")
 @version(1, 0)
-def retrieve_host_dns() -> Any:
+async def retrieve_host_dns() -> Any:
     """REST API endpoint to retrieve the host DNS configuration."""
-    return manager.dns.retrieve_host_nameservers()
+    return await manager.retrieve_host_nameservers()
 
 
 @app.post("/host_dns", summary="Update host DNS configuration.")
 @version(1, 0)
-def update_host_dns(dns_data: DnsData) -> Any:
+async def update_host_dns(dns_data: DnsData) -> Any:
     """REST API endpoint to update the host DNS configuration."""
-    manager.dns.update_host_nameservers(dns_data)
+    await manager.update_host_nameservers(dns_data)
 
 
 @app.post("/route", summary="Add route to interface.")
 @version(1, 0)
-def add_route(interface_name: str, route: Route) -> Any:
+async def add_route(interface_name: str, route: Route) -> Any:
     """REST API endpoint to add route."""
-    manager.add_route(interface_name, route)
-    manager.save()
+    await manager.add_route(interface_name, route)
+    await manager.save()
 
 
 @app.delete("/route", summary="Remove route from interface.")
 @version(1, 0)
-def remove_route(interface_name: str, route: Route) -> Any:
+async def remove_route(interface_name: str, route: Route) -> Any:
     """REST API endpoint remove route."""
-    manager.remove_route(interface_name, route)
-    manager.save()
+    await manager.remove_route(interface_name, route)
+    await manager.save()
 
 
 @app.get("/route", summary="Get the interface routes.")
 @version(1, 0)
-def get_route(interface_name: str) -> List[Route]:
+async def get_route(interface_name: str) -> List[Route]:
     """REST API endpoint to get routes."""
-    return list(manager.get_routes(interface_name, ignore_unmanaged=False))
+    return await manager.get_routes(interface_name)
+
+
+@app.get("/operations_metrics", summary="Get latency metrics of the interfaces operations.")
+@version(1, 0)
+async def get_operations_metrics() -> Dict[str, OperationMetrics]:
+    """REST API endpoint to get the count, errors, timeouts and latencies of each interfaces operation."""
+    return manager.metrics()
 
 
 app = VersionedFastAPI(
@@ -182,7 +209,7 @@ async def main() -> None:
     config = Config(app=app, host="0.0.0.0", port=9090, log_config=None)
     server = Server(config)
 
-    await manager.initialize()
+    await ethernet_manager.initialize()
     asyncio.create_task(manager.watchdog())
 
     await server.serve()
@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import time
+from typing import Any, AsyncGenerator, List, Optional
+
+import pytest
+from api.async_manager import AsyncEthernetManager
+from commonwealth.utils.streaming import streamer
+
+
+class SlowManager:
+    """Records the blocking calls done by the facade, each one taking the given time."""
+
+    def __init__(self, delay_s: float) -> None:
+        self.delay_s = delay_s
+        self.calls: List[Any] = []
+        self._calls_lock = threading.Lock()
+
+    def _call(self, *args: Any) -> None:
+        with self._calls_lock:
+            self.calls.append(("start", *args))
+        time.sleep(self.delay_s)
+        with self._calls_lock:
+            self.calls.append(("end", *args))
+
+    def add_static_ip(self, interface_name: str, ip: str) -> None:
+        self._call(interface_name, ip)
+
+    def remove_ip(self, interface_name: str, ip: str) -> None:
+        if ip == "invalid":
+            raise ValueError("Invalid IP")
+        self._call(interface_name, ip)
+
+
+@pytest.mark.asyncio
+async def test_async_manager_interface_locks() -> None:
+    slow_manager = SlowManager(delay_s=0.1)
+    manager = AsyncEthernetManager(slow_manager)  # type: ignore
+
+    await asyncio.gather(
+        manager.add_static_ip("eth0", "192.168.2.2"),
+        manager.add_static_ip("eth0", "192.168.2.3"),
+        manager.add_static_ip("wlan0", "192.168.3.2"),
+    )
+
+    # Changes of the same interface are serialized
+    eth0_calls = [call for call in slow_manager.calls if call[1] == "eth0"]
+    assert [call[0] for call in eth0_calls] == ["start", "end", "start", "end"]
+
+    with pytest.raises(ValueError):
+        await manager.remove_ip("eth0", "invalid")
+
+    metrics = manager.metrics()
+    assert metrics["add_static_ip"].count == 3
+    assert metrics["add_static_ip"].max_ms >= 100
+    assert metrics["remove_ip"].errors == 1
+    manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_async_manager_timeout() -> None:
+    slow_manager = SlowManager(delay_s=0.3)
+    manager = AsyncEthernetManager(slow_manager)  # type: ignore
+    manager.WRITE_TIMEOUT_S = 0.1
+
+    with pytest.raises(TimeoutError):
+        await manager.add_static_ip("eth0", "192.168.2.2")
+    # The timed out change is still running, so the next one waits for it instead of overlapping
+    manager.WRITE_TIMEOUT_S = 1.0
+    await manager.add_static_ip("eth0", "192.168.2.3")
+    assert [call[0] for call in slow_manager.calls] == ["start", "end", "start", "end"]
+
+    metrics = manager.metrics()["add_static_ip"]
+    assert metrics.timeouts == 1
+    assert metrics.count == 2
+    manager.stop()
+
+
+class LeasesManager:
+    """Streams lease events to each subscriber, as the manager does it."""
+
+    def __init__(self) -> None:
+        self.queues: List["asyncio.Queue[str]"] = []
+
+    async def dhcp_lease_events(self, _interface_name: Optional[str] = None) -> AsyncGenerator[str, None]:
+        queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self.queues.append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.queues.remove(queue)
+
+
+@pytest.mark.asyncio
+async def test_async_manager_lease_events_unsubscribe_on_disconnect() -> None:
+    leases_manager = LeasesManager()
+    manager = AsyncEthernetManager(leases_manager)  # type: ignore
+    stream = streamer((str(event) async for event in manager.dhcp_lease_events("eth0")), heartbeats=1.0)
+    first: "asyncio.Future[str]" = asyncio.ensure_future(stream.__anext__())
+    await asyncio.sleep(0.01)
+    assert len(leases_manager.queues) == 1
+    leases_manager.queues[0].put_nowait("added")
+    assert '"fragment": 0' in await first
+
+    # The client disconnects
+    await stream.aclose()
+    await asyncio.sleep(0)
+    assert leases_manager.queues == []
+    manager.stop()
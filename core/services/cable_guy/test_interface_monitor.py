@@ -0,0 +1,65 @@
+import asyncio
+from typing import Any, Dict
+
+import pytest
+from api.monitor import InterfaceMonitor
+from api.netlink import IFF_RUNNING, IFF_UP
+
+
+class FakeMessage:
+    def __init__(self, fields: Dict[str, Any], attrs: Dict[str, Any]) -> None:
+        self._fields = fields
+        self._attrs = attrs
+
+    def __getitem__(self, key: str) -> Any:
+        return self._fields[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._fields.get(key, default)
+
+    def get_attr(self, name: str, default: Any = None) -> Any:
+        return self._attrs.get(name, default)
+
+
+def link(index: int, name: str, running: bool) -> FakeMessage:
+    flags = IFF_UP | (IFF_RUNNING if running else 0)
+    return FakeMessage({"event": "RTM_NEWLINK", "index": index, "flags": flags}, {"IFLA_IFNAME": name})
+
+
+def address(event: str, index: int, ip: str) -> FakeMessage:
+    return FakeMessage({"event": event, "index": index}, {"IFA_LOCAL": ip, "IFA_ADDRESS": ip})
+
+
+@pytest.mark.asyncio
+async def test_interface_monitor() -> None:
+    monitor = InterfaceMonitor(debounce_s=0.1, max_delay_s=0.5)
+    # Pretend it's running, messages are fed directly instead of being read from netlink
+    monitor._loop = asyncio.get_running_loop()
+    monitor._ipr = object()  # type: ignore
+    monitor._apply(link(2, "eth0", running=True))
+    monitor._apply(link(3, "usb0", running=True))
+
+    # Same link state, like statistics updates, is not a change
+    monitor._handle_messages([link(2, "eth0", running=True)])
+    assert await monitor.wait_for_changes(timeout=0.3) == set()
+
+    # A flapping link is reported once, after it settles down
+    for running in [False, True, False]:
+        monitor._handle_messages([link(2, "eth0", running=running)])
+        await asyncio.sleep(0.02)
+    monitor._handle_messages([link(2, "eth0", running=True), address("RTM_NEWADDR", 3, "192.168.2.2")])
+    assert await monitor.wait_for_changes(timeout=1.0) == {"eth0", "usb0"}
+    assert await monitor.wait_for_changes(timeout=0.3) == set()
+    assert {state.name: state.addresses for state in monitor.interfaces()} == {
+        "eth0": set(),
+        "usb0": {"192.168.2.2"},
+    }
+
+    # A link that never settles is still reported after the maximum delay
+    flapping = asyncio.create_task(monitor.wait_for_changes(timeout=2.0))
+    for index in range(20):
+        monitor._handle_messages([link(2, "eth0", running=bool(index % 2))])
+        await asyncio.sleep(0.05)
+        if flapping.done():
+            break
+    assert await flapping == {"eth0"}
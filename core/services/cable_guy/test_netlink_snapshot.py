@@ -0,0 +1,130 @@
+from collections import Counter
+from socket import AddressFamily
+from typing import Any, Dict, List, Optional
+
+import pytest
+from api.netlink import IFF_RUNNING, IFF_UP, NetlinkSnapshot
+from pyroute2 import IPRoute
+
+IFA_F_PERMANENT = 0x80
+
+
+class FakeMessage:
+    def __init__(self, fields: Dict[str, Any], attrs: Dict[str, Any]) -> None:
+        self._fields = fields
+        self._attrs = attrs
+
+    def __getitem__(self, key: str) -> Any:
+        return self._fields[key]
+
+    def get_attr(self, name: str, default: Any = None) -> Any:
+        return self._attrs.get(name, default)
+
+
+class CountingIPRoute:
+    """Serves netlink dumps from given messages, or from a real IPRoute, counting each dump request."""
+
+    def __init__(self, ipr: Optional[IPRoute] = None, **tables: List[FakeMessage]) -> None:
+        self._ipr = ipr
+        self._tables = tables
+        self.dumps: Counter[str] = Counter()
+
+    def _dump(self, table: str, **kwargs: Any) -> Any:
+        self.dumps[table] += 1
+        if self._ipr is not None:
+            return getattr(self._ipr, table)(**kwargs)
+        return self._tables[table]
+
+    def get_links(self) -> Any:
+        return self._dump("get_links")
+
+    def get_addr(self, **kwargs: Any) -> Any:
+        return self._dump("get_addr", **kwargs)
+
+    def get_routes(self, **kwargs: Any) -> Any:
+        return self._dump("get_routes", **kwargs)
+
+
+def fake_ipr(interfaces: int) -> CountingIPRoute:
+    links, addresses, routes = [], [], []
+    for index in range(1, interfaces + 1):
+        links.append(
+            FakeMessage(
+                {"index": index, "flags": IFF_UP | IFF_RUNNING},
+                {"IFLA_IFNAME": f"eth{index}", "IFLA_CARRIER": 1, "IFLA_CARRIER_DOWN_COUNT": index},
+            )
+        )
+        for host, flags in [(1, IFA_F_PERMANENT), (2, 0)]:
+            address = f"192.168.{index}.{host}"
+            addresses.append(
+                FakeMessage(
+                    {"index": index, "flags": 0}, {"IFA_ADDRESS": address, "IFA_LOCAL": address, "IFA_FLAGS": flags}
+                )
+            )
+        routes.append(
+            FakeMessage(
+                {"family": AddressFamily.AF_INET, "dst_len": 0}, {"RTA_OIF": index, "RTA_PRIORITY": 100 + index}
+            )
+        )
+        routes.append(
+            FakeMessage(
+                {"family": AddressFamily.AF_INET, "dst_len": 24}, {"RTA_OIF": index, "RTA_DST": f"192.168.{index}.0"}
+            )
+        )
+    return CountingIPRoute(get_links=links, get_addr=addresses, get_routes=routes)
+
+
+def lookup_all(snapshot: NetlinkSnapshot) -> None:
+    """Same lookups done by EthernetManager.get_interfaces for every interface."""
+    for name in snapshot.interface_names():
+        for address in snapshot.ipv4_addresses(name):
+            snapshot.is_static_ip(address)
+        snapshot.carrier(name)
+        snapshot.carrier_down_count(name)
+        next((metric for metric in snapshot.interfaces_metrics if metric.name == name), None)
+        snapshot.routes_of(name)
+
+
+def test_snapshot_lookups() -> None:
+    ipr = fake_ipr(interfaces=3)
+    snapshot = NetlinkSnapshot(ipr)  # type: ignore
+
+    assert snapshot.interface_names() == ["eth1", "eth2", "eth3"]
+    assert snapshot.ipv4_addresses("eth2") == ["192.168.2.1", "192.168.2.2"]
+    assert snapshot.ipv4_addresses("wlan0") == []
+    assert snapshot.is_static_ip("192.168.2.1")
+    assert not snapshot.is_static_ip("192.168.2.2")
+    assert not snapshot.is_static_ip("10.0.0.1")
+    assert snapshot.carrier("eth3") and snapshot.carrier_down_count("eth3") == 3
+    assert len(snapshot.routes_of("eth1")) == 2
+    assert [(metric.name, metric.priority) for metric in snapshot.interfaces_metrics] == [
+        ("eth1", 101),
+        ("eth2", 102),
+        ("eth3", 103),
+    ]
+    with pytest.raises(ValueError):
+        snapshot.routes_of("wlan0")
+
+    lookup_all(snapshot)
+    assert ipr.dumps == {"get_links": 1, "get_addr": 1, "get_routes": 1}
+
+
+@pytest.mark.parametrize("interfaces", [1, 10, 100])
+def test_snapshot_dumps_do_not_grow_with_interfaces(interfaces: int) -> None:
+    ipr = fake_ipr(interfaces)
+    lookup_all(NetlinkSnapshot(ipr))  # type: ignore
+    assert ipr.dumps == {"get_links": 1, "get_addr": 1, "get_routes": 1}
+
+
+def test_snapshot_on_this_system() -> None:
+    """Looking up every interface of this system through a snapshot dumps each table once."""
+    try:
+        ipr = IPRoute()
+    except Exception as error:
+        pytest.skip(f"Netlink is not available: {error}")
+
+    with ipr:
+        counting_ipr = CountingIPRoute(ipr)
+        lookup_all(NetlinkSnapshot(counting_ipr))  # type: ignore
+
+    assert counting_ipr.dumps == {"get_links": 1, "get_addr": 1, "get_routes": 1}
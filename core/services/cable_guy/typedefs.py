@@ -82,3 +82,12 @@ class NetworkInterfaceMetric(BaseModel):
 class NetworkInterfaceMetricApi(BaseModel):
     name: str
     priority: int
+
+
+class OperationMetrics(BaseModel):
+    count: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    last_ms: float = 0.0
+    average_ms: float = 0.0
+    max_ms: float = 0.0
@@ -0,0 +1,127 @@
+"""Stream folders as compressed tar archives, built while they are downloaded."""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import os
+import tarfile
+import threading
+import zlib
+from pathlib import Path
+from typing import IO, AsyncGenerator, Optional
+
+from loguru import logger
+
+CHUNK_SIZE = 256 * 2**10
+# Compressed chunks waiting to be sent, bounding the memory used by slow downloads
+QUEUED_CHUNKS = 8
+COMPRESSION_LEVEL = 6
+
+
+class ArchiveCancelledError(Exception):
+    """The download of the archive was interrupted"""
+
+
+class _FixedSizeReader:
+    """Reads exactly size bytes of a file that may change while archived, padding it with zeros if it shrinks"""
+
+    def __init__(self, file: IO[bytes], size: int) -> None:
+        self.file = file
+        self.remaining = size
+
+    def read(self, size: int = -1) -> bytes:
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        data += bytes(size - len(data))
+        self.remaining -= size
+        return data
+
+
+class _QueueWriter:
+    """Compresses the tar stream written by a worker thread into chunks consumed by the event loop"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue[Optional[bytes]]) -> None:
+        self.loop = loop
+        self.queue = queue
+        self.stopped = threading.Event()
+        # gzip container
+        self._compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        self._pending: list[bytes] = []
+        self._pending_size = 0
+
+    def write(self, data: bytes) -> int:
+        compressed = self._compressor.compress(data)
+        if compressed:
+            self._pending.append(compressed)
+            self._pending_size += len(compressed)
+        if self._pending_size >= CHUNK_SIZE:
+            self._put(b"".join(self._pending))
+            self._pending, self._pending_size = [], 0
+        return len(data)
+
+    def close(self) -> None:
+        self._pending.append(self._compressor.flush())
+        self._put(b"".join(self._pending))
+        self._put(None)
+
+    def _put(self, chunk: Optional[bytes]) -> None:
+        future = asyncio.run_coroutine_threadsafe(self.queue.put(chunk), self.loop)
+        while True:
+            try:
+                future.result(timeout=0.1)
+                return
+            except concurrent.futures.TimeoutError as error:
+                if self.stopped.is_set():
+                    future.cancel()
+                    raise ArchiveCancelledError() from error
+
+
+def _write_archive(root: Path, since: Optional[float], writer: _QueueWriter) -> None:
+    with tarfile.open(fileobj=writer, mode="w|", format=tarfile.PAX_FORMAT) as tar:  # type: ignore[arg-type]
+        for directory, directories, files in os.walk(root):
+            directories.sort()
+            for name in sorted(files):
+                path = Path(directory) / name
+                try:
+                    tarinfo = tar.gettarinfo(str(path), arcname=str(path.relative_to(root.parent)))
+                    if not tarinfo.isreg() or (since is not None and tarinfo.mtime < since):
+                        continue
+                    file = open(path, "rb")  # pylint: disable=consider-using-with
+                except OSError as error:
+                    # Logs may be rotated or removed while archived
+                    logger.debug(f"Skipping {path} from archive: {error}")
+                    continue
+                with file:
+                    tar.addfile(tarinfo, _FixedSizeReader(file, tarinfo.size))  # type: ignore[arg-type]
+    writer.close()
+
+
+async def stream_tar_gz(root: Path, since: Optional[float] = None) -> AsyncGenerator[bytes, None]:
+    """Stream root and everything under it as a .tar.gz, skipping files not modified since the given timestamp.
+
+    Files are read, archived and compressed by a worker thread while the archive is sent, so it's never stored,
+    and the memory used is bounded by the chunks waiting to be sent.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[Optional[bytes]] = asyncio.Queue(maxsize=QUEUED_CHUNKS)
+    writer = _QueueWriter(loop, queue)
+    worker = asyncio.ensure_future(asyncio.to_thread(_write_archive, root, since, writer))
+    # Interrupted downloads stop the worker with ArchiveCancelledError, which doesn't need to be reported
+    worker.add_done_callback(lambda future: future.cancelled() or future.exception())
+    try:
+        while True:
+            get = asyncio.ensure_future(queue.get())
+            await asyncio.wait([get, worker], return_when=asyncio.FIRST_COMPLETED)
+            if not get.done() and worker.exception() is not None:
+                # The worker failed before finishing the archive
+                get.cancel()
+                raise worker.exception()  # type: ignore[misc]
+            chunk = await get
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        writer.stopped.set()
+        if not worker.done():
+            logger.info(f"Archive download of {root} interrupted")
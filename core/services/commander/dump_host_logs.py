@@ -4,7 +4,10 @@
 from __future__ import annotations
 
 import asyncio
+import gzip
 import os
+import shutil
+import signal
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Awaitable, Dict, List, Optional, Tuple
@@ -12,6 +15,9 @@ from typing import Any, Awaitable, Dict, List, Optional, Tuple
 from loguru import logger
 
 DEFAULT_OUTPUT_DIR = Path(os.environ.get("BLUEOS_LOG_FOLDER_PATH", "/var/logs/blueos")) / "host_diagnostics"
+CHUNK_SIZE = 256 * 2**10
+# Fast enough for a Raspberry Pi to keep up with journalctl, while still compressing logs ~10x
+COMPRESSION_LEVEL = 6
 
 
 async def _run(command: str) -> Tuple[int, str, str]:
@@ -36,8 +42,88 @@ def _write_text(path: Path, content: str) -> None:
     path.write_text(content, encoding="utf-8", errors="replace")
 
 
+def _join_members(path: Path, header: str, body_path: Path) -> None:
+    """Write the header as a gzip member followed by the already compressed body, which decompress as one text"""
+    with open(path, "wb") as output, open(body_path, "rb") as body:
+        output.write(gzip.compress(header.encode("utf-8"), COMPRESSION_LEVEL))
+        shutil.copyfileobj(body, output)
+    body_path.unlink()
+
+
+async def _dump(command: str, path: Path, title: str, max_bytes: Optional[int]) -> Tuple[int, str, int]:
+    """Pipe the stdout of command into a gzip file at path, preceded by its header.
+
+    The output is compressed while it's produced, so it's never held in memory, and is truncated after max_bytes.
+    Nothing is written if the command fails without output.
+
+    Returns:
+        The return code and stderr of the command, and the size of its output.
+    """
+    process = await asyncio.create_subprocess_exec(
+        "bash",
+        "-lc",
+        command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        # Its own process group, so truncated commands can be killed together with the shell
+        start_new_session=True,
+    )
+    assert process.stdout is not None and process.stderr is not None
+
+    def kill() -> None:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    stderr_task = asyncio.ensure_future(process.stderr.read())
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    body_path = path.with_name(f"{path.name}.body")
+    body = gzip.GzipFile(body_path, "wb", COMPRESSION_LEVEL)  # pylint: disable=consider-using-with
+    size = 0
+    try:
+        while chunk := await process.stdout.read(CHUNK_SIZE):
+            if max_bytes is not None and size + len(chunk) > max_bytes:
+                chunk = chunk[: max_bytes - size]
+                size += len(chunk)
+                await asyncio.to_thread(body.write, chunk + f"\n# truncated after {max_bytes} bytes\n".encode())
+                kill()
+                # The process is only waited for after its output is closed
+                while await process.stdout.read(CHUNK_SIZE):
+                    pass
+                break
+            size += len(chunk)
+            await asyncio.to_thread(body.write, chunk)
+    except BaseException:
+        kill()
+        raise
+    finally:
+        await asyncio.to_thread(body.close)
+
+    returncode = await process.wait()
+    stderr = (await stderr_task).decode(errors="replace")
+    if returncode != 0 and size == 0:
+        body_path.unlink()
+        return returncode, stderr, size
+
+    await asyncio.to_thread(_join_members, path, _header(title, command, returncode, stderr), body_path)
+    return returncode, stderr, size
+
+
+def _time_window(since: Optional[datetime], until: Optional[datetime]) -> str:
+    """journalctl arguments limiting its output to the given time window"""
+    arguments = ""
+    if since is not None:
+        arguments += f" --since=@{int(since.timestamp())}"
+    if until is not None:
+        arguments += f" --until=@{int(until.timestamp())}"
+    return arguments
+
+
 # Dump file preamble: "# <title>", "# generated: <UTC ISO>", "# command: …", "# return_code: …",
-# optional "# stderr:" block, then a "#====…" separator. Consumers of the zip can rely on this.
+# optional "# stderr:" block, then a "#====…" separator. Consumers of the archive can rely on this,
+# also for the decompressed .gz logs.
 def _header(title: str, command: str, returncode: int, stderr: str) -> str:
     header = (
         f"# {title}\n"
@@ -51,47 +137,49 @@ def _header(title: str, command: str, returncode: int, stderr: str) -> str:
     return header
 
 
-async def dump_journal(output_dir: Path, boot_index: int, filename: str) -> Optional[str]:
-    command = f"journalctl -b {boot_index} --no-pager --output=short-iso"
-    returncode, stdout, stderr = await _run(command)
-    if returncode != 0 and not stdout.strip():
+async def dump_journal(
+    output_dir: Path,
+    boot_index: int,
+    filename: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    max_bytes: Optional[int] = None,
+) -> Optional[str]:
+    command = f"journalctl -b {boot_index} --no-pager --output=short-iso{_time_window(since, until)}"
+    returncode, stderr, size = await _dump(
+        command, output_dir / "journal" / filename, f"journalctl boot index {boot_index}", max_bytes
+    )
+    if returncode != 0 and size == 0:
         logger.warning(f"Failed to dump journal boot {boot_index}: {stderr}")
         return f"journal/{filename}: failed ({stderr.strip() or returncode})"
-
-    _write_text(
-        output_dir / "journal" / filename,
-        _header(f"journalctl boot index {boot_index}", command, returncode, stderr) + stdout,
-    )
     return None
 
 
-async def dump_dmesg(output_dir: Path) -> Optional[str]:
+async def dump_dmesg(output_dir: Path, max_bytes: Optional[int] = None) -> Optional[str]:
     stderr = ""
     returncode = 1
     for command in ("dmesg --ctime --color=never", "dmesg -T", "dmesg"):
-        returncode, stdout, stderr = await _run(command)
-        if returncode == 0 or stdout.strip():
-            _write_text(
-                output_dir / "kernel" / "dmesg.log",
-                _header("dmesg", command, returncode, stderr) + stdout,
-            )
+        returncode, stderr, size = await _dump(command, output_dir / "kernel" / "dmesg.log.gz", "dmesg", max_bytes)
+        if returncode == 0 or size > 0:
             return None
 
     logger.warning(f"Failed to dump dmesg: {stderr}")
-    return f"kernel/dmesg.log: failed ({stderr.strip() or returncode})"
-
-
-async def dump_kernel_journal(output_dir: Path) -> Optional[str]:
-    command = "journalctl -k -b 0 --no-pager --output=short-iso"
-    returncode, stdout, stderr = await _run(command)
-    if returncode != 0 and not stdout.strip():
-        logger.warning(f"Failed to dump kernel journal: {stderr}")
-        return f"kernel/journal_kernel.log: failed ({stderr.strip() or returncode})"
-
-    _write_text(
-        output_dir / "kernel" / "journal_kernel.log",
-        _header("journalctl -k (current boot)", command, returncode, stderr) + stdout,
+    return f"kernel/dmesg.log.gz: failed ({stderr.strip() or returncode})"
+
+
+async def dump_kernel_journal(
+    output_dir: Path,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    max_bytes: Optional[int] = None,
+) -> Optional[str]:
+    command = f"journalctl -k -b 0 --no-pager --output=short-iso{_time_window(since, until)}"
+    returncode, stderr, size = await _dump(
+        command, output_dir / "kernel" / "journal_kernel.log.gz", "journalctl -k (current boot)", max_bytes
     )
+    if returncode != 0 and size == 0:
+        logger.warning(f"Failed to dump kernel journal: {stderr}")
+        return f"kernel/journal_kernel.log.gz: failed ({stderr.strip() or returncode})"
     return None
 
 
@@ -207,16 +295,26 @@ ls -1 /sys/bus/usb/devices 2>/dev/null
     return None
 
 
-async def prepare_system_logs(output_dir: Path = DEFAULT_OUTPUT_DIR) -> Dict[str, Any]:
-    """Dump host diagnostics into output_dir. Best-effort; does not raise on section failures."""
+async def prepare_system_logs(
+    output_dir: Path = DEFAULT_OUTPUT_DIR,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    max_bytes: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Dump host diagnostics into output_dir. Best-effort; does not raise on section failures.
+
+    Journals are limited to the given time window, and each log is truncated after max_bytes before compression.
+    """
     output_dir = Path(output_dir)
+    # Dumps of previous runs are replaced, including uncompressed ones of older versions
+    await asyncio.to_thread(shutil.rmtree, output_dir, True)
     output_dir.mkdir(parents=True, exist_ok=True)
 
     tasks: List[Awaitable[Optional[str]]] = [
-        dump_journal(output_dir, 0, "current_boot.log"),
-        dump_journal(output_dir, -1, "previous_boot.log"),
-        dump_dmesg(output_dir),
-        dump_kernel_journal(output_dir),
+        dump_journal(output_dir, 0, "current_boot.log.gz", since, until, max_bytes),
+        dump_journal(output_dir, -1, "previous_boot.log.gz", since, until, max_bytes),
+        dump_dmesg(output_dir, max_bytes),
+        dump_kernel_journal(output_dir, since, until, max_bytes),
         dump_lsusb(output_dir),
         dump_snapshot(output_dir),
     ]
@@ -0,0 +1,175 @@
+"""Sizes of log folders, cached per directory and updated from their changes."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import stat
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from commonwealth.utils.inotify import InotifyWatch
+from loguru import logger
+
+# Files directly in the root folder, in the breakdown by subfolder
+ROOT_FILES = "."
+
+
+@dataclass
+class DirectorySizes:
+    """Sizes of the files directly in a directory"""
+
+    mtime_ns: int
+    scanned: float
+    files: Dict[str, int] = field(default_factory=dict)
+    subdirectories: Set[str] = field(default_factory=set)
+    # Total size of the files by extension, computed when needed
+    _by_extension: Optional[Dict[str, int]] = None
+
+    def changed(self) -> None:
+        self._by_extension = None
+
+    def by_extension(self) -> Dict[str, int]:
+        if self._by_extension is None:
+            self._by_extension = {}
+            for name, size in self.files.items():
+                file_type = extension(name)
+                self._by_extension[file_type] = self._by_extension.get(file_type, 0) + size
+        return self._by_extension
+
+
+@dataclass
+class FolderSize:
+    total: int = 0
+    files: int = 0
+    by_subfolder: Dict[str, int] = field(default_factory=dict)
+    by_extension: Dict[str, int] = field(default_factory=dict)
+
+
+def extension(name: str) -> str:
+    """Lowercase extension of a file name, ignoring counters of rotated logs as in ardupilot.log.1"""
+    parts = name.lower().split(".")[1:]
+    while parts and parts[-1].isdigit():
+        parts.pop()
+    return f".{parts[-1]}" if parts else ""
+
+
+class FolderSizeAccountant:
+    """Size of a folder tree, broken down by subfolder and file type.
+
+    Sizes of the files of each directory are kept, and directories are only scanned again when their modification
+    time changes, since files were created, removed or renamed in them. Files that are written to don't change the
+    directory, so the directories are watched with inotify, and only the files that changed are checked again.
+    Directories that can't be watched are scanned again after FALLBACK_TTL_S.
+    """
+
+    FALLBACK_TTL_S = 10.0
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        # Sizes are computed in worker threads, possibly by concurrent requests
+        self._lock = threading.Lock()
+        self._directories: Dict[Path, DirectorySizes] = {}
+        self._watch: Optional[InotifyWatch] = None
+        self._watched: Set[Path] = set()
+
+    async def size(self) -> FolderSize:
+        return await asyncio.to_thread(self.compute)
+
+    def compute(self) -> FolderSize:
+        with self._lock:
+            self._apply_changes()
+            size = FolderSize()
+            visited: Set[Path] = set()
+            pending: List[Path] = [self.root]
+            while pending:
+                directory = pending.pop()
+                sizes = self._directory(directory)
+                if sizes is None:
+                    continue
+                visited.add(directory)
+                subfolder = directory.relative_to(self.root).parts[0] if directory != self.root else ROOT_FILES
+                size.files += len(sizes.files)
+                for file_type, type_size in sizes.by_extension().items():
+                    size.total += type_size
+                    size.by_subfolder[subfolder] = size.by_subfolder.get(subfolder, 0) + type_size
+                    size.by_extension[file_type] = size.by_extension.get(file_type, 0) + type_size
+                pending.extend(directory / name for name in sizes.subdirectories)
+
+            for removed in set(self._directories) - visited:
+                del self._directories[removed]
+            return size
+
+    def _apply_changes(self) -> None:
+        """Update the sizes of files changed since the last computation"""
+        if self._watch is None:
+            return
+        changes = self._watch.read_folder_changes()
+        # Removed directories stop being watched
+        self._watched = self._watch.folders
+        if changes is None:
+            logger.warning(f"Changes under {self.root} were lost, scanning it again")
+            self._directories.clear()
+            return
+        for directory, names in changes.items():
+            sizes = self._directories.get(directory)
+            if sizes is None:
+                continue
+            sizes.changed()
+            for name in names:
+                sizes.files.pop(name, None)
+                sizes.subdirectories.discard(name)
+                try:
+                    entry_stat = os.lstat(directory / name)
+                except OSError:
+                    continue
+                if stat.S_ISDIR(entry_stat.st_mode):
+                    sizes.subdirectories.add(name)
+                elif stat.S_ISREG(entry_stat.st_mode):
+                    sizes.files[name] = entry_stat.st_size
+
+    def _directory(self, directory: Path) -> Optional[DirectorySizes]:
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            return None
+        sizes = self._directories.get(directory)
+        if sizes is not None and sizes.mtime_ns == mtime_ns:
+            if directory in self._watched or time.monotonic() - sizes.scanned < self.FALLBACK_TTL_S:
+                return sizes
+
+        # Watched before scanning, so changes done while scanning are not lost
+        self._add_watch(directory)
+        sizes = DirectorySizes(mtime_ns=mtime_ns, scanned=time.monotonic())
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            sizes.subdirectories.add(entry.name)
+                        elif entry.is_file(follow_symlinks=False):
+                            sizes.files[entry.name] = entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        # Removed while scanned
+                        continue
+        except OSError as error:
+            logger.debug(f"Failed to scan {directory}: {error}")
+            return None
+        self._directories[directory] = sizes
+        return sizes
+
+    def _add_watch(self, directory: Path) -> None:
+        if directory in self._watched:
+            return
+        try:
+            if self._watch is None:
+                self._watch = InotifyWatch(directory)
+            else:
+                self._watch.add_folder(directory)
+            self._watched.add(directory)
+        except OSError as error:
+            # As when running out of inotify watches, sizes are then checked periodically
+            logger.debug(f"Sizes under {directory} will be checked every {self.FALLBACK_TTL_S}s: {error}")
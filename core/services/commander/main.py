@@ -5,11 +5,14 @@ import logging
 import os
 import subprocess
 import time
+from dataclasses import asdict
+from datetime import datetime
 from enum import Enum
 from pathlib import Path
-from typing import Any, AsyncGenerator, Dict
+from typing import Any, AsyncGenerator, Dict, Optional
 
 import appdirs
+from archive import stream_tar_gz
 from commonwealth.utils.apis import GenericErrorHandlingRoute
 from commonwealth.utils.commands import run_command
 from commonwealth.utils.general import delete_everything, delete_everything_stream
@@ -20,13 +23,15 @@ from dump_host_logs import prepare_system_logs
 from fastapi import FastAPI, HTTPException, status
 from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi_versioning import VersionedFastAPI, version
-from filebrowser.filebrowser import filebrowser
+from folder_size import FolderSizeAccountant
 from loguru import logger
 from uvicorn import Config, Server
 
 SERVICE_NAME = "commander"
 LOG_FOLDER_PATH = os.environ.get("BLUEOS_LOG_FOLDER_PATH", "/var/logs/blueos")
 MAVLINK_LOG_FOLDER_PATH = os.environ.get("BLUEOS_MAVLINK_LOG_FOLDER_PATH", "/shortcuts/ardupilot_logs/logs/")
+LOG_FOLDER_SIZE = FolderSizeAccountant(Path(LOG_FOLDER_PATH))
+MAVLINK_LOG_FOLDER_SIZE = FolderSizeAccountant(Path(MAVLINK_LOG_FOLDER_PATH))
 
 logging.basicConfig(handlers=[InterceptHandler()], level=0)
 init_logger(SERVICE_NAME)
@@ -234,35 +239,36 @@ async def remove_mavlink_log_services_stream(i_know_what_i_am_doing: bool = Fals
 @app.get("/services/check_log_folder_size", status_code=status.HTTP_200_OK)
 @version(1, 0)
 async def check_log_folder_size() -> Any:
-    log_path = Path(LOG_FOLDER_PATH)
     # Return the total size in bytes
-    return sum(file.stat().st_size for file in log_path.glob("**/*") if file.is_file())
+    return (await LOG_FOLDER_SIZE.size()).total
+
+
+@app.get("/services/log_folder_usage", status_code=status.HTTP_200_OK)
+@version(1, 0)
+async def log_folder_usage() -> Any:
+    """Size of the log folder in bytes, broken down by subfolder and file type."""
+    return asdict(await LOG_FOLDER_SIZE.size())
 
 
 @app.get("/services/download_system_logs", status_code=status.HTTP_200_OK)
 @version(1, 0)
-async def download_system_logs() -> StreamingResponse:
-    """Dump host diagnostics, then stream filebrowser's on-the-fly zip of system_logs."""
-    try:
-        await prepare_system_logs()
-    except Exception as error:
-        logger.exception(f"Failed to prepare system logs diagnostics: {error}")
+async def download_system_logs(
+    since: Optional[datetime] = None, until: Optional[datetime] = None, max_bytes_per_log: Optional[int] = None
+) -> StreamingResponse:
+    """Dump host diagnostics, then stream a .tar.gz of the system logs built while downloaded.
 
+    Journals are limited to the given time window, as are the other logs by their modification time,
+    and each diagnostics log is truncated after max_bytes_per_log.
+    """
     try:
-        # Fresh token every download so a cached JWT cannot expire mid-stream.
-        # Fail before StreamingResponse so auth errors return 502, not a broken zip.
-        await filebrowser.update_filebrowser_token()
+        await prepare_system_logs(since=since, until=until, max_bytes=max_bytes_per_log)
     except Exception as error:
-        logger.exception(f"Failed to authenticate with filebrowser: {error}")
-        raise HTTPException(
-            status_code=status.HTTP_502_BAD_GATEWAY,
-            detail=f"Failed to authenticate with filebrowser: {error}",
-        ) from error
+        logger.exception(f"Failed to prepare system logs diagnostics: {error}")
 
-    filename = time.strftime("blueos-system-logs-%Y%m%d-%H%M%S.zip", time.gmtime())
+    filename = time.strftime("blueos-system-logs-%Y%m%d-%H%M%S.tar.gz", time.gmtime())
     return StreamingResponse(
-        filebrowser.download_folder("system_root/var/logs/blueos"),
-        media_type="application/zip",
+        stream_tar_gz(Path(LOG_FOLDER_PATH), since.timestamp() if since else None),
+        media_type="application/gzip",
         headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
@@ -270,9 +276,15 @@ async def download_system_logs() -> StreamingResponse:
 @app.get("/services/check_mavlink_log_folder_size", status_code=status.HTTP_200_OK)
 @version(1, 0)
 async def check_mavlink_log_folder_size() -> Any:
-    log_path = Path(MAVLINK_LOG_FOLDER_PATH)
     # Return the total size in bytes
-    return sum(file.stat().st_size for file in log_path.glob("**/*") if file.is_file())
+    return (await MAVLINK_LOG_FOLDER_SIZE.size()).total
+
+
+@app.get("/services/mavlink_log_folder_usage", status_code=status.HTTP_200_OK)
+@version(1, 0)
+async def mavlink_log_folder_usage() -> Any:
+    """Size of the MAVLink log folder in bytes, broken down by subfolder and file type."""
+    return asdict(await MAVLINK_LOG_FOLDER_SIZE.size())
 
 
 @app.get("/environment_variables", status_code=status.HTTP_200_OK)
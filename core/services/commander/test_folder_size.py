@@ -0,0 +1,87 @@
+import os
+import pathlib
+import shutil
+from typing import Any, List, Tuple
+
+import folder_size
+from folder_size import FolderSizeAccountant
+
+
+def legacy_size(path: pathlib.Path) -> int:
+    return sum(file.stat().st_size for file in path.glob("**/*") if file.is_file())
+
+
+def test_folder_size_follows_changes(tmp_path: pathlib.Path) -> None:
+    (tmp_path / "ardupilot" / "2024").mkdir(parents=True)
+    (tmp_path / "ardupilot" / "2024" / "00000001.BIN").write_bytes(b"\0" * 1000)
+    (tmp_path / "ardupilot" / "2024" / "00000002.tlog").write_bytes(b"\0" * 200)
+    (tmp_path / "ardupilot.log.1").write_bytes(b"\0" * 30)
+    accountant = FolderSizeAccountant(tmp_path)
+
+    size = accountant.compute()
+    assert size.total == legacy_size(tmp_path) == 1230 and size.files == 3
+    assert size.by_subfolder == {"ardupilot": 1200, ".": 30}
+    assert size.by_extension == {".bin": 1000, ".tlog": 200, ".log": 30}
+
+    # Files being written, created and removed
+    with open(tmp_path / "ardupilot" / "2024" / "00000001.BIN", "ab") as log:
+        log.write(b"\0" * 24)
+    (tmp_path / "ardupilot" / "2025").mkdir()
+    (tmp_path / "ardupilot" / "2025" / "00000003.BIN").write_bytes(b"\0" * 100)
+    (tmp_path / "ardupilot.log.1").unlink()
+    size = accountant.compute()
+    assert size.total == legacy_size(tmp_path) == 1324
+    assert size.by_subfolder == {"ardupilot": 1324}
+
+    shutil.rmtree(tmp_path / "ardupilot" / "2024")
+    assert accountant.compute().total == legacy_size(tmp_path) == 100
+
+
+def test_folder_size_cache_invalidation(tmp_path: pathlib.Path, mocker: Any) -> None:
+    for folder in range(3):
+        (tmp_path / f"{folder}").mkdir()
+        for index in range(10):
+            (tmp_path / f"{folder}" / f"{index:08}.BIN").write_bytes(b"\0" * index)
+    accountant = FolderSizeAccountant(tmp_path)
+    assert accountant.compute().total == legacy_size(tmp_path) == 135
+    scandir = mocker.spy(os, "scandir")
+
+    def scanned_total() -> Tuple[List[pathlib.Path], int]:
+        """Total size of the folder, and the directories scanned to compute it"""
+        scandir.reset_mock()
+        total = accountant.compute().total
+        return [call.args[0] for call in scandir.call_args_list], total
+
+    # Unchanged directories are not scanned again
+    assert scanned_total() == ([], 135)
+
+    # Written files are updated from their changes alone
+    with open(tmp_path / "2" / "00000009.BIN", "ab") as log:
+        log.write(b"\0")
+    assert scanned_total() == ([], 136)
+
+    # Only directories where files were added or removed are scanned again
+    (tmp_path / "1" / "00000010.BIN").write_bytes(b"\0" * 10)
+    assert scanned_total() == ([tmp_path / "1"], 146)
+    (tmp_path / "0" / "00000009.BIN").unlink()
+    assert scanned_total() == ([tmp_path / "0"], 137)
+    assert legacy_size(tmp_path) == 137
+
+
+def test_folder_size_without_inotify(tmp_path: pathlib.Path, mocker: Any) -> None:
+    mocker.patch.object(folder_size, "InotifyWatch", side_effect=OSError("No inotify watches left"))
+    (tmp_path / "00000001.BIN").write_bytes(b"\0" * 100)
+    accountant = FolderSizeAccountant(tmp_path)
+    assert accountant.compute().total == 100
+
+    # Written files are only seen when the directory is checked again
+    with open(tmp_path / "00000001.BIN", "ab") as log:
+        log.write(b"\0")
+    assert accountant.compute().total == 100
+    accountant.FALLBACK_TTL_S = 0.0
+    assert accountant.compute().total == legacy_size(tmp_path) == 101
+
+    # While added and removed files change the directory
+    accountant.FALLBACK_TTL_S = 10.0
+    (tmp_path / "00000002.BIN").write_bytes(b"\0" * 10)
+    assert accountant.compute().total == legacy_size(tmp_path) == 111
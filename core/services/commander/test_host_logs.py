@@ -0,0 +1,64 @@
+import asyncio
+import gzip
+import io
+import os
+import pathlib
+import tarfile
+
+import pytest
+from archive import stream_tar_gz
+from dump_host_logs import _dump
+
+
+@pytest.mark.asyncio
+async def test_dump_is_compressed_while_produced(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "journal" / "current_boot.log.gz"
+    command = "seq 1 100000 | sed 's/^/line /'; echo warning >&2"
+    returncode, stderr, size = await _dump(command, path, "lines", max_bytes=None)
+    assert returncode == 0 and stderr.endswith("warning\n")
+    assert size == len("".join(f"line {i}\n" for i in range(1, 100001)))
+
+    content = gzip.decompress(path.read_bytes()).decode()
+    assert content.startswith("# lines\n# generated: ")
+    assert "# return_code: 0\n# stderr:\n" in content and "warning\n#====" in content
+    assert content.endswith("line 99999\nline 100000\n")
+    assert path.stat().st_size < size / 4
+    assert os.listdir(path.parent) == [path.name]
+
+    # Outputs are truncated after max_bytes, and failures without output are not written
+    await _dump("yes", path, "endless", max_bytes=1000)
+    assert gzip.decompress(path.read_bytes()).decode().endswith("y\n" * 500 + "\n# truncated after 1000 bytes\n")
+    failed = tmp_path / "failed.log.gz"
+    assert (await _dump("exit 3", failed, "failed", max_bytes=None))[::2] == (3, 0)
+    assert not failed.exists()
+
+
+@pytest.mark.asyncio
+async def test_archive_is_streamed(tmp_path: pathlib.Path) -> None:
+    root = tmp_path / "blueos"
+    (root / "services" / "ardupilot").mkdir(parents=True)
+    (root / "services" / "ardupilot" / "ardupilot.log").write_bytes(os.urandom(2 * 2**20))
+    (root / "old.log").write_text("old")
+    os.utime(root / "old.log", (1000, 1000))
+
+    async def download(since: float | None) -> bytes:
+        return b"".join([chunk async for chunk in stream_tar_gz(root, since)])
+
+    with tarfile.open(fileobj=io.BytesIO(await download(None)), mode="r:gz") as tar:
+        assert sorted(tar.getnames()) == ["blueos/old.log", "blueos/services/ardupilot/ardupilot.log"]
+        member = tar.extractfile("blueos/services/ardupilot/ardupilot.log")
+        assert member is not None
+        assert member.read() == (root / "services" / "ardupilot" / "ardupilot.log").read_bytes()
+
+    with tarfile.open(fileobj=io.BytesIO(await download(2000)), mode="r:gz") as tar:
+        assert tar.getnames() == ["blueos/services/ardupilot/ardupilot.log"]
+
+    # Interrupted downloads stop the worker
+    tasks = asyncio.all_tasks()
+    chunks = stream_tar_gz(root)
+    await chunks.__anext__()
+    await chunks.aclose()
+    workers = asyncio.all_tasks() - tasks
+    assert workers
+    _done, pending = await asyncio.wait(workers, timeout=1)
+    assert not pending
@@ -0,0 +1,278 @@
+import asyncio
+import fcntl
+import json
+import socket
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional
+
+from loguru import logger
+
+SIOCGIFADDR = 0x8915
+
+
+class InternetTestRunningError(RuntimeError):
+    """Another internet test is already running"""
+
+
+class InternetTestCancelledError(RuntimeError):
+    """The internet test was cancelled before finishing"""
+
+
+def interface_of_address(address: Optional[str]) -> Optional[str]:
+    """Name of the interface with the given IPv4 address, or of the default route when no address is given"""
+    if not address:
+        try:
+            with open("/proc/net/route", encoding="utf-8") as routes:
+                for line in routes.readlines()[1:]:
+                    fields = line.split()
+                    # Default route, with the up flag
+                    if fields[1] == "00000000" and int(fields[3], 16) & 1:
+                        return fields[0]
+        except (OSError, IndexError, ValueError):
+            pass
+        return None
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for _index, name in socket.if_nameindex():
+            try:
+                request = struct.pack("256s", name.encode("utf-8")[:15])
+                interface_address = socket.inet_ntoa(fcntl.ioctl(sock.fileno(), SIOCGIFADDR, request)[20:24])
+            except OSError:
+                continue
+            if interface_address == address:
+                return name
+    return None
+
+
+def interface_bytes(interface: Optional[str], counter: str) -> Optional[int]:
+    """Counter of bytes of the interface, as rx_bytes or tx_bytes"""
+    if interface is None:
+        return None
+    try:
+        return int(Path(f"/sys/class/net/{interface}/statistics/{counter}").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+@dataclass
+class InternetTestProgress:
+    """Progress of the running test, updated from its worker thread"""
+
+    stage: str
+    interface: Optional[str]
+    started: float
+    requests_done: int = 0
+    requests_total: int = 0
+    finished: bool = False
+    # Bytes counted by the interface since the test started, including other traffic of it
+    total_bytes: Optional[int] = None
+    bytes_per_second: Optional[float] = None
+
+    def callback(self, _index: int, count: int, start: bool = False, end: bool = False) -> None:
+        self.requests_total = count
+        if end:
+            self.requests_done += 1
+
+    def report(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        return {
+            "type": "internet_test",
+            "stage": self.stage,
+            "interface": self.interface,
+            "finished": self.finished,
+            "elapsed_s": elapsed,
+            "requests_done": self.requests_done,
+            "requests_total": self.requests_total,
+            "total_bytes": self.total_bytes,
+            "bytes_per_second": self.bytes_per_second,
+            "average_bytes_per_second": (
+                self.total_bytes / elapsed if self.total_bytes is not None and elapsed > 0 else None
+            ),
+        }
+
+
+class InternetSpeedTest:
+    """Runs the blocking speedtest.net client in worker threads, one test at a time.
+
+    While a test runs its progress is sampled from the byte counters of the interface used, and reported to
+    subscribers. Results of finished tests are kept as history per interface.
+    """
+
+    REPORT_INTERVAL_S = 0.5
+    # Results kept for each interface
+    MAX_HISTORY = 100
+
+    def __init__(self, history_path: Path, speedtest_factory: Callable[..., Any]) -> None:
+        self.history_path = history_path
+        self._speedtest_factory = speedtest_factory
+        self._speedtest: Optional[Any] = None
+        self._interface: Optional[str] = None
+        self._lock = asyncio.Lock()
+        self._shutdown = threading.Event()
+        self.progress: Optional[InternetTestProgress] = None
+        self._progress_queues: List["asyncio.Queue[Dict[str, Any]]"] = []
+        self._history: Dict[str, List[Dict[str, Any]]] = self._load_history()
+
+    def _load_history(self) -> Dict[str, List[Dict[str, Any]]]:
+        try:
+            history = json.loads(self.history_path.read_text(encoding="utf-8"))
+            if isinstance(history, dict):
+                return history
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as error:
+            logger.warning(f"Failed to load internet test history from {self.history_path}: {error}")
+        return {}
+
+    def _save_history(self, history: Dict[str, List[Dict[str, Any]]]) -> None:
+        self.history_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = self.history_path.with_suffix(".tmp")
+        temp_file.write_text(json.dumps(history), encoding="utf-8")
+        temp_file.replace(self.history_path)
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def results(self) -> Dict[str, Any]:
+        return dict(self._initialized().results.dict())
+
+    def history(self, interface: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+        if interface is None:
+            return self._history
+        return {interface: self._history.get(interface, [])}
+
+    def cancel(self) -> bool:
+        """Stop the running test, returning if there was one"""
+        if not self.running:
+            return False
+        self._shutdown.set()
+        return True
+
+    async def initialize(self) -> None:
+        """Create a client for the default interface, unless a server was searched for in the meantime.
+
+        Runs outside the test guard, as the system may take long to be connected, and tests requested meanwhile
+        should not be refused.
+        """
+        interface = interface_of_address(None)
+        speedtest = await asyncio.to_thread(self._speedtest_factory, secure=True, shutdown_event=self._shutdown)
+        if self._speedtest is None:
+            self._speedtest = speedtest
+            self._interface = interface
+
+    async def best_server(self, interface_addr: Optional[str]) -> Dict[str, Any]:
+        """Find the best server with a new client, bound to the given address, clearing previous results"""
+
+        def find() -> Any:
+            speedtest = self._speedtest_factory(
+                secure=True, source_address=interface_addr, shutdown_event=self._shutdown
+            )
+            speedtest.get_best_server()
+            return speedtest
+
+        interface = interface_of_address(interface_addr)
+        self._speedtest = await self._run("best_server", interface, None, find)
+        self._interface = interface
+        return self.results()
+
+    async def download(self) -> Dict[str, Any]:
+        speedtest = self._initialized()
+        await self._run("download", self._interface, "rx_bytes", lambda: speedtest.download(callback=self._callback))
+        return await self._record("download")
+
+    async def upload(self) -> Dict[str, Any]:
+        speedtest = self._initialized()
+        await self._run(
+            "upload",
+            self._interface,
+            "tx_bytes",
+            lambda: speedtest.upload(callback=self._callback, pre_allocate=False),
+        )
+        return await self._record("upload")
+
+    def _initialized(self) -> Any:
+        if self._speedtest is None:
+            raise RuntimeError("SPEED_TEST not initialized, initialize server search.")
+        return self._speedtest
+
+    def _callback(self, index: int, count: int, start: bool = False, end: bool = False) -> None:
+        if self.progress is not None:
+            self.progress.callback(index, count, start=start, end=end)
+
+    async def _run(self, stage: str, interface: Optional[str], counter: Optional[str], test: Callable[[], Any]) -> Any:
+        if self.running:
+            raise InternetTestRunningError(f"Internet test {self.progress and self.progress.stage} is already running")
+        async with self._lock:
+            self._shutdown.clear()
+            self.progress = InternetTestProgress(stage=stage, interface=interface, started=time.monotonic())
+            sampler = asyncio.create_task(self._sample(self.progress, counter))
+            worker = asyncio.ensure_future(asyncio.to_thread(test))
+            try:
+                result = await asyncio.shield(worker)
+            except asyncio.CancelledError:
+                # Threads can't be cancelled, so the test is stopped and the guard held until its worker returns
+                self._shutdown.set()
+                await asyncio.wait([worker])
+                raise
+            finally:
+                self.progress.finished = True
+                sampler.cancel()
+                self._publish(self.progress.report())
+            if self._shutdown.is_set():
+                raise InternetTestCancelledError(f"Internet test {stage} was cancelled")
+            return result
+
+    async def _sample(self, progress: InternetTestProgress, counter: Optional[str]) -> None:
+        initial = interface_bytes(progress.interface, counter) if counter else None
+        previous, previous_time = initial, time.monotonic()
+        while True:
+            await asyncio.sleep(self.REPORT_INTERVAL_S)
+            current, now = interface_bytes(progress.interface, counter) if counter else None, time.monotonic()
+            if initial is not None and previous is not None and current is not None:
+                progress.total_bytes = current - initial
+                progress.bytes_per_second = (current - previous) / (now - previous_time)
+            previous, previous_time = current, now
+            self._publish(progress.report())
+
+    async def _record(self, stage: str) -> Dict[str, Any]:
+        results = self.results()
+        interface = self._interface or "default"
+        entry = {
+            "stage": stage,
+            "time": time.time(),
+            "download": results.get("download"),
+            "upload": results.get("upload"),
+            "ping": results.get("ping"),
+            "bytes_received": results.get("bytes_received"),
+            "bytes_sent": results.get("bytes_sent"),
+            "server": results.get("server", {}).get("host"),
+        }
+        entries = self._history.setdefault(interface, [])
+        entries.append(entry)
+        del entries[: -self.MAX_HISTORY]
+        try:
+            await asyncio.to_thread(self._save_history, json.loads(json.dumps(self._history)))
+        except OSError as error:
+            logger.warning(f"Failed to save internet test history to {self.history_path}: {error}")
+        return results
+
+    def _publish(self, report: Dict[str, Any]) -> None:
+        for queue in self._progress_queues:
+            queue.put_nowait(report)
+
+    async def reports(self) -> AsyncGenerator[Dict[str, Any], None]:
+        """Stream progress reports of the tests, starting with the latest one"""
+        queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        self._progress_queues.append(queue)
+        try:
+            if self.progress is not None:
+                yield self.progress.report()
+            while True:
+                yield await queue.get()
+        finally:
+            self._progress_queues.remove(queue)
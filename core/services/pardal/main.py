@@ -2,19 +2,21 @@
 
 import argparse
 import asyncio
+import json
 import logging
-import os
-from typing import Generator, Optional
+from pathlib import Path
+from typing import Set
 
 import aiohttp
 from aiohttp import web
 from commonwealth.utils.logs import InterceptHandler, init_logger
 from commonwealth.utils.sentry_config import init_sentry_async
+from internet import InternetSpeedTest, InternetTestRunningError
 from loguru import logger
 from speedtest import Speedtest
+from throughput import ThroughputEngine, ThroughputTestNotFoundError
 
 SERVICE_NAME = "pardal"
-SPEED_TEST: Optional[Speedtest] = None
 
 parser = argparse.ArgumentParser(description="Pardal, web service to help with speed and latency tests")
 parser.add_argument("-p", "--port", help="Port to run web server", action="store_true", default=9120)
@@ -28,51 +30,90 @@ logger.info("Starting Pardal")
 
 routes = web.RouteTableDef()
 
-try:
-    SPEED_TEST = Speedtest(secure=True)
-except Exception:
-    # When starting, the system may not be connected to the internet
-    pass
+SPEED_TEST = InternetSpeedTest(Path.home() / ".config" / SERVICE_NAME / "internet_tests.json", Speedtest)
+THROUGHPUT = ThroughputEngine()
 
 
-def generate_random_data(size: int, chunk_size: int = 1024 * 1024) -> Generator[bytes, None, None]:
-    remaining_size = size
-    while remaining_size > 0:
-        yield os.urandom(min(chunk_size, remaining_size))
-        remaining_size -= chunk_size
+async def send_throughput_reports(websocket: web.WebSocketResponse, test_id: str) -> None:
+    try:
+        async for report in THROUGHPUT.reports(test_id):
+            await websocket.send_str(json.dumps(report))
+    except ThroughputTestNotFoundError as error:
+        await websocket.send_str(
+            json.dumps({"type": "error", "status": 404, "test_id": test_id, "error": error.args[0]})
+        )
+
+
+async def send_internet_test_reports(websocket: web.WebSocketResponse) -> None:
+    async for report in SPEED_TEST.reports():
+        await websocket.send_str(json.dumps(report))
 
 
 async def websocket_echo(request: web.Request) -> web.WebSocketResponse:
+    """
+    Echo text messages, for latency tests.
+    Messages as {"subscribe": test_id} are answered with periodic reports of the given throughput test instead,
+    or with an error of status 404 if none of its streams was started yet,
+    and {"subscribe": "internet_test"} with the progress of internet speed tests.
+    """
     websocket = web.WebSocketResponse()
     await websocket.prepare(request)
 
-    async for message in websocket:
-        if message.type == aiohttp.WSMsgType.TEXT:
+    report_tasks: Set["asyncio.Task[None]"] = set()
+    try:
+        async for message in websocket:
+            if message.type != aiohttp.WSMsgType.TEXT:
+                continue
+            try:
+                command = json.loads(message.data)
+            except ValueError:
+                command = None
+            if isinstance(command, dict) and "subscribe" in command:
+                if command["subscribe"] == "internet_test":
+                    task = asyncio.create_task(send_internet_test_reports(websocket))
+                else:
+                    task = asyncio.create_task(send_throughput_reports(websocket, str(command["subscribe"])))
+                report_tasks.add(task)
+                task.add_done_callback(report_tasks.discard)
+                continue
             await websocket.send_str(message.data)
+    finally:
+        for task in report_tasks:
+            task.cancel()
 
     return websocket
 
 
 async def get_file(request: web.Request) -> web.StreamResponse:
+    """
+    Download test payload, of the given size or for the given duration in seconds.
+    Parallel streams with the same test_id are measured together.
+    """
     size = int(request.rel_url.query.get("size", 100 * (2**20)))  # 100MB by default
+    duration = request.rel_url.query.get("duration")
+    return await THROUGHPUT.send(request, size, float(duration) if duration else None)
 
-    response = web.StreamResponse(status=200)
-    response.headers["Content-Length"] = str(size)
-    await response.prepare(request)
 
-    for data_chunk in generate_random_data(size):
-        await response.write(bytes(data_chunk))
+async def post_file(request: web.Request) -> web.Response:
+    """
+    Upload test, measured together with other streams of the same test_id.
+    """
+    return await THROUGHPUT.receive(request)
+
 
-    await response.write_eof()
-    return response
+# pylint: disable=unused-argument
+async def throughput_tests(request: web.Request) -> web.Response:
+    """
+    Server side results of the latest throughput tests.
+    """
+    return web.json_response(THROUGHPUT.tests())
 
 
-async def post_file(request: web.Request) -> web.Response:
-    while True:
-        chunk = await request.content.readany()
-        if not chunk:
-            break
-    return web.Response(status=200)
+def internet_test_error(error: RuntimeError) -> web.HTTPException:
+    """Tests already running are a conflict, while cancelled or not initialized ones are unavailable"""
+    if isinstance(error, InternetTestRunningError):
+        return web.HTTPConflict(text=str(error))
+    return web.HTTPServiceUnavailable(text=str(error))
 
 
 @routes.get("/internet_best_server")
@@ -81,14 +122,11 @@ async def internet_best_server(request: web.Request) -> web.Response:
     Check internet best server for test from BlueOS.
     """
     # Since we are finding a new server, clear previous results
-    # pylint: disable=global-statement
-
     interface_addr = request.query.get("interface_addr") or None
-
-    global SPEED_TEST
-    SPEED_TEST = Speedtest(secure=True, source_address=interface_addr)
-    SPEED_TEST.get_best_server()
-    return web.json_response(SPEED_TEST.results.dict())
+    try:
+        return web.json_response(await SPEED_TEST.best_server(interface_addr))
+    except RuntimeError as error:
+        raise internet_test_error(error) from error
 
 
 # pylint: disable=unused-argument
@@ -97,10 +135,10 @@ async def internet_download_speed(request: web.Request) -> web.Response:
     """
     Check internet download speed test from BlueOS.
     """
-    if not SPEED_TEST:
-        raise RuntimeError("SPEED_TEST not initialized, initialize server search.")
-    SPEED_TEST.download()
-    return web.json_response(SPEED_TEST.results.dict())
+    try:
+        return web.json_response(await SPEED_TEST.download())
+    except RuntimeError as error:
+        raise internet_test_error(error) from error
 
 
 # pylint: disable=unused-argument
@@ -109,10 +147,36 @@ async def internet_upload_speed(request: web.Request) -> web.Response:
     """
     Check internet upload speed test from BlueOS.
     """
-    if not SPEED_TEST:
-        raise RuntimeError("SPEED_TEST not initialized, initialize server search.")
-    SPEED_TEST.upload(pre_allocate=False)
-    return web.json_response(SPEED_TEST.results.dict())
+    try:
+        return web.json_response(await SPEED_TEST.upload())
+    except RuntimeError as error:
+        raise internet_test_error(error) from error
+
+
+# pylint: disable=unused-argument
+@routes.post("/internet_test_cancel")
+async def internet_test_cancel(request: web.Request) -> web.Response:
+    """
+    Cancel the running internet speed test.
+    """
+    return web.json_response({"cancelled": SPEED_TEST.cancel()})
+
+
+# pylint: disable=unused-argument
+@routes.get("/internet_test_progress")
+async def internet_test_progress(request: web.Request) -> web.Response:
+    """
+    Progress of the running internet speed test, or of the latest one.
+    """
+    return web.json_response(SPEED_TEST.progress.report() if SPEED_TEST.progress else None)
+
+
+@routes.get("/internet_test_history")
+async def internet_test_history(request: web.Request) -> web.Response:
+    """
+    Results of previous internet speed tests, per interface.
+    """
+    return web.json_response(SPEED_TEST.history(request.query.get("interface") or None))
 
 
 # pylint: disable=unused-argument
@@ -121,9 +185,10 @@ async def internet_test_previous_result(request: web.Request) -> web.Response:
     """
     Return previous result of internet speed test.
     """
-    if not SPEED_TEST:
-        raise RuntimeError("SPEED_TEST not initialized, initialize server search.")
-    return web.json_response(SPEED_TEST.results.dict())
+    try:
+        return web.json_response(SPEED_TEST.results())
+    except RuntimeError as error:
+        raise internet_test_error(error) from error
 
 
 # pylint: disable=unused-argument
@@ -138,8 +203,16 @@ async def root(request: web.Request) -> web.Response:
     return web.Response(text=html_content, content_type="text/html")
 
 
+def log_initialization_failure(task: "asyncio.Task[None]") -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Internet test client not initialized: {task.exception()}")
+
+
 async def main() -> None:
     await init_sentry_async(SERVICE_NAME)
+    # When starting, the system may not be connected to the internet, so it's not waited for
+    initialization = asyncio.create_task(SPEED_TEST.initialize())
+    initialization.add_done_callback(log_initialization_failure)
 
     app = web.Application()
     app.client_max_size = 2 * (2**30)  # 2 GBs
@@ -148,6 +221,7 @@ async def main() -> None:
     app.router.add_get("/", root, name="root")
     app.router.add_get("/get_file", get_file, name="get_file")
     app.router.add_post("/post_file", post_file, name="post_file")
+    app.router.add_get("/throughput_tests", throughput_tests, name="throughput_tests")
 
     runner = web.AppRunner(app)
     await runner.setup()
@@ -0,0 +1,127 @@
+import asyncio
+import pathlib
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import pytest
+from internet import (
+    InternetSpeedTest,
+    InternetTestCancelledError,
+    InternetTestRunningError,
+)
+
+
+class FakeResults:
+    def __init__(self) -> None:
+        self.download = 0.0
+        self.upload = 0.0
+
+    def dict(self) -> Dict[str, Any]:
+        return {"download": self.download, "upload": self.upload, "ping": 10.0, "server": {"host": "fake:8080"}}
+
+
+class FakeSpeedtest:
+    """Blocking client taking REQUESTS * REQUEST_S seconds for each test, stopping on its shutdown event"""
+
+    REQUESTS = 10
+    REQUEST_S = 0.05
+
+    def __init__(self, shutdown_event: threading.Event, **_kwargs: Any) -> None:
+        self.shutdown_event = shutdown_event
+        self.results = FakeResults()
+
+    def get_best_server(self) -> None:
+        time.sleep(self.REQUEST_S)
+
+    def download(self, callback: Callable[..., None]) -> float:
+        for index in range(self.REQUESTS):
+            if self.shutdown_event.is_set():
+                break
+            time.sleep(self.REQUEST_S)
+            callback(index, self.REQUESTS, end=True)
+        self.results.download = 1e6
+        return self.results.download
+
+    def upload(self, callback: Callable[..., None], pre_allocate: bool) -> float:
+        self.download(callback)
+        self.results.upload = 5e5
+        return self.results.upload
+
+
+@pytest.mark.asyncio
+async def test_internet_speed_test(tmp_path: pathlib.Path) -> None:
+    history_path = tmp_path / "internet_tests.json"
+
+    speed_test = InternetSpeedTest(history_path, FakeSpeedtest)
+    speed_test.REPORT_INTERVAL_S = 0.1
+    with pytest.raises(RuntimeError):
+        await speed_test.download()
+    await speed_test.best_server(None)
+
+    reports: List[Dict[str, Any]] = []
+
+    async def collect_reports() -> None:
+        async for report in speed_test.reports():
+            reports.append(report)
+            if report["finished"] and report["stage"] == "download":
+                return
+
+    reports_task = asyncio.create_task(collect_reports())
+    download = asyncio.create_task(speed_test.download())
+    await asyncio.sleep(0.1)
+    # Only one test runs at a time
+    with pytest.raises(InternetTestRunningError):
+        await speed_test.upload()
+
+    # The event loop keeps running while the test does
+    longest_sleep = 0.0
+    while not download.done():
+        start = time.monotonic()
+        await asyncio.sleep(0.01)
+        longest_sleep = max(longest_sleep, time.monotonic() - start)
+    assert longest_sleep < 0.1
+    assert (await download)["download"] == 1e6
+    await asyncio.wait_for(reports_task, 1)
+    assert len(reports) > 2 and reports[-1]["stage"] == "download"
+    assert reports[-1]["requests_done"] == FakeSpeedtest.REQUESTS
+
+    # Cancelled tests stop their worker, and are not recorded
+    upload = asyncio.create_task(speed_test.upload())
+    await asyncio.sleep(0.1)
+    assert speed_test.cancel()
+    with pytest.raises(InternetTestCancelledError):
+        await asyncio.wait_for(upload, 0.2)
+    assert not speed_test.running and not speed_test.cancel()
+    await speed_test.upload()
+
+    history: Optional[Dict[str, List[Dict[str, Any]]]] = InternetSpeedTest(history_path, FakeSpeedtest).history()
+    assert history is not None and len(history) == 1
+    assert [entry["stage"] for entry in next(iter(history.values()))] == ["download", "upload"]
+
+
+@pytest.mark.asyncio
+async def test_internet_speed_test_initialization(tmp_path: pathlib.Path) -> None:
+    created: List[FakeSpeedtest] = []
+
+    def slow_factory(**kwargs: Any) -> FakeSpeedtest:
+        if not created:
+            # The default client takes long to be created, as when the system is not connected yet
+            time.sleep(0.3)
+        created.append(FakeSpeedtest(**kwargs))
+        return created[-1]
+
+    speed_test = InternetSpeedTest(tmp_path / "internet_tests.json", slow_factory)
+    initialization = asyncio.create_task(speed_test.initialize())
+    await asyncio.sleep(0.1)
+    # Tests are not refused while initializing, and their server is kept
+    await speed_test.best_server(None)
+    await initialization
+    assert len(created) == 2
+    assert speed_test._speedtest is created[1]
+
+    def failing_factory(**_kwargs: Any) -> FakeSpeedtest:
+        raise OSError("Network is unreachable")
+
+    with pytest.raises(OSError):
+        await InternetSpeedTest(tmp_path / "internet_tests.json", failing_factory).initialize()
@@ -0,0 +1,117 @@
+import asyncio
+from typing import Any, Dict, List
+
+import aiohttp
+import pytest
+from aiohttp import web
+from throughput import ThroughputEngine, ThroughputTestNotFoundError
+
+
+@pytest.mark.asyncio
+async def test_throughput_engine() -> None:
+    engine = ThroughputEngine()
+
+    async def get_file(request: web.Request) -> web.StreamResponse:
+        duration = request.query.get("duration")
+        return await engine.send(request, int(request.query.get("size", 0)), float(duration) if duration else None)
+
+    async def post_file(request: web.Request) -> web.Response:
+        return await engine.receive(request)
+
+    app = web.Application()
+    app.router.add_get("/get_file", get_file)
+    app.router.add_post("/post_file", post_file)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host="127.0.0.1", port=0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore
+    url = f"http://127.0.0.1:{port}"
+
+    reports: List[Dict[str, Any]] = []
+
+    async def collect_reports() -> None:
+        async for report in engine.reports("parallel"):
+            reports.append(report)
+
+    async with aiohttp.ClientSession() as session:
+
+        async def download(query: str) -> int:
+            async with session.get(f"{url}/get_file?{query}") as response:
+                return len(await response.read())
+
+        # Sized downloads keep working as before
+        assert await download(f"size={5 * 2**20 + 1}") == 5 * 2**20 + 1
+
+        # Parallel streams running for a given duration are measured together, and followed once started
+        downloads = asyncio.gather(*[download("duration=0.6&test_id=parallel") for _ in range(3)])
+        while "parallel" not in [test["test_id"] for test in engine.tests()]:
+            await asyncio.sleep(0.01)
+        reports_task = asyncio.create_task(collect_reports())
+        sizes = await downloads
+        await asyncio.wait_for(reports_task, 2)
+
+        async with session.post(f"{url}/post_file?test_id=upload", data=b"\0" * 3 * 2**20) as response:
+            assert response.status == 200
+
+    final = reports[-1]
+    assert final["finished"] and final["direction"] == "download"
+    assert final["total_bytes"] == sum(sizes)
+    assert 0.5 < final["elapsed_s"] < 1.5
+    assert final["bytes_per_second"] > 0
+    assert final["rtt_ms"] is not None
+    assert any(report["streams"] == 3 for report in reports)
+    assert engine.test("upload").total_bytes == 3 * 2**20
+    await runner.cleanup()
+
+
+def test_throughput_test_reused() -> None:
+    engine = ThroughputEngine()
+    test = engine.test("reused", "upload")
+    test.start_stream(None)
+    test.add_bytes(100)
+    test.rtt_samples.append(10.0)
+    test.stop_stream(None)
+    assert test.report()["finished"]
+
+    # Starting a stream after the test finished starts it over
+    test.start_stream(None)
+    test.add_bytes(30)
+    report = test.report()
+    assert not report["finished"]
+    assert report["total_bytes"] == 30
+    assert report["rtt_ms"] is None
+    assert report["elapsed_s"] < 0.5
+
+    # While streams joining a running test add to it
+    test.start_stream(None)
+    test.add_bytes(20)
+    assert test.report()["total_bytes"] == 50
+
+
+@pytest.mark.asyncio
+async def test_throughput_reports_subscribers() -> None:
+    engine = ThroughputEngine()
+    # Reports only come from updates of the test
+    engine.REPORT_INTERVAL_S = 60
+    with pytest.raises(ThroughputTestNotFoundError):
+        await engine.reports("unknown").__anext__()
+    assert engine.tests() == []
+
+    test = engine.test("shared", "download")
+    test.start_stream(None)
+    test.start_stream(None)
+    first, second = engine.reports("shared"), engine.reports("shared")
+    first_report, second_report = asyncio.ensure_future(first.__anext__()), asyncio.ensure_future(second.__anext__())
+    await asyncio.sleep(0)
+    test.stop_stream(None)
+    assert (await first_report)["streams"] == 1 and (await second_report)["streams"] == 1
+
+    # The first client follows the test while the second one is still sending its report
+    first_report = asyncio.ensure_future(first.__anext__())
+    await asyncio.sleep(0)
+    test.stop_stream(None)
+    assert (await first_report)["finished"]
+    assert (await asyncio.wait_for(second.__anext__(), 1))["finished"]
+    assert [report async for report in first] == [] and [report async for report in second] == []
+    assert not test.subscribers
@@ -0,0 +1,227 @@
+import asyncio
+import os
+import socket
+import struct
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, Deque, Dict, List, Optional, Set
+
+from aiohttp import web
+from loguru import logger
+
+# struct tcp_info from linux/tcp.h: 8 u8 fields followed by u32 fields, where tcpi_rtt, tcpi_rttvar and
+# tcpi_total_retrans are the 16th, 17th and 24th ones
+TCP_INFO_FORMAT = struct.Struct("8B24I")
+TCP_INFO_RTT = 8 + 15
+TCP_INFO_RTTVAR = 8 + 16
+TCP_INFO_TOTAL_RETRANS = 8 + 23
+
+
+@dataclass
+class RttSample:
+    rtt_ms: float
+    rttvar_ms: float
+    retransmissions: int
+
+
+def sample_rtt(transport: Optional[asyncio.BaseTransport]) -> Optional[RttSample]:
+    """Smoothed RTT measured by the kernel for the TCP connection of the given transport"""
+    if transport is None:
+        return None
+    sock = transport.get_extra_info("socket")
+    if sock is None or sock.family not in (socket.AF_INET, socket.AF_INET6):
+        return None
+    try:
+        info = TCP_INFO_FORMAT.unpack(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, TCP_INFO_FORMAT.size))
+    except (OSError, struct.error):
+        return None
+    return RttSample(
+        rtt_ms=info[TCP_INFO_RTT] / 1000,
+        rttvar_ms=info[TCP_INFO_RTTVAR] / 1000,
+        retransmissions=info[TCP_INFO_TOTAL_RETRANS],
+    )
+
+
+class ThroughputTestNotFoundError(KeyError):
+    """No stream of the throughput test was started"""
+
+
+@dataclass
+class ThroughputTest:
+    """Bytes transferred by all streams of a test, with RTT samples of their connections"""
+
+    test_id: str
+    direction: Optional[str] = None
+    started: float = field(default_factory=time.monotonic)
+    finished: Optional[float] = None
+    total_bytes: int = 0
+    streams: int = 0
+    transports: Set[asyncio.BaseTransport] = field(default_factory=set)
+    retransmissions: Dict[int, int] = field(default_factory=dict)
+    rtt_samples: Deque[float] = field(default_factory=lambda: deque(maxlen=100))
+    # Woken up when a stream stops, one for each client following the test
+    subscribers: Set[asyncio.Event] = field(default_factory=set)
+
+    def start_stream(self, transport: Optional[asyncio.BaseTransport]) -> None:
+        # Tests start with their first stream, and start over if their ids are reused after they finished
+        if self.streams == 0 and (self.total_bytes == 0 or self.finished is not None):
+            self.started = time.monotonic()
+            self.total_bytes = 0
+            self.retransmissions.clear()
+            self.rtt_samples.clear()
+        self.streams += 1
+        self.finished = None
+        if transport is not None:
+            self.transports.add(transport)
+
+    def stop_stream(self, transport: Optional[asyncio.BaseTransport]) -> None:
+        self.sample_rtt()
+        self.streams -= 1
+        if transport is not None:
+            self.transports.discard(transport)
+        if self.streams == 0:
+            self.finished = time.monotonic()
+        for subscriber in self.subscribers:
+            subscriber.set()
+
+    def add_bytes(self, size: int) -> None:
+        self.total_bytes += size
+
+    def sample_rtt(self) -> None:
+        for transport in self.transports:
+            sample = sample_rtt(transport)
+            if sample is not None:
+                self.rtt_samples.append(sample.rtt_ms)
+                self.retransmissions[id(transport)] = sample.retransmissions
+
+    def report(self, previous_bytes: int = 0, interval_s: float = 0.0) -> Dict[str, Any]:
+        elapsed = (self.finished or time.monotonic()) - self.started
+        samples = list(self.rtt_samples)
+        # Mean absolute difference between consecutive samples
+        jitter = sum(abs(current - last) for last, current in zip(samples, samples[1:])) / max(1, len(samples) - 1)
+        return {
+            "type": "throughput",
+            "test_id": self.test_id,
+            "direction": self.direction,
+            "streams": self.streams,
+            "finished": self.finished is not None,
+            "elapsed_s": elapsed,
+            "total_bytes": self.total_bytes,
+            "bytes_per_second": self.total_bytes / elapsed if elapsed > 0 else 0.0,
+            "current_bytes_per_second": (self.total_bytes - previous_bytes) / interval_s if interval_s > 0 else None,
+            "rtt_ms": samples[-1] if samples else None,
+            "rtt_samples_ms": samples[-10:],
+            "jitter_ms": jitter if len(samples) > 1 else None,
+            "retransmissions": sum(self.retransmissions.values()),
+        }
+
+
+class ThroughputEngine:
+    """Serves and receives the payload of network throughput tests, measuring them on the server side.
+
+    The payload is an incompressible buffer generated once, sent as slices of it, so the CPU cost of each test is
+    the one of the network stack alone. Many streams can share the same test, to saturate links with parallel
+    connections, and their transfers are reported together.
+    """
+
+    BUFFER_SIZE = 4 * 2**20
+    CHUNK_SIZE = 2**20
+    REPORT_INTERVAL_S = 0.5
+    # Finished tests kept to be reported
+    MAX_TESTS = 16
+
+    def __init__(self) -> None:
+        self._buffer: Optional[memoryview] = None
+        self._tests: OrderedDict[str, ThroughputTest] = OrderedDict()
+
+    @property
+    def payload(self) -> memoryview:
+        if self._buffer is None:
+            self._buffer = memoryview(os.urandom(self.BUFFER_SIZE))
+        return self._buffer
+
+    def test(self, test_id: Optional[str], direction: Optional[str] = None) -> ThroughputTest:
+        """Test with the given id, created if needed. Requests without one are a test by themselves."""
+        test_id = test_id or f"{direction}-{time.monotonic_ns()}"
+        if test_id not in self._tests:
+            self._tests[test_id] = ThroughputTest(test_id)
+            while len(self._tests) > self.MAX_TESTS:
+                self._tests.popitem(last=False)
+        test = self._tests[test_id]
+        test.direction = test.direction or direction
+        return test
+
+    def tests(self) -> List[Dict[str, Any]]:
+        return [test.report() for test in self._tests.values()]
+
+    async def send(self, request: web.Request, size: Optional[int], duration_s: Optional[float]) -> web.StreamResponse:
+        """Send the payload until size bytes were sent, or for duration_s seconds"""
+        test = self.test(request.query.get("test_id"), "download")
+        response = web.StreamResponse(status=200)
+        if duration_s is None:
+            response.content_length = size
+        await response.prepare(request)
+
+        test.start_stream(request.transport)
+        try:
+            payload = self.payload
+            deadline = time.monotonic() + duration_s if duration_s is not None else None
+            remaining = size if deadline is None else None
+            offset = 0
+            while True:
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                chunk_size = self.CHUNK_SIZE if remaining is None else min(self.CHUNK_SIZE, remaining)
+                if chunk_size <= 0:
+                    break
+                chunk = payload[offset : offset + chunk_size]
+                offset = (offset + len(chunk)) % len(payload)
+                await response.write(chunk)
+                test.add_bytes(len(chunk))
+                if remaining is not None:
+                    remaining -= len(chunk)
+            await response.write_eof()
+        except (ConnectionResetError, asyncio.CancelledError):
+            logger.debug(f"Download of test {test.test_id} interrupted after {test.total_bytes} bytes")
+            raise
+        finally:
+            test.stop_stream(request.transport)
+        return response
+
+    async def receive(self, request: web.Request) -> web.Response:
+        test = self.test(request.query.get("test_id"), "upload")
+        test.start_stream(request.transport)
+        try:
+            async for chunk in request.content.iter_any():
+                test.add_bytes(len(chunk))
+        finally:
+            test.stop_stream(request.transport)
+        return web.Response(status=200)
+
+    async def reports(self, test_id: str) -> AsyncGenerator[Dict[str, Any], None]:
+        """Report the given test periodically while it runs, finishing with its final report.
+        Raises ThroughputTestNotFoundError if no stream of the test was started."""
+        if test_id not in self._tests:
+            raise ThroughputTestNotFoundError(f"Throughput test '{test_id}' not found.")
+        test = self._tests[test_id]
+        updated = asyncio.Event()
+        test.subscribers.add(updated)
+        try:
+            previous_bytes, previous_time = test.total_bytes, time.monotonic()
+            while True:
+                try:
+                    await asyncio.wait_for(updated.wait(), self.REPORT_INTERVAL_S)
+                except asyncio.TimeoutError:
+                    pass
+                # Cleared once woken up, so updates while the report is being sent are not missed
+                updated.clear()
+                test.sample_rtt()
+                finished = test.finished is not None
+                now = time.monotonic()
+                yield test.report(previous_bytes, now - previous_time)
+                previous_bytes, previous_time = test.total_bytes, now
+                if finished:
+                    return
+        finally:
+            test.subscribers.discard(updated)
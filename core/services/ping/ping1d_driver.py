@@ -1,8 +1,6 @@
 import asyncio
 from pathlib import Path
 
-from bridges.bridges import Bridge
-from bridges.serialhelper import Baudrate
 from commonwealth.settings.manager import PydanticManager
 from loguru import logger
 from ping1d_mavlink import Ping1DMavlinkDriver
@@ -32,23 +30,27 @@ class Ping1DDriver(PingDriver):
         (our_settings,) = [ping1d for ping1d in self.manager.settings.ping1d_specs if ping1d.port == connection_info]
         self.driver_status.mavlink_driver_enabled = our_settings.mavlink_enabled
         self.mavlink_driver = Ping1DMavlinkDriver(our_settings.mavlink_enabled)
+        self.driver_status.mavlink_driver_stats = self.mavlink_driver.stats
 
     async def start(self) -> None:
         await super().start()
         # self.port shouldn't be None, as we force port to Int in the constructor
         # the following assert makes mypy happy
         assert self.port is not None, "Ping1d port is None."
-        while True:
+        # Until the driver is stopped
+        while self.ping.driver is self:
             try:
                 logger.info("trying to start mavlink driver")
                 await self.mavlink_driver.drive(self.port)
             except Exception as error:
                 logger.warning(error)
                 assert self.bridge is not None
-                self.bridge.stop()
+                if self.ping.driver is not self:
+                    break
+                await self.bridge.stop()
                 await asyncio.sleep(5)
-                baudrate = Baudrate.b115200 if self.baud is None else self.baud
-                self.bridge = Bridge(self.ping.port, baudrate, "0.0.0.0", 0, self.port, automatic_disconnect=False)
+                if self.ping.driver is self:
+                    await self.bridge.start()
 
     def save_settings(self) -> None:
         self.manager.load()  # re-load as other sensors could have changed it
@@ -2,13 +2,17 @@
     Send results to an autopilot via MAVLink over UDP, for use as a rangefinder.
     Don't request if we are already getting data from device (e.g. there is another client
     (pingviewer gui) making requests to the proxy).
+
+    Datagrams from the device are handled as they arrive, and each distance is sent right away as a binary
+    MAVLink DISTANCE_SENSOR message to a router endpoint shared by all rangefinders.
 """
 
 import asyncio
 import socket
+import struct
 import time
-from select import select
-from typing import Any, Dict
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
 
 from brping import (
     PING1D_DISTANCE,
@@ -16,69 +20,249 @@ from brping import (
     PING1D_PROFILE,
     PING1D_SET_PING_INTERVAL,
     PingMessage,
-    PingParser,
 )
 from commonwealth.mavlink_comm.MavlinkComm import MavlinkMessenger
 from loguru import logger
+from typedefs import MavlinkDriverStats
 
 ## The minimum interval time for distance updates to the autopilot
-PING_INTERVAL_S = 0.1
+PING_INTERVAL_S = 0.05
+
+## Router endpoint receiving the DISTANCE_SENSOR messages, created by the autopilot manager
+MAVLINK_ENDPOINT = ("127.0.0.1", 14661)
+
+## Messages that have the current distance measurement in the payload
+DISTANCE_MESSAGES = {PING1D_DISTANCE, PING1D_DISTANCE_SIMPLE, PING1D_PROFILE}
+
+# start "BR", payload length, message id, source and destination device ids
+PING_HEADER = struct.Struct("<2sHHBB")
+PING_CHECKSUM = struct.Struct("<H")
+
+# Weight of new samples in the averages of the statistics
+SMOOTHING = 0.1
+
+
+@dataclass
+class PingFrame:
+    message_id: int
+    src_device_id: int
+    payload: bytes
+
+
+class PingFrameScanner:
+    """Splits a stream of bytes into checksum-verified ping protocol frames.
+
+    Frame starts are searched with bytes.find and checksums are summed over whole frames, instead of going through
+    PingParser byte by byte, so the Python work is per frame and not per byte.
+    """
+
+    # Ping1D profiles are the largest messages, with 200 points
+    MAX_PAYLOAD_LENGTH = 1024
+
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+        self.parsed = 0
+        self.errors = 0
+
+    def feed(self, data: bytes) -> List[PingFrame]:
+        buffer = self.buffer
+        buffer += data
+        frames = []
+        start = 0
+        while True:
+            start = buffer.find(b"BR", start)
+            if start < 0:
+                # A trailing "B" may be the start of the next frame
+                start = len(buffer) - 1 if buffer.endswith(b"B") else len(buffer)
+                break
+            if len(buffer) - start < PING_HEADER.size:
+                break
+            _, payload_length, message_id, src_device_id, _ = PING_HEADER.unpack_from(buffer, start)
+            if payload_length > self.MAX_PAYLOAD_LENGTH:
+                self.errors += 1
+                start += 1
+                continue
+            payload_start = start + PING_HEADER.size
+            end = payload_start + payload_length
+            if len(buffer) < end + PING_CHECKSUM.size:
+                break
+            (checksum,) = PING_CHECKSUM.unpack_from(buffer, end)
+            if sum(buffer[start:end]) & 0xFFFF != checksum:
+                self.errors += 1
+                start += 1
+                continue
+            self.parsed += 1
+            frames.append(PingFrame(message_id, src_device_id, bytes(buffer[payload_start:end])))
+            start = end + PING_CHECKSUM.size
+        del buffer[:start]
+        return frames
+
+
+def parse_distance(frame: PingFrame) -> Tuple[int, int]:
+    """Distance in mm and confidence in % of a distance message"""
+    if frame.message_id == PING1D_DISTANCE_SIMPLE:
+        return struct.unpack_from("<IB", frame.payload)  # type: ignore[return-value]
+    return struct.unpack_from("<IH", frame.payload)  # type: ignore[return-value]
+
+
+def x25_crc(data: bytes, crc: int = 0xFFFF) -> int:
+    """CRC-16/MCRF4XX checksum used by MAVLink"""
+    for byte in data:
+        tmp = byte ^ (crc & 0xFF)
+        tmp = (tmp ^ (tmp << 4)) & 0xFF
+        crc = ((crc >> 8) ^ (tmp << 8) ^ (tmp << 3) ^ (tmp >> 4)) & 0xFFFF
+    return crc
+
+
+class MavlinkDistanceSender:
+    """Sends DISTANCE_SENSOR messages as MAVLink 2 datagrams to a router endpoint.
+
+    A single socket is used for all rangefinders, as router UDP server endpoints send their messages to one client.
+    Messages from the router are never read, the kernel drops them once the small receive buffer is full.
+    Messages are sent with the system id of the vehicle, detected in the background through mavlink2rest.
+    """
+
+    MSG_ID_DISTANCE_SENSOR = 132
+    CRC_EXTRA_DISTANCE_SENSOR = 85
+    # time_boot_ms, min, max and current distance, type, id, orientation, covariance,
+    # and the extensions horizontal and vertical fov, quaternion and signal quality
+    PAYLOAD = struct.Struct("<IHHHBBBBff4fB")
+    MAV_DISTANCE_SENSOR_ULTRASOUND = 1
+    MAV_SENSOR_ROTATION_PITCH_270 = 25
+    # The vehicle system id may be changed while running
+    SYSTEM_ID_INTERVAL_S = 10.0
+
+    def __init__(self, address: Tuple[str, int] = MAVLINK_ENDPOINT) -> None:
+        self.address = address
+        self.messenger = MavlinkMessenger()
+        self.system_id = self.messenger.system_id
+        self.component_id = self.messenger.component_id
+        self.sequence = 0
+        self.boot_time = time.monotonic()
+        self._socket: Optional[socket.socket] = None
+        self._detection: Optional["asyncio.Task[None]"] = None
+        self._detected_at = -self.SYSTEM_ID_INTERVAL_S
+
+    def update_system_id(self) -> None:
+        """Detect the vehicle system id in the background, at most every SYSTEM_ID_INTERVAL_S"""
+        now = time.monotonic()
+        if self._detection is not None or now - self._detected_at < self.SYSTEM_ID_INTERVAL_S:
+            return
+        self._detected_at = now
+        self._detection = asyncio.create_task(self._detect_system_id())
+
+    async def _detect_system_id(self) -> None:
+        try:
+            system_id = await self.messenger.get_most_recent_vehicle_id()
+            if system_id != self.system_id:
+                logger.info(f"Sending distances with the vehicle system id {system_id}.")
+                self.system_id = system_id
+        except Exception as error:
+            logger.debug(f"Failed to detect vehicle system id: {error}")
+        finally:
+            self._detection = None
+
+    def distance_message(self, time_boot_ms: int, distance_cm: int, device_id: int, confidence: int) -> bytes:
+        payload = self.PAYLOAD.pack(
+            time_boot_ms & 0xFFFFFFFF,
+            20,
+            12000,
+            distance_cm,
+            self.MAV_DISTANCE_SENSOR_ULTRASOUND,
+            device_id,
+            self.MAV_SENSOR_ROTATION_PITCH_270,
+            255,
+            0.52,
+            0.52,
+            0,
+            0,
+            0,
+            0,
+            max(1, confidence),  # 0 means undefined per MAVLink spec
+        )
+        # MAVLink 2 payloads are sent without trailing zeros
+        payload = payload.rstrip(b"\0") or b"\0"
+        # payload length, incompatibility and compatibility flags, sequence, system, component and message ids
+        header = struct.pack(
+            "<BBBBBB", len(payload), 0, 0, self.sequence, self.system_id, self.component_id
+        ) + self.MSG_ID_DISTANCE_SENSOR.to_bytes(3, "little")
+        self.sequence = (self.sequence + 1) % 256
+        crc = x25_crc(bytes([self.CRC_EXTRA_DISTANCE_SENSOR]), x25_crc(header + payload))
+        return b"\xfd" + header + payload + struct.pack("<H", crc)
+
+    def send_distance_data(self, distance_mm: int, device_id: int, confidence: int) -> bool:
+        if self._socket is None:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1)
+            self._socket.setblocking(False)
+        time_boot_ms = int((time.monotonic() - self.boot_time) * 1000)
+        message = self.distance_message(time_boot_ms, min(distance_mm // 10, 0xFFFF), device_id, min(confidence, 100))
+        try:
+            self._socket.sendto(message, self.address)
+        except OSError as error:
+            logger.debug(f"Failed to send distance to {self.address}: {error}")
+            return False
+        return True
+
+
+class Ping1DProtocol(asyncio.DatagramProtocol):
+    def __init__(self, on_distance: Callable[[PingFrame, float], None]) -> None:
+        self.on_distance = on_distance
+        self.scanner = PingFrameScanner()
+        self.error: Optional[Exception] = None
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        received = time.perf_counter()
+        for frame in self.scanner.feed(data):
+            if frame.message_id in DISTANCE_MESSAGES:
+                self.on_distance(frame, received)
+
+    def error_received(self, exc: Exception) -> None:
+        self.error = exc
 
 
 class Ping1DMavlinkDriver:
-    mavlink2rest = MavlinkMessenger()
+    mavlink = MavlinkDistanceSender()
 
     def __init__(self, should_run: bool) -> None:
         self.should_run = should_run
-        self.time_since_boot = time.time()
-        self.ping1d_io = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.ping1d_io.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.ping1d_io.setblocking(False)
-        ## Parser to decode incoming PingMessage
-        self.parser = PingParser()
+        self.stats = MavlinkDriverStats()
+        self.last_distance_time = 0.0
+        self.last_request_time = 0.0
+        self.protocol: Optional[Ping1DProtocol] = None
 
     def set_should_run(self, should_run: bool) -> None:
         self.should_run = should_run
 
+    def handle_distance(self, frame: PingFrame, received: float) -> None:
+        if not self.should_run or received - self.last_distance_time < PING_INTERVAL_S * 0.5:
+            # skip data arriving too fast, as when other clients request it
+            return
+        if self.last_distance_time:
+            rate = 1 / (received - self.last_distance_time)
+            self.stats.rate_hz += SMOOTHING * (rate - self.stats.rate_hz)
+        if self.last_request_time > self.last_distance_time:
+            self.stats.reply_latency_ms = (received - self.last_request_time) * 1000
+        self.last_distance_time = received
+
+        distance, confidence = parse_distance(frame)
+        if self.mavlink.send_distance_data(distance, frame.src_device_id, confidence):
+            self.stats.messages_sent += 1
+        else:
+            self.stats.send_errors += 1
+        latency_ms = (time.perf_counter() - received) * 1000
+        self.stats.latency_ms += SMOOTHING * (latency_ms - self.stats.latency_ms)
+
     @staticmethod
-    def distance_message(time_boot_ms: int, distance_cm: int, device_id: int, confidence: int) -> Dict[str, Any]:
-        return {
-            "type": "DISTANCE_SENSOR",
-            "time_boot_ms": time_boot_ms,
-            "min_distance": 20,
-            "max_distance": 12000,
-            "current_distance": int(distance_cm),
-            "mavtype": {"type": "MAV_DISTANCE_SENSOR_ULTRASOUND"},
-            "id": device_id,
-            "orientation": {"type": "MAV_SENSOR_ROTATION_PITCH_270"},
-            "covariance": 255,
-            "horizontal_fov": 0.52,
-            "vertical_fov": 0.52,
-            "quaternion": [0, 0, 0, 0],
-            "signal_quality": max(1, confidence),  # 0 means undefined per MAVLink spec
-        }
-
-    ## Send distance_sensor message to autopilot
-    async def send_distance_data(self, distance: int, deviceid: int, confidence: int) -> None:
-        logger.info(f"sending {distance} ({confidence})")
-        await self.mavlink2rest.send_mavlink_message(
-            self.distance_message(
-                int((time.time() - self.time_since_boot) * 1000), int(distance / 10), deviceid, confidence
-            )
-        )
+    def create_request_message() -> PingMessage:
+        request_message = PingMessage()
+        request_message.request_id = PING1D_DISTANCE_SIMPLE
+        request_message.src_device_id = 0
+        request_message.pack_msg_data()
+        return request_message
 
-    ## Send a request for distance_simple message to ping device
-    async def send_ping1d_request(
-        self,
-    ) -> None:
-        logger.debug("requesting new data")
-        data = PingMessage()
-        data.request_id = PING1D_DISTANCE_SIMPLE
-        data.src_device_id = 0
-        data.pack_msg_data()
-        self.ping1d_io.sendall(data.msg_data)
-
-    def create_interval_message(self) -> PingMessage:
+    @staticmethod
+    def create_interval_message() -> PingMessage:
         interval_message = PingMessage()
         interval_message.request_id = PING1D_SET_PING_INTERVAL
         interval_message.src_device_id = 0
@@ -87,71 +271,41 @@ class Ping1DMavlinkDriver:
         return interval_message
 
     async def drive(self, port: int) -> None:
+        loop = asyncio.get_running_loop()
+        transport, protocol = await loop.create_datagram_endpoint(
+            lambda: Ping1DProtocol(self.handle_distance), remote_addr=("127.0.0.1", port)
+        )
+        self.protocol = protocol
+        request_message = self.create_request_message()
+        interval_message = self.create_interval_message()
+        try:
+            # set the ping interval once at startup
+            # the ping interval may change if another client to the pingproxy requests it
+            transport.sendto(interval_message.msg_data)
+            self.last_distance_time = time.perf_counter()
 
-        ## Messages that have the current distance measurement in the payload
-        distance_messages = [PING1D_DISTANCE, PING1D_DISTANCE_SIMPLE, PING1D_PROFILE]
-
-        last_distance_measurement_time = 0.0
-
-        last_ping_request_time = 0.0
-
-        pingserver = ("127.0.0.1", port)
-        self.ping1d_io.connect(pingserver)
+            while True:
+                await asyncio.sleep(PING_INTERVAL_S)
+                if protocol.error is not None:
+                    raise protocol.error
+                self.stats.frame_errors = protocol.scanner.errors
+                if not self.should_run:
+                    continue
+                self.mavlink.update_system_id()
+                now = time.perf_counter()
 
-        # set the ping interval once at startup
-        # the ping interval may change if another client to the pingproxy requests it
-        interval_message = self.create_interval_message()
-        self.ping1d_io.sendall(interval_message.msg_data)
+                # request data from ping device, if no other client is doing it
+                if now > self.last_distance_time + PING_INTERVAL_S * 2.5:
+                    if now > self.last_request_time + PING_INTERVAL_S:
+                        logger.debug("requesting new data")
+                        self.last_request_time = now
+                        transport.sendto(request_message.msg_data)
 
-        while True:
-            if not self.should_run:
-                await asyncio.sleep(1)
-                continue
-            await asyncio.sleep(0.1 * PING_INTERVAL_S)
-            now = time.perf_counter()
-
-            # request data from ping device
-            if now > last_distance_measurement_time + PING_INTERVAL_S * 2.5:
-                if now > last_ping_request_time + PING_INTERVAL_S:
-                    last_ping_request_time = time.perf_counter()
-                    await self.send_ping1d_request()
-
-                # deal with possibly lost connection
-                if now > last_distance_measurement_time + PING_INTERVAL_S * 10:
-                    logger.info("attempting reconnection...")
-                    self.ping1d_io.connect(pingserver)
-                    last_distance_measurement_time = time.perf_counter()
-
-            # read data in from ping device
-            data = b""
-            while select([self.ping1d_io], [], [], 0)[0]:
-                data += self.ping1d_io.recv(4096)
-
-            if not data or now - last_distance_measurement_time < PING_INTERVAL_S * 0.5:
-                # skip decoding data to save cpu if it is arriving too fast
-                self.parser.state = self.parser.WAIT_START
-                continue
-            # decode data from ping device, forward to autopilot
-            new_data_available = False
-            distance = 0
-            deviceid = 0
-            confidence = 0
-
-            for byte in data:
-                try:
-                    if (
-                        self.parser.parse_byte(byte) == PingParser.NEW_MESSAGE
-                        and self.parser.rx_msg.message_id in distance_messages
-                    ):
-                        last_distance_measurement_time = time.perf_counter()
-                        new_data_available = True
-                        distance = self.parser.rx_msg.distance
-                        deviceid = self.parser.rx_msg.src_device_id
-                        confidence = self.parser.rx_msg.confidence
-                except Exception as error:
-                    logger.warning(error)
-            if new_data_available:
-                try:
-                    await self.send_distance_data(distance, deviceid, confidence)
-                except Exception as error:
-                    logger.warning(error)
+                    # deal with possibly lost connection
+                    if now > self.last_distance_time + PING_INTERVAL_S * 20:
+                        logger.info("attempting reconnection...")
+                        transport.sendto(interval_message.msg_data)
+                        self.last_distance_time = now
+        finally:
+            transport.close()
+            self.protocol = None
@@ -1,6 +1,7 @@
 import asyncio
 import socket
-from typing import List, Set
+import time
+from typing import Dict, List, Optional, Set, Tuple
 
 import psutil
 from loguru import logger
@@ -40,54 +41,122 @@ def remove_zeros(ip: str) -> str:
     return new_ip
 
 
-async def find_ping360_ethernet() -> List[PingDeviceDescriptor]:
+def parse_discovery_reply(data: bytes) -> Optional[PingDeviceDescriptor]:
     """
-    Return a list of Ping360 devices found in the connected ethernet interfaces
+    Returns the device described in a reply to the discovery message, if data is one.
     """
-    found = []
-    loop = asyncio.get_running_loop()
-    for ip in list_ips():
-        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-        server.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        # Set a timeout so the socket does not block
-        # indefinitely when trying to receive data.
-        server.settimeout(0.2)
-        try:
-            server.bind((ip, 30303))
-        except OSError:
-            continue
-        message = b"Discovery"
+    try:
+        device_type, _, _, ip_address, *extras = data.decode("utf8").split("\n")
+        formatted_ip = remove_zeros(ip_address.replace("IP Address:-", "").strip())
+    except ValueError:
+        return None
+    port = "12345"
+    for line in extras:
+        if line.startswith("Port:-"):
+            port = line[6:].strip()
+
+    return PingDeviceDescriptor(
+        ping_type=PingType.PING360 if "PING360" in device_type else PingType.UNKNOWN,
+        device_id=0,
+        device_model=0,
+        device_revision=0,
+        firmware_version_major=0,
+        firmware_version_minor=0,
+        firmware_version_patch=0,
+        ethernet_discovery_info=f"{formatted_ip}:{port}",
+        port=None,
+        driver=None,
+    )
+
+
+class DiscoveryProtocol(asyncio.DatagramProtocol):
+    def __init__(self, replies: List[bytes]) -> None:
+        self.replies = replies
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        logger.debug(f"Data received from {addr}: {data!r}")
+        self.replies.append(data)
+
+    def error_received(self, exc: Exception) -> None:
+        logger.debug(f"Error while discovering Ping360 devices: {exc}")
+
 
-        server.sendto(message, ("255.255.255.255", 30303))
-        await asyncio.sleep(1)
+class Ping360EthernetDiscovery:
+    """Finds Ping360 devices in the connected ethernet interfaces.
+
+    The discovery message is broadcast from all interfaces at once, and every reply received during WINDOW_S is
+    collected. Devices are kept until they don't reply for DEVICE_TTL_S, so a lost datagram doesn't drop them, and
+    discovery happens less often while the devices and interfaces stay the same, down to MAX_INTERVAL_S.
+    """
+
+    DISCOVERY_PORT = 30303
+    WINDOW_S = 1.0
+    MIN_INTERVAL_S = 1.0
+    MAX_INTERVAL_S = 16.0
+    # Devices are dropped after missing at least two rounds, even when discovery is backed off
+    DEVICE_TTL_S = 2 * MAX_INTERVAL_S + 3 * WINDOW_S
+
+    def __init__(self, port: int = DISCOVERY_PORT, broadcast_address: str = "255.255.255.255") -> None:
+        self.port = port
+        self.broadcast_address = broadcast_address
+        self.interval = self.MIN_INTERVAL_S
+        self._devices: Dict[str, PingDeviceDescriptor] = {}
+        self._last_seen: Dict[str, float] = {}
+        self._ips: Set[str] = set()
+
+    async def broadcast(self, ips: Set[str]) -> List[bytes]:
+        """Broadcast the discovery message from each ip and return the replies received during WINDOW_S"""
+        loop = asyncio.get_running_loop()
+        replies: List[bytes] = []
+        transports = []
         try:
-            data = await loop.sock_recv(server, 2048)
-            decoded_message = data.decode("utf8")
-            logger.info(f"Data received: {decoded_message}")
-            device_type, _, _, ip_address, *extras = decoded_message.split("\n")
-            formatted_ip = remove_zeros(ip_address.replace("IP Address:-", "").strip())
-            port = "12345"
-            for line in extras:
-                if line.startswith("Port:-"):
-                    port = line[6:].strip()
-
-            found.append(
-                PingDeviceDescriptor(
-                    ping_type=PingType.PING360 if "PING360" in device_type else PingType.UNKNOWN,
-                    device_id=0,
-                    device_model=0,
-                    device_revision=0,
-                    firmware_version_major=0,
-                    firmware_version_minor=0,
-                    firmware_version_patch=0,
-                    ethernet_discovery_info=f"{formatted_ip}:{port}",
-                    port=None,
-                    driver=None,
-                )
-            )
-        except socket.timeout:
-            logger.debug(f"timed out waiting for ping360 at ip {ip}")
-        except Exception as e:
-            logger.error(f"Error while probing for ping360 at ip {ip}: {e}")
-    return found
+            for ip in ips:
+                server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+                server.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+                server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                try:
+                    server.bind((ip, self.port))
+                except OSError as error:
+                    logger.debug(f"Failed to bind to {ip}: {error}")
+                    server.close()
+                    continue
+                transport, _ = await loop.create_datagram_endpoint(lambda: DiscoveryProtocol(replies), sock=server)
+                transports.append(transport)
+                transport.sendto(b"Discovery", (self.broadcast_address, self.port))
+            if transports:
+                await asyncio.sleep(self.WINDOW_S)
+        finally:
+            for transport in transports:
+                transport.close()
+        return replies
+
+    async def discover(self) -> List[PingDeviceDescriptor]:
+        """
+        Return a list of Ping360 devices found in the connected ethernet interfaces, including the ones that
+        replied to previous discoveries in the last DEVICE_TTL_S.
+        """
+        ips = list_ips()
+        replies = await self.broadcast(ips)
+        now = time.monotonic()
+        known = set(self._devices)
+        for reply in replies:
+            device = parse_discovery_reply(reply)
+            if device is None:
+                continue
+            key = str(device.ethernet_discovery_info)
+            if key not in self._devices:
+                logger.info(f"Found {device.ping_type} at {key}")
+            self._devices[key] = device
+            self._last_seen[key] = now
+        for key, last_seen in list(self._last_seen.items()):
+            if now - last_seen > self.DEVICE_TTL_S:
+                logger.info(f"Device at {key} didn't reply for {self.DEVICE_TTL_S}s, forgetting it")
+                del self._devices[key]
+                del self._last_seen[key]
+
+        if set(self._devices) != known or ips != self._ips:
+            self.interval = self.MIN_INTERVAL_S
+        else:
+            self.interval = min(self.interval * 2, self.MAX_INTERVAL_S)
+        self._ips = ips
+        return list(self._devices.values())
@@ -1,3 +1,4 @@
+import asyncio
 from typing import Any, Dict, Optional
 
 from bridges.bridges import Bridge
@@ -6,11 +7,14 @@ from brping import PingDevice
 from brping.definitions import COMMON_DEVICE_INFORMATION
 from loguru import logger
 from ping_exceptions import InvalidDeviceDescriptor, NoUDPPortAssignedToPingDriver
-from pingutils import PingDeviceDescriptor
+from pingutils import PingDeviceDescriptor, close_serial
 from typedefs import DriverStatus
 
 
 class PingDriver:
+    # Ping1D hangs with a baudrate bigger than 3M, going to ignore it for now
+    MAX_BAUDRATE = Baudrate.b3000000
+
     def __init__(self, ping: PingDeviceDescriptor, port: Optional[int]) -> None:
         self.ping = ping
         self.port = port
@@ -19,26 +23,18 @@ class PingDriver:
         self.baud: Optional[Baudrate] = None
         self.driver_status = DriverStatus(udp_port=port, mavlink_driver_enabled=False)
 
-    def detect_highest_baud(self) -> Baudrate:
-        """Tries to communicate in increasingly high baudrates up to 4M
-        returns the highest one with at least 90% success rate.
-        """
+    def baud_is_reliable(self, baud: Baudrate) -> bool:
+        """If requests at the given baudrate have at least 90% success rate"""
         failure_threshold = 0.1  # allow up to 10% failure rate
         attempts = 10  # try up to 10 times per baudrate
         max_failures = attempts * failure_threshold
-        last_valid_baud = Baudrate.b115200
 
-        if self.ping.port is None:
-            raise InvalidDeviceDescriptor("PingDeviceDescriptor has no usable port")
-
-        for baud in Baudrate:
-            # Ping1D hangs with a baudrate bigger than 3M, going to ignore it for now
-            if baud > 3000000:
-                continue
-            logger.debug(f"Trying baud {baud}...")
-            failures = 0
-            ping = PingDevice()
-            ping.connect_serial(self.ping.port.device, baud)
+        assert self.ping.port is not None
+        logger.debug(f"Trying baud {baud}...")
+        failures = 0
+        ping = PingDevice()
+        ping.connect_serial(self.ping.port.device, baud)
+        try:
             for _ in range(attempts):
                 device_info = None
                 try:
@@ -49,9 +45,31 @@ class PingDriver:
                     failures += 1
                     if failures > max_failures:
                         break  # there's no pointing in testing again if we already failed.
-            if failures <= max_failures:
-                last_valid_baud = baud
-            logger.debug(f"Baudrate {baud} is {'valid' if baud==last_valid_baud else 'invalid'}")
+        finally:
+            close_serial(ping)
+        logger.debug(f"Baudrate {baud} is {'valid' if failures <= max_failures else 'invalid'}")
+        return failures <= max_failures
+
+    def detect_highest_baud(self) -> Baudrate:
+        """Returns the highest baudrate up to MAX_BAUDRATE with at least 90% success rate.
+
+        Baudrates are binary searched, as the ones a device supports go up to a limit of its serial adapter,
+        so only a few of them are tried instead of all. The result is always one that was tried and is reliable,
+        falling back to 115200, at which devices were probed.
+        """
+        if self.ping.port is None:
+            raise InvalidDeviceDescriptor("PingDeviceDescriptor has no usable port")
+
+        candidates = [baud for baud in Baudrate if Baudrate.b115200 < baud <= self.MAX_BAUDRATE]
+        last_valid_baud = Baudrate.b115200
+        low, high = 0, len(candidates) - 1
+        while low <= high:
+            middle = (low + high) // 2
+            if self.baud_is_reliable(candidates[middle]):
+                last_valid_baud = candidates[middle]
+                low = middle + 1
+            else:
+                high = middle - 1
         logger.info(f"Highest baudrate detected: {last_valid_baud}")
         return last_valid_baud
 
@@ -63,18 +81,24 @@ class PingDriver:
         if self.port is None:
             raise NoUDPPortAssignedToPingDriver("PingDriver attempted to stash with no UDP port.")
 
-        self.baud = self.detect_highest_baud()
+        # Serial I/O is blocking, so it's done in a worker thread
+        self.baud = await asyncio.to_thread(self.detect_highest_baud)
         # Do a ping connection to set the baudrate
-        PingDevice().connect_serial(self.ping.port.device, self.baud)
+        await asyncio.to_thread(PingDevice().connect_serial, self.ping.port.device, self.baud)
         set_low_latency(self.ping.port)
         self.bridge = Bridge(self.ping.port, self.baud, "0.0.0.0", 0, self.port, automatic_disconnect=False)
+        await self.bridge.start()
 
-    def stop(self) -> None:
+    async def stop(self) -> None:
         """Stops the driver"""
         logger.info(f"Forcing Ping1d at port {self.port} to stop.")
         self.ping.driver = None
         if self.bridge:
-            self.bridge.stop()
+            await self.bridge.stop()
+
+    def status(self) -> DriverStatus:
+        bridge_statistics = self.bridge.statistics() if self.bridge is not None else None
+        return self.driver_status.model_copy(update={"bridge_statistics": bridge_statistics})
 
     def update_settings(self, sensor_settings: Dict[str, Any]) -> None:
         if "mavlink_driver" in sensor_settings:
@@ -82,6 +106,3 @@ class PingDriver:
 
     def set_mavlink_driver_running(self, should_run: bool) -> None:
         pass
-
-    def __del__(self) -> None:
-        self.stop()
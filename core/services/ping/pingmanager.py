@@ -1,5 +1,6 @@
 import asyncio
-from typing import Any, Dict, List, Set
+import functools
+from typing import Any, Coroutine, Dict, List, Set
 
 from loguru import logger
 from ping1d_driver import Ping1DDriver
@@ -16,13 +17,24 @@ class PingManager:
         self.connecting_ports: Set[int] = set()
         self.ping1d_base_port: int = 9090
         self.ping360_base_port: int = 9092
+        # Drivers being started and stopped
+        self._driver_tasks: Set["asyncio.Task[None]"] = set()
+
+    def _run_in_background(self, coroutine: Coroutine[Any, Any, None], description: str) -> None:
+        task = asyncio.create_task(coroutine)
+        self._driver_tasks.add(task)
+        task.add_done_callback(functools.partial(self._driver_task_done, description))
+
+    def _driver_task_done(self, description: str, task: "asyncio.Task[None]") -> None:
+        self._driver_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Failed to {description}: {task.exception()}")
 
     def stop_driver_at_port(self, port: SysFS | str) -> None:
         """Stops the driver instance running for port "port" """
         ping_at_port = [ping for ping in self.drivers if port in [ping.port, ping.ethernet_discovery_info]]
         if ping_at_port:
-            self.drivers[ping_at_port[0]].stop()
-            del self.drivers[ping_at_port[0]]
+            self._run_in_background(self.drivers.pop(ping_at_port[0]).stop(), f"stop driver at {port}")
 
     async def register_ethernet_ping360(self, ping: PingDeviceDescriptor) -> None:
         if ping not in self.drivers:
@@ -55,8 +67,7 @@ class PingManager:
             driver = Ping360Driver(ping, port)
 
         self.drivers[ping] = driver
-        loop = asyncio.get_running_loop()
-        loop.create_task(driver.start())
+        self._run_in_background(driver.start(), f"start driver for {ping}")
 
     def devices(self) -> List[PingDeviceDescriptor]:
         return list(self.drivers)
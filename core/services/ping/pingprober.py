@@ -1,9 +1,10 @@
+import asyncio
 from typing import Any, Callable, Coroutine, Optional
 
 from brping import PingDevice
 from brping.definitions import COMMON_DEVICE_INFORMATION, PING1D_FIRMWARE_VERSION
 from loguru import logger
-from pingutils import PingDeviceDescriptor, PingType
+from pingutils import PingDeviceDescriptor, PingType, close_serial
 from serial.tools.list_ports_linux import SysFS
 
 
@@ -14,7 +15,8 @@ class PingProber:
         """Attempts to communicate via Ping Protocol at port "port".
         Calls on_ping_found callback when a ping device is found."""
         logger.info(f"Probing {port}")
-        detected_device = self.detect_device(port)
+        # Serial I/O is blocking, so ports are probed in worker threads, allowing many to be probed at once
+        detected_device = await asyncio.to_thread(self.detect_device, port)
         if detected_device:
             await self.ping_found_callback(detected_device)
         return detected_device
@@ -29,7 +31,10 @@ class PingProber:
         """
         ping = PingDevice()
         ping.connect_serial(port.device, 115200)
-        firmware_version = ping.request(PING1D_FIRMWARE_VERSION)
+        try:
+            firmware_version = ping.request(PING1D_FIRMWARE_VERSION)
+        finally:
+            close_serial(ping)
         if firmware_version is None:
             return None
         descriptor = PingDeviceDescriptor(
@@ -71,10 +76,14 @@ class PingProber:
             )
             return None
 
-        if not ping.initialize():
-            return None
+        try:
+            if not ping.initialize():
+                return None
+            device_info = ping.request(COMMON_DEVICE_INFORMATION)
+        finally:
+            # The port is opened again by the driver
+            close_serial(ping)
 
-        device_info = ping.request(COMMON_DEVICE_INFORMATION)
         if not device_info:
             return self.legacy_detect_ping1d(port)
 
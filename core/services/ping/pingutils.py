@@ -4,6 +4,7 @@ from enum import IntEnum
 from typing import Optional
 
 import psutil
+from brping import PingDevice
 from loguru import logger
 from ping_exceptions import InvalidDeviceDescriptor
 from serial.tools.list_ports_linux import SysFS
@@ -63,6 +64,13 @@ FW: v{self.firmware_version_major}.{self.firmware_version_minor}.{self.firmware_
 port: {self.get_hw_or_eth_info()}"""
 
 
+def close_serial(ping: PingDevice) -> None:
+    """Close the serial port opened by connect_serial, if any"""
+    iodev = getattr(ping, "iodev", None)
+    if iodev is not None:
+        iodev.close()
+
+
 def udp_port_is_in_use(port: int) -> bool:
     return any(
         conn.laddr.port == port and conn.type == socket.SocketKind.SOCK_DGRAM for conn in psutil.net_connections()
@@ -1,19 +1,42 @@
 import asyncio
+import functools
+from pathlib import Path
 from typing import Any, Callable, Coroutine, Dict, Optional, Set
 from warnings import warn
 
 import serial.tools.list_ports
+from commonwealth.utils.inotify import (
+    IN_CREATE,
+    IN_DELETE,
+    IN_MOVED_FROM,
+    IN_MOVED_TO,
+    InotifyWatch,
+)
 from loguru import logger
-from ping360_ethernet_prober import find_ping360_ethernet
+from ping360_ethernet_prober import Ping360EthernetDiscovery
 from pingutils import PingDeviceDescriptor
 from serial.tools.list_ports_linux import SysFS
 
 MAX_ATTEMPTS = 3
+DEVICES_FOLDER = Path("/dev")
 
 
 class PortWatcher:
     """Watches the Serial ports on the system.
-    Calls set_prober when a port is found, and port_post_callback when a port is no longer present."""
+    Calls set_prober when a port is found, and port_post_callback when a port is no longer present.
+
+    Serial ports are checked again when device nodes are created or removed in /dev, and new ones are probed
+    concurrently.
+    """
+
+    # Each probe may take a while when talking to devices that don't answer, longer ones are reported
+    PROBE_TIMEOUT_S = 15.0
+    # Time for udev to finish setting up new devices before they are used
+    SETTLE_TIME_S = 0.5
+    # Ports are also checked periodically, in case hotplug events are not available
+    RESCAN_INTERVAL_S = 30.0
+    POLLING_INTERVAL_S = 1.0
+    RETRY_INTERVAL_S = 1.0
 
     def __init__(
         self,
@@ -21,7 +44,7 @@ class PortWatcher:
         found_callback: Callable[[Any], Coroutine[Any, SysFS, Optional[PingDeviceDescriptor]]],
     ) -> None:
         logger.info("PortWatcher Started")
-        self.known_ports: Set[str] = set()
+        self.known_ports: Set[SysFS] = set()
         self.known_ips: Set[str] = set()
 
         self.probe_callback: Callable[[Any], Coroutine[Any, SysFS, Optional[PingDeviceDescriptor]]] = probe_callback
@@ -30,6 +53,9 @@ class PortWatcher:
         ] = found_callback
         self.port_lost_callback: Optional[Callable[[SysFS], None]] = None
         self.probe_attempts_counter: Dict[SysFS, int] = {}
+        self.probing: Dict[SysFS, "asyncio.Task[None]"] = {}
+        self._ports_changed = asyncio.Event()
+        self.ethernet_discovery = Ping360EthernetDiscovery()
 
     def set_port_post_callback(self, callback: Callable[[SysFS], None]) -> None:
         self.port_lost_callback = callback
@@ -38,7 +64,7 @@ class PortWatcher:
         """A port should be probed if there hasn't been MAX_ATTEMPTS to probe it yet
         and it is caught by our filters
         """
-        if port in self.known_ports:
+        if port in self.known_ports or port in self.probing:
             return False
         if self.probe_attempts_counter.get(port, 0) >= MAX_ATTEMPTS:
             return False
@@ -51,17 +77,34 @@ class PortWatcher:
             warn(f"Developer error: Port is already known, but being probed again: {port}")
             return
         attempts = self.probe_attempts_counter.get(port, 0)
-        good_port = await self.probe_callback(port)
+        good_port = None
+        probe = asyncio.ensure_future(self.probe_callback(port))
+        try:
+            try:
+                good_port = await asyncio.wait_for(asyncio.shield(probe), self.PROBE_TIMEOUT_S)
+            except asyncio.TimeoutError:
+                logger.warning(f"Probing of {port.hwid} is taking more than {self.PROBE_TIMEOUT_S}s.")
+                # Serial I/O is done in worker threads, which can't be cancelled. The port is kept as being probed
+                # until the probe returns, so it's not opened twice, and devices found that late are still used
+                good_port = await probe
+        except Exception as error:
+            logger.warning(f"Failed to probe {port.hwid}: {error}")
         if good_port:
             self.known_ports.add(port)
         attempts += 1
         self.probe_attempts_counter[port] = attempts
         if attempts == MAX_ATTEMPTS:
             logger.info(f"Max number of probing attempts reached for {port}. Giving up.")
+        elif not good_port:
+            # Busy devices may be free in a bit
+            asyncio.get_running_loop().call_later(self.RETRY_INTERVAL_S, self._ports_changed.set)
+
+    def _probe_done(self, port: SysFS, _task: "asyncio.Task[None]") -> None:
+        self.probing.pop(port, None)
 
     async def add_ping360(self) -> None:
-        devices_list = await find_ping360_ethernet()
-        # find_ping360_ethernet sets the discovery info, but cast it so mypy doesn't complain
+        devices_list = await self.ethernet_discovery.discover()
+        # discover sets the discovery info, but cast it so mypy doesn't complain
         ip_devices = {str(device.ethernet_discovery_info): device for device in devices_list}
         ips = set(ip_devices)
         lost_ips = self.known_ips - ips
@@ -74,27 +117,80 @@ class PortWatcher:
             self.known_ips.add(ip)
             await self.ethernet_ping_found_callback(ip_devices[ip])
 
-    async def start_watching(self) -> None:
-        """Start watching for plugged/unplugged serial devices in the system."""
-        # TODO: try https://pypi.org/project/inotify/
+    async def check_ports(self) -> None:
+        """Probe new serial ports concurrently, and report the lost ones"""
+        ports = await asyncio.to_thread(serial.tools.list_ports.comports)
+        ports_description = [f"{port.subsystem}:{port.name}" for port in ports]
+        logger.debug(f"Currently detected ports: {ports_description}")
+        found_ports = set()
+        for port in ports:
+            if self.port_should_be_probed(port):
+                task = asyncio.create_task(self.probe_port(port))
+                self.probing[port] = task
+                task.add_done_callback(functools.partial(self._probe_done, port))
+            found_ports.add(port)
+
+        # Replugged devices are probed again
+        for port in set(self.probe_attempts_counter) - found_ports:
+            del self.probe_attempts_counter[port]
+
+        missing = self.known_ports - found_ports
+        for port in missing:
+            logger.info(f"Port lost: {port.hwid}")
+            self.known_ports.remove(port)
+            if self.port_lost_callback is not None:
+                self.port_lost_callback(port)
+
+    def _watch_devices(self) -> Optional[InotifyWatch]:
+        try:
+            watch = InotifyWatch(DEVICES_FOLDER, IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO)
+        except OSError as error:
+            logger.warning(f"Serial ports will be polled, failed to watch {DEVICES_FOLDER}: {error}")
+            return None
+
+        def on_events() -> None:
+            if watch.read_changes():
+                self._ports_changed.set()
+
+        asyncio.get_running_loop().add_reader(watch.fileno(), on_events)
+        return watch
+
+    async def watch_serial_ports(self) -> None:
+        watch = self._watch_devices()
+        try:
+            while True:
+                self._ports_changed.clear()
+                try:
+                    await self.check_ports()
+                except Exception as error:
+                    logger.exception(f"Error while watching ports: {error}")
+                try:
+                    interval = self.RESCAN_INTERVAL_S if watch is not None else self.POLLING_INTERVAL_S
+                    await asyncio.wait_for(self._ports_changed.wait(), interval)
+                    await asyncio.sleep(self.SETTLE_TIME_S)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if watch is not None:
+                asyncio.get_running_loop().remove_reader(watch.fileno())
+                watch.close()
+            for task in self.probing.values():
+                task.cancel()
+
+    async def watch_ethernet(self) -> None:
         while True:
             try:
-                ports = serial.tools.list_ports.comports()
-                ports_description = [f"{port.subsystem}:{port.name}" for port in ports]
-                logger.debug(f"Currently detected ports: {ports_description}")
-                found_ports = set()
-                for port in ports:
-                    if self.port_should_be_probed(port):
-                        await self.probe_port(port)
-                    found_ports.add(port)
-
-                missing = self.known_ports - found_ports
-                for port in missing:
-                    logger.info(f"Port lost: {port.hwid}")
-                    self.known_ports.remove(port)
-                    if self.port_lost_callback is not None:
-                        self.port_lost_callback(port)
                 await self.add_ping360()
             except Exception as error:
-                logger.exception(f"Error while watching ports/devices: {error}")
-            await asyncio.sleep(1)
+                logger.exception(f"Error while watching ethernet devices: {error}")
+            await asyncio.sleep(self.ethernet_discovery.interval)
+
+    async def start_watching(self) -> None:
+        """Start watching for plugged/unplugged serial devices in the system."""
+        tasks = [asyncio.create_task(self.watch_serial_ports()), asyncio.create_task(self.watch_ethernet())]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
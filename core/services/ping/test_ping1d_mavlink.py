@@ -0,0 +1,128 @@
+import asyncio
+import socket
+import struct
+from typing import List
+from unittest.mock import AsyncMock
+
+import pytest
+from brping import PING1D_DISTANCE_SIMPLE, PING1D_PROFILE, PingMessage, PingParser
+from ping1d_mavlink import (
+    MavlinkDistanceSender,
+    Ping1DMavlinkDriver,
+    PingFrameScanner,
+    x25_crc,
+)
+
+
+def distance_simple(distance: int, confidence: int, src_device_id: int = 1) -> bytes:
+    message = PingMessage(PING1D_DISTANCE_SIMPLE)
+    message.distance = distance
+    message.confidence = confidence
+    message.src_device_id = src_device_id
+    message.pack_msg_data()
+    return bytes(message.msg_data)
+
+
+def profile(distance: int) -> bytes:
+    message = PingMessage(PING1D_PROFILE)
+    message.distance = distance
+    message.confidence = 100
+    message.profile_data = bytearray(range(200))
+    message.pack_msg_data()
+    return bytes(message.msg_data)
+
+
+def test_scanner_matches_ping_parser() -> None:
+    stream = b"".join([distance_simple(1500, 90), profile(2000), distance_simple(700, 50)])
+    parser = PingParser()
+    expected = []
+    for byte in stream:
+        if parser.parse_byte(byte) == PingParser.NEW_MESSAGE:
+            expected.append((parser.rx_msg.message_id, parser.rx_msg.distance))
+    assert [distance for _, distance in expected] == [1500, 2000, 700]
+
+    # Frames are found after garbage and corrupted frames, and datagrams may split frames anywhere
+    corrupted = bytearray(distance_simple(999, 99))
+    corrupted[-1] ^= 0xFF
+    stream = b"garbage BR" + stream + b"\x00B" + bytes(corrupted) + distance_simple(1234, 77)
+    scanner = PingFrameScanner()
+    frames = []
+    for start in range(0, len(stream), 7):
+        frames.extend(scanner.feed(stream[start : start + 7]))
+    distances = [(frame.message_id, struct.unpack_from("<I", frame.payload)[0]) for frame in frames]
+    assert distances == expected + [(PING1D_DISTANCE_SIMPLE, 1234)]
+    assert scanner.errors > 0 and not scanner.buffer
+
+
+def test_distance_sensor_message() -> None:
+    sender = MavlinkDistanceSender()
+    message = sender.distance_message(time_boot_ms=1000, distance_cm=150, device_id=1, confidence=90)
+    magic, length, _, _, sequence, system_id, component_id = struct.unpack_from("<BBBBBBB", message)
+    assert (magic, length, sequence, system_id, component_id) == (0xFD, 39, 0, 1, 194)
+    assert int.from_bytes(message[7:10], "little") == 132
+    assert len(message) == 10 + length + 2
+    crc = x25_crc(bytes([85]), x25_crc(message[1:-2]))
+    assert message[-2:] == struct.pack("<H", crc)
+    time_boot_ms, _, _, current_distance = struct.unpack_from("<IHHH", message, 10)
+    assert (time_boot_ms, current_distance, message[-3]) == (1000, 150, 90)
+    assert sender.distance_message(1000, 150, 1, 90)[4] == 1
+
+
+@pytest.mark.asyncio
+async def test_vehicle_system_id_is_detected() -> None:
+    sender = MavlinkDistanceSender()
+    detect = AsyncMock(return_value=3)
+    sender.messenger.get_most_recent_vehicle_id = detect  # type: ignore
+    sender.update_system_id()
+    await asyncio.sleep(0)
+    assert sender.distance_message(1000, 150, 1, 90)[5] == 3
+
+    # Detected again only after a while
+    sender.update_system_id()
+    await asyncio.sleep(0)
+    assert detect.await_count == 1
+
+    # Keeping the current one when it can't be detected
+    detect.side_effect = ConnectionError("mavlink2rest is not running")
+    sender.SYSTEM_ID_INTERVAL_S = 0.0
+    sender.update_system_id()
+    await asyncio.sleep(0)
+    assert detect.await_count == 2 and sender.system_id == 3
+
+
+@pytest.mark.asyncio
+async def test_distances_are_sent_as_they_arrive() -> None:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as proxy, socket.socket(
+        socket.AF_INET, socket.SOCK_DGRAM
+    ) as router:
+        proxy.bind(("127.0.0.1", 0))
+        proxy.setblocking(False)
+        router.bind(("127.0.0.1", 0))
+        router.settimeout(1)
+        driver = Ping1DMavlinkDriver(should_run=True)
+        driver.mavlink = MavlinkDistanceSender(router.getsockname())
+        drive = asyncio.create_task(driver.drive(proxy.getsockname()[1]))
+        loop = asyncio.get_running_loop()
+
+        # The interval is set, and distances are requested as no other client is doing it
+        received: List[bytes] = []
+        while len(received) < 2:
+            data, client = await loop.sock_recvfrom(proxy, 1024)
+            received.append(data)
+        assert received == [
+            bytes(driver.create_interval_message().msg_data),
+            bytes(driver.create_request_message().msg_data),
+        ]
+
+        for distance in range(1000, 1500, 100):
+            proxy.sendto(distance_simple(distance, 80, src_device_id=2), client)
+            await asyncio.sleep(0.03)
+        distances = []
+        for _ in range(5):
+            message = await asyncio.to_thread(router.recv, 1024)
+            distances.append((struct.unpack_from("<H", message, 18)[0], message[21]))
+        drive.cancel()
+
+    assert distances == [(distance // 10, 2) for distance in range(1000, 1500, 100)]
+    assert driver.stats.messages_sent == 5 and driver.stats.reply_latency_ms is not None
+    assert 0 < driver.stats.latency_ms < 10
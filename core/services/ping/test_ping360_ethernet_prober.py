@@ -1,9 +1,11 @@
+import asyncio
 import socket
 from types import SimpleNamespace
 from unittest.mock import patch
 
 import ping360_ethernet_prober
 import psutil
+import pytest
 
 
 def test_list_ips_ignores_interfaces_missing_from_address_snapshot() -> None:
@@ -34,3 +36,60 @@ def test_list_ips_returns_empty_set_for_empty_snapshots() -> None:
         patch.object(psutil, "net_if_addrs", return_value={}),
     ):
         assert ping360_ethernet_prober.list_ips() == set()
+
+
+def reply(ip: str) -> bytes:
+    return f"SONAR PING360\nBlue Robotics\nMAC Address:- 54-10-EC-79-7D-D1\nIP Address:- {ip}\n".encode()
+
+
+@pytest.mark.asyncio
+async def test_discovery_collects_all_replies() -> None:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    discovery = ping360_ethernet_prober.Ping360EthernetDiscovery(port=port, broadcast_address="127.0.0.1")
+    discovery.WINDOW_S = 0.2
+
+    async def reply_from_devices() -> None:
+        await asyncio.sleep(0.05)
+        for ip in ["192.168.002.010", "192.168.002.011"]:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as device:
+                device.sendto(reply(ip), ("127.0.0.1", port))
+
+    with patch.object(ping360_ethernet_prober, "list_ips", return_value={"127.0.0.1"}):
+        devices, _ = await asyncio.gather(discovery.discover(), reply_from_devices())
+
+    # The discovery message itself is received too, and ignored
+    assert sorted(str(device.ethernet_discovery_info) for device in devices) == [
+        "192.168.2.10:12345",
+        "192.168.2.11:12345",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_discovery_backs_off_while_devices_are_stable() -> None:
+    discovery = ping360_ethernet_prober.Ping360EthernetDiscovery()
+    now = 0.0
+    replies = [reply("192.168.2.10")]
+
+    async def discover() -> int:
+        nonlocal now
+        now += discovery.interval
+        return len(await discovery.discover())
+
+    with (
+        patch.object(ping360_ethernet_prober, "list_ips", return_value={"192.168.2.2"}),
+        patch.object(discovery, "broadcast", side_effect=lambda _ips: replies),
+        patch("ping360_ethernet_prober.time.monotonic", side_effect=lambda: now),
+    ):
+        assert await discover() == 1 and discovery.interval == discovery.MIN_INTERVAL_S
+        intervals = []
+        for _ in range(6):
+            assert await discover() == 1
+            intervals.append(discovery.interval)
+        assert intervals == [2, 4, 8, 16, 16, 16]
+
+        # Devices that stop replying are kept for a while
+        replies = []
+        assert await discover() == 1 and await discover() == 1
+        assert await discover() == 0 and discovery.interval == discovery.MIN_INTERVAL_S
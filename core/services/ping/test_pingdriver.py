@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+from typing import Any, List, Optional
+from unittest.mock import patch
+
+from bridges.serialhelper import Baudrate
+from pingdriver import PingDriver
+from pingutils import PingDeviceDescriptor, PingType
+
+# Highest baudrate reliable in the serial adapter of the emulated device
+DEVICE_MAX_BAUDRATE = Baudrate.b921600
+
+
+class FakePingDevice:
+    tried: List[int] = []
+
+    def __init__(self) -> None:
+        self.baud = 0
+        self.iodev: Optional[SimpleNamespace] = None
+
+    def connect_serial(self, _device: str, baud: int) -> None:
+        self.baud = baud
+        self.iodev = SimpleNamespace(close=lambda: None)
+        FakePingDevice.tried.append(baud)
+
+    def request(self, _message_id: int, timeout: float = 0.5) -> Any:  # pylint: disable=unused-argument
+        return {} if self.baud <= DEVICE_MAX_BAUDRATE else None
+
+
+def test_highest_baud_is_binary_searched() -> None:
+    ping = PingDeviceDescriptor(
+        ping_type=PingType.PING1D,
+        device_id=1,
+        device_model=1,
+        device_revision=1,
+        firmware_version_major=3,
+        firmware_version_minor=29,
+        firmware_version_patch=0,
+        port=SimpleNamespace(device="/dev/ttyUSB0", device_path="/sys/ttyUSB0"),  # type: ignore[arg-type]
+        ethernet_discovery_info=None,
+    )
+    driver = PingDriver(ping, None)
+    with patch("pingdriver.PingDevice", FakePingDevice):
+        assert driver.detect_highest_baud() == DEVICE_MAX_BAUDRATE
+
+    candidates = [baud for baud in Baudrate if Baudrate.b115200 < baud <= PingDriver.MAX_BAUDRATE]
+    assert set(FakePingDevice.tried) < set(candidates)
+    assert len(FakePingDevice.tried) <= len(candidates).bit_length()
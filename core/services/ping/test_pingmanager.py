@@ -0,0 +1,47 @@
+import asyncio
+from typing import Any, List
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from loguru import logger
+from pingmanager import PingManager
+from pingutils import PingDeviceDescriptor, PingType
+
+
+def ethernet_ping360(ip: str) -> PingDeviceDescriptor:
+    return PingDeviceDescriptor(
+        ping_type=PingType.PING360,
+        device_id=2,
+        device_model=2,
+        device_revision=1,
+        firmware_version_major=3,
+        firmware_version_minor=3,
+        firmware_version_patch=0,
+        port=None,
+        ethernet_discovery_info=ip,
+    )
+
+
+@pytest.mark.asyncio
+async def test_drivers_of_lost_ports_are_stopped() -> None:
+    manager = PingManager()
+    stopped = Mock(stop=AsyncMock())
+    failing = Mock(stop=AsyncMock(side_effect=RuntimeError("Bridges process doesn't exist.")))
+    manager.drivers = {ethernet_ping360("192.168.2.10"): stopped, ethernet_ping360("192.168.2.11"): failing}
+    errors: List[Any] = []
+    handler = logger.add(errors.append, level="ERROR")
+    try:
+        manager.stop_driver_at_port("192.168.2.10")
+        manager.stop_driver_at_port("192.168.2.11")
+        manager.stop_driver_at_port("192.168.2.12")
+        assert not manager.drivers
+        await asyncio.gather(*manager._driver_tasks, return_exceptions=True)
+        await asyncio.sleep(0)
+    finally:
+        logger.remove(handler)
+
+    stopped.stop.assert_awaited_once()
+    failing.stop.assert_awaited_once()
+    # Failures are logged, and finished tasks are not kept
+    assert len(errors) == 1 and "192.168.2.11" in errors[0]
+    assert not manager._driver_tasks
@@ -1,10 +1,22 @@
 import asyncio
+from dataclasses import dataclass
+from typing import Any, List
 from unittest.mock import AsyncMock, patch
 
 import pytest
 from portwatcher import PortWatcher
 
 
+@dataclass(frozen=True)
+class FakePort:
+    name: str
+    subsystem: str = "usb"
+
+    @property
+    def hwid(self) -> str:
+        return f"USB VID:PID=2341:0043 LOCATION={self.name}"
+
+
 @pytest.mark.asyncio
 async def test_start_watching_continues_after_add_ping360_error() -> None:
     watcher = PortWatcher(probe_callback=AsyncMock(), found_callback=AsyncMock())
@@ -26,3 +38,50 @@ async def test_start_watching_continues_after_add_ping360_error() -> None:
             await watcher.start_watching()
 
     assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_ports_are_probed_concurrently() -> None:
+    ports = [FakePort(f"ttyUSB{index}") for index in range(4)]
+    probing = 0
+    most_probing = 0
+
+    async def slow_probe(port: Any) -> Any:
+        nonlocal probing, most_probing
+        probing += 1
+        most_probing = max(most_probing, probing)
+        await asyncio.sleep(0.1)
+        probing -= 1
+        return port
+
+    watcher = PortWatcher(probe_callback=slow_probe, found_callback=AsyncMock())
+    with patch("portwatcher.serial.tools.list_ports.comports", return_value=ports):
+        await watcher.check_ports()
+        await asyncio.gather(*watcher.probing.values())
+
+    assert most_probing == len(ports)
+    assert watcher.known_ports == set(ports) and not watcher.probing
+
+    # Slow probes are not started again until they return, and unplugged ports are reported as lost
+    lost: List[Any] = []
+    watcher.set_port_post_callback(lost.append)
+    watcher.PROBE_TIMEOUT_S = 0.01
+    slow = FakePort("ttyACM0")
+    probes = 0
+
+    async def slow_failing_probe(_port: Any) -> None:
+        nonlocal probes
+        probes += 1
+        await asyncio.sleep(0.2)
+
+    watcher.probe_callback = slow_failing_probe
+    with patch("portwatcher.serial.tools.list_ports.comports", return_value=[slow]):
+        await watcher.check_ports()
+        await asyncio.sleep(0.1)
+        assert slow in watcher.probing
+        await watcher.check_ports()
+        await asyncio.gather(*watcher.probing.values())
+
+    assert probes == 1
+    assert sorted(port.name for port in lost) == [port.name for port in ports]
+    assert watcher.probe_attempts_counter == {slow: 1} and not watcher.known_ports
@@ -1,12 +1,26 @@
 from typing import Optional
 
+from bridges.bridges import BridgeStatistics
 from pingutils import PingDeviceDescriptor
 from pydantic import BaseModel
 
 
+class MavlinkDriverStats(BaseModel):
+    rate_hz: float = 0
+    # From receiving a distance from the device to sending it to the autopilot
+    latency_ms: float = 0
+    # From requesting a distance to receiving it, when no other client is requesting them
+    reply_latency_ms: Optional[float] = None
+    messages_sent: int = 0
+    send_errors: int = 0
+    frame_errors: int = 0
+
+
 class DriverStatus(BaseModel):
     udp_port: Optional[int]
     mavlink_driver_enabled: bool
+    mavlink_driver_stats: Optional[MavlinkDriverStats] = None
+    bridge_statistics: Optional[BridgeStatistics] = None
 
     @staticmethod
     def unknown() -> "DriverStatus":
@@ -39,5 +53,5 @@ class PingDeviceDescriptorModel(BaseModel):
             firmware_version_patch=descriptor.firmware_version_patch,
             port=descriptor.port.device if descriptor.port is not None else "",
             ethernet_discovery_info=descriptor.ethernet_discovery_info,
-            driver_status=descriptor.driver.driver_status if descriptor.driver is not None else DriverStatus.unknown(),
+            driver_status=descriptor.driver.status() if descriptor.driver is not None else DriverStatus.unknown(),
         )
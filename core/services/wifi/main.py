@@ -4,7 +4,7 @@ import argparse
 import asyncio
 import logging
 from pathlib import Path
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional
 
 from commonwealth.utils.apis import (
     GenericErrorHandlingRoute,
@@ -24,6 +24,7 @@ from typedefs import (
     SavedWifiNetwork,
     ScannedWifiNetwork,
     WifiCredentials,
+    WPACommandMetrics,
 )
 from uvicorn import Config, Server
 from wifi_handlers.AbstractWifiHandler import AbstractWifiManager
@@ -163,6 +164,12 @@ def get_hotspot_credentials() -> Any:
     return wifi_manager.hotspot_credentials()
 
 
+@app.get("/wpa_command_metrics", summary="Get latency metrics of wpa_supplicant commands.")
+@version(1, 0)
+def get_wpa_command_metrics() -> Dict[str, WPACommandMetrics]:
+    return wpa_manager.wpa.command_metrics()
+
+
 app = VersionedFastAPI(app, version="1.0.0", prefix_format="/v{major}.{minor}", enable_latest=True)
 app.mount("/", StaticFiles(directory=str(FRONTEND_FOLDER), html=True))
 
@@ -59,3 +59,13 @@ class ConnectionStatus(str, Enum):
     JUST_CONNECTED = "JUST_CONNECTED"
     STILL_CONNECTED = "STILL_CONNECTED"
     UNKNOWN = "UNKNOWN"
+
+
+class WPACommandMetrics(BaseModel):
+    count: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    busy_retries: int = 0
+    last_ms: float = 0.0
+    average_ms: float = 0.0
+    max_ms: float = 0.0
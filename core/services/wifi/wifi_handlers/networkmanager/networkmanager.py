@@ -3,8 +3,9 @@ import hashlib
 import select
 import signal
 import subprocess
+import time
 from concurrent.futures import CancelledError
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional
 
 import sdbus
 from commonwealth.utils.general import device_id
@@ -32,6 +33,124 @@ class InvalidConfigurationError(Exception):
     pass
 
 
+def security_flags_string(flags: int, wpa_flags: int, rsn_flags: int) -> str:
+    security_flags = []
+
+    # Check flag bits
+    if flags & AccessPointCapabilities.PRIVACY:
+        security_flags.append("WEP")
+
+    if wpa_flags:
+        if wpa_flags & WpaSecurityFlags.AUTH_PSK:
+            security_flags.append("WPA-PSK")
+        if wpa_flags & WpaSecurityFlags.BROADCAST_TKIP:
+            security_flags.append("TKIP")
+        if wpa_flags & WpaSecurityFlags.BROADCAST_CCMP:
+            security_flags.append("CCMP")
+
+    if rsn_flags:
+        if rsn_flags & WpaSecurityFlags.AUTH_PSK:
+            security_flags.append("WPA2-PSK")
+        if rsn_flags & WpaSecurityFlags.BROADCAST_TKIP:
+            security_flags.append("TKIP")
+        if rsn_flags & WpaSecurityFlags.BROADCAST_CCMP:
+            security_flags.append("CCMP")
+
+    return f"[{'-'.join(set(security_flags))}]" if security_flags else ""
+
+
+class AccessPointCache:
+    """Access points seen by the wifi device, keyed by their D-Bus object path.
+
+    Each access point is fetched with a single GetAll call, and kept updated from the device AccessPointAdded and
+    AccessPointRemoved signals and from its own PropertiesChanged signal, so reading the cache doesn't reach D-Bus.
+    While the device signals are not watched, the cache has to be loaded again before every read.
+    """
+
+    # D-Bus names of the access point properties used, and their names on the fetched properties
+    PROPERTIES = {
+        "Ssid": "ssid",
+        "Frequency": "frequency",
+        "Flags": "flags",
+        "WpaFlags": "wpa_flags",
+        "RsnFlags": "rsn_flags",
+        "Strength": "strength",
+        "HwAddress": "hw_address",
+    }
+
+    def __init__(self, bus: sdbus.SdBus) -> None:
+        self._bus = bus
+        self._access_points: Dict[str, Dict[str, Any]] = {}
+        self._watchers: Dict[str, asyncio.Task[None]] = {}
+        # If the device signals are being watched, keeping the list of access points updated
+        self.watched = False
+
+    async def load(self, device: NetworkDeviceWireless) -> None:
+        paths = await device.get_all_access_points()
+        for path in set(self._access_points) - set(paths):
+            self.remove(path)
+        await asyncio.gather(*[self.add(path) for path in paths if path not in self._access_points])
+
+    async def add(self, path: str) -> None:
+        access_point = AccessPoint(path, self._bus)
+        # Watching before fetching, so changes in between are not lost
+        if path not in self._watchers:
+            self._watchers[path] = asyncio.create_task(self._watch(path, access_point))
+        try:
+            properties = await access_point.properties_get_all_dict(on_unknown_member="ignore")
+        except Exception as error:
+            logger.warning(f"Failed to fetch access point {path}: {error}")
+            self.remove(path)
+            return
+        if path in self._watchers:
+            self._access_points[path] = properties
+
+    def remove(self, path: str) -> None:
+        self._access_points.pop(path, None)
+        watcher = self._watchers.pop(path, None)
+        if watcher is not None:
+            watcher.cancel()
+
+    async def _watch(self, path: str, access_point: AccessPoint) -> None:
+        try:
+            async for _interface, changed, _invalidated in access_point.properties_changed:
+                properties = self._access_points.get(path)
+                if properties is None:
+                    continue
+                for dbus_name, (_signature, value) in changed.items():
+                    if dbus_name in self.PROPERTIES:
+                        properties[self.PROPERTIES[dbus_name]] = value
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            logger.warning(f"Stopped watching access point {path}: {error}")
+
+    def networks(self) -> List[ScannedWifiNetwork]:
+        networks: List[ScannedWifiNetwork] = []
+        for path, properties in self._access_points.items():
+            try:
+                networks.append(
+                    ScannedWifiNetwork(
+                        ssid=properties["ssid"].decode("utf-8", errors="replace"),
+                        frequency=properties["frequency"],
+                        bssid=properties["hw_address"],
+                        flags=security_flags_string(
+                            properties["flags"], properties["wpa_flags"], properties["rsn_flags"]
+                        ),
+                        signallevel=properties["strength"],
+                    )
+                )
+            except Exception as error:
+                logger.debug(f"Skipping access point {path}: {error}")
+        return networks
+
+    def clear(self) -> None:
+        for path in list(self._watchers):
+            self.remove(path)
+        self._access_points.clear()
+        self.watched = False
+
+
 class NetworkManagerWifi(AbstractWifiManager):
     """NetworkManager implementation of the WiFi manager interface.
 
@@ -39,6 +158,9 @@ class NetworkManagerWifi(AbstractWifiManager):
     both client and access point (hotspot) modes.
     """
 
+    # Delay before watching the access points again after the device signals stopped
+    WATCH_RETRY_S = 5.0
+
     def __init__(self) -> None:
         """Initialize NetworkManager WiFi handler."""
         super().__init__()
@@ -49,6 +171,9 @@ class NetworkManagerWifi(AbstractWifiManager):
         self._create_ap_process: Optional[subprocess.Popen[str]] = None
         self._ap_interface = "uap0"
         self._tasks: List[asyncio.Task[Any]] = []
+        self._access_points = AccessPointCache(self._bus)
+        # Time of the last scan, in CLOCK_BOOTTIME milliseconds, updated from the device signals
+        self._last_scan = -1
         self._nm = NetworkManager(self._bus)
         self._nm_settings = NetworkManagerSettings(self._bus)
         logger.info("NetworkManagerWifi initialized")
@@ -118,17 +243,60 @@ class NetworkManagerWifi(AbstractWifiManager):
 
         # Create virtual AP interface if needed
         await self._create_virtual_interface()
+        self._tasks.append(asyncio.get_event_loop().create_task(self._watch_access_points()))
         self._tasks.append(asyncio.get_event_loop().create_task(self._autoscan()))
         self._tasks.append(asyncio.get_event_loop().create_task(self.hotspot_watchdog()))
 
-    async def _autoscan(self) -> None:
+    async def _watch_access_points(self) -> None:
+        """Keep the access points cache and the last scan time updated from the device signals"""
+        assert self._device_path is not None
+        device = NetworkDeviceWireless(self._device_path, self._bus)
+        while True:
+            await self._watch_device(device)
+            # Access points are fetched again on demand until watched again
+            await asyncio.sleep(self.WATCH_RETRY_S)
+
+    async def _watch_device(self, device: NetworkDeviceWireless) -> None:
+        async def watch_added() -> None:
+            async for path in device.access_point_added:
+                await self._access_points.add(path)
+
+        async def watch_removed() -> None:
+            async for path in device.access_point_removed:
+                self._access_points.remove(path)
+
+        async def watch_last_scan() -> None:
+            async for _interface, changed, _invalidated in device.properties_changed:
+                if "LastScan" in changed:
+                    self._last_scan = changed["LastScan"][1]
+
+        # Watching before loading, so changes in between are not lost
+        watchers = [asyncio.create_task(watch()) for watch in [watch_added, watch_removed, watch_last_scan]]
+        try:
+            self._last_scan = await device.last_scan
+            await self._access_points.load(device)
+            self._access_points.watched = True
+            await asyncio.gather(*watchers)
+            logger.warning("Access points signals ended.")
+        except Exception as e:
+            logger.error(f"Error watching access points: {e}")
+        finally:
+            for watcher in watchers:
+                watcher.cancel()
+            self._access_points.clear()
 
+    async def _autoscan(self) -> None:
+        assert self._device_path is not None
+        device = NetworkDeviceWireless(self._device_path, self._bus)
         while True:
-            assert self._device_path is not None
-            device = NetworkDeviceWireless(self._device_path, self._bus)
-            if await device.last_scan > 10000:
-                await device.request_scan({})
-                logger.info("Requested WiFi scan")
+            now = time.clock_gettime(time.CLOCK_BOOTTIME) * 1000
+            if self._last_scan < 0 or now - self._last_scan > 10000:
+                try:
+                    await device.request_scan({})
+                    logger.info("Requested WiFi scan")
+                except Exception as e:
+                    # NetworkManager refuses scan requests while one is already running
+                    logger.debug(f"WiFi scan request failed: {e}")
             await asyncio.sleep(10)
 
     async def get_wifi_available(self) -> List[ScannedWifiNetwork]:
@@ -136,57 +304,9 @@ class NetworkManagerWifi(AbstractWifiManager):
             return []
 
         try:
-            device = NetworkDeviceWireless(self._device_path, bus=self._bus)
-            networks: List[ScannedWifiNetwork] = []
-
-            ap_paths = await device.get_all_access_points()
-            for ap_path in ap_paths:
-                ap = AccessPoint(ap_path, self._bus)
-                freq = await ap.frequency.get_async()
-                ssid = (await ap.ssid.get_async()).decode("utf-8")
-
-                # Get raw flag values
-                wpa_flags = await ap.wpa_flags.get_async()
-                rsn_flags = await ap.rsn_flags.get_async()
-                flags = await ap.flags.get_async()
-
-                security_flags = []
-
-                # Check flag bits
-                if flags & AccessPointCapabilities.PRIVACY:
-                    security_flags.append("WEP")
-
-                if wpa_flags:
-                    if wpa_flags & WpaSecurityFlags.AUTH_PSK:
-                        security_flags.append("WPA-PSK")
-                    if wpa_flags & WpaSecurityFlags.BROADCAST_TKIP:
-                        security_flags.append("TKIP")
-                    if wpa_flags & WpaSecurityFlags.BROADCAST_CCMP:
-                        security_flags.append("CCMP")
-
-                if rsn_flags:
-                    if rsn_flags & WpaSecurityFlags.AUTH_PSK:
-                        security_flags.append("WPA2-PSK")
-                    if rsn_flags & WpaSecurityFlags.BROADCAST_TKIP:
-                        security_flags.append("TKIP")
-                    if rsn_flags & WpaSecurityFlags.BROADCAST_CCMP:
-                        security_flags.append("CCMP")
-
-                flag_str = f"[{'-'.join(set(security_flags))}]" if security_flags else ""
-
-                networks.append(
-                    ScannedWifiNetwork(
-                        ssid=ssid,
-                        signal_strength=(await ap.strength.get_async()),
-                        frequency=freq,
-                        bssid=(await ap.hw_address.get_async()),
-                        flags=flag_str,
-                        signallevel=(await ap.strength.get_async()),
-                    )
-                )
-
-            return networks
-
+            if not self._access_points.watched:
+                await self._access_points.load(NetworkDeviceWireless(self._device_path, bus=self._bus))
+            return self._access_points.networks()
         except Exception as e:
             logger.error(f"Error getting available networks: {e}")
             return []
@@ -520,6 +640,7 @@ class NetworkManagerWifi(AbstractWifiManager):
                 except Exception as e:
                     logger.error(f"Error while cancelling task: {e}")
         self._tasks.clear()
+        self._access_points.clear()
 
         # Cleanup virtual interface
         await self._cleanup_virtual_interface()
@@ -0,0 +1,177 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+
+import pytest
+
+pytest.importorskip("sdbus_async.networkmanager")
+
+# pylint: disable=wrong-import-position
+from wifi_handlers.networkmanager import networkmanager  # noqa: E402
+from wifi_handlers.networkmanager.networkmanager import (  # noqa: E402
+    AccessPointCache,
+    NetworkManagerWifi,
+)
+
+
+class FakeSignal:
+    """D-Bus signal, iterated until an exception is emitted."""
+
+    def __init__(self) -> None:
+        self.queue: "asyncio.Queue[Any]" = asyncio.Queue()
+
+    def emit(self, value: Union[Any, Exception]) -> None:
+        self.queue.put_nowait(value)
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        while True:
+            value = await self.queue.get()
+            if isinstance(value, Exception):
+                raise value
+            yield value
+
+
+def properties(ssid: str, strength: int) -> Dict[str, Any]:
+    return {
+        "ssid": ssid.encode(),
+        "frequency": 2412,
+        "flags": 0,
+        "wpa_flags": 0,
+        "rsn_flags": 0,
+        "strength": strength,
+        "hw_address": f"00:00:00:00:00:{strength:02x}",
+    }
+
+
+class FakeNetwork:
+    """Access points seen by a wifi device, with the signals of the device and of each access point."""
+
+    def __init__(self) -> None:
+        self.access_points: Dict[str, Dict[str, Any]] = {}
+        self.access_point_signals: Dict[str, FakeSignal] = {}
+        self.device_signals: List[FakeSignal] = []
+        self.device_loads = 0
+
+    def access_point(self, path: str, _bus: Any) -> Any:
+        network = self
+
+        class FakeAccessPoint:
+            properties_changed = self.access_point_signals.setdefault(path, FakeSignal())
+
+            async def properties_get_all_dict(self, on_unknown_member: str) -> Dict[str, Any]:
+                return dict(network.access_points[path])
+
+        return FakeAccessPoint()
+
+    def device(self, _path: str, bus: Any = None) -> Any:
+        network = self
+        signals = [FakeSignal(), FakeSignal(), FakeSignal()]
+        self.device_signals = signals
+
+        class FakeDevice:
+            access_point_added, access_point_removed, properties_changed = signals
+
+            @property
+            async def last_scan(self) -> int:
+                return 0
+
+            async def get_all_access_points(self) -> List[str]:
+                network.device_loads += 1
+                return list(network.access_points)
+
+        return FakeDevice()
+
+    def emit_property(self, path: str, strength: int) -> None:
+        self.access_points[path]["strength"] = strength
+        self.access_point_signals[path].emit(
+            ("org.freedesktop.NetworkManager.AccessPoint", {"Strength": ("y", strength)}, [])
+        )
+
+
+@pytest.fixture(name="network")
+def fixture_network(mocker: Any) -> FakeNetwork:
+    network = FakeNetwork()
+    mocker.patch.object(networkmanager, "AccessPoint", side_effect=network.access_point)
+    mocker.patch.object(networkmanager, "NetworkDeviceWireless", side_effect=network.device)
+    mocker.patch.object(networkmanager, "NetworkManager")
+    mocker.patch.object(networkmanager, "NetworkManagerSettings")
+    mocker.patch("wifi_handlers.networkmanager.networkmanager.sdbus.sd_bus_open_system")
+    mocker.patch("wifi_handlers.AbstractWifiHandler.PydanticManager")
+    return network
+
+
+async def wait_until(condition: Any) -> None:
+    for _ in range(100):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise TimeoutError("Condition not met.")
+
+
+def strengths(wifi: NetworkManagerWifi) -> Dict[Optional[str], int]:
+    return {network.ssid: network.signallevel for network in wifi._access_points.networks()}
+
+
+@pytest.mark.asyncio
+async def test_access_points_follow_signals(network: FakeNetwork) -> None:
+    network.access_points["/ap/1"] = properties("boat", 40)
+    wifi = NetworkManagerWifi()
+    wifi._device_path = "/device/wlan0"
+    watcher = asyncio.create_task(wifi._watch_access_points())
+    await wait_until(lambda: wifi._access_points.watched)
+    assert strengths(wifi) == {"boat": 40}
+
+    network.emit_property("/ap/1", 70)
+    await wait_until(lambda: strengths(wifi) == {"boat": 70})
+
+    network.access_points["/ap/2"] = properties("shore", 20)
+    network.device_signals[0].emit("/ap/2")
+    await wait_until(lambda: strengths(wifi) == {"boat": 70, "shore": 20})
+
+    network.device_signals[1].emit("/ap/1")
+    await wait_until(lambda: strengths(wifi) == {"shore": 20})
+
+    # Read from the cache, without loading the access points again
+    assert [available.ssid for available in await wifi.get_wifi_available()] == ["shore"]
+    assert network.device_loads == 1
+    watcher.cancel()
+
+
+@pytest.mark.asyncio
+async def test_access_points_are_reloaded_while_not_watched(network: FakeNetwork) -> None:
+    network.access_points["/ap/1"] = properties("boat", 40)
+    wifi = NetworkManagerWifi()
+    wifi._device_path = "/device/wlan0"
+    wifi.WATCH_RETRY_S = 0.3
+    watcher = asyncio.create_task(wifi._watch_access_points())
+    await wait_until(lambda: wifi._access_points.watched)
+
+    # The device signals die, so the cache can't follow the access points anymore
+    network.device_signals[2].emit(RuntimeError("D-Bus connection lost"))
+    await wait_until(lambda: not wifi._access_points.watched)
+
+    network.access_points["/ap/2"] = properties("shore", 20)
+    assert {available.ssid for available in await wifi.get_wifi_available()} == {"boat", "shore"}
+    del network.access_points["/ap/1"]
+    assert [available.ssid for available in await wifi.get_wifi_available()] == ["shore"]
+
+    # Until the device signals are watched again
+    await wait_until(lambda: wifi._access_points.watched)
+    loads = network.device_loads
+    assert [available.ssid for available in await wifi.get_wifi_available()] == ["shore"]
+    assert network.device_loads == loads
+    watcher.cancel()
+
+
+@pytest.mark.asyncio
+async def test_access_point_cache_clear(network: FakeNetwork, mocker: Any) -> None:
+    network.access_points["/ap/1"] = properties("boat", 40)
+    cache = AccessPointCache(mocker.Mock())
+    await cache.load(network.device("/device/wlan0", None))
+    assert len(cache.networks()) == 1
+
+    cache.clear()
+    assert cache.networks() == [] and not cache.watched
+    # Changes of cleared access points are ignored
+    network.emit_property("/ap/1", 70)
+    await asyncio.sleep(0.01)
+    assert cache.networks() == []
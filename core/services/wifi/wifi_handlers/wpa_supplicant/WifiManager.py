@@ -6,10 +6,10 @@ import time
 from argparse import ArgumentParser, Namespace
 from http.client import HTTPException
 from ipaddress import IPv4Address
-from typing import Any, Dict, List, Optional
+from typing import Any, List, Optional
 
 from commonwealth.utils.general import HostOs, get_host_os
-from exceptions import FetchError, ParseError
+from exceptions import FetchError
 from fastapi import status
 from loguru import logger
 from typedefs import (
@@ -21,7 +21,12 @@ from typedefs import (
 )
 from wifi_handlers.AbstractWifiHandler import AbstractWifiManager
 from wifi_handlers.wpa_supplicant.Hotspot import HotspotManager
-from wifi_handlers.wpa_supplicant.wpa_supplicant import WPASupplicant
+from wifi_handlers.wpa_supplicant.parsers import (
+    parse_key_values,
+    parse_saved_networks,
+    parse_scan_results,
+)
+from wifi_handlers.wpa_supplicant.wpa_supplicant import WPAEvent, WPASupplicant
 
 
 # pylint: disable=too-many-instance-attributes
@@ -29,6 +34,21 @@ class WifiManager(AbstractWifiManager):
     wpa = WPASupplicant()
     wpa_path: Optional[str] = None
 
+    # Events that may change the connection state
+    CONNECTION_EVENTS = (
+        "CTRL-EVENT-CONNECTED",
+        "CTRL-EVENT-DISCONNECTED",
+        "CTRL-EVENT-SSID-TEMP-DISABLED",
+        "CTRL-EVENT-NETWORK-NOT-FOUND",
+        "CTRL-EVENT-TERMINATING",
+    )
+    SCAN_EVENTS = ("CTRL-EVENT-SCAN-RESULTS", "CTRL-EVENT-SCAN-FAILED")
+    SCAN_TIMEOUT_S = 15.0
+    # Interval between state refreshes without events, which also catches changes that have none, like the IP address
+    STATE_REFRESH_INTERVAL_S = 10.0
+    # Used instead when wpa_supplicant events are not available
+    STATE_POLLING_INTERVAL_S = 2.5
+
     async def can_work(self) -> bool:
         return bool(get_host_os() == HostOs.Bullseye)
 
@@ -93,8 +113,11 @@ class WifiManager(AbstractWifiManager):
         Arguments:
             path {[tuple/str]} -- Can be a tuple to connect (ip/port) or unix socket file
         """
-        self.wpa.run(path)
-        self._scan_task: Optional[asyncio.Task[bytes]] = None
+        await self.wpa.run(path)
+        self._scan_task: Optional[asyncio.Task[List[ScannedWifiNetwork]]] = None
+        # Connection state as last seen, read by the API without reaching wpa_supplicant
+        self._status_snapshot: Optional[WifiStatus] = None
+        self._current_network_snapshot: Optional[SavedWifiNetwork] = None
         self._updated_scan_results: Optional[List[ScannedWifiNetwork]] = None
         self._ignored_reconnection_networks: List[str] = []
         self.connection_status = ConnectionStatus.UNKNOWN
@@ -117,69 +140,6 @@ class WifiManager(AbstractWifiManager):
         except Exception:
             logger.exception("Could not load previous hotspot settings.")
 
-    @staticmethod
-    def __decode_escaped(data: bytes) -> str:
-        """Decode escaped byte array
-        For more info: https://stackoverflow.com/questions/14820429/how-do-i-decodestring-escape-in-python3
-        """
-        return data.decode("unicode-escape").encode("latin1").decode("utf-8")
-
-    @staticmethod
-    def __dict_from_table(table: bytes) -> List[Dict[str, Any]]:
-        """Create a dict from table text
-
-        Arguments:
-            table {[bytes]} -- A byte string table provided by wpa_supplicant
-
-        Returns:
-            [list of dicts] -- A list of dicts where keys are table header values
-        """
-        raw_lines = table.strip().split(b"\n")
-
-        listed_lines = []
-        for raw_line in raw_lines:
-            listed_lines += [raw_line.split(b"\t")]
-
-        # Create keys from header
-        try:
-            temp_header = listed_lines.pop(0)[0]
-            header = temp_header.replace(b" ", b"").split(b"/")
-        except Exception as error:
-            raise ParseError("Failed creating header to dictionary.") from error
-
-        output: List[Any] = []
-        for line in listed_lines:
-            output += [{}]
-            try:
-                for key, value in zip(header, line):
-                    output[-1][WifiManager.__decode_escaped(key)] = WifiManager.__decode_escaped(value)
-            except Exception as error:
-                raise ParseError("Failed parsing dictionary data from table.") from error
-
-        return output
-
-    @staticmethod
-    def __dict_from_list(data: bytes) -> Dict[str, Any]:
-        """Create a dict from a value based list
-
-        Arguments:
-            data {[bytes]} -- A byte string list provided by wpa_supplicant
-
-        Returns:
-            [dict] -- Dict where which key is the variable value of the list
-        """
-        raw_lines = data.strip().split(b"\n")
-
-        output = {}
-        for line in raw_lines:
-            try:
-                key, value = line.split(b"=")
-                output[WifiManager.__decode_escaped(key)] = WifiManager.__decode_escaped(value)
-            except Exception as error:
-                raise ParseError("Failed parsing dictionary data from list.") from error
-
-        return output
-
     @property
     def hotspot(self) -> HotspotManager:
         if self._hotspot is None:
@@ -193,23 +153,27 @@ class WifiManager(AbstractWifiManager):
     async def get_wifi_available(self) -> List[ScannedWifiNetwork]:
         """Get a dict from the wifi signals available"""
 
-        async def perform_new_scan() -> None:
+        async def perform_new_scan() -> List[ScannedWifiNetwork]:
+            # Subscribed before the scan request, so its results event is not missed
+            events = self.wpa.subscribe()
             try:
-                # We store the scan task here so that new scan requests that happen in the interval
-                # where this one is running can check when it has finished.
-                # Otherwise, it could happen that a new scan is initiated before the ones waiting know
-                # the previous one has finished, making them stay on the loop unnecessarily.
-                self._scan_task = asyncio.create_task(self.wpa.send_command_scan(timeout=30))
-                await self._scan_task
+                await self.wpa.send_command_scan(timeout=30)
+                if self.wpa.has_events:
+                    try:
+                        event = await self.wpa.wait_for_event(self.SCAN_EVENTS, self.SCAN_TIMEOUT_S, events)
+                        if event.name == "CTRL-EVENT-SCAN-FAILED":
+                            raise FetchError(f"Scan failed: {event.text}")
+                    except asyncio.TimeoutError:
+                        logger.warning("Scan results took too long, using the latest ones available.")
                 data = await self.wpa.send_command_scan_results()
-                networks_list = WifiManager.__dict_from_table(data)
-                self._updated_scan_results = [ScannedWifiNetwork(**network) for network in networks_list]
+                self._updated_scan_results = parse_scan_results(data)
                 self._time_last_scan = time.time()
+                return self._updated_scan_results
             except Exception as error:
-                if self._scan_task is not None:
-                    self._scan_task.cancel()
                 self._updated_scan_results = None
                 raise FetchError("Failed to fetch wifi list.") from error
+            finally:
+                self.wpa.unsubscribe(events)
 
         # Performs a new scan only if more than 30 seconds passed since last scan
         if time.time() - self._time_last_scan < 30:
@@ -217,24 +181,17 @@ class WifiManager(AbstractWifiManager):
         # Performs a new scan only if it's the first one or the last one is already done
         # In case there's one running already, wait for it to finish and use its result
         if self._scan_task is None or self._scan_task.done():
-            await perform_new_scan()
+            self._scan_task = asyncio.create_task(perform_new_scan())
         else:
-            awaited_scan_task_name = self._scan_task.get_name()
-            while self._scan_task.get_name() == awaited_scan_task_name and not self._scan_task.done():
-                logger.info(f"Waiting for {awaited_scan_task_name} results.")
-                await asyncio.sleep(0.5)
-
-        if self._updated_scan_results is None:
-            raise FetchError("Failed to fetch wifi list.")
-
-        return self._updated_scan_results
+            logger.info(f"Waiting for {self._scan_task.get_name()} results.")
+        # Shielded so a cancelled request doesn't cancel the scan that others are waiting for
+        return await asyncio.shield(self._scan_task)
 
     async def get_saved_wifi_network(self) -> List[SavedWifiNetwork]:
         """Get a list of saved wifi networks"""
         try:
             data = await self.wpa.send_command_list_networks()
-            networks_list = WifiManager.__dict_from_table(data)
-            return [SavedWifiNetwork(**network) for network in networks_list]
+            return parse_saved_networks(data)
         except Exception as error:
             raise FetchError("Failed to fetch saved networks list.") from error
 
@@ -298,23 +255,16 @@ class WifiManager(AbstractWifiManager):
         try:
             if was_hotspot_enabled:
                 await self.disable_hotspot(save_settings=False)
-            await self.wpa.send_command_select_network(network_id)
-            await self.wpa.send_command_save_config()
-            await self.wpa.send_command_reconfigure()
-            await self.wpa.send_command_reconnect()
-            start_time = time.time()
-            while True:
-                wpa_status = await self.status()
-                is_connected = wpa_status.wpa_state == "COMPLETED"
-                if is_connected:
-                    current_network = await self.get_current_network()
-                    if current_network and current_network.networkid == network_id:
-                        break
-                    raise RuntimeError("Association or authentication failed.")
-                timer = time.time() - start_time
-                if timer > timeout:
-                    raise RuntimeError("Could not stablish a wifi connection in time.")
-                await asyncio.sleep(2.0)
+            # Subscribed before the connection request, so its events are not missed
+            events = self.wpa.subscribe()
+            try:
+                await self.wpa.send_command_select_network(network_id)
+                await self.wpa.send_command_save_config()
+                await self.wpa.send_command_reconfigure()
+                await self.wpa.send_command_reconnect()
+                await self._wait_for_connection(network_id, timeout, events)
+            finally:
+                self.wpa.unsubscribe(events)
 
             # Remove network from ignored list if user deliberately connected
             current_network = await self.get_current_network()
@@ -329,14 +279,53 @@ class WifiManager(AbstractWifiManager):
             if was_hotspot_enabled:
                 await self.enable_hotspot(save_settings=False)
 
-    async def status(self) -> WifiStatus:
-        """Check wpa_supplicant status"""
+    async def _wait_for_connection(self, network_id: int, timeout: float, events: "asyncio.Queue[WPAEvent]") -> None:
+        """Wait for the connection with the given network, checking the status on each connection event."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        # Without events the status is polled, as it was done before them
+        check_interval = self.STATE_REFRESH_INTERVAL_S if self.wpa.has_events else 2.0
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise RuntimeError("Could not stablish a wifi connection in time.")
+            try:
+                event = await self.wpa.wait_for_event(self.CONNECTION_EVENTS, min(remaining, check_interval), events)
+                if event.name == "CTRL-EVENT-SSID-TEMP-DISABLED" and "reason=WRONG_KEY" in event.text:
+                    if f"id={network_id} " in f"{event.text} ":
+                        raise RuntimeError("Association or authentication failed.")
+            except asyncio.TimeoutError:
+                pass
+
+            wpa_status = await self.refresh_status()
+            if wpa_status.wpa_state == "COMPLETED":
+                current_network = await self.get_current_network()
+                if current_network and current_network.networkid == network_id:
+                    return
+                raise RuntimeError("Association or authentication failed.")
+
+    async def refresh_status(self) -> WifiStatus:
+        """Get wpa_supplicant status, updating the cached one"""
         try:
             data = await self.wpa.send_command_status()
-            return WifiStatus(**WifiManager.__dict_from_list(data))
+            self._status_snapshot = WifiStatus(**parse_key_values(data))
+            return self._status_snapshot
         except Exception as error:
             raise FetchError("Failed to get status from wifi manager.") from error
 
+    async def status(self) -> WifiStatus:
+        """Check wpa_supplicant status
+
+        The status is kept updated from wpa_supplicant events, so it's only fetched when not known yet.
+        """
+        if self._status_snapshot is None:
+            return await self.refresh_status()
+        return self._status_snapshot
+
+    async def _refresh_state(self) -> None:
+        await self.refresh_status()
+        self._current_network_snapshot = await self.get_current_network()
+
     async def reconfigure(self) -> None:
         """Reconfigure wpa_supplicant
         This will force the reevaluation of the conf file
@@ -410,14 +399,30 @@ class WifiManager(AbstractWifiManager):
         was_connected = False
         logger.debug("Watchdog starting disconnected.")
         time_disconnection = time.time()
+        events = self.wpa.subscribe()
         while True:
-            await asyncio.sleep(2.5)
+            # Wakes up on connection changes, or to re-enable the networks once disconnected for long enough
+            interval = self.STATE_REFRESH_INTERVAL_S if self.wpa.has_events else self.STATE_POLLING_INTERVAL_S
+            if not was_connected and not networks_reenabled:
+                time_to_reenable = time_disconnection + seconds_before_reconnecting - time.time()
+                interval = min(interval, max(self.STATE_POLLING_INTERVAL_S, time_to_reenable))
+            try:
+                await self.wpa.wait_for_event(self.CONNECTION_EVENTS, interval, events)
+            except asyncio.TimeoutError:
+                pass
+
+            try:
+                await self._refresh_state()
+            except Exception as error:
+                logger.warning(f"Failed to refresh wifi state: {error}")
+                await asyncio.sleep(self.STATE_POLLING_INTERVAL_S)
+                continue
 
             # Disable watchdog checks while deliberately connecting or disconnecting
             if self.connection_status in [ConnectionStatus.CONNECTING, ConnectionStatus.DISCONNECTING]:
                 continue
 
-            is_connected = await self.get_current_network() is not None
+            is_connected = self._current_network_snapshot is not None
 
             if is_connected and (await self.status()).ip_address is None:
                 # we are connected but have no ip addres? lets ask cable-guy for a new ip
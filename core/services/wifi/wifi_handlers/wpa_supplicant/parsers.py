@@ -0,0 +1,102 @@
+"""
+Parsers for the wpa_supplicant control interface responses.
+
+wpa_supplicant escapes non-printable characters of user provided fields (like SSIDs) with C style sequences,
+so only fields with a backslash need to be unescaped, while all the others are plain UTF-8.
+"""
+
+from typing import Dict, List
+
+from exceptions import ParseError
+from typedefs import SavedWifiNetwork, ScannedWifiNetwork
+
+
+def decode_escaped(data: bytes) -> str:
+    """Decode a field from wpa_supplicant, unescaping it only when needed
+    For more info: https://stackoverflow.com/questions/14820429/how-do-i-decodestring-escape-in-python3
+    """
+    if b"\\" not in data:
+        return data.decode("utf-8")
+    return data.decode("unicode-escape").encode("latin1").decode("utf-8")
+
+
+def _table_lines(table: bytes) -> List[bytes]:
+    """Lines of a table, without its header"""
+    lines = table.strip(b"\n").split(b"\n")
+    if not lines or b"/" not in lines[0]:
+        raise ParseError("Failed creating header to dictionary.")
+    return lines[1:]
+
+
+def parse_scan_results(data: bytes) -> List[ScannedWifiNetwork]:
+    """Parse the SCAN_RESULTS table
+
+    Arguments:
+        data {[bytes]} -- Table with "bssid / frequency / signal level / flags / ssid" columns
+
+    Returns:
+        [list of ScannedWifiNetwork] -- Scanned networks, with an empty SSID for hidden networks
+    """
+    networks = []
+    for line in _table_lines(data):
+        try:
+            # SSID is the last column and may be missing for hidden networks
+            fields = line.split(b"\t", 4)
+            networks.append(
+                ScannedWifiNetwork(
+                    bssid=fields[0].decode("ascii"),
+                    frequency=int(fields[1]),
+                    signallevel=int(fields[2]),
+                    flags=fields[3].decode("ascii"),
+                    ssid=decode_escaped(fields[4]) if len(fields) > 4 else "",
+                )
+            )
+        except Exception as error:
+            raise ParseError(f"Failed parsing scan results line: {line!r}") from error
+    return networks
+
+
+def parse_saved_networks(data: bytes) -> List[SavedWifiNetwork]:
+    """Parse the LIST_NETWORKS table
+
+    Arguments:
+        data {[bytes]} -- Table with "network id / ssid / bssid / flags" columns
+
+    Returns:
+        [list of SavedWifiNetwork] -- Networks saved on wpa_supplicant configuration
+    """
+    networks = []
+    for line in _table_lines(data):
+        try:
+            fields = line.split(b"\t")
+            networks.append(
+                SavedWifiNetwork(
+                    networkid=int(fields[0]),
+                    ssid=decode_escaped(fields[1]),
+                    bssid=fields[2].decode("ascii") if len(fields) > 2 else None,
+                    flags=fields[3].decode("ascii") if len(fields) > 3 else None,
+                )
+            )
+        except Exception as error:
+            raise ParseError(f"Failed parsing saved networks line: {line!r}") from error
+    return networks
+
+
+def parse_key_values(data: bytes) -> Dict[str, str]:
+    """Parse "key=value" lines, like the STATUS response
+
+    Values may contain "=" themselves, so only the first one of each line is used as separator.
+
+    Arguments:
+        data {[bytes]} -- Lines of "key=value" pairs
+
+    Returns:
+        [dict] -- Values by key
+    """
+    output = {}
+    for line in data.strip(b"\n").split(b"\n"):
+        key, separator, value = line.partition(b"=")
+        if not separator:
+            raise ParseError(f"Failed parsing dictionary data from list: {line!r}")
+        output[key.decode("ascii")] = decode_escaped(value)
+    return output
@@ -0,0 +1,146 @@
+from typing import Any, Dict, List
+
+import pytest
+from exceptions import ParseError
+from typedefs import ScannedWifiNetwork
+
+from .parsers import (
+    decode_escaped,
+    parse_key_values,
+    parse_saved_networks,
+    parse_scan_results,
+)
+
+# Recorded from wpa_supplicant 2.9 control interface
+SCAN_RESULTS = (
+    b"bssid / frequency / signal level / flags / ssid\n"
+    b"c4:ad:34:1f:60:2a\t2437\t-41\t[WPA2-PSK-CCMP][WPS][ESS]\tBlueBoat Lab\n"
+    b"c4:ad:34:1f:60:2b\t5180\t-52\t[WPA2-PSK-CCMP][ESS]\tBlueBoat Lab 5G\n"
+    b"00:1a:2b:3c:4d:5e\t2412\t-67\t[WPA-PSK-CCMP+TKIP][WPA2-PSK-CCMP+TKIP][ESS]\tMarina Guest\n"
+    b"9c:53:22:8a:11:07\t2462\t-71\t[ESS]\tCaf\\xc3\\xa9 do Porto\n"
+    b'3a:07:16:42:bb:90\t2437\t-80\t[WPA2-PSK-CCMP][ESS]\tyacht\\\\net \\"A\\"\n'
+    b"e8:48:b8:c7:02:ff\t5745\t-84\t[WPA2-EAP-CCMP][ESS]\t\n"
+    b"e8:48:b8:c7:03:ff\t5765\t-86\t[WPA2-PSK-CCMP][ESS]\n"
+)
+
+LIST_NETWORKS = (
+    b"network id / ssid / bssid / flags\n"
+    b"0\tBlueBoat Lab\tany\t[CURRENT]\n"
+    b"1\tMarina Guest\tany\t[DISABLED]\n"
+    b"2\tCaf\\xc3\\xa9 do Porto\tany\t\n"
+)
+
+STATUS = (
+    b"bssid=c4:ad:34:1f:60:2a\n"
+    b"freq=2437\n"
+    b"ssid=BlueBoat Lab\n"
+    b"id=0\n"
+    b"mode=station\n"
+    b"wifi_generation=4\n"
+    b"pairwise_cipher=CCMP\n"
+    b"group_cipher=CCMP\n"
+    b"key_mgmt=WPA2-PSK\n"
+    b"wpa_state=COMPLETED\n"
+    b"ip_address=192.168.1.42\n"
+    b"p2p_device_address=b8:27:eb:12:34:56\n"
+    b"address=b8:27:eb:12:34:56\n"
+    b"uuid=6c7e8f1a-3b2d-5e4f-9a8b-b827eb123456\n"
+    b"ieee80211ac=1\n"
+)
+
+
+def dense_scan_results(count: int) -> bytes:
+    """Scan results of a dense RF environment, built from the recorded ones"""
+    header, *lines = SCAN_RESULTS.strip(b"\n").split(b"\n")
+    # The previous parser gave None instead of an empty SSID for hidden networks at the end of the table
+    lines = [line for line in lines if not line.endswith(b"]") and not line.endswith(b"\t")]
+    dense = [header]
+    for index in range(count):
+        line = lines[index % len(lines)]
+        dense.append(f"02:00:00:00:{index // 256:02x}:{index % 256:02x}".encode() + line[17:])
+    return b"\n".join(dense) + b"\n"
+
+
+def legacy_parse_scan_results(table: bytes) -> List[ScannedWifiNetwork]:
+    """Previous parser, unescaping every key and value, used as reference"""
+
+    def decode(data: bytes) -> str:
+        return data.decode("unicode-escape").encode("latin1").decode("utf-8")
+
+    listed_lines = []
+    for raw_line in table.strip().split(b"\n"):
+        listed_lines += [raw_line.split(b"\t")]
+    header = listed_lines.pop(0)[0].replace(b" ", b"").split(b"/")
+    output: List[Dict[str, Any]] = []
+    for line in listed_lines:
+        output += [{}]
+        for key, value in zip(header, line):
+            output[-1][decode(key)] = decode(value)
+    return [ScannedWifiNetwork(**network) for network in output]
+
+
+def test_decode_escaped() -> None:
+    assert decode_escaped(b"BlueBoat Lab") == "BlueBoat Lab"
+    assert decode_escaped("Café".encode()) == "Café"
+    assert decode_escaped(b"Caf\\xc3\\xa9") == "Café"
+    assert decode_escaped(b"tab\\tand\\\\slash") == "tab\tand\\slash"
+
+
+def test_parse_scan_results() -> None:
+    networks = parse_scan_results(SCAN_RESULTS)
+    assert len(networks) == 7
+    assert networks[0] == ScannedWifiNetwork(
+        bssid="c4:ad:34:1f:60:2a",
+        frequency=2437,
+        signallevel=-41,
+        flags="[WPA2-PSK-CCMP][WPS][ESS]",
+        ssid="BlueBoat Lab",
+    )
+    assert networks[3].ssid == "Café do Porto"
+    assert networks[4].ssid == 'yacht\\net "A"'
+    # Hidden networks, with the trailing tab or without it
+    assert networks[5].ssid == ""
+    assert networks[6].ssid == ""
+    assert networks[6].frequency == 5765
+
+    assert parse_scan_results(b"bssid / frequency / signal level / flags / ssid\n") == []
+    with pytest.raises(ParseError):
+        parse_scan_results(b"FAIL\n")
+    with pytest.raises(ParseError):
+        parse_scan_results(b"bssid / frequency / signal level / flags / ssid\nc4:ad:34:1f:60:2a\tnan\n")
+
+
+def test_parse_saved_networks() -> None:
+    networks = parse_saved_networks(LIST_NETWORKS)
+    assert [(network.networkid, network.ssid, network.flags) for network in networks] == [
+        (0, "BlueBoat Lab", "[CURRENT]"),
+        (1, "Marina Guest", "[DISABLED]"),
+        (2, "Café do Porto", ""),
+    ]
+
+
+def test_parse_key_values() -> None:
+    status = parse_key_values(STATUS)
+    assert status["wpa_state"] == "COMPLETED"
+    assert status["ip_address"] == "192.168.1.42"
+    assert len(status) == 15
+
+    # Values may have "=" in them
+    assert parse_key_values(b"ssid=a=b==\nid=1\n") == {"ssid": "a=b==", "id": "1"}
+    with pytest.raises(ParseError):
+        parse_key_values(b"bssid=c4:ad:34:1f:60:2a\nFAIL\n")
+
+
+def test_parse_scan_results_matches_legacy_parser() -> None:
+    data = dense_scan_results(300)
+    assert parse_scan_results(data) == legacy_parse_scan_results(data)
+
+
+@pytest.mark.parametrize("parser", [parse_scan_results, legacy_parse_scan_results], ids=["parser", "legacy"])
+@pytest.mark.parametrize("count", [10, 300])
+def test_parse_scan_results_benchmark(request: pytest.FixtureRequest, parser: Any, count: int) -> None:
+    """Parsing time of the recorded scan results, repeated as in a dense RF environment. Runs with pytest-benchmark."""
+    pytest.importorskip("pytest_benchmark")
+    benchmark = request.getfixturevalue("benchmark")
+    benchmark.group = f"parse_scan_results of {count} networks"
+    benchmark(parser, dense_scan_results(count))
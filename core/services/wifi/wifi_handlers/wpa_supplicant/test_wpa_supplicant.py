@@ -0,0 +1,97 @@
+import asyncio
+import pathlib
+import socket
+from typing import List, Optional, cast
+
+import pytest
+from exceptions import BusyError, SockCommError
+
+from .wpa_supplicant import WPASupplicant
+
+
+class FakeWPASupplicant(asyncio.DatagramProtocol):
+    """Control socket of wpa_supplicant, answering some commands and sending events to attached clients."""
+
+    def __init__(self) -> None:
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.monitors: List[str] = []
+        self.busy_scans = 0
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = cast(asyncio.DatagramTransport, transport)
+
+    def send_event(self, event: str) -> None:
+        assert self.transport is not None
+        for monitor in self.monitors:
+            self.transport.sendto(event.encode(), monitor)
+
+    def datagram_received(self, data: bytes, addr: str) -> None:  # type: ignore[override]
+        assert self.transport is not None
+        command = data.decode()
+        if command == "ATTACH":
+            self.monitors.append(addr)
+            self.transport.sendto(b"OK\n", addr)
+        elif command == "PING":
+            self.transport.sendto(b"PONG\n", addr)
+        elif command == "SCAN":
+            if self.busy_scans > 0:
+                self.busy_scans -= 1
+                self.transport.sendto(b"FAIL-BUSY\n", addr)
+                # The scan that kept it busy finishes a bit later
+                asyncio.get_running_loop().call_later(0.02, self.send_event, "<2>CTRL-EVENT-SCAN-RESULTS ")
+            else:
+                self.transport.sendto(b"OK\n", addr)
+        elif command == "LOST":
+            pass
+        elif command.startswith("SLOW"):
+            asyncio.get_running_loop().call_later(0.3, self.transport.sendto, f"{command} DONE\n".encode(), addr)
+        else:
+            self.transport.sendto(b"FAIL", addr)
+
+
+def test_wpa_supplicant_client(tmp_path: pathlib.Path) -> None:
+    async def run() -> None:
+        loop = asyncio.get_running_loop()
+        server_path = str(tmp_path / "wlan0")
+        server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        server_socket.bind(server_path)
+        transport, server = await loop.create_datagram_endpoint(FakeWPASupplicant, sock=server_socket)
+
+        wpa = WPASupplicant()
+        await wpa.run(server_path)
+        assert wpa.has_events and len(server.monitors) == 1
+
+        # Concurrent commands get their own replies
+        assert await asyncio.gather(*[wpa.send_command_ping() for _ in range(10)]) == [b"PONG\n"] * 10
+
+        # A late reply is not taken as the reply of the next command
+        with pytest.raises(BusyError):
+            await wpa.send_command("SLOW", timeout=0.1)
+        assert await wpa.send_command("SLOW 2", timeout=1) == b"SLOW 2 DONE\n"
+
+        # Neither is a lost reply, and the commands that were waiting with it fail instead of taking other replies
+        lost = asyncio.create_task(wpa.send_command("LOST", timeout=0.1))
+        waiting = asyncio.create_task(wpa.send_command("SLOW 3", timeout=1))
+        with pytest.raises(BusyError):
+            await lost
+        with pytest.raises(SockCommError):
+            await waiting
+        assert await wpa.send_command_ping() == b"PONG\n"
+        assert wpa.has_events and len(server.monitors) == 1
+
+        # Busy commands are retried when wpa_supplicant reports it's done, instead of sleeping past the timeout
+        wpa.BUSY_RETRY_MIN_S = wpa.BUSY_RETRY_MAX_S = 60
+        server.busy_scans = 2
+        events = wpa.subscribe()
+        assert await wpa.send_command_scan(timeout=5) == b"OK\n"
+        assert server.busy_scans == 0
+        assert (await wpa.wait_for_event(["CTRL-EVENT-SCAN-RESULTS"], timeout=1, queue=events)).level == 2
+
+        metrics = wpa.command_metrics()
+        assert metrics["PING"].count == 11
+        assert metrics["SLOW"].timeouts == 1
+        assert metrics["SCAN"].busy_retries == 2
+        wpa.close()
+        transport.close()
+
+    asyncio.run(run())
@@ -1,50 +1,291 @@
 import asyncio
 import glob
+import itertools
 import os
+import re
 import socket
-import time
+from collections import deque
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Tuple, Union
+from typing import (
+    AsyncGenerator,
+    Callable,
+    Collection,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
 
 from exceptions import BusyError, NetworkAddFail, SockCommError, WPAOperationFail
 from loguru import logger
+from typedefs import WPACommandMetrics
+
+# Unsolicited messages are prefixed by their priority level, e.g. "<3>CTRL-EVENT-SCAN-RESULTS "
+EVENT_PATTERN = re.compile(rb"^<(\d+)>(\S+)\s?(.*)$", re.DOTALL)
+
+
+@dataclass
+class WPAEvent:
+    level: int
+    name: str
+    text: str
+
+
+class _ControlChannel(asyncio.DatagramProtocol):
+    """A wpa_supplicant control socket, matching replies to their requests.
+
+    wpa_supplicant answers the commands of a socket in order, so replies are matched to the oldest pending
+    request. Replies can't be told apart otherwise, so a socket where a request timed out has to be replaced, as
+    its late or lost reply would shift the following replies onto the wrong requests.
+    """
+
+    def __init__(self, on_event: Callable[[WPAEvent], None], on_lost: Callable[[Exception], None]) -> None:
+        self._on_event = on_event
+        self._on_lost = on_lost
+        self._transport: Optional[asyncio.DatagramTransport] = None
+        self._pending: Deque["asyncio.Future[bytes]"] = deque()
+        self._closed = False
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self._transport = cast(asyncio.DatagramTransport, transport)
+
+    def datagram_received(self, data: bytes, _addr: Union[Tuple[str, int], str]) -> None:
+        match = EVENT_PATTERN.match(data)
+        if match:
+            level, name, text = match.groups()
+            self._on_event(WPAEvent(int(level), name.decode(errors="ignore"), text.decode(errors="ignore").strip()))
+            return
+        if not self._pending:
+            logger.debug(f"Discarding unexpected wpa_supplicant reply: {data!r}")
+            return
+        future = self._pending.popleft()
+        if not future.done():
+            future.set_result(data)
+
+    def error_received(self, exc: Exception) -> None:
+        self._fail(exc)
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self._fail(exc or ConnectionError("Socket closed."))
+
+    def _fail(self, error: Exception) -> None:
+        self._transport = None
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(SockCommError(f"Lost communication with WPA Supplicant: {error}"))
+        if not self._closed:
+            self._on_lost(error)
+
+    async def request(self, command: str, timeout: float) -> bytes:
+        if self._transport is None:
+            raise SockCommError("WPA Supplicant socket is not connected.")
+        future: "asyncio.Future[bytes]" = asyncio.get_running_loop().create_future()
+        self._pending.append(future)
+        self._transport.sendto(command.encode("utf-8"))
+        return await asyncio.wait_for(future, timeout)
+
+    def close(self) -> None:
+        self._closed = True
+        if self._transport is not None:
+            sockname = self._transport.get_extra_info("sockname")
+            # Fails the pending requests once the transport is closed
+            self._transport.close()
+            self._transport = None
+            if isinstance(sockname, str) and sockname:
+                try:
+                    os.remove(sockname)
+                except OSError:
+                    pass
 
 
 class WPASupplicant:
-    BUFFER_SIZE = 4096
     target: Union[Tuple[str, int], str] = ("localhost", 6664)
+    # Delays between retries of commands that wpa_supplicant is too busy to handle, unless an event comes first
+    BUSY_RETRY_MIN_S = 0.05
+    BUSY_RETRY_MAX_S = 1.0
+    # Events after which wpa_supplicant is usually able to handle the command that was busy
+    BUSY_CLEARING_EVENTS = (
+        "CTRL-EVENT-SCAN-RESULTS",
+        "CTRL-EVENT-SCAN-FAILED",
+        "CTRL-EVENT-CONNECTED",
+        "CTRL-EVENT-DISCONNECTED",
+    )
 
     def __init__(self) -> None:
-        self.sock: Optional[socket.socket] = None
+        # Commands are sent through the control socket, and unsolicited events received on the attached monitor one
+        self._control: Optional[_ControlChannel] = None
+        self._monitor: Optional[_ControlChannel] = None
+        self._event_queues: List["asyncio.Queue[WPAEvent]"] = []
+        self._metrics: Dict[str, WPACommandMetrics] = {}
+        self._reconnect_task: Optional["asyncio.Task[None]"] = None
+        self._control_lock = asyncio.Lock()
+        # Sockets get unique addresses, so replies to a replaced socket never reach the new one
+        self._socket_ids = itertools.count()
 
     def __del__(self) -> None:
-        if self.sock:
-            self.sock.close()
-
-    def run(self, target: Union[Tuple[str, int], str] = target) -> None:
+        try:
+            self.close()
+        except Exception:
+            # The event loop may be already closed
+            pass
+
+    def close(self) -> None:
+        for channel in [self._control, self._monitor]:
+            if channel is not None:
+                channel.close()
+        self._control = None
+        self._monitor = None
+
+    def _create_socket(self, name: str) -> socket.socket:
+        if isinstance(self.target, tuple):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(f"/tmp/wpa_playground/wpa_supplicant_service_{os.getpid()}_{name}_{next(self._socket_ids)}")
+        sock.setblocking(False)
+        sock.connect(self.target)
+        return sock
+
+    async def _open_channel(self, name: str) -> _ControlChannel:
+        loop = asyncio.get_running_loop()
+        sock = self._create_socket(name)
+        try:
+            _, channel = await loop.create_datagram_endpoint(
+                lambda: _ControlChannel(self._publish_event, self._on_connection_lost), sock=sock
+            )
+        except Exception:
+            sock.close()
+            raise
+        return channel
+
+    async def run(self, target: Union[Tuple[str, int], str] = target) -> None:
         """Does the connection and setup variables
 
         Arguments:
             path {[tuple/str]} -- Can be a tuple to connect (ip/port) or unix socket file
         """
+        self.close()
         self.target = target
 
         wpa_playground_path = "/tmp/wpa_playground"
         Path(wpa_playground_path).mkdir(parents=True, exist_ok=True)
-
-        if isinstance(self.target, tuple):
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        else:
-            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        if not isinstance(self.target, tuple):
             # clear path
             files = glob.glob(f"{wpa_playground_path}/*")
             for f in files:
                 os.remove(f)
-            socket_client = f"{wpa_playground_path}/wpa_supplicant_service_{os.getpid()}"
-            self.sock.bind(socket_client)
 
-        self.sock.settimeout(10)
-        self.sock.connect(self.target)
+        self._control = await self._open_channel("control")
+        try:
+            self._monitor = await self._open_channel("monitor")
+            reply = await self._monitor.request("ATTACH", timeout=5)
+            if reply.strip() != b"OK":
+                raise WPAOperationFail(f"Failed to attach to WPA Supplicant events: {reply!r}")
+        except Exception as error:
+            # Commands still work without the events
+            logger.warning(f"Could not subscribe to WPA Supplicant events: {error}")
+            if self._monitor is not None:
+                self._monitor.close()
+                self._monitor = None
+
+    async def _replace_control(self, control: _ControlChannel) -> None:
+        """Replace the control socket after a request timed out on it, unless it was already replaced."""
+        async with self._control_lock:
+            if self._control is not control:
+                return
+            try:
+                self._control = await self._open_channel("control")
+            except Exception as error:
+                logger.warning(f"Failed to replace WPA Supplicant control socket: {error}")
+                self._on_connection_lost(error)
+            finally:
+                control.close()
+
+    def _on_connection_lost(self, error: Exception) -> None:
+        if self._reconnect_task is not None and not self._reconnect_task.done():
+            return
+        logger.warning(f"Lost connection with WPA Supplicant socket: {error}")
+        self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        try:
+            logger.warning("Trying to recover and recreate socket..")
+            await self.run(self.target)
+        except Exception as error:
+            logger.error(f"Failed to recreate wpa socket: {error}")
+
+    def _publish_event(self, event: WPAEvent) -> None:
+        logger.debug(f"WPA Supplicant event: {event.name} {event.text}")
+        for queue in self._event_queues:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                logger.warning(f"Dropping WPA Supplicant event {event.name}, subscriber is not keeping up.")
+
+    def subscribe(self, max_events: int = 100) -> "asyncio.Queue[WPAEvent]":
+        """Receive the unsolicited events of wpa_supplicant on the returned queue, until unsubscribed."""
+        queue: "asyncio.Queue[WPAEvent]" = asyncio.Queue(max_events)
+        self._event_queues.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: "asyncio.Queue[WPAEvent]") -> None:
+        if queue in self._event_queues:
+            self._event_queues.remove(queue)
+
+    @property
+    def has_events(self) -> bool:
+        """If the unsolicited events are being received."""
+        return self._monitor is not None
+
+    async def events(self) -> AsyncGenerator[WPAEvent, None]:
+        queue = self.subscribe()
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.unsubscribe(queue)
+
+    async def wait_for_event(
+        self, names: Collection[str], timeout: float, queue: Optional["asyncio.Queue[WPAEvent]"] = None
+    ) -> WPAEvent:
+        """Wait for one of the given events.
+        Raises asyncio.TimeoutError if none of them arrives before the specified timeout.
+
+        Arguments:
+            names {Collection[str]} -- Names of the events to wait for, e.g. CTRL-EVENT-SCAN-RESULTS
+            timeout {float} -- Maximum time (in seconds) to wait for the event
+            queue {asyncio.Queue} -- Subscription to be used, so events that happened since it was created are
+                not missed. A temporary one is used if not provided.
+        """
+        subscription = queue if queue is not None else self.subscribe()
+
+        async def wait() -> WPAEvent:
+            while True:
+                event = await subscription.get()
+                if event.name in names:
+                    return event
+
+        try:
+            return await asyncio.wait_for(wait(), timeout)
+        finally:
+            if queue is None:
+                self.unsubscribe(subscription)
+
+    def command_metrics(self) -> Dict[str, WPACommandMetrics]:
+        return {command: metrics.model_copy() for command, metrics in self._metrics.items()}
+
+    def _record(self, metrics: WPACommandMetrics, elapsed_s: float, error: bool = False) -> None:
+        elapsed_ms = elapsed_s * 1000
+        metrics.average_ms = (metrics.average_ms * metrics.count + elapsed_ms) / (metrics.count + 1)
+        metrics.count += 1
+        metrics.errors += int(error)
+        metrics.last_ms = elapsed_ms
+        metrics.max_ms = max(metrics.max_ms, elapsed_ms)
 
     async def send_command(self, command: str, timeout: float) -> bytes:
         """Send a specific WPA Supplicant command.
@@ -54,34 +295,54 @@ class WPASupplicant:
             command {str} -- WPA Supplicant command to be sent
             timeout {float} -- Maximum time (in seconds) allowed for receiving an answer before raising a BusyError
         """
-        assert self.sock, "No socket assigned to WPA Supplicant"
+        assert self._control, "No socket assigned to WPA Supplicant"
 
-        timeout_start = time.time()
-        while time.time() - timeout_start < timeout:
+        loop = asyncio.get_running_loop()
+        metrics = self._metrics.setdefault(command.split(" ", 1)[0], WPACommandMetrics())
+        start = loop.time()
+        retry_delay = self.BUSY_RETRY_MIN_S
+        while True:
+            remaining = timeout - (loop.time() - start)
+            control = self._control
             try:
-                self.sock.send(command.encode("utf-8"))
-                data, _ = self.sock.recvfrom(self.BUFFER_SIZE)
+                if control is None:
+                    raise SockCommError("WPA Supplicant socket is not connected.")
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                data = await control.request(command, remaining)
+            except asyncio.TimeoutError as error:
+                metrics.timeouts += 1
+                if control is not None and remaining > 0:
+                    await self._replace_control(control)
+                raise BusyError(
+                    f"{command} operation took more than specified timeout ({timeout}). Cancelling."
+                ) from error
             except Exception as error:
+                self._record(metrics, loop.time() - start, error=True)
+                if isinstance(error, SockCommError):
+                    raise
                 # Oh my, something is wrong!
                 # For now, let us report the error but not without recreating the socket
                 error_message = "Could not communicate with WPA Supplicant socket"
-                try:
-                    logger.warning(f"{error_message}: {error}")
-                    logger.warning("Trying to recover and recreate socket..")
-                    self.run(self.target)
-                except Exception as inner_error:
-                    logger.error(f"Failed to send command and failed to recreate wpa socket: {inner_error}")
+                logger.warning(f"{error_message}: {error}")
+                self._on_connection_lost(error)
                 raise SockCommError(error_message) from error
 
-            if b"FAIL-BUSY" in data:
-                logger.info(f"Busy during {command} operation. Trying again...")
-                await asyncio.sleep(0.1)
-                continue
-            break
-        else:
-            raise BusyError(f"{command} operation took more than specified timeout ({timeout}). Cancelling.")
-
-        if data == b"FAIL":
+            if b"FAIL-BUSY" not in data:
+                break
+            logger.info(f"Busy during {command} operation. Trying again...")
+            metrics.busy_retries += 1
+            try:
+                await self.wait_for_event(
+                    self.BUSY_CLEARING_EVENTS, min(retry_delay, max(0.0, timeout - (loop.time() - start)))
+                )
+            except asyncio.TimeoutError:
+                pass
+            retry_delay = min(retry_delay * 2, self.BUSY_RETRY_MAX_S)
+
+        failed = data == b"FAIL"
+        self._record(metrics, loop.time() - start, error=failed)
+        if failed:
             raise WPAOperationFail(f"WPA operation {command} failed.")
 
         return data
@@ -890,8 +1151,8 @@ class WPASupplicant:
 
 async def main() -> None:
     wpa = WPASupplicant()
-    wpa.run(("localhost", 6664))
-    time.sleep(1)
+    await wpa.run(("localhost", 6664))
+    await asyncio.sleep(1)
     await wpa.send_command_list_networks()
     for i in range(5):
         await wpa.send_command_remove_network(i)
@@ -903,7 +1164,7 @@ async def main() -> None:
     await wpa.send_command_save_config()
     await wpa.send_command_reconfigure()
     while True:
-        time.sleep(1)
+        await asyncio.sleep(1)
         await wpa.send_command_ping()
 
 